@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+One-shot migration of API Key database to hashed API Keys.
+
+Adds api_key_hash column and its unique index to api_keys table and fills digests of existing API Keys.
+Account runs the same migration when it opens the database, running this before deploy keeps first requests fast
+on large databases. Migration is idempotent.
+
+Usage (from Account directory):
+    python api_key_migrate.py [--database app/mod_api_auth/apiauth.sqlite] [--batch-size 1000]
+"""
+import argparse
+import sqlite3
+import sys
+import time
+
+from app.mod_api_auth import services
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migration of API Key database to hashed API Keys")
+    parser.add_argument('--database', default=services.DATABASE, help="API Key database, Defaults to DATABASE")
+    parser.add_argument('--batch-size', type=int, default=services.MIGRATION_BATCH_SIZE, help="Rows hashed in one batch")
+    args = parser.parse_args()
+
+    services.MIGRATION_BATCH_SIZE = args.batch_size
+    connection = sqlite3.connect(args.database, timeout=services.BUSY_TIMEOUT)
+    try:
+        for sql_query in services.SCHEMA:
+            connection.execute(sql_query)
+        start = time.time()
+        hashed = services.migrate_api_key_hashes(connection=connection)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    sys.stderr.write("API Keys hashed: {} in {:.3f} s\n".format(hashed, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,6 @@ sys.setdefaultencoding('utf-8')
 # Import flask and template operators
 from flask import Flask, render_template, Blueprint, json, make_response
 from flask_restful import Resource, Api
-from flask.ext.mysqldb import MySQL
 from flask.ext.login import LoginManager
 
 # Define the WSGI application object
@@ -43,7 +42,9 @@ login_manager.login_message = app.config["LOGIN_MESSAGE"]
 login_manager.session_protection = app.config["SESSION_PROTECTION"]
 
 # Database
-db = MySQL(app)
+# Pooled replacement for Flask-MySQLdb, imported here as it needs configured app object
+from app.mod_database.services import PooledMySQL
+db = PooledMySQL(app)
 
 # =========================================
 # Flask-restful
@@ -12,12 +12,17 @@ __status__ = "Development"
 """
 
 import logging
+import threading
+import time
+from collections import OrderedDict
 from logging.handlers import TimedRotatingFileHandler
 from os.path import isdir
 from datetime import datetime
 from functools import wraps
 
-from flask import json
+from flask import json, request, current_app
+
+from app.log_helpers import BackgroundLogHandler, lazy_repr, lazy_json, log_writer
 
 # https://docs.python.org/3/howto/urllib2.html#httperror
 http_responses = {
@@ -67,11 +72,16 @@ http_responses = {
 }
 
 
+_log_handler = None
+
+
 def get_custom_logger(logger_name='default_logger'):
     # TODO: Is it ok to import here?
     from os import mkdir
     from app import app
 
+    global _log_handler
+
     # Logging levels
     # CRITICAL
     # ERROR
@@ -80,6 +90,11 @@ def get_custom_logger(logger_name='default_logger'):
     # DEBUG
     # NOTSET
 
+    logger = logging.getLogger(logger_name)
+    if _log_handler is not None and _log_handler in logger.handlers:
+        # Already configured, get_custom_logger() is cheap to call at request time
+        return logger
+
     # If there is no directory './logs', it will be created
     if app.config["LOG_PATH"] != "./":
         if not isdir(app.config["LOG_PATH"]):
@@ -91,12 +106,9 @@ def get_custom_logger(logger_name='default_logger'):
             except Exception as e:
                 print("LOG_PATH: '{}' could not be created. Exception: {}.".format(app.config["LOG_PATH"], repr(e)))
 
-    logger = logging.getLogger(logger_name)
-
-    if len(logger.handlers) == 0:
-        # TODO: This can not be correct solution
-        logger.setLevel(logging.DEBUG)
+    logger.setLevel(app.config["LOG_LEVEL"])
 
+    if _log_handler is None:
         # create formatter
         formatter = logging.Formatter(app.config["LOG_FORMATTER"])
 
@@ -104,18 +116,34 @@ def get_custom_logger(logger_name='default_logger'):
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.DEBUG)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers = [console_handler]
 
         # file handler
         if app.config["LOG_TO_FILE"]:
             file_handler = TimedRotatingFileHandler(app.config["LOG_FILE"], when="midnight", interval=1, backupCount=10, utc=True)
             file_handler.setLevel(logging.DEBUG)
             file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
+
+        # Console and file are written in background thread, request threads only enqueue records.
+        # Writer is shared with loggers of blackbox and api auth, queue is created on first record of the process.
+        log_writer.queue_size = int(app.config["LOG_QUEUE_SIZE"])
+        _log_handler = BackgroundLogHandler(handlers=handlers)
+
+    logger.addHandler(_log_handler)
 
     return logger
 
 
+def get_log_handler_stats():
+    """
+    Counters of background log writer of current process, shared by all loggers.
+
+    :return: dict
+    """
+    return log_writer.stats()
+
+
 def make_json_response(data=None, errors=None, status_code=200):
 
     logger = get_custom_logger(logger_name="make_json_response")
@@ -154,10 +182,10 @@ def make_json_response(data=None, errors=None, status_code=200):
     # To fix strange json encoding behaviour
     # TODO: Get rid of this
     if errors is not None:
-        logger.debug("response_data: " + json.dumps(response_data))
+        logger.debug("response_data: %s", lazy_json(response_data))
         response_data = json.dumps(response_data, sort_keys=True, indent=4)
     else:
-        logger.debug("response_data: " + json.dumps(response_data))
+        logger.debug("response_data: %s", lazy_json(response_data))
 
     # http://flask.pocoo.org/snippets/83/
     # response = jsonify(message=str(ex))
@@ -222,3 +250,172 @@ def get_utc_time():
     """
 
     return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class StageTimer(object):
+    """
+    Wall clock durations of named stages of request handling, in milliseconds.
+    Each mark() ends the stage that started at previous mark or at creation of the timer.
+    """
+
+    def __init__(self):
+        self._start = time.time()
+        self._last = self._start
+        self.stages = []
+
+    def mark(self, stage=None):
+        if stage is None:
+            raise AttributeError("Provide stage as parameter")
+
+        now = time.time()
+        self.stages.append((stage, round((now - self._last) * 1000.0, 3)))
+        self._last = now
+
+    def to_dict(self):
+        return {
+            'stages': [{'stage': stage, 'ms': duration} for stage, duration in self.stages],
+            'total_ms': round((self._last - self._start) * 1000.0, 3)
+        }
+
+
+def debug_timing_requested():
+    """
+    :return: True if request has DEBUG_TIMING_HEADER and durations of stages should be added to response
+    """
+    header = current_app.config.get("DEBUG_TIMING_HEADER")
+    return bool(header) and request.headers.get(header) is not None
+
+
+class LruTtlCache(object):
+    """
+    Thread safe in-process cache with least recently used eviction and time to live for entries.
+
+    Cache is per process. Entries are not shared between worker processes,
+    so ttl limits how long a stale entry can live in other processes after invalidation.
+
+    Entries can be tagged, for example with Account ID, so that all entries of a tag are invalidated
+    without scanning the cache.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        if max_size < 1:
+            raise AttributeError("Illegal value for max_size: " + str(max_size))
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key: (value, expires_at, tag), most recently used at the end
+        self._tags = {}  # tag: set of keys
+
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key=None, default=None):
+        """
+        :param key: Cache key
+        :param default: Returned if there is no valid entry for the key
+        :return: Cached value or default
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._misses += 1
+                return default
+            if entry[1] is not None and entry[1] < time.time():
+                self._untag(key=key, tag=entry[2])
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._entries[key] = entry
+            self._hits += 1
+            return entry[0]
+
+    def _untag(self, key=None, tag=None):
+        if tag is None:
+            return
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def set(self, key=None, value=None, ttl=None, tag=None):
+        """
+        :param key: Cache key
+        :param value: Value to cache
+        :param ttl: Time to live of the entry in seconds, defaults to ttl of the cache. 0 or None disables expiration.
+        :param tag: Tag of the entry for invalidate_tag(), optional
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = time.time() + ttl if ttl else None
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._untag(key=key, tag=entry[2])
+            self._entries[key] = (value, expires_at, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, evicted_entry = self._entries.popitem(last=False)
+                self._untag(key=evicted_key, tag=evicted_entry[2])
+                self._evictions += 1
+
+    def invalidate(self, key=None):
+        """
+        :param key: Cache key
+        :return: True if entry was removed
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._untag(key=key, tag=entry[2])
+            self._invalidations += 1
+            return True
+
+    def invalidate_tag(self, tag=None):
+        """
+        :param tag: Tag given to set()
+        :return: Number of removed entries
+        """
+        if tag is None:
+            raise AttributeError("Provide tag as parameter")
+
+        with self._lock:
+            keys = self._tags.pop(tag, ())
+            for key in keys:
+                del self._entries[key]
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        """
+        Gauges and counters of the cache.
+
+        :return: dict
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': float(self._hits) / lookups if lookups else 0.0,
+                'expirations': self._expirations,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Logging utilities shared by all modules. Does not depend on Flask application or other modules,
+so that it can be imported by modules that are also run outside of the application, like blackbox daemon.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
+
+LOG_MAX_LENGTH = 2000  # Lazily formatted log arguments are truncated to this many characters, 0 disables. Default: 2000
+LOG_QUEUE_SIZE = 10000  # Log records waiting for background writer, more are dropped. Default: 10000
+
+
+class LazyLogArgument(object):
+    """
+    Log argument that is formatted only if log record is emitted.
+
+    Use with %-style logging calls, so that nothing is serialized if level is disabled:
+        logger.debug('jws_object: %s', lazy_json(jws_object.__dict__))
+    Formatted text is truncated to max_length characters.
+    """
+    __slots__ = ('function', 'value', 'max_length')
+
+    def __init__(self, function=None, value=None, max_length=None):
+        self.function = function
+        self.value = value
+        self.max_length = LOG_MAX_LENGTH if max_length is None else max_length
+
+    def __str__(self):
+        try:
+            text = self.function(self.value)
+        except Exception as exp:
+            text = 'Could not format log argument: ' + repr(exp)
+        if self.max_length and len(text) > self.max_length:
+            text = text[:self.max_length] + '... (' + str(len(text)) + ' characters)'
+        return text
+
+    __repr__ = __str__
+
+
+def lazy_repr(value=None, max_length=None):
+    return LazyLogArgument(function=repr, value=value, max_length=max_length)
+
+
+def lazy_json(value=None, pretty=False, max_length=None):
+    if pretty:
+        return LazyLogArgument(function=lambda data: json.dumps(data, indent=4, sort_keys=True), value=value, max_length=max_length)
+    return LazyLogArgument(function=json.dumps, value=value, max_length=max_length)
+
+
+class BackgroundLogWriter(object):
+    """
+    Queue and background thread that write log records with the handlers they were queued with.
+
+    Writer thread is started on first record of each process. If queue is full, records are dropped and counted.
+    queue_size can be changed until the first record is queued.
+    """
+
+    def __init__(self, queue_size=10000):
+        self.queue_size = queue_size
+
+        self._queue = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._emitted = 0
+        self._dropped = 0
+
+    def _writer_queue(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._start_lock:
+                if self._pid != pid:
+                    # Writer thread of parent process does not exist after fork
+                    self._queue = Queue.Queue(maxsize=self.queue_size)
+                    writer = threading.Thread(target=self._write, args=(self._queue,), name='log-writer-' + str(pid))
+                    writer.daemon = True
+                    writer.start()
+                    self._pid = pid
+        return self._queue
+
+    def _write(self, queue):
+        while True:
+            handlers, record = queue.get()
+            for handler in handlers:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except Exception:
+                        handler.handleError(record)
+
+    def put(self, handlers=None, record=None):
+        """
+        Queues record without blocking.
+
+        :return: False if queue was full and record was dropped
+        """
+        try:
+            self._writer_queue().put_nowait((handlers, record))
+        except Queue.Full:
+            self._dropped += 1
+            return False
+        else:
+            self._emitted += 1
+            return True
+
+    def flush(self):
+        # Called by logging.shutdown() at exit, gives writer thread a moment to write pending records
+        if self._queue is not None and self._pid == os.getpid():
+            deadline = time.time() + 1.0
+            while not self._queue.empty() and time.time() < deadline:
+                time.sleep(0.01)
+
+    def stats(self):
+        """
+        Gauges and counters of the writer in current process.
+
+        :return: dict
+        """
+        return {
+            'queue_size': self.queue_size,
+            'queue_depth': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+            'emitted': self._emitted,
+            'dropped': self._dropped,
+        }
+
+
+# One queue and writer thread per process for all loggers
+log_writer = BackgroundLogWriter(queue_size=LOG_QUEUE_SIZE)
+
+
+class BackgroundLogHandler(logging.Handler):
+    """
+    Hands log records to background writer, which writes them with given handlers.
+    Equivalent of QueueHandler and QueueListener of Python 3 logging.
+
+    Message is formatted in the calling thread, so that lazy arguments see the values they had when logged.
+    All handlers share the writer of this module unless other writer is given.
+    """
+
+    def __init__(self, handlers=None, writer=None):
+        if handlers is None:
+            raise AttributeError("Provide handlers as parameter")
+
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.writer = log_writer if writer is None else writer
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.writer.put(handlers=self.handlers, record=self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.writer.flush()
+
+    def stats(self):
+        return self.writer.stats()
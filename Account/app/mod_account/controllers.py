@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 # Import dependencies
+import json
 import uuid
 import logging
 import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/bcrypt/2.0.0
@@ -19,8 +20,14 @@ from app import db, api, login_manager, app
 # Import services
 from app.helpers import get_custom_logger
 from app.mod_database.helpers import get_db_cursor
+from app.mod_account.models import AccountSchema2
 from app.mod_account.services import get_contacts_by_account, get_emails_by_account, get_telephones_by_account, \
-    get_service_link_record_count_by_account, get_consent_record_count_by_account
+    get_service_link_record_count_by_account, get_consent_record_count_by_account, get_account_counters, \
+    store_accounts
+from app.mod_api_auth.controllers import gen_account_api_key, gen_account_api_keys
+from app.mod_auth.helpers import invalidate_cached_credentials, invalidate_cached_user
+from app.mod_auth.services import hash_passwords
+from app.mod_blackbox.client import gen_account_key, gen_account_keys
 
 
 # create logger with 'spam_application'
@@ -46,13 +53,16 @@ def get_potential_consents_count(cursor=None, account_id=None):
     return cursor, data
 
 
-def get_passive_services_count(cursor=None, account_id=None):
-    data = randint(10, 100)
-    return cursor, data
+def get_counters(cursor=None, account_id=None):
 
+    check_account_id(account_id=account_id)
+
+    if cursor is None:
+        cursor = get_db_cursor()
+        logger.debug('No DB cursor provided as call parameter. Getting new one.')
+
+    cursor, data = get_account_counters(cursor=cursor, account_id=account_id)
 
-def get_passive_consents_count(cursor=None, account_id=None):
-    data = randint(10, 100)
     return cursor, data
 
 
@@ -121,3 +131,170 @@ def get_telephones(cursor=None, account_id=None):
     return cursor, data
 
 
+
+
+##########################################
+# Account import
+##########################################
+def parse_account_import_line(line_no=None, line=None):
+    """
+    Parses and validates one NDJSON line of Account import with AccountSchema2.
+
+    :return: Tuple of Account data and result dict. Account data is None if line is not valid.
+    """
+    result = {'line': line_no, 'status': 'failed'}
+
+    try:
+        json_data = json.loads(line)
+        result['username'] = json_data.get('username')
+    except Exception as exp:
+        result['errors'] = {'0': 'Invalid JSON: ' + repr(exp)}
+        return None, result
+
+    schema_validation_result = AccountSchema2().load(json_data)
+    if schema_validation_result.errors:
+        result['errors'] = dict(schema_validation_result.errors)
+        return None, result
+
+    return json_data, result
+
+
+def store_imported_accounts(account_entries=None, results=None):
+    """
+    Stores Accounts in one transaction. If transaction fails, Accounts are stored one by one,
+    so that only the failing rows are reported as failed.
+    """
+    cursor = get_db_cursor()
+
+    try:
+        cursor, accounts = store_accounts(cursor=cursor, account_entries=account_entries)
+        db.connection.commit()
+    except Exception as exp:
+        db.connection.rollback()
+        logger.info('Could not store ' + str(len(account_entries)) + ' Accounts in one transaction, '
+                    'storing them one by one: ' + repr(exp))
+    else:
+        for result, account in zip(results, accounts):
+            invalidate_cached_credentials(account_id=account.id)
+            invalidate_cached_user(account_id=account.id)
+            result['status'] = 'created'
+            result['id'] = str(account.id)
+        return
+
+    for entry, result in zip(account_entries, results):
+        try:
+            cursor, accounts = store_accounts(cursor=cursor, account_entries=[entry])
+            db.connection.commit()
+        except Exception as exp:
+            db.connection.rollback()
+            result['errors'] = {'0': 'Could not create Account: ' + repr(exp)}
+        else:
+            invalidate_cached_credentials(account_id=accounts[0].id)
+            invalidate_cached_user(account_id=accounts[0].id)
+            result['status'] = 'created'
+            result['id'] = str(accounts[0].id)
+
+
+def generate_imported_account_keys(results=None, key_type=None, batch_function=None, single_function=None):
+    """
+    Generates keys for created Accounts in one batch. If batch fails, keys are generated one by one.
+    Failures are reported as warnings as the Account itself has been created.
+    """
+    account_ids = [result['id'] for result in results]
+    if len(account_ids) == 0:
+        return
+
+    try:
+        batch_function(account_ids=account_ids)
+    except Exception as exp:
+        logger.info('Could not generate ' + key_type + 's in batch, generating them one by one: ' + repr(exp))
+    else:
+        return
+
+    for result in results:
+        try:
+            single_function(account_id=result['id'])
+        except Exception as exp:
+            logger.error('Could not generate ' + key_type + ' for Account ' + result['id'] + ': ' + repr(exp))
+            result.setdefault('warnings', {})[key_type] = 'Could not generate ' + key_type + ': ' + repr(exp)
+
+
+def import_account_chunk(rows=None):
+    """
+    Imports one chunk of validated Account rows.
+    Passwords are hashed in parallel, Accounts are stored in one transaction
+    and Keys and API Keys are generated in batches.
+
+    :param rows: List of (Account data, result dict) tuples
+    :return: List of result dicts
+    """
+    if rows is None:
+        raise AttributeError("Provide rows as parameter")
+
+    hashes = hash_passwords(passwords=[json_data['password'] for json_data, result in rows])
+
+    account_entries = []
+    entry_results = []
+    for (json_data, result), (error, salt, pwd_hash) in zip(rows, hashes):
+        if error is not None:
+            result['errors'] = {'0': 'Could not hash password: ' + error}
+            continue
+        account_entries.append({
+            'global_identifier': str(uuid.uuid4()),
+            'username': json_data['username'],
+            'pwd_hash': pwd_hash,
+            'salt': salt,
+            'firstname': json_data['firstName'],
+            'lastname': json_data['lastName'],
+            'date_of_birth': json_data['dateOfBirth'],
+            'email': json_data['email']
+        })
+        entry_results.append(result)
+
+    if len(account_entries) > 0:
+        store_imported_accounts(account_entries=account_entries, results=entry_results)
+
+    created = [result for result in entry_results if result['status'] == 'created']
+    generate_imported_account_keys(results=created, key_type='Key',
+                                   batch_function=gen_account_keys, single_function=gen_account_key)
+    generate_imported_account_keys(results=created, key_type='API Key',
+                                   batch_function=gen_account_api_keys, single_function=gen_account_api_key)
+
+    return [result for json_data, result in rows]
+
+
+def import_accounts(lines=None, chunk_size=500):
+    """
+    Imports Accounts from NDJSON lines, one Account per line in the same format as in POST /api/accounts/.
+    Lines are processed in chunks of chunk_size. Invalid rows are reported without aborting the import.
+
+    Must be called within application context.
+
+    :param lines: Iterable of NDJSON lines
+    :param chunk_size: Number of Accounts stored in one transaction
+    :return: Generator of result dicts, one per non-empty line
+    """
+    if lines is None:
+        raise AttributeError("Provide lines as parameter")
+    if chunk_size < 1:
+        raise AttributeError("Illegal value for chunk_size: " + str(chunk_size))
+
+    rows = []
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+
+        json_data, result = parse_account_import_line(line_no=line_no, line=line)
+        if json_data is None:
+            yield result
+            continue
+
+        rows.append((json_data, result))
+        if len(rows) >= chunk_size:
+            for result in import_account_chunk(rows=rows):
+                yield result
+            rows = []
+
+    if len(rows) > 0:
+        for result in import_account_chunk(rows=rows):
+            yield result
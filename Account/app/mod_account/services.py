@@ -1,30 +1,34 @@
 # -*- coding: utf-8 -*-
 
 # Import dependencies
+import time
 import uuid
 import logging
 import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/bcrypt/2.0.0
+import MySQLdb.cursors
+from flask import json
 
 
 # Import the database object from the main app module
 from app import db, api, login_manager, app
 
 # create logger with 'spam_application'
-from app.helpers import get_custom_logger
-from app.mod_database.helpers import execute_sql_select
-from app.mod_database.models import Contacts, Email, Telephone
+from app.helpers import get_custom_logger, lazy_repr
+from app.mod_database.helpers import execute_sql_select, execute_sql_select_2
+from app.mod_database.models import ContactRow, EmailRow, TelephoneRow, Email, Account, LocalIdentityPWD, LocalIdentity, Salt, \
+    Particulars
 
 logger = get_custom_logger('mod_account_services')
 
 
 def get_service_link_record_count_by_account(cursor=None, account_id=None):
     if app.config["SUPER_DEBUG"]:
-        logger.debug('account_id: ' + repr(account_id))
+        logger.debug('account_id: %s', lazy_repr(account_id))
 
     ###
     logger.debug('get_consent_record_count(account_id)')
     if app.config["SUPER_DEBUG"]:
-        logger.debug('account_id: ' + repr(account_id))
+        logger.debug('account_id: %s', lazy_repr(account_id))
 
     sql_query = "SELECT count(MyDataAccount.ServiceLinkRecords.id) " \
                 "FROM MyDataAccount.ServiceLinkRecords " \
@@ -35,23 +39,23 @@ def get_service_link_record_count_by_account(cursor=None, account_id=None):
         count = count[0][0]
     except Exception as exp:
         logger.error('Failed')
-        logger.debug('sql_query: ' + repr(exp))
+        logger.debug('sql_query: %s', lazy_repr(exp))
         raise
     else:
         if app.config["SUPER_DEBUG"]:
-            logger.debug('contacts: ' + repr(count))
+            logger.debug('contacts: %s', lazy_repr(count))
 
         return cursor, count
 
 
 def get_consent_record_count_by_account(cursor=None, account_id=None):
     if app.config["SUPER_DEBUG"]:
-        logger.debug('account_id: ' + repr(account_id))
+        logger.debug('account_id: %s', lazy_repr(account_id))
 
     ###
     logger.debug('get_consent_record_count(account_id)')
     if app.config["SUPER_DEBUG"]:
-        logger.debug('account_id: ' + repr(account_id))
+        logger.debug('account_id: %s', lazy_repr(account_id))
 
     sql_query = "SELECT count(MyDataAccount.ConsentRecords.id) " \
                 "FROM MyDataAccount.ConsentRecords " \
@@ -62,11 +66,11 @@ def get_consent_record_count_by_account(cursor=None, account_id=None):
         count = count[0][0]
     except Exception as exp:
         logger.error('Failed')
-        logger.debug('sql_query: ' + repr(exp))
+        logger.debug('sql_query: %s', lazy_repr(exp))
         raise
     else:
         if app.config["SUPER_DEBUG"]:
-            logger.debug('contacts: ' + repr(count))
+            logger.debug('contacts: %s', lazy_repr(count))
 
         return cursor, count
 
@@ -84,36 +88,21 @@ def get_contacts_by_account(cursor=None, account_id=None):
                 "MyDataAccount.Contacts.typeEnum, " \
                 "MyDataAccount.Contacts.prime " \
                 "FROM MyDataAccount.Contacts " \
-                "WHERE Accounts_id = ('%s')" % (account_id)
+                "WHERE Accounts_id = %s"
 
-    try:
-        cursor, data = execute_sql_select(cursor=cursor, sql_query=sql_query)
-
-        contacts = []
-
-        for entry in data:
-            contact_obj = Contacts(
-                id=entry[0],
-                address1=entry[1],
-                address2=entry[2],
-                postal_code=entry[3],
-                city=entry[4],
-                state=entry[5],
-                country=entry[6],
-                type=entry[7],
-                prime=entry[8]
-            )
-
-            contacts.append(contact_obj.to_dict)
+    arguments = (account_id, )
 
+    try:
+        cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
 
+        contacts = ContactRow.from_rows(rows=data)
     except Exception as exp:
         logger.error('Failed')
-        logger.debug('sql_query: ' + repr(exp))
+        logger.debug('sql_query: %s', lazy_repr(exp))
         raise
     else:
         if app.config["SUPER_DEBUG"]:
-            logger.debug('contacts: ' + repr(contacts))
+            logger.debug('contacts: %s', lazy_repr(contacts))
 
         return cursor, contacts
 
@@ -126,31 +115,21 @@ def get_emails_by_account(cursor=None, account_id=None):
                 "MyDataAccount.Emails.typeEnum, " \
                 "MyDataAccount.Emails.prime " \
                 "FROM MyDataAccount.Emails " \
-                "WHERE Accounts_id = ('%s')" % (account_id)
-
-    try:
-        cursor, data = execute_sql_select(cursor=cursor, sql_query=sql_query)
-
-        emails = []
-
-        for entry in data:
-            email_obj = Email(
-                id=entry[0],
-                email=entry[1],
-                type=entry[2],
-                prime=entry[3]
-            )
+                "WHERE Accounts_id = %s"
 
-            emails.append(email_obj.to_dict)
+    arguments = (account_id, )
 
+    try:
+        cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
 
+        emails = EmailRow.from_rows(rows=data)
     except Exception as exp:
         logger.error('Failed')
-        logger.debug('sql_query: ' + repr(exp))
+        logger.debug('sql_query: %s', lazy_repr(exp))
         raise
     else:
         if app.config["SUPER_DEBUG"]:
-            logger.debug('contacts: ' + repr(emails))
+            logger.debug('contacts: %s', lazy_repr(emails))
 
         return cursor, emails
 
@@ -163,31 +142,522 @@ def get_telephones_by_account(cursor=None, account_id=None):
                 "MyDataAccount.Telephones.typeEnum, " \
                 "MyDataAccount.Telephones.prime " \
                 "FROM MyDataAccount.Telephones " \
-                "WHERE Accounts_id = ('%s')" % (account_id)
+                "WHERE Accounts_id = %s"
+
+    arguments = (account_id, )
 
     try:
-        cursor, data = execute_sql_select(cursor=cursor, sql_query=sql_query)
+        cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
 
-        telephones = []
+        telephones = TelephoneRow.from_rows(rows=data)
+    except Exception as exp:
+        logger.error('Failed')
+        logger.debug('sql_query: %s', lazy_repr(exp))
+        raise
+    else:
+        if app.config["SUPER_DEBUG"]:
+            logger.debug('contacts: %s', lazy_repr(telephones))
 
-        for entry in data:
-            telephone_obj = Telephone(
-                id=entry[0],
-                tel=entry[1],
-                type=entry[2],
-                prime=entry[3]
-            )
+        return cursor, telephones
 
-            telephones.append(telephone_obj.to_dict)
 
+##########################################
+# Account counters
+##########################################
+# Counters in AccountCounters table. Consents are counted by Sink's Consent Records, one per consent.
+ACCOUNT_COUNTER_COLUMNS = (
+    'serviceLinks',
+    'serviceLinksActive',
+    'serviceLinksRemoved',
+    'consents',
+    'consentsActive',
+    'consentsPaused',
+    'consentsWithdrawn',
+)
+
+SERVICE_LINK_STATUS_COUNTERS = {
+    'Active': 'serviceLinksActive',
+    'Removed': 'serviceLinksRemoved',
+}
+
+CONSENT_STATUS_COUNTERS = {
+    'Active': 'consentsActive',
+    'Paused': 'consentsPaused',
+    'Withdrawn': 'consentsWithdrawn',
+}
+
+# Counters computed from Service Link Records, Consent Records and their latest status records.
+# Used for Accounts that have records stored before AccountCounters table was introduced.
+ACCOUNT_COUNTERS_COMPUTE_QUERY = \
+    "SELECT acc.id, " \
+    "(SELECT count(slr.id) FROM MyDataAccount.ServiceLinkRecords slr WHERE slr.Accounts_id = acc.id), " \
+    "(SELECT count(ssr.id) FROM MyDataAccount.ServiceLinkStatusRecords ssr " \
+    "JOIN MyDataAccount.ServiceLinkRecords slr ON ssr.ServiceLinkRecords_id = slr.id " \
+    "WHERE slr.Accounts_id = acc.id AND ssr.serviceLinkStatus = 'Active' AND ssr.id = (" \
+    "SELECT max(latest.id) FROM MyDataAccount.ServiceLinkStatusRecords latest " \
+    "WHERE latest.ServiceLinkRecords_id = slr.id)), " \
+    "(SELECT count(ssr.id) FROM MyDataAccount.ServiceLinkStatusRecords ssr " \
+    "JOIN MyDataAccount.ServiceLinkRecords slr ON ssr.ServiceLinkRecords_id = slr.id " \
+    "WHERE slr.Accounts_id = acc.id AND ssr.serviceLinkStatus = 'Removed' AND ssr.id = (" \
+    "SELECT max(latest.id) FROM MyDataAccount.ServiceLinkStatusRecords latest " \
+    "WHERE latest.ServiceLinkRecords_id = slr.id)), " \
+    "(SELECT count(cr.id) FROM MyDataAccount.ConsentRecords cr " \
+    "JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id " \
+    "WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink'), " \
+    "(SELECT count(csr.id) FROM MyDataAccount.ConsentStatusRecords csr " \
+    "JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id " \
+    "JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id " \
+    "WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink' AND csr.consentStatus = 'Active' AND csr.id = (" \
+    "SELECT max(latest.id) FROM MyDataAccount.ConsentStatusRecords latest " \
+    "WHERE latest.ConsentRecords_id = cr.id)), " \
+    "(SELECT count(csr.id) FROM MyDataAccount.ConsentStatusRecords csr " \
+    "JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id " \
+    "JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id " \
+    "WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink' AND csr.consentStatus = 'Paused' AND csr.id = (" \
+    "SELECT max(latest.id) FROM MyDataAccount.ConsentStatusRecords latest " \
+    "WHERE latest.ConsentRecords_id = cr.id)), " \
+    "(SELECT count(csr.id) FROM MyDataAccount.ConsentStatusRecords csr " \
+    "JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id " \
+    "JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id " \
+    "WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink' AND csr.consentStatus = 'Withdrawn' AND csr.id = (" \
+    "SELECT max(latest.id) FROM MyDataAccount.ConsentStatusRecords latest " \
+    "WHERE latest.ConsentRecords_id = cr.id)) " \
+    "FROM MyDataAccount.Accounts acc " \
+    "WHERE acc.id = %s"
+
+ACCOUNT_COUNTERS_BACKFILL_QUERY = \
+    "INSERT INTO MyDataAccount.AccountCounters (" \
+    "Accounts_id, serviceLinks, serviceLinksActive, serviceLinksRemoved, " \
+    "consents, consentsActive, consentsPaused, consentsWithdrawn" \
+    ") " + ACCOUNT_COUNTERS_COMPUTE_QUERY + " " \
+    "ON DUPLICATE KEY UPDATE Accounts_id = Accounts_id"
+
+
+def service_link_counter_deltas(status=None, previous_status=None):
+    """
+    Counter changes caused by new Service Link Status Record.
+
+    :param status: Status of new Service Link Status Record
+    :param previous_status: Status of previous Service Link Status Record, None for new Service Link
+    :return: dict of counter column and change
+    """
+    if status is None:
+        raise AttributeError("Provide status as parameter")
+
+    deltas = {}
+    if previous_status is None:
+        deltas['serviceLinks'] = 1
+    elif previous_status in SERVICE_LINK_STATUS_COUNTERS:
+        deltas[SERVICE_LINK_STATUS_COUNTERS[previous_status]] = -1
+    if status in SERVICE_LINK_STATUS_COUNTERS:
+        column = SERVICE_LINK_STATUS_COUNTERS[status]
+        deltas[column] = deltas.get(column, 0) + 1
+    return deltas
+
+
+def consent_counter_deltas(status=None, previous_status=None):
+    """
+    Counter changes caused by new Consent Status Record of Sink's Consent Record.
+
+    :param status: Status of new Consent Status Record
+    :param previous_status: Status of previous Consent Status Record, None for new Consent
+    :return: dict of counter column and change
+    """
+    if status is None:
+        raise AttributeError("Provide status as parameter")
+
+    deltas = {}
+    if previous_status is None:
+        deltas['consents'] = 1
+    elif previous_status in CONSENT_STATUS_COUNTERS:
+        deltas[CONSENT_STATUS_COUNTERS[previous_status]] = -1
+    if status in CONSENT_STATUS_COUNTERS:
+        column = CONSENT_STATUS_COUNTERS[status]
+        deltas[column] = deltas.get(column, 0) + 1
+    return deltas
+
+
+def init_account_counters(cursor=None, account_ids=None):
+    """
+    Inserts zeroed counters for new Accounts. Transaction is not committed.
+
+    :param cursor: Database cursor
+    :param account_ids: List of Account IDs
+    :return: Database cursor
+    """
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if account_ids is None:
+        raise AttributeError("Provide account_ids as parameter")
+
+    if len(account_ids) == 0:
+        return cursor
+
+    sql_query = "INSERT INTO MyDataAccount.AccountCounters (Accounts_id) VALUES (%s)"
+    arguments = [(str(account_id), ) for account_id in account_ids]
 
+    try:
+        cursor.executemany(sql_query, arguments)
     except Exception as exp:
-        logger.error('Failed')
-        logger.debug('sql_query: ' + repr(exp))
+        logger.error('Could not initialize Account counters: ' + repr(exp))
+        raise
+    else:
+        return cursor
+
+
+def update_account_counters(cursor=None, account_id=None, deltas=None):
+    """
+    Adds deltas to counters of Account.
+    Must be called in the same transaction that stores the records counted, transaction is not committed.
+
+    If Account has no counters row, e.g. it was created before AccountCounters table was introduced,
+    counters are computed from stored records instead. Records stored earlier in the same transaction
+    are already included in the computed counters, so deltas are not added on top of them.
+
+    :param cursor: Database cursor
+    :param account_id: ID of Account
+    :param deltas: dict of counter column and change
+    :return: Database cursor
+    """
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+    if deltas is None:
+        raise AttributeError("Provide deltas as parameter")
+
+    columns = [column for column in ACCOUNT_COUNTER_COLUMNS if deltas.get(column, 0) != 0]
+    if len(columns) == 0:
+        return cursor
+
+    sql_query = "UPDATE MyDataAccount.AccountCounters " \
+                "SET " + ", ".join([column + " = " + column + " + %s" for column in columns]) + " " \
+                "WHERE Accounts_id = %s"
+
+    arguments = tuple(int(deltas[column]) for column in columns) + (str(account_id), )
+
+    if app.config["SUPER_DEBUG"]:
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
+        logger.debug('arguments: %s', lazy_repr(arguments))
+
+    try:
+        cursor.execute(sql_query, arguments)
+        if cursor.rowcount == 0:
+            logger.info('No counters for Account ' + str(account_id) + ', computing them from stored records')
+            cursor.execute(ACCOUNT_COUNTERS_BACKFILL_QUERY, (str(account_id), ))
+    except Exception as exp:
+        logger.error('Could not update Account counters: ' + repr(exp))
+        raise
+    else:
+        return cursor
+
+
+def get_account_counters(cursor=None, account_id=None):
+    """
+    Reads counters of Account with single query.
+    If Account has no counters yet, they are computed from stored records.
+    Computed counters are not stored, the row is created by the next update_account_counters call.
+
+    :param cursor: Database cursor
+    :param account_id: ID of Account
+    :return: Database cursor and dict of counters
+    """
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    sql_query = "SELECT " + ", ".join(ACCOUNT_COUNTER_COLUMNS) + " " \
+                "FROM MyDataAccount.AccountCounters " \
+                "WHERE Accounts_id = %s"
+
+    arguments = (str(account_id), )
+
+    try:
+        cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
+        if len(data) == 0:
+            logger.info('No counters for Account ' + str(account_id) + ', computing them from stored records')
+            cursor, data = execute_sql_select_2(cursor=cursor, sql_query=ACCOUNT_COUNTERS_COMPUTE_QUERY,
+                                                arguments=arguments)
+            data = [row[1:] for row in data]
+        counters = dict(zip(ACCOUNT_COUNTER_COLUMNS, [int(value) for value in data[0]]))
+    except Exception as exp:
+        logger.error('Could not get Account counters: ' + repr(exp))
         raise
     else:
         if app.config["SUPER_DEBUG"]:
-            logger.debug('contacts: ' + repr(telephones))
+            logger.debug('counters: %s', lazy_repr(counters))
 
-        return cursor, telephones
+        return cursor, counters
+
+
+def store_accounts(cursor=None, account_entries=None):
+    """
+    Stores Accounts with local identities, passwords, salts, particulars, primary emails and zeroed counters.
+    Rows of each table are inserted with one multi-row INSERT,
+    so the number of database round trips does not depend on the number of Accounts.
+
+    Transaction is not committed. Cached credentials and Users of the Accounts must be invalidated after commit.
+
+    :param cursor: Database cursor
+    :param account_entries: List of dicts with keys: global_identifier, username, pwd_hash, salt,
+                            firstname, lastname, date_of_birth and email
+    :return: Database cursor and list of Account objects in the same order as account_entries
+    """
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if account_entries is None:
+        raise AttributeError("Provide account_entries as parameter")
+
+    ###
+    # Accounts
+    logger.debug('Accounts')
+    accounts = [Account(global_identifyer=entry['global_identifier']) for entry in account_entries]
+    cursor, account_ids = Account.bulk_to_db(cursor=cursor, objects=accounts)
 
+    ###
+    # localIdentityPWDs
+    logger.debug('localIdentityPWDs')
+    local_pwds = [LocalIdentityPWD(password=entry['pwd_hash']) for entry in account_entries]
+    cursor, pwd_ids = LocalIdentityPWD.bulk_to_db(cursor=cursor, objects=local_pwds)
+
+    ###
+    # localIdentities
+    logger.debug('localIdentities')
+    local_identities = []
+    for entry, account, local_pwd in zip(account_entries, accounts, local_pwds):
+        local_identities.append(LocalIdentity(
+            username=entry['username'],
+            pwd_id=local_pwd.id,
+            accounts_id=account.id
+        ))
+    cursor, identity_ids = LocalIdentity.bulk_to_db(cursor=cursor, objects=local_identities)
+
+    ###
+    # salts
+    logger.debug('salts')
+    salts = []
+    for entry, local_identity in zip(account_entries, local_identities):
+        salts.append(Salt(
+            salt=entry['salt'],
+            identity_id=local_identity.id
+        ))
+    cursor, salt_ids = Salt.bulk_to_db(cursor=cursor, objects=salts)
+
+    ###
+    # Particulars
+    logger.debug('particulars')
+    particulars = []
+    for entry, account in zip(account_entries, accounts):
+        particulars.append(Particulars(
+            firstname=entry['firstname'],
+            lastname=entry['lastname'],
+            date_of_birth=entry['date_of_birth'],
+            account_id=account.id
+        ))
+    cursor, particulars_ids = Particulars.bulk_to_db(cursor=cursor, objects=particulars)
+
+    ###
+    # emails
+    logger.debug('emails')
+    emails = []
+    for entry, account in zip(account_entries, accounts):
+        emails.append(Email(
+            email=entry['email'],
+            type="Personal",
+            prime=1,
+            account_id=account.id
+        ))
+    cursor, email_ids = Email.bulk_to_db(cursor=cursor, objects=emails)
+
+    ###
+    # counters
+    logger.debug('counters')
+    cursor = init_account_counters(cursor=cursor, account_ids=account_ids)
+
+    return cursor, accounts
+
+
+##########################################
+# Account export
+##########################################
+# (type, SELECT query with account id placeholder, attribute names, attributes stored as JSON)
+ACCOUNT_EXPORT_SECTIONS = (
+    (
+        "Particulars",
+        "SELECT id, firstname, lastname, dateOfBirth, img_url "
+        "FROM MyDataAccount.Particulars "
+        "WHERE Accounts_id = %s ORDER BY id",
+        ('id', 'firstname', 'lastname', 'date_of_birth', 'img_url'),
+        ()
+    ),
+    (
+        "Email",
+        "SELECT id, email, typeEnum, prime "
+        "FROM MyDataAccount.Emails "
+        "WHERE Accounts_id = %s ORDER BY id",
+        ('id', 'email', 'type', 'prime'),
+        ()
+    ),
+    (
+        "Telephone",
+        "SELECT id, tel, typeEnum, prime "
+        "FROM MyDataAccount.Telephones "
+        "WHERE Accounts_id = %s ORDER BY id",
+        ('id', 'tel', 'type', 'prime'),
+        ()
+    ),
+    (
+        "Contacts",
+        "SELECT id, address1, address2, postalCode, city, state, country, typeEnum, prime "
+        "FROM MyDataAccount.Contacts "
+        "WHERE Accounts_id = %s ORDER BY id",
+        ('id', 'address1', 'address2', 'postal_code', 'city', 'state', 'country', 'type', 'prime'),
+        ()
+    ),
+    (
+        "ServiceLinkRecord",
+        "SELECT id, serviceLinkRecord, serviceLinkRecordId, serviceId, surrogateId, operatorId "
+        "FROM MyDataAccount.ServiceLinkRecords "
+        "WHERE Accounts_id = %s ORDER BY id",
+        ('id', 'service_link_record', 'service_link_record_id', 'service_id', 'surrogate_id', 'operator_id'),
+        ('service_link_record',)
+    ),
+    (
+        "ServiceLinkStatusRecord",
+        "SELECT ssr.id, ssr.serviceLinkStatus, ssr.serviceLinkStatusRecord, ssr.ServiceLinkRecords_id, "
+        "ssr.serviceLinkRecordId, ssr.issued_at, ssr.prevRecordId, ssr.serviceLinkStatusRecordId "
+        "FROM MyDataAccount.ServiceLinkStatusRecords ssr "
+        "JOIN MyDataAccount.ServiceLinkRecords slr ON ssr.ServiceLinkRecords_id = slr.id "
+        "WHERE slr.Accounts_id = %s ORDER BY ssr.id",
+        ('id', 'status', 'service_link_status_record', 'service_link_records_id', 'service_link_record_id',
+         'issued_at', 'prev_record_id', 'service_link_status_record_id'),
+        ('service_link_status_record',)
+    ),
+    (
+        "ConsentRecord",
+        "SELECT cr.id, cr.consentRecord, cr.ServiceLinkRecords_id, cr.surrogateId, cr.consentRecordId, "
+        "cr.ResourceSetId, cr.serviceLinkRecordId, cr.subjectId, cr.role "
+        "FROM MyDataAccount.ConsentRecords cr "
+        "JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id "
+        "WHERE slr.Accounts_id = %s ORDER BY cr.id",
+        ('id', 'consent_record', 'service_link_records_id', 'surrogate_id', 'consent_id', 'resource_set_id',
+         'service_link_record_id', 'subject_id', 'role'),
+        ('consent_record',)
+    ),
+    (
+        "ConsentStatusRecord",
+        "SELECT csr.id, csr.consentStatus, csr.consentStatusRecord, csr.ConsentRecords_id, csr.consentRecordId, "
+        "csr.issued_at, csr.prevRecordId "
+        "FROM MyDataAccount.ConsentStatusRecords csr "
+        "JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id "
+        "JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id "
+        "WHERE slr.Accounts_id = %s ORDER BY csr.id",
+        ('id', 'consent_status', 'consent_status_record', 'consent_records_id', 'consent_record_id',
+         'issued_at', 'prev_record_id'),
+        ('consent_status_record',)
+    ),
+    (
+        "EventLog",
+        "SELECT id, actor, event, created "
+        "FROM MyDataAccount.EventLogs "
+        "WHERE Accounts_id = %s ORDER BY id",
+        ('id', 'actor', 'event', 'created'),
+        ()
+    ),
+)
+
+
+def iterate_unbuffered_rows(connection=None, sql_query=None, arguments=None, fetch_size=500):
+    """
+    Executes SELECT with unbuffered server side cursor and yields rows one by one.
+    At most fetch_size rows are held in memory at a time.
+
+    Connection can not be used for other queries until all rows are consumed or generator is closed.
+
+    :param connection: MySQLdb connection object
+    :param sql_query: SELECT query
+    :param arguments: Query arguments
+    :param fetch_size: Number of rows fetched from server at a time
+    :return: Generator of row tuples
+    """
+    if connection is None:
+        raise AttributeError("Provide connection as parameter")
+    if sql_query is None:
+        raise AttributeError("Provide sql_query as parameter")
+
+    if app.config["SUPER_DEBUG"]:
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
+
+    cursor = connection.cursor(MySQLdb.cursors.SSCursor)
+    try:
+        cursor.execute(sql_query, arguments)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        # Closing SSCursor reads and discards rows that were not consumed
+        cursor.close()
+
+
+def decode_export_attribute(value=None):
+    """
+    Records are stored as JSON text. Value is returned as is if it is not valid JSON.
+    """
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def get_account_export(connection=None, account_id=None, fetch_size=500):
+    """
+    Generator of Account export in NDJSON format.
+    First line describes the export, rest of the lines are records of the Account one per line:
+    Particulars, Emails, Telephones, Contacts, ServiceLinkRecords, ServiceLinkStatusRecords,
+    ConsentRecords, ConsentStatusRecords and EventLogs.
+
+    Rows are read with unbuffered cursor, so memory use does not depend on amount of data the Account has.
+
+    :param connection: MySQLdb connection object reserved for the export
+    :param account_id: ID of Account
+    :param fetch_size: Number of rows fetched from server at a time
+    :return: Generator of NDJSON lines
+    """
+    if connection is None:
+        raise AttributeError("Provide connection as parameter")
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    arguments = (account_id, )
+    record_count = 0
+
+    yield json.dumps({
+        'type': "AccountExport",
+        'id': str(account_id),
+        'attributes': {
+            'created': int(time.time()),
+            'types': [section[0] for section in ACCOUNT_EXPORT_SECTIONS]
+        }
+    }) + "\n"
+
+    for record_type, sql_query, attribute_names, json_attributes in ACCOUNT_EXPORT_SECTIONS:
+        logger.debug('Exporting ' + record_type + ' records of Account: ' + str(account_id))
+        try:
+            for row in iterate_unbuffered_rows(connection=connection, sql_query=sql_query, arguments=arguments,
+                                               fetch_size=fetch_size):
+                attributes = dict(zip(attribute_names, row))
+                for attribute in json_attributes:
+                    attributes[attribute] = decode_export_attribute(value=attributes[attribute])
+                record_id = attributes.pop('id')
+                record_count += 1
+
+                yield json.dumps({'type': record_type, 'id': str(record_id), 'attributes': attributes}) + "\n"
+        except Exception as exp:
+            logger.error('Could not export ' + record_type + ' records of Account ' + str(account_id) + ': ' + repr(exp))
+            raise
+
+    logger.info('Exported ' + str(record_count) + ' records of Account: ' + str(account_id))
@@ -10,7 +10,7 @@ import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/b
 from random import randint
 
 # Import flask dependencies
-from flask import Blueprint, render_template, make_response, flash, session, request
+from flask import Blueprint, render_template, make_response, flash, session, request, Response, stream_with_context
 from flask.ext.login import login_user, login_required
 from flask_restful import Resource, Api, reqparse
 
@@ -18,14 +18,17 @@ from flask_restful import Resource, Api, reqparse
 from app import db, api, login_manager, app
 
 # Import services
-from app.helpers import get_custom_logger, make_json_response, ApiError
+from app.helpers import get_custom_logger, make_json_response, ApiError, lazy_repr, lazy_json
 from app.mod_account.controllers import get_service_link_record_count, get_consent_record_count, get_telephones, \
-    get_emails, get_contacts, get_passive_consents_count, get_potential_services_count, get_potential_consents_count
+    get_emails, get_contacts, get_potential_services_count, get_potential_consents_count, import_accounts
 from app.mod_account.models import AccountSchema2
-from app.mod_api_auth.controllers import gen_account_api_key, requires_api_auth_user, provideApiKey
-from app.mod_blackbox.controllers import gen_account_key
+from app.mod_account.services import store_accounts, get_account_export
+from app.mod_api_auth.controllers import gen_account_api_key, requires_api_auth_user, requires_api_auth_sdk, \
+    provideApiKey, get_account_id_by_api_key
+from app.mod_auth.helpers import invalidate_cached_credentials, invalidate_cached_user
+from app.mod_auth.services import hash_password
+from app.mod_blackbox.client import gen_account_key
 from app.mod_database.helpers import get_db_cursor
-from app.mod_database.models import Account, LocalIdentityPWD, LocalIdentity, Salt, Particulars, Email
 
 mod_account_api = Blueprint('account_api', __name__, template_folder='templates')
 
@@ -61,7 +64,7 @@ class Accounts(Resource):
             error_detail = {'0': 'Set application/json as Content-Type', '1': 'Provide json payload'}
             raise ApiError(code=400, title="No input data provided", detail=error_detail, source=endpoint)
         else:
-            logger.debug("json_data: " + json.dumps(json_data))
+            logger.debug("json_data: %s", lazy_json(json_data))
 
         # Validate payload content
         schema = AccountSchema2()
@@ -84,8 +87,9 @@ class Accounts(Resource):
             acceptTermsOfService = json_data['acceptTermsOfService']
 
             global_identifier = str(uuid.uuid4())
-            salt_str = str(bcrypt.gensalt())
-            pwd_hash = bcrypt.hashpw(str(password), salt_str)
+            salt_str, pwd_hash = hash_password(password=password)
+        except ApiError:
+            raise
         except Exception as exp:
             error_title = "Could not prepare Account data"
             logger.error(error_title)
@@ -95,72 +99,33 @@ class Accounts(Resource):
         cursor = get_db_cursor()
 
         try:
-            ###
-            # Accounts
-            logger.debug('Accounts')
-            account = Account(global_identifyer=global_identifier)
-            account.to_db(cursor=cursor)
-
-            ###
-            # localIdentityPWDs
-            logger.debug('localIdentityPWDs')
-            local_pwd = LocalIdentityPWD(password=pwd_hash)
-            local_pwd.to_db(cursor=cursor)
-
-            ###
-            # localIdentities
-            logger.debug('localIdentities')
-            local_identity = LocalIdentity(
-                username=username,
-                pwd_id=local_pwd.id,
-                accounts_id=account.id
-            )
-            local_identity.to_db(cursor=cursor)
-
-            ###
-            # salts
-            logger.debug('salts')
-            salt = Salt(
-                salt=salt_str,
-                identity_id=local_identity.id
-            )
-            salt.to_db(cursor=cursor)
-
-            ###
-            # Particulars
-            logger.debug('particulars')
-            particulars = Particulars(
-                firstname=firstName,
-                lastname=lastName,
-                date_of_birth=dateOfBirth,
-                account_id=account.id
-            )
-            logger.debug("to_dict: " + repr(particulars.to_dict))
-            cursor = particulars.to_db(cursor=cursor)
-
-            ###
-            # emails
-            logger.debug('emails')
-            email = Email(
-                email=email_address,
-                type="Personal",
-                prime=1,
-                account_id=account.id
-            )
-            email.to_db(cursor=cursor)
+            account_entry = {
+                'global_identifier': global_identifier,
+                'username': username,
+                'pwd_hash': pwd_hash,
+                'salt': salt_str,
+                'firstname': firstName,
+                'lastname': lastName,
+                'date_of_birth': dateOfBirth,
+                'email': email_address
+            }
+            cursor, accounts = store_accounts(cursor=cursor, account_entries=[account_entry])
+            account = accounts[0]
 
             ###
             # Commit
             db.connection.commit()
         except Exception as exp:
             error_title = "Could not create Account"
-            logger.debug('commit failed: ' + repr(exp))
+            logger.debug('commit failed: %s', lazy_repr(exp))
             logger.debug('--> rollback')
             logger.error(error_title)
             db.connection.rollback()
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
         else:
             logger.debug('Account commited')
+            invalidate_cached_credentials(account_id=account.id)
+            invalidate_cached_user(account_id=account.id)
 
             try:
                 logger.info("Generating Key for Account")
@@ -183,7 +148,7 @@ class Accounts(Resource):
                 logger.info("Generated API Key: " + str(api_key))
 
             data = cursor.fetchall()
-            logger.debug('data: ' + repr(data))
+            logger.debug('data: %s', lazy_repr(data))
 
         # Response data container
         try:
@@ -206,13 +171,72 @@ class Accounts(Resource):
             raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
         else:
             logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
+            logger.debug('response_data: %s', lazy_repr(response_data))
 
         response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
+        logger.debug('response_data_dict: %s', lazy_repr(response_data_dict))
         return make_json_response(data=response_data_dict, status_code=201)
 
 
+class ImportAccounts(Resource):
+    @requires_api_auth_sdk
+    def post(self):
+        """
+        Bulk import of Accounts. Payload is NDJSON (application/x-ndjson),
+        one Account per line in the same format as in POST /api/accounts/.
+
+        Rows that can not be imported are reported in response, other rows are imported.
+        :return:
+        """
+
+        try:
+            endpoint = str(api.url_for(self))
+        except Exception as exp:
+            endpoint = str(__name__)
+
+        try:
+            chunk_size = int(request.args.get('chunk_size', app.config["ACCOUNT_IMPORT_CHUNK_SIZE"]))
+            if chunk_size < 1:
+                raise ValueError("chunk_size must be positive")
+        except Exception as exp:
+            raise ApiError(code=400, title="Unsupported chunk_size", detail=repr(exp), source=endpoint)
+
+        created = []
+        errors = []
+        try:
+            for result in import_accounts(lines=request.stream, chunk_size=chunk_size):
+                if result['status'] == 'created':
+                    created.append(result)
+                else:
+                    errors.append(result)
+        except ApiError:
+            raise
+        except Exception as exp:
+            logger.error('Account import failed: ' + repr(exp))
+            raise ApiError(code=500, title="Account import failed", detail=repr(exp), source=endpoint)
+        else:
+            logger.info('Imported ' + str(len(created)) + ' Accounts, ' + str(len(errors)) + ' rows failed')
+
+        # Response data container
+        try:
+            response_data = {}
+            response_data['meta'] = {}
+            response_data['meta']['rows'] = len(created) + len(errors)
+            response_data['meta']['created'] = len(created)
+            response_data['meta']['failed'] = len(errors)
+
+            response_data['data'] = {}
+            response_data['data']['type'] = "AccountImport"
+            response_data['data']['attributes'] = {}
+            response_data['data']['attributes']['accounts'] = created
+            response_data['data']['attributes']['errors'] = errors
+        except Exception as exp:
+            logger.error('Could not prepare response data: ' + repr(exp))
+            raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
+
+        return make_json_response(data=response_data, status_code=200)
+
+
 class ExportAccount(Resource):
     @requires_api_auth_user
     def get(self, account_id):
@@ -226,7 +250,7 @@ class ExportAccount(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -234,26 +258,38 @@ class ExportAccount(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Unsupported account_id", detail=repr(exp), source=endpoint)
 
-        # Response data container
+        # Export is only given to owner of Account
         try:
-            response_data = {}
-            response_data['meta'] = {}
-            response_data['meta']['activationInstructions'] = "Account Export"
+            account_id_by_api_key = str(get_account_id_by_api_key(api_key=api_key))
+        except Exception as exp:
+            logger.error('Could not get Account ID by Api Key: ' + repr(exp))
+            raise ApiError(code=403, title="Api Key does not grant access to Account", detail=repr(exp), source=endpoint)
+        if account_id_by_api_key != account_id:
+            logger.error('Api Key of Account ' + account_id_by_api_key + ' used to export Account ' + account_id)
+            raise ApiError(code=403, title="Api Key does not grant access to Account", source=endpoint)
 
-            response_data['data'] = {}
-            response_data['data']['type'] = "Account"
+        # Dedicated connection for the export, unbuffered cursor keeps it busy until response is streamed
+        connection_entry = db.borrow()
+
+        try:
+            lines = get_account_export(
+                connection=connection_entry[0],
+                account_id=account_id,
+                fetch_size=int(app.config["ACCOUNT_EXPORT_FETCH_SIZE"])
+            )
+            response = Response(stream_with_context(lines), status=200, mimetype='application/x-ndjson')
+            response.headers['Content-Disposition'] = 'attachment; filename="account-' + account_id + '.ndjson"'
+            response.call_on_close(lambda: db.rollback_and_release(entry=connection_entry))
         except Exception as exp:
-            logger.error('Could not prepare response data: ' + repr(exp))
-            raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
+            db.rollback_and_release(entry=connection_entry)
+            logger.error('Could not prepare Account export: ' + repr(exp))
+            raise ApiError(code=500, title="Could not prepare Account export", detail=repr(exp), source=endpoint)
         else:
-            logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
-
-        response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
-        return make_json_response(data=response_data_dict, status_code=201)
+            logger.info('Streaming Account export')
+            return response
 
 
 # Register resources
 api.add_resource(Accounts, '/api/accounts/', '/', endpoint='/api/accounts/')
+api.add_resource(ImportAccounts, '/api/accounts/import/', endpoint='accounts-import')
 api.add_resource(ExportAccount, '/api/account/<string:account_id>/export/', endpoint='account-export')
@@ -18,8 +18,8 @@ from app import db, api, login_manager, app
 
 # Import services
 from app.helpers import get_custom_logger
-from app.mod_account.controllers import get_service_link_record_count, get_consent_record_count, get_telephones, \
-    get_emails, get_contacts, get_passive_consents_count, get_potential_services_count, get_potential_consents_count
+from app.mod_account.controllers import get_counters, get_telephones, get_emails, get_contacts, \
+    get_potential_services_count, get_potential_consents_count
 from app.mod_api_auth.controllers import get_account_api_key
 from app.mod_database.helpers import get_db_cursor
 
@@ -35,7 +35,7 @@ class Home(Resource):
     def get(self):
 
         account_id = session['user_id']
-        logger.debug('Account id: ' + account_id)
+        logger.debug('Account id: %s', account_id)
 
         apikey = get_account_api_key(account_id=account_id)
 
@@ -52,12 +52,11 @@ class Details(Resource):
     def get(self):
 
         account_id = session['user_id']
-        logger.debug('Account id: ' + account_id)
+        logger.debug('Account id: %s', account_id)
 
         cursor = get_db_cursor()
 
-        cursor, service_link_record_count = get_service_link_record_count(cursor=cursor, account_id=account_id)
-        cursor, consent_count = get_consent_record_count(cursor=cursor, account_id=account_id)
+        cursor, counters = get_counters(cursor=cursor, account_id=account_id)
 
         cursor, contacts = get_contacts(cursor=cursor, account_id=account_id)
         cursor, emails = get_emails(cursor=cursor, account_id=account_id)
@@ -65,12 +64,12 @@ class Details(Resource):
 
         cursor, potential_services = get_potential_services_count(cursor=cursor, account_id=account_id)
         cursor, potential_consents = get_potential_consents_count(cursor=cursor, account_id=account_id)
-        cursor, passive_services = get_potential_services_count(cursor=cursor, account_id=account_id)
-        cursor, passive_consents = get_passive_consents_count(cursor=cursor, account_id=account_id)
+        passive_services = counters['serviceLinksRemoved']
+        passive_consents = counters['consentsPaused'] + counters['consentsWithdrawn']
 
         content_data = {
-            'service_link_record_count': service_link_record_count,
-            'consent_count': consent_count,
+            'service_link_record_count': counters['serviceLinksActive'],
+            'consent_count': counters['consentsActive'],
             'contacts': contacts,
             'emails': emails,
             'telephones': telephones,
@@ -88,7 +87,7 @@ class Settings(Resource):
     @login_required
     def get(self):
         account_id = session['user_id']
-        logger.debug('Account id: ' + account_id)
+        logger.debug('Account id: %s', account_id)
 
         content_data = {
             'service_link_record_count': None,
@@ -14,18 +14,219 @@ __status__ = "Development"
 __date__ = 26.5.2016
 """
 import base64
+import time
 from functools import wraps
 from uuid import uuid4
 
 from flask import request
 
-from app import ApiError
+from app import app, ApiError
+from app.helpers import LruTtlCache
+from app.mod_api_auth.helpers import AccountIdNotFoundError, hash_api_key, ApiTokenError, is_api_token, \
+    encode_api_token, decode_api_token
 from app.mod_api_auth.services import get_sqlite_connection, get_sqlite_cursor, store_api_key_to_db, get_api_key, \
-    get_account_id
-from app.mod_blackbox.helpers import append_description_to_exception, get_custom_logger
+    get_account_id, store_api_keys_to_db, store_revoked_api_token_to_db, is_api_token_revoked_in_db
+from app.mod_blackbox.helpers import append_description_to_exception, get_custom_logger, lazy_repr
 
 logger = get_custom_logger('mod_api_auth_controllers')
 
+# Account IDs of API Keys, keyed by digest of API Key
+api_key_cache = LruTtlCache(
+    max_size=int(app.config["API_KEY_CACHE_SIZE"]),
+    ttl=int(app.config["API_KEY_CACHE_TTL"])
+)
+
+# API Keys not found from database. Separate cache, so that unknown keys can not evict known ones.
+unknown_api_key_cache = LruTtlCache(
+    max_size=int(app.config["API_KEY_NEGATIVE_CACHE_SIZE"]),
+    ttl=int(app.config["API_KEY_NEGATIVE_CACHE_TTL"])
+)
+
+# Secrets must be shared by all workers and instances, otherwise tokens are accepted only by the worker that issued them
+if app.config["API_TOKEN_ENABLED"] and not app.config["API_TOKEN_SECRETS"]:
+    raise AttributeError("API_TOKEN_SECRETS must be configured when API_TOKEN_ENABLED is set")
+
+# Revocation status of API tokens, keyed by ID of token. Revocations are stored in database shared by all workers,
+# revoked tokens are cached until they expire and valid ones for API_TOKEN_REVOCATION_CACHE_TTL.
+revoked_api_tokens = LruTtlCache(
+    max_size=int(app.config["API_TOKEN_REVOCATION_LIST_SIZE"]),
+    ttl=int(app.config["API_TOKEN_REVOCATION_CACHE_TTL"])
+)
+
+
+def invalidate_api_key_cache(account_id=None, api_key=None):
+    """
+    Removes cached API Keys of account and cached unknown API Key from caches of current process.
+    Must be called when new API Key is stored for account.
+
+    :param account_id: User account ID
+    :param api_key: New API Key of account
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+    if api_key is None:
+        raise AttributeError("Provide api_key as parameter")
+
+    account_id = str(account_id)
+    removed = api_key_cache.invalidate_tag(tag=account_id)
+    if unknown_api_key_cache.invalidate(key=hash_api_key(api_key=api_key)):
+        removed += 1
+    if removed:
+        logger.debug('Cached API Keys invalidated for account: %s', account_id)
+
+
+def clear_api_key_cache():
+    api_key_cache.clear()
+    unknown_api_key_cache.clear()
+
+
+def get_api_key_cache_stats():
+    """
+    Gauges and counters of API Key caches of current process.
+
+    :return: dict
+    """
+    return {
+        'known': api_key_cache.stats(),
+        'unknown': unknown_api_key_cache.stats(),
+    }
+
+
+def issue_api_token(subject=None, scope=None):
+    """
+    Issues signed API token. Token is verified without database, so any Account instance with same
+    API_TOKEN_SECRETS accepts it.
+
+    :param subject: User account ID for scope 'user', username of SDK for scope 'sdk'
+    :param scope: 'user' or 'sdk'
+    :return: API token
+    """
+    if subject is None:
+        raise AttributeError("Provide subject as parameter")
+    if scope is None:
+        raise AttributeError("Provide scope as parameter")
+
+    claims = {
+        'sub': str(subject),
+        'scope': scope,
+        'exp': int(time.time()) + int(app.config["API_TOKEN_TTL"]),
+        'jti': uuid4().hex
+    }
+    logger.debug('Issuing API token for %s with scope %s', claims['sub'], scope)
+    return encode_api_token(claims=claims, secret=app.config["API_TOKEN_SECRETS"][0])
+
+
+def verify_api_token(api_key=None, scope=None):
+    """
+    Verifies signature, expiry, scope and revocation of API token.
+
+    :param api_key: API token
+    :param scope: Required scope
+    :return: Claims of token as dict
+    """
+    if api_key is None:
+        raise AttributeError("Provide api_key as parameter")
+    if scope is None:
+        raise AttributeError("Provide scope as parameter")
+
+    claims = decode_api_token(token=api_key, secrets=app.config["API_TOKEN_SECRETS"])
+    if claims.get('scope') != scope:
+        raise ApiTokenError("API token not valid for scope " + str(scope))
+    if is_api_token_revoked(claims=claims):
+        raise ApiTokenError("API token revoked")
+    return claims
+
+
+def is_api_token_revoked(claims=None):
+    """
+    Checks revocation of API token from cache and from database if token is not cached.
+
+    :param claims: Claims of verified API token
+    :return: True if token is revoked
+    """
+    if claims is None:
+        raise AttributeError("Provide claims as parameter")
+
+    jti = str(claims['jti'])
+    revoked = revoked_api_tokens.get(key=jti)
+    if revoked is not None:
+        return revoked
+
+    try:
+        connection = get_sqlite_connection()
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
+        logger.error('Could not get connection SQL database: ' + repr(exp))
+        raise
+
+    try:
+        cursor, connection = get_sqlite_cursor(connection=connection)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
+        logger.error('Could not get cursor for database connection: ' + repr(exp))
+        raise
+
+    try:
+        cursor, revoked = is_api_token_revoked_in_db(jti=jti, cursor=cursor)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not check revocation of API token')
+        logger.error('Could not check revocation of API token: ' + repr(exp))
+        connection.rollback()
+        raise
+    else:
+        if revoked:
+            revoked_api_tokens.set(key=jti, value=True, ttl=max(1, int(claims['exp'] - time.time()) + 1))
+        else:
+            revoked_api_tokens.set(key=jti, value=False)
+        return revoked
+
+
+def revoke_api_token(api_key=None):
+    """
+    Stores revocation of API token to database shared by all workers. Revocation is kept until token expires.
+    Other workers reject the token at the latest after API_TOKEN_REVOCATION_CACHE_TTL.
+
+    :param api_key: API token
+    :return: True if token was valid and is now revoked
+    """
+    if api_key is None:
+        raise AttributeError("Provide api_key as parameter")
+
+    try:
+        claims = decode_api_token(token=api_key, secrets=app.config["API_TOKEN_SECRETS"])
+    except ApiTokenError as exp:
+        logger.debug('Not revoking API token: %s', lazy_repr(exp))
+        return False
+
+    jti = str(claims['jti'])
+
+    try:
+        connection = get_sqlite_connection()
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
+        logger.error('Could not get connection SQL database: ' + repr(exp))
+        raise
+
+    try:
+        cursor, connection = get_sqlite_cursor(connection=connection)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
+        logger.error('Could not get cursor for database connection: ' + repr(exp))
+        raise
+
+    try:
+        cursor = store_revoked_api_token_to_db(jti=jti, expires_at=claims['exp'], cursor=cursor)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not store revoked API token to database')
+        logger.error('Could not store revoked API token to database: ' + repr(exp))
+        connection.rollback()
+        raise
+    else:
+        connection.commit()
+        revoked_api_tokens.set(key=jti, value=True, ttl=max(1, int(claims['exp'] - time.time()) + 1))
+        logger.info('API token revoked: %s', jti)
+        return True
+
 
 def store_api_key(account_id=None, account_api_key=None):
     """
@@ -63,7 +264,7 @@ def store_api_key(account_id=None, account_api_key=None):
         raise
     else:
         connection.commit()
-        connection.close()
+        invalidate_api_key_cache(account_id=account_id, api_key=account_api_key)
         logger.debug('API Key and account_id stored')
 
 
@@ -79,7 +280,7 @@ def gen_account_api_key(account_id=None):
 
     account_api_key = "account-api-key-" + str(uuid4())
     account_api_key = base64.b64encode(account_api_key)
-    logger.debug('Generated account_api_key: ' + str(account_api_key))
+    logger.debug('Generated account_api_key: %s', account_api_key)
 
     try:
         store_api_key(account_id=account_id, account_api_key=account_api_key)
@@ -92,6 +293,50 @@ def gen_account_api_key(account_id=None):
         return account_api_key
 
 
+def gen_account_api_keys(account_ids=None):
+    """
+    Generate API Keys for multiple account IDs. Keys are stored in one transaction.
+
+    :param account_ids: List of account IDs
+    :return: dict of account ID and API Key
+    """
+    if account_ids is None:
+        raise AttributeError("Provide account_ids as parameter")
+
+    api_key_entries = []
+    for account_id in account_ids:
+        account_api_key = base64.b64encode("account-api-key-" + str(uuid4()))
+        api_key_entries.append((account_id, account_api_key))
+
+    try:
+        connection = get_sqlite_connection()
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
+        logger.error('Could not get connection SQL database: ' + repr(exp))
+        raise
+
+    try:
+        cursor, connection = get_sqlite_cursor(connection=connection)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
+        logger.error('Could not get cursor for database connection: ' + repr(exp))
+        raise
+
+    try:
+        cursor = store_api_keys_to_db(api_key_entries=api_key_entries, cursor=cursor)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Failed to store generated Api keys. Keys must be regenerated.')
+        logger.error('Failed to store generated api keys: ' + repr(exp))
+        connection.rollback()
+        raise
+    else:
+        connection.commit()
+        for account_id, account_api_key in api_key_entries:
+            invalidate_api_key_cache(account_id=account_id, api_key=account_api_key)
+        logger.info('Generated Api Keys for ' + str(len(api_key_entries)) + ' accounts')
+        return dict(api_key_entries)
+
+
 def get_account_api_key(account_id=None):
     """
     Get API Key by account ID
@@ -122,17 +367,17 @@ def get_account_api_key(account_id=None):
         exp = append_description_to_exception(exp=exp, description='Could not API key from database')
         logger.error('Could not get API key from database: ' + repr(exp))
         connection.rollback()
-        connection.close()
         raise
     else:
-        connection.close()
         logger.debug('API key fetched')
         return api_key
 
 
 def get_account_id_by_api_key(api_key=None):
     """
-    Get User account ID by Api Key
+    Get User account ID by Api Key.
+    Account IDs and unknown Api Keys are cached, database is used only if Api Key is not cached.
+    Account ID of signed API token is taken from the token.
 
     :param api_key:
     :return: User account ID
@@ -140,6 +385,19 @@ def get_account_id_by_api_key(api_key=None):
     if api_key is None:
         raise AttributeError("Provide api_key as parameter")
 
+    if is_api_token(api_key=api_key):
+        return verify_api_token(api_key=api_key, scope='user')['sub']
+
+    api_key_hash = hash_api_key(api_key=api_key)
+    cache_enabled = app.config["API_KEY_CACHE_ENABLED"]
+    if cache_enabled:
+        account_id = api_key_cache.get(key=api_key_hash)
+        if account_id is not None:
+            logger.debug('Account ID from cache')
+            return account_id
+        if unknown_api_key_cache.get(key=api_key_hash) is not None:
+            raise AccountIdNotFoundError("Account ID for Api Key not found")
+
     try:
         connection = get_sqlite_connection()
     except Exception as exp:
@@ -155,16 +413,23 @@ def get_account_id_by_api_key(api_key=None):
         raise
 
     try:
-        cursor, account_id = get_account_id(api_key=api_key, cursor=cursor)
+        cursor, account_id = get_account_id(api_key_hash=api_key_hash, cursor=cursor)
+    except AccountIdNotFoundError as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not Account ID from database')
+        logger.error('Could not get Account ID from database: ' + repr(exp))
+        connection.rollback()
+        if cache_enabled:
+            unknown_api_key_cache.set(key=api_key_hash, value=True)
+        raise
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not Account ID from database')
         logger.error('Could not get Account ID from database: ' + repr(exp))
         connection.rollback()
-        connection.close()
         raise
     else:
-        connection.close()
         logger.debug('Account ID fetched')
+        if cache_enabled:
+            api_key_cache.set(key=api_key_hash, value=account_id, tag=str(account_id))
         return account_id
 
 
@@ -177,7 +442,7 @@ def check_api_auth_user(api_key):
         logger.error('Fetching Account ID failed: ' + repr(exp))
         return False
     else:
-        logger.debug("Found account_id: " + str(account_id) + " with api_key: " + str(api_key))
+        logger.debug("Found account_id: %s", account_id)
         return True
 
 
@@ -192,6 +457,15 @@ def get_api_key_sdk():
     return api_key
 
 def check_api_auth_sdk(api_key):
+    if is_api_token(api_key=api_key):
+        try:
+            verify_api_token(api_key=api_key, scope='sdk')
+        except Exception as exp:
+            logger.error("Incorrect ApiKey: " + repr(exp))
+            return False
+        else:
+            logger.info("Correct ApiKey")
+            return True
     if api_key == get_api_key_sdk():
         logger.info("Correct ApiKey")
         return True
@@ -225,7 +499,7 @@ def requires_api_auth_user(f):
             if api_key is None:
                 raise AttributeError('No API Key in Request Headers')
         except Exception as exp:
-            logger.debug("No ApiKey in headers: " + repr(exp))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey()
         else:
             if not check_api_auth_user(api_key=api_key):
@@ -244,7 +518,7 @@ def requires_api_auth_sdk(f):
             if api_key is None:
                 raise AttributeError('No API Key in Request Headers')
         except Exception as exp:
-            logger.debug("No ApiKey in headers: " + repr(exp))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey()
         else:
             if not check_api_auth_sdk(api_key=api_key):
@@ -13,12 +13,19 @@ __contact__ = "https://github.com/HIIT/mydata-stack"
 __status__ = "Development"
 __date__ = 26.5.2016
 """
+import hmac
 import inspect
+import json
 import logging
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import sha256
 from logging.handlers import TimedRotatingFileHandler
 from os.path import isdir, dirname, abspath
 from os import mkdir
 
+from app.log_helpers import BackgroundLogHandler
+
 
 def append_description_to_exception(exp=None, description=None):
     """
@@ -49,6 +56,129 @@ def append_description_to_exception(exp=None, description=None):
     return exp
 
 
+def hash_api_key(api_key=None):
+    """
+    SHA-256 digest of API Key. API Keys are looked up from database and caches by digest.
+
+    :param api_key: API Key as presented
+    :return: Hex digest, 64 characters
+    """
+    if api_key is None:
+        raise AttributeError("Provide api_key as parameter")
+
+    if not isinstance(api_key, bytes):
+        # BLOB column is returned as buffer or memoryview
+        api_key = api_key.encode('utf-8') if hasattr(api_key, 'encode') else bytes(api_key)
+    return sha256(api_key).hexdigest()
+
+
+API_TOKEN_PREFIX = 'mdt1.'
+
+
+def _base64url_encode(data):
+    return urlsafe_b64encode(data).decode('utf-8').rstrip('=')
+
+
+def _base64url_decode(data):
+    data = data.encode('utf-8')
+    return urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def _secret_bytes(secret):
+    if not isinstance(secret, bytes):
+        secret = secret.encode('utf-8')
+    return secret
+
+
+def api_token_secret_id(secret=None):
+    """
+    Identifier of token secret. Included in tokens, so that verifier can pick the secret without trying all of them.
+
+    :param secret: Secret of HMAC
+    :return: 8 character identifier
+    """
+    if secret is None:
+        raise AttributeError("Provide secret as parameter")
+    return sha256(b'api-token-secret-id:' + _secret_bytes(secret)).hexdigest()[:8]
+
+
+def is_api_token(api_key=None):
+    """
+    :param api_key: Value of Api-Key header
+    :return: True if value is signed API token instead of API Key
+    """
+    return api_key is not None and api_key.startswith(API_TOKEN_PREFIX)
+
+
+def encode_api_token(claims=None, secret=None):
+    """
+    Signed API token: mdt1.<secret id>.<base64url of claims>.<base64url of HMAC-SHA256>
+
+    :param claims: Claims as dict, such as sub, scope, exp and jti
+    :param secret: Secret of HMAC
+    :return: Token as String
+    """
+    if claims is None:
+        raise AttributeError("Provide claims as parameter")
+    if secret is None:
+        raise AttributeError("Provide secret as parameter")
+
+    signing_input = API_TOKEN_PREFIX + api_token_secret_id(secret=secret) + '.' + \
+        _base64url_encode(json.dumps(claims, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+    signature = hmac.new(_secret_bytes(secret), signing_input.encode('utf-8'), sha256).digest()
+    return signing_input + '.' + _base64url_encode(signature)
+
+
+def decode_api_token(token=None, secrets=None, now=None):
+    """
+    Verifies signature and expiry of API token. Only CPU work, no I/O.
+
+    :param token: Token as String
+    :param secrets: Secrets that are accepted, rotated out secrets can be kept here until their tokens expire
+    :param now: Current time as Unix timestamp, Defaults to time.time()
+    :return: Claims as dict
+    """
+    if token is None:
+        raise AttributeError("Provide token as parameter")
+    if secrets is None:
+        raise AttributeError("Provide secrets as parameter")
+    if now is None:
+        now = time.time()
+
+    try:
+        prefix, secret_id, payload, signature = token.split('.')
+    except ValueError:
+        raise ApiTokenError("Malformed API token")
+    if prefix + '.' != API_TOKEN_PREFIX:
+        raise ApiTokenError("Malformed API token")
+
+    for secret in secrets:
+        if api_token_secret_id(secret=secret) == secret_id:
+            break
+    else:
+        raise ApiTokenError("API token signed with unknown secret")
+
+    expected = hmac.new(_secret_bytes(secret), (API_TOKEN_PREFIX + secret_id + '.' + payload).encode('utf-8'), sha256).digest()
+    try:
+        signature = _base64url_decode(signature)
+    except Exception:
+        raise ApiTokenError("Malformed API token")
+    if not hmac.compare_digest(expected, signature):
+        raise ApiTokenError("Invalid signature of API token")
+
+    claims = json.loads(_base64url_decode(payload).decode('utf-8'))
+    if claims.get('exp') is None or claims['exp'] < now:
+        raise ApiTokenError("API token expired")
+    return claims
+
+
+class ApiTokenError(StandardError):
+    """
+    Exception to indicate that API token is malformed, expired, revoked or has invalid signature.
+    """
+    pass
+
+
 class ApiKeyNotFoundError(StandardError):
     """
     Exception to indicate that there were no key for user account in database.
@@ -67,6 +197,9 @@ class AccountIdNotFoundError(StandardError):
     pass
 
 
+_log_handler = None
+
+
 def get_custom_logger(logger_name='default_logger'):
     """
     Creates logger instance.
@@ -74,6 +207,10 @@ def get_custom_logger(logger_name='default_logger'):
     :param logger_name: Name for logger
     :return: Logger object
     """
+    # Log level of application config, imported here like in app.helpers.get_custom_logger()
+    from app import app
+
+    global _log_handler
 
     LOG_TO_FILE = False
     DELIMITTER = '/'
@@ -92,23 +229,30 @@ def get_custom_logger(logger_name='default_logger'):
             print("LOG_PATH: '{}' could not be created. Exception: {}.".format(LOG_PATH, repr(e)))
 
     logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.DEBUG)
-
-    # create formatter
-    formatter = logging.Formatter(LOG_FORMATTER)
-
-    # console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # file handler
-    if LOG_TO_FILE:
-        file_handler = TimedRotatingFileHandler(LOG_FILE, when="midnight", interval=1, backupCount=10, utc=True)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+    logger.setLevel(app.config["LOG_LEVEL"])
+
+    if _log_handler is None:
+        # create formatter
+        formatter = logging.Formatter(LOG_FORMATTER)
+
+        # console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.DEBUG)
+        console_handler.setFormatter(formatter)
+        handlers = [console_handler]
+
+        # file handler
+        if LOG_TO_FILE:
+            file_handler = TimedRotatingFileHandler(LOG_FILE, when="midnight", interval=1, backupCount=10, utc=True)
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        # Console and file are written in background thread
+        _log_handler = BackgroundLogHandler(handlers=handlers)
+
+    if _log_handler not in logger.handlers:
+        logger.addHandler(_log_handler)
 
     return logger
 
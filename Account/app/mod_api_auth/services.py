@@ -14,17 +14,77 @@ __status__ = "Development"
 __date__ = 26.5.2016
 """
 import json
+import logging
 import os
-
-import sqlite3
+import time
 
 from app.mod_api_auth.helpers import get_custom_logger, append_description_to_exception, ApiKeyNotFoundError, \
-    AccountIdNotFoundError
+    AccountIdNotFoundError, hash_api_key
+from app.mod_blackbox.helpers import lazy_repr
+from app.mod_database.helpers import SqliteEngine
 
 logger = get_custom_logger('mod_api_auth_services')
 
 DELIMITTER = '/'
 DATABASE = os.path.dirname(os.path.abspath(__file__)) + DELIMITTER + 'apiauth.sqlite'
+BUSY_TIMEOUT = 5.0  # Seconds to wait for lock of database before failing. Default: 5.0
+
+MIGRATION_BATCH_SIZE = 1000  # Rows hashed in one statement batch when api_key_hash column is filled. Default: 1000
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS api_keys (
+              id            INTEGER   PRIMARY KEY AUTOINCREMENT,
+              account_id    INTEGER  UNIQUE NOT NULL,
+              api_key       BLOB  NOT NULL,
+              api_key_hash  TEXT
+          );''',
+    '''CREATE TABLE IF NOT EXISTS revoked_api_tokens (
+              jti           TEXT  PRIMARY KEY,
+              expires_at    INTEGER  NOT NULL
+          );''',
+    '''CREATE INDEX IF NOT EXISTS revoked_api_tokens_expires_at_idx ON revoked_api_tokens (expires_at);''',
+)
+
+
+def migrate_api_key_hashes(connection=None):
+    """
+    Adds api_key_hash column with unique index to api_keys table and fills it for existing rows.
+    Does nothing for rows that already have hash, so it can be run any number of times. Caller commits.
+
+    :param connection: Database connection object
+    :return: Number of hashed rows
+    """
+    if connection is None:
+        raise AttributeError("Provide connection as parameter")
+
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(api_keys);").fetchall()]
+    if 'api_key_hash' not in columns:
+        logger.info('Adding api_key_hash column to api_keys table')
+        connection.execute("ALTER TABLE api_keys ADD COLUMN api_key_hash TEXT;")
+
+    hashed = 0
+    last_id = 0
+    while True:
+        data = connection.execute(
+            "SELECT id, api_key FROM api_keys WHERE id > ? AND api_key_hash IS NULL ORDER BY id LIMIT ?",
+            (last_id, MIGRATION_BATCH_SIZE)
+        ).fetchall()
+        if not data:
+            break
+        last_id = data[-1][0]
+        connection.executemany(
+            "UPDATE api_keys SET api_key_hash=? WHERE id=?",
+            [(hash_api_key(api_key=api_key), row_id) for row_id, api_key in data]
+        )
+        hashed += len(data)
+
+    connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS api_keys_api_key_hash_idx ON api_keys (api_key_hash);")
+    if hashed:
+        logger.info('Hashed ' + str(hashed) + ' API Keys')
+    return hashed
+
+
+engine = SqliteEngine(database=DATABASE, schema=SCHEMA, busy_timeout=BUSY_TIMEOUT, migrations=(migrate_api_key_hashes,))
 
 
 def log_dict_as_json(data=None, pretty=0, lineno=None):
@@ -36,6 +96,8 @@ def log_dict_as_json(data=None, pretty=0, lineno=None):
     """
     if data is None:
         raise AttributeError("Provide data as parameter")
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     if lineno is not None:
         data['lineno'] = str(lineno)
 
@@ -53,64 +115,19 @@ def log_dict_as_json(data=None, pretty=0, lineno=None):
         raise AttributeError("Illegal value for pretty")
 
 
-def init_sqlite_db(connection=None):
-    """
-    Initializes SQLite database.
-
-    :param connection: Database connection object
-    :return: Database connection object
-    """
-    if connection is None:
-        raise AttributeError("Provide connection as parameter")
-
-    sql_query = '''CREATE TABLE api_keys (
-              id            INTEGER   PRIMARY KEY AUTOINCREMENT,
-              account_id    INTEGER  UNIQUE NOT NULL,
-              api_key       BLOB  NOT NULL
-          );'''
-
-    try:
-        logger.debug('Initializing database')
-        connection.execute(sql_query)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not initialize database')
-        logger.error('connection.execute(sql): ' + repr(exp))
-        connection.rollback()
-        raise
-    else:
-        connection.commit()
-        logger.debug('Database initialized')
-        return connection
-
-
 def get_sqlite_connection():
     """
-    Get connection for SQLite Database
+    Get connection for SQLite Database. Connection is persistent connection of current thread and must not be closed.
 
     :return: Database connection object
     """
-
-    if(os.path.exists(DATABASE) and os.path.isfile(DATABASE)):
-        logger.debug("init_db = False")
-        init_db = False
-    else:
-        logger.debug("init_db = True")
-        init_db = True
-
     try:
-        connection = sqlite3.connect(DATABASE)
+        connection = engine.connection()
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description="Could not get database connection. Could not open db file.")
         logger.error('sqlite3.connect(' + DATABASE + '): ' + repr(exp))
         raise
     else:
-        if init_db:
-            try:
-                connection = init_sqlite_db(connection=connection)
-            except Exception:
-                raise
-
-        logger.debug('DB connection at ' + repr(connection))
         return connection
 
 
@@ -131,16 +148,17 @@ def get_sqlite_cursor(connection=None):
         logger.error('connection.cursor(): ' + repr(exp))
         raise
     else:
-        logger.debug('DB cursor at ' + repr(cursor))
+        logger.debug('DB cursor at %s', lazy_repr(cursor))
         return cursor, connection
 
 
-def execute_sql_insert(cursor, sql_query):
+def execute_sql_insert(cursor, sql_query, arguments=()):
     """
     Executes SQL INSERT queries.
 
     :param cursor: Database cursor
     :param sql_query: SQl query to execute
+    :param arguments: Tuple of arguments for ? placeholders in sql_query
     :return: Database cursor and last inserted row id
     """
 
@@ -152,7 +170,7 @@ def execute_sql_insert(cursor, sql_query):
     last_id = ""
 
     try:
-        cursor.execute(sql_query)
+        cursor.execute(sql_query, arguments)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Error in SQL INSERT query execution')
         logger.error('Error in SQL query execution: ' + repr(exp))
@@ -168,17 +186,18 @@ def execute_sql_insert(cursor, sql_query):
         logger.info('cursor.lastrowid not found. Using None instead')
         last_id = None
     else:
-        logger.debug('cursor.lastrowid: ' + last_id)
+        logger.debug('cursor.lastrowid: %s', last_id)
 
     return cursor, last_id
 
 
-def execute_sql_select(cursor=None, sql_query=None):
+def execute_sql_select(cursor=None, sql_query=None, arguments=()):
     """
     Executes SQL SELECT queries.
 
     :param cursor: Database cursor
     :param sql_query: SQl query to execute
+    :param arguments: Tuple of arguments for ? placeholders in sql_query
     :return: Database cursor and result of database query
     """
 
@@ -188,7 +207,7 @@ def execute_sql_select(cursor=None, sql_query=None):
         raise AttributeError("Provide sql_query as parameter")
 
     try:
-        cursor.execute(sql_query)
+        cursor.execute(sql_query, arguments)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Error in SQL SELECT query execution')
         logger.error('Error in SQL query execution: ' + repr(exp))
@@ -224,20 +243,48 @@ def store_api_key_to_db(account_id=None, account_api_key=None, cursor=None):
     if cursor is None:
         raise AttributeError("Provide cursor as parameter")
 
-    sql_query = "INSERT INTO api_keys (account_id, api_key) VALUES ('%s', '%s')" % \
-                (account_id, account_api_key)
+    sql_query = "INSERT INTO api_keys (account_id, api_key, api_key_hash) VALUES (?, ?, ?)"
+    arguments = (account_id, account_api_key, hash_api_key(api_key=account_api_key))
 
     try:
-        cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
+        cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query, arguments=arguments)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not store API Key to Database')
         logger.error('Could not store API Key to Database: ' + repr(exp))
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
         raise
     else:
         return cursor, last_id
 
 
+def store_api_keys_to_db(api_key_entries=None, cursor=None):
+    """
+    Store multiple API Keys to DB with one executemany()
+
+    :param api_key_entries: List of (account_id, api_key) tuples
+    :param cursor: Database cursor
+    :return: Database cursor
+    """
+    if api_key_entries is None:
+        raise AttributeError("Provide api_key_entries as parameter")
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+
+    sql_query = "INSERT INTO api_keys (account_id, api_key, api_key_hash) VALUES (?, ?, ?)"
+
+    try:
+        cursor.executemany(sql_query, [
+            (account_id, api_key, hash_api_key(api_key=api_key)) for account_id, api_key in api_key_entries
+        ])
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not store API Keys to Database')
+        logger.error('Could not store API Keys to Database: ' + repr(exp))
+        raise
+    else:
+        logger.debug('%s API Keys stored', len(api_key_entries))
+        return cursor
+
+
 def get_api_key(account_id=None, cursor=None):
     """
     Get API key from DB
@@ -253,14 +300,14 @@ def get_api_key(account_id=None, cursor=None):
 
     api_key_dict = {}
 
-    sql_query = "SELECT id, account_id, api_key FROM api_keys WHERE account_id='%s' ORDER BY id DESC LIMIT 1" % (account_id)
+    sql_query = "SELECT id, account_id, api_key FROM api_keys WHERE account_id=? ORDER BY id DESC LIMIT 1"
 
     try:
-        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor)
+        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor, arguments=(account_id,))
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not fetch APi Key from database')
         logger.error('Could not fetch APi Key from database: ' + repr(exp))
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
         raise
     else:
         logger.debug("APi Key fetched from database")
@@ -279,29 +326,32 @@ def get_api_key(account_id=None, cursor=None):
             return cursor, api_key_dict['api_key']
 
 
-def get_account_id(api_key=None, cursor=None):
+def get_account_id(api_key=None, cursor=None, api_key_hash=None):
     """
-    Get User account ID from DB
+    Get User account ID from DB. Api Key is looked up by its SHA-256 digest from unique index.
 
     :param api_key: Api Key
     :param cursor: Database cursor
+    :param api_key_hash: Digest of Api Key from hash_api_key(), computed from api_key if not given
     :return: Database User account ID
     """
-    if api_key is None:
+    if api_key is None and api_key_hash is None:
         raise AttributeError("Provide api_key as parameter")
     if cursor is None:
         raise AttributeError("Provide cursor as parameter")
+    if api_key_hash is None:
+        api_key_hash = hash_api_key(api_key=api_key)
 
     api_key_dict = {}
 
-    sql_query = "SELECT id, account_id, api_key FROM api_keys WHERE api_key='%s' ORDER BY id DESC LIMIT 1" % (api_key)
+    sql_query = "SELECT id, account_id, api_key FROM api_keys WHERE api_key_hash=?"
 
     try:
-        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor)
+        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor, arguments=(api_key_hash,))
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not fetch Account ID from database')
         logger.error('Could not fetch Account ID from database: ' + repr(exp))
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
         raise
     else:
         logger.debug("Account ID fetched from database")
@@ -320,6 +370,60 @@ def get_account_id(api_key=None, cursor=None):
             return cursor, api_key_dict['account_id']
 
 
+def store_revoked_api_token_to_db(jti=None, expires_at=None, cursor=None):
+    """
+    Store ID of revoked API token to DB. Revocations of expired tokens are removed at the same time.
+
+    :param jti: ID of API token
+    :param expires_at: Expiry time of API token as Unix time
+    :param cursor: Database cursor
+    :return: Database cursor
+    """
+    if jti is None:
+        raise AttributeError("Provide jti as parameter")
+    if expires_at is None:
+        raise AttributeError("Provide expires_at as parameter")
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+
+    try:
+        cursor.execute("DELETE FROM revoked_api_tokens WHERE expires_at < ?", (int(time.time()),))
+        cursor.execute("INSERT OR IGNORE INTO revoked_api_tokens (jti, expires_at) VALUES (?, ?)", (jti, int(expires_at)))
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not store revoked API token to Database')
+        logger.error('Could not store revoked API token to Database: ' + repr(exp))
+        raise
+    else:
+        logger.debug('Revoked API token stored')
+        return cursor
+
+
+def is_api_token_revoked_in_db(jti=None, cursor=None):
+    """
+    Check if API token is revoked
+
+    :param jti: ID of API token
+    :param cursor: Database cursor
+    :return: Database cursor and True if token is revoked
+    """
+    if jti is None:
+        raise AttributeError("Provide jti as parameter")
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+
+    sql_query = "SELECT jti FROM revoked_api_tokens WHERE jti=?"
+
+    try:
+        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor, arguments=(jti,))
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not fetch revoked API token from database')
+        logger.error('Could not fetch revoked API token from database: ' + repr(exp))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
+        raise
+    else:
+        return cursor, len(data) > 0
+
+
 def clear_apikey_sqlite_db():
     """
     Initializes SQLite database.
@@ -338,7 +442,7 @@ def clear_apikey_sqlite_db():
 
     try:
         logger.info('Clearing database')
-        logger.debug('Executing: ' + str(sql_query))
+        logger.debug('Executing: %s', sql_query)
         connection.execute(sql_query)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not clear database')
@@ -347,7 +451,6 @@ def clear_apikey_sqlite_db():
         raise
     else:
         connection.commit()
-        connection.close()
         logger.info('Database cleared')
         return True
 
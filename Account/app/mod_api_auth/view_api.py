@@ -17,9 +17,11 @@ __date__ = 26.5.2016
 from flask import Blueprint, render_template, make_response, flash, session, request
 from flask_restful import Resource, Api, reqparse
 
-from app import api
-from app.helpers import get_custom_logger, make_json_response
-from app.mod_api_auth.controllers import get_account_api_key, get_api_key_sdk
+from app import api, app
+from app.helpers import get_custom_logger, make_json_response, ApiError
+from app.mod_api_auth.controllers import get_account_api_key, get_api_key_sdk, issue_api_token, revoke_api_token, \
+    provideApiKey, wrongApiKey
+from app.mod_api_auth.helpers import is_api_token
 from app.mod_auth.helpers import get_account_id_by_username_and_password
 
 logger = get_custom_logger('mod_api_auth_view_api')
@@ -38,7 +40,7 @@ class ApiKeyUser(Resource):
         This function is called to check if a username password combination is valid.
         """
         user = get_account_id_by_username_and_password(username=username, password=password)
-        logger.debug("User with following info: " + str(user))
+        logger.debug("User with following info: %s", user)
         if user is not None:
             self.account_id = user['account_id']
             self.username = user['username']
@@ -63,7 +65,10 @@ class ApiKeyUser(Resource):
         if not auth or not self.check_basic_auth(auth.username, auth.password):
             return self.authenticate()
 
-        api_key = get_account_api_key(account_id=self.account_id)
+        if app.config["API_TOKEN_ENABLED"]:
+            api_key = issue_api_token(subject=self.account_id, scope='user')
+        else:
+            api_key = get_account_api_key(account_id=self.account_id)
 
 
         response_data = {
@@ -82,8 +87,8 @@ class ApiKeySDK(Resource):
         """
         This function is called to check if a username password combination is valid.
         """
-        logger.debug("Provided username: " + str(username))
-        logger.debug("Provided password: " + str(password))
+        logger.debug("Provided username: %s", username)
+        logger.debug("Provided password: %s", password)
 
         if (username == self.username) and (password == self.password):
             return True
@@ -105,7 +110,10 @@ class ApiKeySDK(Resource):
         if not auth or not self.check_basic_auth(auth.username, auth.password):
             return self.authenticate()
 
-        api_key = get_api_key_sdk()
+        if app.config["API_TOKEN_ENABLED"]:
+            api_key = issue_api_token(subject=self.username, scope='sdk')
+        else:
+            api_key = get_api_key_sdk()
 
         response_data = {
             'api_key': api_key
@@ -114,6 +122,41 @@ class ApiKeySDK(Resource):
         return make_json_response(data=response_data, status_code=200)
 
 
+class ApiTokenRevoke(Resource):
+
+    def post(self):
+        """
+        Revokes API token given in Api-Key header. Token is authenticated by its own signature,
+        so a holder of token can only revoke that token. Revocation is stored to database shared by all workers.
+        """
+        endpoint = "ApiTokenRevoke.post()"
+        api_key = request.headers.get('Api-Key')
+        if api_key is None:
+            return provideApiKey(endpoint=endpoint)
+
+        if not is_api_token(api_key=api_key):
+            logger.debug("Not a valid API token")
+            return wrongApiKey()
+
+        try:
+            revoked = revoke_api_token(api_key=api_key)
+        except Exception as exp:
+            error_title = "Could not revoke API token"
+            logger.error(error_title + ": " + repr(exp))
+            raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
+
+        if not revoked:
+            logger.debug("Not a valid API token")
+            return wrongApiKey()
+
+        response_data = {
+            'revoked': True
+        }
+
+        return make_json_response(data=response_data, status_code=200)
+
+
 # Register resources
 api.add_resource(ApiKeyUser, '/api/auth/user/', endpoint='api_auth_user')
 api.add_resource(ApiKeySDK, '/api/auth/sdk/', endpoint='api_auth_sdk')
+api.add_resource(ApiTokenRevoke, '/api/auth/token/revoke/', endpoint='api_auth_token_revoke')
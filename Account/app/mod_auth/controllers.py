@@ -16,15 +16,17 @@ from flask_restful import Resource, Api, reqparse
 from app import db, api, app
 
 # Import Models
-from app.helpers import get_custom_logger
+from app.helpers import get_custom_logger, lazy_repr
 from app.mod_api_auth.controllers import gen_account_api_key
-from app.mod_auth.helpers import get_account_by_username_and_password
+from app.mod_auth.helpers import get_account_by_username_and_password, invalidate_cached_credentials, \
+    invalidate_cached_user
+from app.mod_auth.services import hash_password
 
 # Import Resources
-from app.mod_blackbox.controllers import gen_account_key
+from app.mod_blackbox.client import gen_account_key
 from app.mod_database.helpers import get_db_cursor
-from app.mod_database.models import Particulars, Account, LocalIdentityPWD, LocalIdentity, Salt, Email
 from app.mod_account.view_html import Home
+from app.mod_account.services import store_accounts
 
 # Define the blueprint: 'auth', set its url prefix: app.url/auth
 mod_auth = Blueprint('auth', __name__, template_folder='templates')
@@ -97,92 +99,49 @@ class SignUp(Resource):
         logger.debug('global_identifier: ' + repr(global_identifier).replace("'u'", "'"))
 
         username = str(repr(args['username'])[2:-1])
-        logger.debug('username: ' + username)
+        logger.debug('username: %s', username)
 
         firstname = str(repr(args['firstname'])[2:-1])
-        logger.debug('firstname: ' + firstname)
+        logger.debug('firstname: %s', firstname)
 
         lastname = str(repr(args['lastname'])[2:-1])
-        logger.debug('lastname: ' + lastname)
+        logger.debug('lastname: %s', lastname)
 
         email = str(repr(args['email'])[2:-1])
-        logger.debug('email: ' + email)
+        logger.debug('email: %s', email)
 
         date_of_birth = str(repr(args['dateofbirth'])[2:-1])
-        logger.debug('date_of_birth: ' + date_of_birth)
-
-        salt = str(bcrypt.gensalt())
-        logger.debug('salt: ' + salt)
+        logger.debug('date_of_birth: %s', date_of_birth)
 
         pwd_to_hash = str(repr(args['password'])[2:-1])
-        logger.debug('pwd_to_hash: ' + pwd_to_hash)
+        logger.debug('pwd_to_hash: %s', pwd_to_hash)
 
-        pwd_hash = bcrypt.hashpw(pwd_to_hash, salt)
-        logger.debug('pwd_hash: ' + repr(pwd_hash))
+        salt, pwd_hash = hash_password(password=pwd_to_hash)
+        logger.debug('salt: %s', salt)
+        logger.debug('pwd_hash: %s', lazy_repr(pwd_hash))
 
         # DB cursor
         cursor = get_db_cursor()
 
         try:
-            ###
-            # Accounts
-            logger.debug('Accounts')
-            account = Account(global_identifyer=global_identifier)
-            account.to_db(cursor=cursor)
-
-            ###
-            # localIdentityPWDs
-            logger.debug('localIdentityPWDs')
-            local_pwd = LocalIdentityPWD(password=pwd_hash)
-            local_pwd.to_db(cursor=cursor)
-
-            ###
-            # localIdentities
-            logger.debug('localIdentities')
-            local_identity = LocalIdentity(
-                username=username,
-                pwd_id=local_pwd.id,
-                accounts_id=account.id
-            )
-            local_identity.to_db(cursor=cursor)
-
-            ###
-            # salts
-            logger.debug('salts')
-            salt = Salt(
-                salt=salt,
-                identity_id=local_identity.id
-            )
-            salt.to_db(cursor=cursor)
-
-            ###
-            # Particulars
-            logger.debug('particulars')
-            particulars = Particulars(
-                firstname=firstname,
-                lastname=lastname,
-                date_of_birth=date_of_birth,
-                account_id=account.id
-            )
-            logger.debug("to_dict: " + repr(particulars.to_dict))
-            cursor = particulars.to_db(cursor=cursor)
-
-            ###
-            # emails
-            logger.debug('emails')
-            email = Email(
-                email=email,
-                type="Personal",
-                prime=1,
-                account_id=account.id
-            )
-            email.to_db(cursor=cursor)
+            account_entry = {
+                'global_identifier': global_identifier,
+                'username': username,
+                'pwd_hash': pwd_hash,
+                'salt': salt,
+                'firstname': firstname,
+                'lastname': lastname,
+                'date_of_birth': date_of_birth,
+                'email': email
+            }
+            cursor, accounts = store_accounts(cursor=cursor, account_entries=[account_entry])
+            account = accounts[0]
 
             ###
             # Commit
             db.connection.commit()
         except Exception as exp:
-            logger.debug('commit failed: ' + repr(exp))
+            logger.debug('commit failed: %s', lazy_repr(exp))
             db.connection.rollback()
             logger.debug('--> rollback')
 
@@ -190,12 +149,14 @@ class SignUp(Resource):
             return {}, 301, {'Location': api.url_for(resource=SignUp)}
         else:
             logger.debug('Account commited')
+            invalidate_cached_credentials(account_id=account.id)
+            invalidate_cached_user(account_id=account.id)
 
             try:
                 logger.info("Generating Key for Account")
                 kid = gen_account_key(account_id=account.id)
             except Exception as exp:
-                logger.debug('Could not generate Key for Account: ' + repr(exp))
+                logger.debug('Could not generate Key for Account: %s', lazy_repr(exp))
             else:
                 logger.info("Generated Key for Account with Key ID: " + str(kid))
 
@@ -203,13 +164,13 @@ class SignUp(Resource):
                 logger.info("Generating API Key for Account")
                 api_key = gen_account_api_key(account_id=account.id)
             except Exception as exp:
-                logger.debug('Could not generate API Key for Account: ' + repr(exp))
+                logger.debug('Could not generate API Key for Account: %s', lazy_repr(exp))
             else:
                 logger.info("Generated API Key: " + str(api_key))
 
         data = cursor.fetchall()
 
-        logger.debug('data: ' + repr(data))
+        logger.debug('data: %s', lazy_repr(data))
 
         #return {'args': args, 'data': data}
         flash('Account added')
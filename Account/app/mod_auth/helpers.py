@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 
 # Import dependencies
+import hmac
 import uuid
+from hashlib import sha256
+from os import urandom
+
 import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/bcrypt/2.0.0
 
 # Import the database object from the main app module
@@ -10,12 +14,74 @@ from flask import json
 from app import login_manager, app
 
 # create logger with 'spam_application'
-from app.helpers import get_custom_logger
+from app.helpers import get_custom_logger, LruTtlCache, lazy_repr
 from app.mod_auth.models import User
+from app.mod_auth.services import verify_password
 from app.mod_database.helpers import get_db_cursor
 
 logger = get_custom_logger('mod_auth_helpers')
 
+# Users loaded by Flask-Login, keyed by account_id
+user_cache = LruTtlCache(max_size=int(app.config["USER_CACHE_SIZE"]), ttl=int(app.config["USER_CACHE_TTL"]))
+
+# Successful verifications of username and password, keyed by credential_cache_key()
+credential_cache = LruTtlCache(
+    max_size=int(app.config["CREDENTIAL_CACHE_SIZE"]),
+    ttl=int(app.config["CREDENTIAL_CACHE_TTL"])
+)
+
+# Key of HMAC for credential_cache. Generated per process and never stored, so cache keys can not be brute forced
+# to passwords if they leak.
+_credential_cache_secret = urandom(32)
+
+
+def credential_cache_key(username=None, password=None):
+    """
+    Keyed HMAC of username and password. Plaintext password is never stored in cache.
+
+    :param username: Username as String
+    :param password: Password as String
+    :return: Hex digest
+    """
+    if username is None:
+        raise AttributeError("Provide username as parameter")
+    if password is None:
+        raise AttributeError("Provide password as parameter")
+
+    # Length prefix keeps username and password apart
+    credentials = str(len(username)) + ':' + username + password
+    if not isinstance(credentials, bytes):
+        credentials = credentials.encode('utf-8')
+    return hmac.new(_credential_cache_secret, credentials, sha256).hexdigest()
+
+
+def invalidate_cached_credentials(account_id=None):
+    """
+    Removes cached verifications of Account from cache of current process. Must be called after the transaction
+    that changes password or username of Account has been committed.
+
+    :param account_id: ID of Account
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    if credential_cache.invalidate_tag(tag=str(account_id)):
+        logger.debug('Cached credentials invalidated: %s', account_id)
+
+
+def invalidate_cached_user(account_id=None):
+    """
+    Removes User from cache of current process. Must be called after the transaction that changes data cached
+    in User has been committed.
+
+    :param account_id: ID of Account
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    if user_cache.invalidate(key=unicode(account_id)):
+        logger.debug('Cached User invalidated: %s', account_id)
+
 
 def get_account_by_id(cursor=None, account_id=None):
 
@@ -24,7 +90,7 @@ def get_account_by_id(cursor=None, account_id=None):
         # User info by acoount_id
         logger.debug('User info by acoount_id')
         if app.config["SUPER_DEBUG"]:
-            logger.debug('account_id: ' + repr(account_id))
+            logger.debug('account_id: %s', lazy_repr(account_id))
 
         sql_query = "SELECT " \
                     "MyDataAccount.Accounts.id, " \
@@ -42,66 +108,46 @@ def get_account_by_id(cursor=None, account_id=None):
                     "ON MyDataAccount.Accounts.id = MyDataAccount.Particulars.Accounts_id " \
                     "INNER JOIN MyDataAccount.Emails " \
                     "ON MyDataAccount.Accounts.id = MyDataAccount.Emails.Accounts_id " \
-                    "WHERE MyDataAccount.Accounts.id = '%s' AND MyDataAccount.Emails.prime = 1" % (account_id)
+                    "WHERE MyDataAccount.Accounts.id = %s AND MyDataAccount.Emails.prime = 1"
+
+        arguments = (account_id, )
 
         if app.config["SUPER_DEBUG"]:
-            logger.debug('sql_query: ' + repr(sql_query))
+            logger.debug('sql_query: %s', lazy_repr(sql_query))
 
-        cursor.execute(sql_query)
+        cursor.execute(sql_query, arguments)
 
         data = cursor.fetchone()
-        if app.config["SUPER_DEBUG"]:
-            logger.debug('data: ' + repr(data))
 
-        account_id_from_db = unicode(data[0])
-        identity_id_from_db = str(data[1])
-        username_from_db = str(data[2])
-        firstname_from_db = str(data[3])
-        lastname_from_db = str(data[4])
-        email_from_db = str(data[5])
-        img_url_from_db = str(data[6])
-        data_of_birth_from_db = str(data[7])
+        user = User(
+            account_id=unicode(data[0]),
+            identity_id=str(data[1]),
+            username=str(data[2]),
+            firstname=str(data[3]),
+            lastname=str(data[4]),
+            email=str(data[5]),
+            img_url=str(data[6]),
+            date_of_birth=str(data[7])
+        )
 
     except Exception as exp:
-        logger.debug('Account not found: ' + repr(exp))
-
-        if app.config["SUPER_DEBUG"]:
-            logger.debug('Exception: ' + repr(exp))
-
+        logger.debug('Account not found: %s', lazy_repr(exp))
         return cursor, None
 
     else:
-        logger.debug('Account found with given id: ' + str(account_id))
+        logger.debug('Account found with given id: %s', account_id)
         if app.config["SUPER_DEBUG"]:
-            logger.debug('account_id_from_db: ' + str(account_id_from_db))
-            logger.debug('identity_id_from_db: ' + str(identity_id_from_db))
-            logger.debug('username_from_db: ' + str(username_from_db))
-            logger.debug('firstname_from_db: ' + str(firstname_from_db))
-            logger.debug('lastname_from_db: ' + str(lastname_from_db))
-            logger.debug('email_from_db: ' + str(email_from_db))
-            logger.debug('img_url_from_db: ' + str(img_url_from_db))
-            logger.debug('data_of_birth_from_db: ' + str(data_of_birth_from_db))
-
-        user = User(
-            account_id=account_id_from_db,
-            identity_id=identity_id_from_db,
-            username=username_from_db,
-            firstname=firstname_from_db,
-            lastname=lastname_from_db,
-            email=email_from_db,
-            img_url=img_url_from_db,
-            date_of_birth=data_of_birth_from_db
-        )
+            logger.debug('user: %s', lazy_repr(user))
 
         return cursor, user
 
 
 def get_account_by_username_and_password(cursor=None, username=None, password=None):
     username_to_check = str(username)
-    logger.debug('username_to_check: ' + username_to_check)
+    logger.debug('username_to_check: %s', username_to_check)
 
     password_to_check = str(password)
-    logger.debug('password_to_check: ' + password_to_check)
+    logger.debug('password_to_check: %s', password_to_check)
 
     try:
         ###
@@ -121,7 +167,7 @@ def get_account_by_username_and_password(cursor=None, username=None, password=No
                     "WHERE MyDataAccount.LocalIdentities.username = '%s'" % (username_to_check)
 
         if app.config["SUPER_DEBUG"]:
-            logger.debug('sql_query: ' + repr(sql_query))
+            logger.debug('sql_query: %s', lazy_repr(sql_query))
 
         cursor.execute(sql_query)
 
@@ -133,36 +179,28 @@ def get_account_by_username_and_password(cursor=None, username=None, password=No
         salt_from_db = str(data[4])
 
     except Exception as exp:
-        logger.debug('Authentication failed: ' + repr(exp))
+        logger.debug('Authentication failed: %s', lazy_repr(exp))
 
         if app.config["SUPER_DEBUG"]:
-            logger.debug('Exception: ' + repr(exp))
+            logger.debug('Exception: %s', lazy_repr(exp))
 
         return cursor, None
 
     else:
-        logger.debug('User found with given username: ' + username)
+        logger.debug('User found with given username: %s', username)
         if app.config["SUPER_DEBUG"]:
-            logger.debug('account_id_from_db: ' + account_id_from_db)
-            logger.debug('identity_id_from_db: ' + identity_id_from_db)
-            logger.debug('username_from_db: ' + username_from_db)
-            logger.debug('password_from_db: ' + password_from_db)
-            logger.debug('salt_from_db: ' + salt_from_db)
-
-    if bcrypt.hashpw(password_to_check, salt_from_db) == password_from_db:
-        if app.config["SUPER_DEBUG"]:
-            logger.debug('Password hash from client: ' + bcrypt.hashpw(password_to_check, salt_from_db))
-            logger.debug('Password hash from db    : ' + password_from_db)
+            logger.debug('account_id_from_db: %s', account_id_from_db)
+            logger.debug('identity_id_from_db: %s', identity_id_from_db)
+            logger.debug('username_from_db: %s', username_from_db)
+            logger.debug('password_from_db: %s', password_from_db)
+            logger.debug('salt_from_db: %s', salt_from_db)
 
+    if verify_password(password=password_to_check, salt=salt_from_db, pwd_hash=password_from_db):
         logger.debug('Authenticated')
         cursor, user = get_account_by_id(cursor=cursor, account_id=int(account_id_from_db))
         return cursor, user
 
     else:
-        if app.config["SUPER_DEBUG"]:
-            logger.debug('Password hash from client: ' + bcrypt.hashpw(password_to_check, salt_from_db))
-            logger.debug('Password hash from db    : ' + password_from_db)
-
         logger.debug('Not Authenticated')
         return cursor, None
 
@@ -172,21 +210,42 @@ def get_account_by_username_and_password(cursor=None, username=None, password=No
 @login_manager.user_loader
 def load_user(account_id):
     if app.config["SUPER_DEBUG"]:
-        logger.debug("load_user(account_id), account_id=" + account_id)
+        logger.debug("load_user(account_id), account_id=%s", account_id)
+
+    account_id = unicode(account_id)
+    cache_enabled = app.config["USER_CACHE_ENABLED"]
+
+    if cache_enabled:
+        cached_user = user_cache.get(key=account_id)
+        if cached_user is not None:
+            return cached_user
 
     cursor = get_db_cursor()
 
-    cursor, loaded_user = get_account_by_id(cursor=cursor, account_id=unicode(account_id))
+    cursor, loaded_user = get_account_by_id(cursor=cursor, account_id=account_id)
+
+    # Missing Accounts are not cached
+    if cache_enabled and loaded_user is not None:
+        user_cache.set(key=account_id, value=loaded_user)
+
     return loaded_user
 
 
 # For API Auth module
 def get_account_id_by_username_and_password(username=None, password=None):
     username_to_check = str(username)
-    logger.debug('username_to_check: ' + username_to_check)
+    logger.debug('username_to_check: %s', username_to_check)
 
     password_to_check = str(password)
-    logger.debug('password_to_check: ' + password_to_check)
+    logger.debug('password_to_check: %s', password_to_check)
+
+    cache_enabled = app.config["CREDENTIAL_CACHE_ENABLED"]
+    if cache_enabled:
+        cache_key = credential_cache_key(username=username_to_check, password=password_to_check)
+        cached_user = credential_cache.get(key=cache_key)
+        if cached_user is not None:
+            logger.debug('Authenticated from cache')
+            return dict(cached_user)
 
     try:
         ###
@@ -206,7 +265,7 @@ def get_account_id_by_username_and_password(username=None, password=None):
                     "WHERE MyDataAccount.LocalIdentities.username = '%s'" % (username_to_check)
 
         if app.config["SUPER_DEBUG"]:
-            logger.debug('sql_query: ' + repr(sql_query))
+            logger.debug('sql_query: %s', lazy_repr(sql_query))
 
         # DB cursor
         cursor = get_db_cursor()
@@ -221,37 +280,32 @@ def get_account_id_by_username_and_password(username=None, password=None):
         salt_from_db = str(data[4])
 
     except Exception as exp:
-        logger.debug('Authentication failed: ' + repr(exp))
+        logger.debug('Authentication failed: %s', lazy_repr(exp))
 
         if app.config["SUPER_DEBUG"]:
-            logger.debug('Exception: ' + repr(exp))
+            logger.debug('Exception: %s', lazy_repr(exp))
 
         return None
 
     else:
-        logger.debug('User found with given username: ' + username)
-        if app.config["SUPER_DEBUG"]:
-            logger.debug('account_id_from_db: ' + account_id_from_db)
-            logger.debug('identity_id_from_db: ' + identity_id_from_db)
-            logger.debug('username_from_db: ' + username_from_db)
-            logger.debug('password_from_db: ' + password_from_db)
-            logger.debug('salt_from_db: ' + salt_from_db)
-
-    if bcrypt.hashpw(password_to_check, salt_from_db) == password_from_db:
+        logger.debug('User found with given username: %s', username)
         if app.config["SUPER_DEBUG"]:
-            logger.debug('Password hash from client: ' + bcrypt.hashpw(password_to_check, salt_from_db))
-            logger.debug('Password hash from db    : ' + password_from_db)
+            logger.debug('account_id_from_db: %s', account_id_from_db)
+            logger.debug('identity_id_from_db: %s', identity_id_from_db)
+            logger.debug('username_from_db: %s', username_from_db)
+            logger.debug('password_from_db: %s', password_from_db)
+            logger.debug('salt_from_db: %s', salt_from_db)
 
+    if verify_password(password=password_to_check, salt=salt_from_db, pwd_hash=password_from_db):
         logger.debug('Authenticated')
         #cursor, user = get_account_by_id(cursor=cursor, account_id=int(account_id_from_db))
         user = {'account_id': account_id_from_db, 'username': username_from_db}
         logger.debug('User dict created')
+        # Failed verifications are not cached
+        if cache_enabled:
+            credential_cache.set(key=cache_key, value=dict(user), tag=account_id_from_db)
         return user
 
     else:
-        if app.config["SUPER_DEBUG"]:
-            logger.debug('Password hash from client: ' + bcrypt.hashpw(password_to_check, salt_from_db))
-            logger.debug('Password hash from db    : ' + password_from_db)
-
         logger.debug('Not Authenticated')
         return None
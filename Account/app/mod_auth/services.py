@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+
+"""
+Password hashing pool
+
+bcrypt is run in separate worker processes, so that hashing does not block the request threads
+of the worker and is not limited by the GIL. Request threads only wait for the result.
+"""
+
+# Import dependencies
+import atexit
+import hmac
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/bcrypt/2.0.0
+
+from app import app
+from app.helpers import get_custom_logger, ApiError
+
+logger = get_custom_logger('mod_auth_services')
+
+
+##########################################
+# Worker functions, executed in pool processes
+##########################################
+def _password_bytes(password=None):
+    """
+    Unicode passwords are hashed as UTF-8, str() would fail with non-ASCII characters.
+    """
+    if not isinstance(password, bytes):
+        password = password.encode('utf-8')
+    return password
+
+
+def _hash_password_task(password=None, rounds=12):
+    """
+    :return: Tuple of (error, salt, pwd_hash, duration)
+    """
+    start = time.time()
+    try:
+        salt = str(bcrypt.gensalt(rounds))
+        pwd_hash = bcrypt.hashpw(_password_bytes(password), salt)
+    except Exception as exp:
+        return repr(exp), None, None, time.time() - start
+    else:
+        return None, salt, pwd_hash, time.time() - start
+
+
+def _verify_password_task(password=None, salt=None, pwd_hash=None):
+    """
+    :return: Tuple of (error, match, duration)
+    """
+    start = time.time()
+    try:
+        match = hmac.compare_digest(bcrypt.hashpw(_password_bytes(password), str(salt)), str(pwd_hash))
+    except Exception as exp:
+        return repr(exp), False, time.time() - start
+    else:
+        return None, match, time.time() - start
+
+
+class HashTimer(object):
+    """
+    Timing metrics of one operation type.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rejected = 0
+        self.compute_time_total = 0.0
+        self.compute_time_max = 0.0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.wait_time_last = 0.0
+
+    def add(self, compute_time=0.0, wait_time=0.0):
+        self.count += 1
+        self.compute_time_total += compute_time
+        self.wait_time_total += wait_time
+        self.wait_time_last = wait_time
+        if compute_time > self.compute_time_max:
+            self.compute_time_max = compute_time
+        if wait_time > self.wait_time_max:
+            self.wait_time_max = wait_time
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'compute_time_avg': self.compute_time_total / self.count if self.count else 0.0,
+            'compute_time_max': self.compute_time_max,
+            'wait_time_avg': self.wait_time_total / self.count if self.count else 0.0,
+            'wait_time_max': self.wait_time_max,
+            'wait_time_last': self.wait_time_last,
+        }
+
+
+class HashSlot(object):
+    """
+    Queue slot of one operation submitted to HashPool. Released with HashPool._release(), at most once.
+    """
+
+    def __init__(self, bulk=False):
+        self.bulk = bulk
+        self.released = False
+
+
+class HashPool(object):
+    """
+    Process pool for bcrypt hashing and verification.
+
+    At most queue_size operations are queued or running at a time, further calls are rejected immediately
+    with ApiError 503 instead of piling up behind slow hashes. With pool_size 0 hashing is done in calling thread.
+    Bulk operations use at most bulk_queue_size of the slots, so that logins are served during Account import.
+
+    Pool is created lazily in each process, so it is safe with forking servers like uWSGI.
+    """
+
+    def __init__(self, pool_size=2, queue_size=32, timeout=10, rounds=12, bulk_queue_size=8):
+        if pool_size < 0:
+            raise AttributeError("Illegal value for pool_size: " + str(pool_size))
+        if queue_size < 1:
+            raise AttributeError("Illegal value for queue_size: " + str(queue_size))
+        if bulk_queue_size < 1 or bulk_queue_size > queue_size:
+            raise AttributeError("Illegal value for bulk_queue_size: " + str(bulk_queue_size))
+
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.bulk_queue_size = bulk_queue_size
+        self.timeout = timeout
+        self.rounds = rounds
+
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._bulk_slots = threading.BoundedSemaphore(bulk_queue_size)
+        self._pending = 0
+
+        self._timers = {
+            'hash': HashTimer(),
+            'verify': HashTimer(),
+        }
+
+    @property
+    def pool(self):
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = multiprocessing.Pool(processes=self.pool_size)
+                    self._pool_pid = pid
+                    logger.info('Hash pool with ' + str(self.pool_size) + ' processes created for process ' + str(pid))
+        return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.terminate()
+            self._pool = None
+            self._pool_pid = None
+
+    def _release(self, slot=None):
+        with self._lock:
+            if slot.released:
+                return
+            slot.released = True
+            self._pending -= 1
+        self._slots.release()
+        if slot.bulk:
+            self._bulk_slots.release()
+
+    def _submit(self, operation=None, function=None, kwargs=None, bulk=False):
+        """
+        Queues function to pool.
+
+        :param bulk: If True, waits for free bulk queue slot instead of rejecting the call
+        :return: AsyncResult
+        """
+        if bulk:
+            self._bulk_slots.acquire()
+        if not self._slots.acquire(bulk):
+            with self._lock:
+                self._timers[operation].rejected += 1
+            logger.error('Hash pool queue is full, ' + str(self.queue_size) + ' operations pending')
+            raise ApiError(code=503, title="Password hashing queue is full", detail="Try again later")
+
+        with self._lock:
+            self._pending += 1
+        slot = HashSlot(bulk=bulk)
+
+        # Slot is released when operation completes, not when caller stops waiting for it,
+        # so operations that timed out still count against queue_size while they are queued or running.
+        # Worker functions catch their exceptions, so callback is called for every result.
+        callbacks = {'callback': lambda result: self._release(slot=slot)}
+        if sys.version_info[0] >= 3:
+            # Called if result can not be returned. apply_async of Python 2 has no error_callback.
+            callbacks['error_callback'] = lambda exp: self._release(slot=slot)
+
+        try:
+            return self.pool.apply_async(function, kwds=kwargs, **callbacks)
+        except Exception:
+            self._release(slot=slot)
+            raise
+
+    def _wait(self, operation=None, async_result=None):
+        try:
+            return async_result.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            with self._lock:
+                self._timers[operation].errors += 1
+            logger.error(operation + ' did not complete in ' + str(self.timeout) + ' seconds')
+            raise ApiError(code=503, title="Password hashing timed out", detail="Try again later")
+
+    def _run(self, operation=None, function=None, kwargs=None):
+        """
+        Runs function in pool and waits for the result.
+
+        :return: Result of function and time spent waiting for it
+        """
+        start = time.time()
+
+        if self.pool_size == 0:
+            return function(**kwargs), time.time() - start
+
+        async_result = self._submit(operation=operation, function=function, kwargs=kwargs)
+        return self._wait(operation=operation, async_result=async_result), time.time() - start
+
+    def _record_hash(self, error=None, compute_time=0.0, wait_time=0.0):
+        with self._lock:
+            if error is not None:
+                self._timers['hash'].errors += 1
+            else:
+                self._timers['hash'].add(compute_time=compute_time, wait_time=wait_time)
+
+    def hash_password(self, password=None):
+        """
+        Generates salt with configured cost and hashes password with it.
+
+        :param password: Password as String
+        :return: Tuple of salt and password hash
+        """
+        if password is None:
+            raise AttributeError("Provide password as parameter")
+
+        result, wait_time = self._run(
+            operation='hash',
+            function=_hash_password_task,
+            kwargs={'password': password, 'rounds': self.rounds}
+        )
+        error, salt, pwd_hash, compute_time = result
+        self._record_hash(error=error, compute_time=compute_time, wait_time=wait_time)
+
+        if error is not None:
+            raise ValueError("Could not hash password: " + error)
+        return salt, pwd_hash
+
+    def hash_passwords(self, passwords=None):
+        """
+        Hashes multiple passwords in parallel. Meant for bulk operations, so instead of rejecting
+        calls when queue is full, waits for free queue slots. At most bulk_queue_size passwords are
+        queued at a time. Hashes that time out are reported as errors of their own passwords
+        instead of failing the whole call.
+
+        :param passwords: List of passwords
+        :return: List of (error, salt, password hash) tuples in the same order as passwords.
+                 error is None for successful hashes.
+        """
+        if passwords is None:
+            raise AttributeError("Provide passwords as parameter")
+
+        start = time.time()
+        results = []
+
+        if self.pool_size == 0:
+            for password in passwords:
+                error, salt, pwd_hash, compute_time = _hash_password_task(password=password, rounds=self.rounds)
+                self._record_hash(error=error, compute_time=compute_time, wait_time=compute_time)
+                results.append((error, salt, pwd_hash))
+            return results
+
+        async_results = []
+        for password in passwords:
+            async_results.append(self._submit(
+                operation='hash',
+                function=_hash_password_task,
+                kwargs={'password': password, 'rounds': self.rounds},
+                bulk=True
+            ))
+
+        for async_result in async_results:
+            try:
+                error, salt, pwd_hash, compute_time = self._wait(operation='hash', async_result=async_result)
+            except ApiError as exp:
+                results.append((exp.title, None, None))
+                continue
+            self._record_hash(error=error, compute_time=compute_time, wait_time=time.time() - start)
+            results.append((error, salt, pwd_hash))
+
+        return results
+
+    def verify_password(self, password=None, salt=None, pwd_hash=None):
+        """
+        Checks password against stored salt and password hash.
+
+        :param password: Password as String
+        :param salt: Stored salt
+        :param pwd_hash: Stored password hash
+        :return: True if password matches
+        """
+        if password is None:
+            raise AttributeError("Provide password as parameter")
+        if salt is None:
+            raise AttributeError("Provide salt as parameter")
+        if pwd_hash is None:
+            raise AttributeError("Provide pwd_hash as parameter")
+
+        result, wait_time = self._run(
+            operation='verify',
+            function=_verify_password_task,
+            kwargs={'password': password, 'salt': salt, 'pwd_hash': pwd_hash}
+        )
+        error, match, compute_time = result
+
+        with self._lock:
+            if error is not None:
+                self._timers['verify'].errors += 1
+            else:
+                self._timers['verify'].add(compute_time=compute_time, wait_time=wait_time)
+
+        if error is not None:
+            logger.debug('Could not verify password: %s', error)
+            return False
+        return match
+
+    def stats(self):
+        """
+        Gauges and counters of the pool.
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'queue_size': self.queue_size,
+                'bulk_queue_size': self.bulk_queue_size,
+                'pending': self._pending,
+                'rounds': self.rounds,
+                'hash': self._timers['hash'].to_dict(),
+                'verify': self._timers['verify'].to_dict(),
+            }
+
+
+hash_pool = HashPool(
+    pool_size=int(app.config["HASH_POOL_SIZE"]),
+    queue_size=int(app.config["HASH_POOL_QUEUE_SIZE"]),
+    bulk_queue_size=int(app.config["HASH_POOL_BULK_QUEUE_SIZE"]),
+    timeout=float(app.config["HASH_POOL_TIMEOUT"]),
+    rounds=int(app.config["BCRYPT_ROUNDS"])
+)
+atexit.register(hash_pool.close)
+
+
+def hash_password(password=None):
+    """
+    :param password: Password as String
+    :return: Tuple of salt and password hash
+    """
+    return hash_pool.hash_password(password=password)
+
+
+def hash_passwords(passwords=None):
+    """
+    :param passwords: List of passwords
+    :return: List of (error, salt, password hash) tuples
+    """
+    return hash_pool.hash_passwords(passwords=passwords)
+
+
+def verify_password(password=None, salt=None, pwd_hash=None):
+    """
+    :param password: Password as String
+    :param salt: Stored salt
+    :param pwd_hash: Stored password hash
+    :return: True if password matches
+    """
+    return hash_pool.verify_password(password=password, salt=salt, pwd_hash=pwd_hash)
@@ -19,73 +19,48 @@ from flask_restful import Resource, Api, reqparse
 from app import db, api, login_manager, app
 
 # Import services
-from app.helpers import get_custom_logger, ApiError, get_utc_time
-from app.mod_blackbox.controllers import get_account_public_key, generate_and_sign_jws
+from app.helpers import get_custom_logger, ApiError, get_utc_time, lazy_repr
+from app.mod_account.services import update_account_counters, consent_counter_deltas
+from app.mod_authorization.services import auth_token_data_cache, get_auth_token_data_from_db, \
+    invalidate_auth_token_data
+from app.mod_blackbox.client import generate_and_sign_jws_batch
 from app.mod_database.helpers import get_db_cursor
 
 
 # create logger with 'spam_application'
-from app.mod_database.models import SurrogateId, ConsentRecord, ServiceLinkRecord
+from app.mod_database.models import SurrogateId, ConsentRecord, ServiceLinkRecord, ConsentStatusRecord
 
 logger = get_custom_logger(__name__)
 
 
-def sign_cr(account_id=None, payload=None, endpoint="sign_slr(account_id, payload, endpoint)"):
+def sign_consent(account_id=None, source_cr_payload=None, source_csr_payload=None, sink_cr_payload=None, sink_csr_payload=None, endpoint="sign_consent()"):
+    """
+    Signs Source's and Sink's Consent Records and Consent Status Records with one batch.
+    Key of account is loaded once for all four signatures.
+
+    :param account_id: User account ID
+    :param source_cr_payload: Payload of Source's CR
+    :param source_csr_payload: Payload of Source's CSR
+    :param sink_cr_payload: Payload of Sink's CR
+    :param sink_csr_payload: Payload of Sink's CSR
+    :param endpoint: Source of ApiErrors
+    :return: List of signed Source's CR, Source's CSR, Sink's CR and Sink's CSR as (dict, JSON) tuples
+             and timestamp filled to payloads
+    """
     if account_id is None:
         raise AttributeError("Provide account_id as parameter")
-    if payload is None:
-        raise AttributeError("Provide payload as parameter")
-
-    logger.info("Signing Consent Record")
-
-    # Get Account owner's public key
-    try:
-        account_public_key, account_kid = get_account_public_key(account_id=account_id)
-        account_public_key = json.loads(account_public_key)
-    except Exception as exp:
-        logger.error("Could not get account owner's public key: " + repr(exp))
-        raise ApiError(code=500, title="Failed to get account owner's public key", detail=repr(exp), source=endpoint)
-    else:
-        logger.info("Account owner's public key and kid fetched")
-
-    # Fill timestamp to created in slr
-    try:
-        timestamp_to_fill = get_utc_time()
-    except Exception as exp:
-        logger.error("Could not get UTC time: " + repr(exp))
-        raise ApiError(code=500, title="Could not get UTC time", detail=repr(exp), source=endpoint)
-    else:
-        logger.info("timestamp_to_fill: " + timestamp_to_fill)
-
-    try:
-        payload['common_part']['issued'] = timestamp_to_fill
-    except Exception as exp:
-        logger.error("Could not fill timestamp to created in cr: " + repr(exp))
-        raise ApiError(code=500, title="Failed to fill timestamp to created in cr", detail=repr(exp), source=endpoint)
-    else:
-        logger.info("Timestamp filled to issued in cr")
-
-    # Sign cr
-    try:
-        cr_signed = generate_and_sign_jws(account_id=account_id, jws_payload=json.dumps(payload))
-    except Exception as exp:
-        logger.error('Could not create Consent Record: ' + repr(exp))
-        raise ApiError(code=500, title="Failed to create Consent Record", detail=repr(exp), source=endpoint)
-    else:
-        logger.info('Service Link Record created and signed')
-        logger.debug('cr_signed: ' + cr_signed)
-        return cr_signed, timestamp_to_fill
-
-
-def sign_csr(account_id=None, payload=None, endpoint="sign_csr(account_id, payload, endpoint)"):
-    if account_id is None:
-        raise AttributeError("Provide account_id as parameter")
-    if payload is None:
-        raise AttributeError("Provide ssr_payload as parameter")
-
-    logger.info("Signing Service Link Status Record")
-
-    # Fill timestamp to created in slr
+    if source_cr_payload is None:
+        raise AttributeError("Provide source_cr_payload as parameter")
+    if source_csr_payload is None:
+        raise AttributeError("Provide source_csr_payload as parameter")
+    if sink_cr_payload is None:
+        raise AttributeError("Provide sink_cr_payload as parameter")
+    if sink_csr_payload is None:
+        raise AttributeError("Provide sink_csr_payload as parameter")
+
+    logger.info("Signing Consent Records and Consent Status Records")
+
+    # Fill timestamp to payloads
     try:
         timestamp_to_fill = get_utc_time()
     except Exception as exp:
@@ -95,23 +70,33 @@ def sign_csr(account_id=None, payload=None, endpoint="sign_csr(account_id, paylo
         logger.info("timestamp_to_fill: " + timestamp_to_fill)
 
     try:
-        payload['iat'] = timestamp_to_fill
+        source_cr_payload['common_part']['issued'] = timestamp_to_fill
+        sink_cr_payload['common_part']['issued'] = timestamp_to_fill
+        source_csr_payload['iat'] = timestamp_to_fill
+        sink_csr_payload['iat'] = timestamp_to_fill
     except Exception as exp:
-        logger.error("Could not fill timestamp to iat in csr_payload: " + repr(exp))
-        raise ApiError(code=500, title="Failed to fill timestamp to iat in csr_payload", detail=repr(exp), source=endpoint)
+        logger.error("Could not fill timestamp to payloads: " + repr(exp))
+        raise ApiError(code=500, title="Failed to fill timestamp to payloads", detail=repr(exp), source=endpoint)
     else:
-        logger.info("Timestamp filled to created in csr_payload")
+        logger.info("Timestamp filled to payloads")
 
-    # Sign csr
+    # Sign CRs and CSRs
     try:
-        csr_signed = generate_and_sign_jws(account_id=account_id, jws_payload=json.dumps(payload))
+        signed = generate_and_sign_jws_batch(
+            account_id=account_id,
+            jws_payloads=[
+                json.dumps(source_cr_payload),
+                json.dumps(source_csr_payload),
+                json.dumps(sink_cr_payload),
+                json.dumps(sink_csr_payload)
+            ]
+        )
     except Exception as exp:
-        logger.error('Could not create Consent Status Record: ' + repr(exp))
-        raise ApiError(code=500, title="Failed to create Consent Status Record", detail=repr(exp), source=endpoint)
+        logger.error('Could not sign Consent Records and Consent Status Records: ' + repr(exp))
+        raise ApiError(code=500, title="Failed to sign Consent Records and Consent Status Records", detail=repr(exp), source=endpoint)
     else:
-        logger.info('SConsent Status Record created and signed')
-        logger.debug('csr_signed: ' + csr_signed)
-        return csr_signed, timestamp_to_fill
+        logger.info('Consent Records and Consent Status Records signed')
+        return signed, timestamp_to_fill
 
 
 def store_cr_and_csr(source_slr_entry=None, sink_slr_entry=None, source_cr_entry=None, source_csr_entry=None, sink_cr_entry=None, sink_csr_entry=None, endpoint="store_cr_and_csr()"):
@@ -131,121 +116,87 @@ def store_cr_and_csr(source_slr_entry=None, sink_slr_entry=None, source_cr_entry
     # Get DB cursor
     try:
         cursor = get_db_cursor()
+    except ApiError:
+        raise
     except Exception as exp:
         logger.error('Could not get database cursor: ' + repr(exp))
         raise ApiError(code=500, title="Failed to get database cursor", detail=repr(exp), source=endpoint)
 
     try:
-        # Get Source's SLR from DB
+        # Get Source's and Sink's SLRs from DB
         try:
-            cursor = source_slr_entry.from_db(cursor=cursor)
+            cursor = ServiceLinkRecord.bulk_from_db(cursor=cursor, objects=[source_slr_entry, sink_slr_entry])
         except Exception as exp:
-            error_title = "Failed to fetch Source's SLR from DB"
+            error_title = "Failed to fetch Source's and Sink's SLRs from DB"
             logger.error(error_title + ": " + repr(exp))
             raise ApiError(code=404, title=error_title, detail=repr(exp), source=endpoint)
         finally:
             logger.debug("source_slr_entry: " + source_slr_entry.log_entry)
-
-        # Get Sink's SLR from DB
-        try:
-            cursor = sink_slr_entry.from_db(cursor=cursor)
-        except Exception as exp:
-            error_title = "Failed to fetch Sink's SLR from DB"
-            logger.error(error_title + ": " + repr(exp))
-            raise ApiError(code=404, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
             logger.debug("sink_slr_entry: " + sink_slr_entry.log_entry)
 
-        # Get Source's SLR ID
+        # Get Source's and Sink's SLR IDs
         try:
             source_cr_entry.service_link_records_id = source_slr_entry.id
-        except Exception as exp:
-            error_title = "Failed to fetch Source's Service Link Record ID"
-            logger.error(error_title + ": " + repr(exp))
-            raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
-            logger.debug("source_cr_entry: " + source_cr_entry.log_entry)
-
-        # Get Sink's SLR ID
-        try:
             sink_cr_entry.service_link_records_id = sink_slr_entry.id
         except Exception as exp:
-            error_title = "Failed to fetch Sink's Service Link Record ID"
+            error_title = "Failed to fetch Service Link Record IDs"
             logger.error(error_title + ": " + repr(exp))
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
-            logger.debug("sink_cr_entry: " + sink_cr_entry.log_entry)
 
-        # Store Source CR
+        # Store Source's and Sink's CRs
         try:
-            cursor = source_cr_entry.to_db(cursor=cursor)
+            cursor, cr_ids = ConsentRecord.bulk_to_db(cursor=cursor, objects=[source_cr_entry, sink_cr_entry])
         except Exception as exp:
-            error_title = "Failed to store Source's Consent Record"
+            error_title = "Failed to store Consent Records"
             logger.error(error_title + ": " + repr(exp))
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
         finally:
             logger.debug("source_cr_entry: " + source_cr_entry.log_entry)
+            logger.debug("sink_cr_entry: " + sink_cr_entry.log_entry)
 
-        # Link Source's CSR with it's CR
+        # Link CSRs with their CRs
         try:
             source_csr_entry.consent_records_id = source_cr_entry.id
+            sink_csr_entry.consent_records_id = sink_cr_entry.id
         except Exception as exp:
-            error_title = "Failed to link Source's CSR with it's CR"
+            error_title = "Failed to link CSRs with their CRs"
             logger.error(error_title + ": " + repr(exp))
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
-            logger.debug(source_csr_entry.log_entry)
 
-        # Store Source CSR
+        # Store Source's and Sink's CSRs
         try:
-            cursor = source_csr_entry.to_db(cursor=cursor)
+            cursor, csr_ids = ConsentStatusRecord.bulk_to_db(cursor=cursor, objects=[source_csr_entry, sink_csr_entry])
         except Exception as exp:
-            error_title = "Failed to store Source's Consent Status Record"
+            error_title = "Failed to store Consent Status Records"
             logger.error(error_title + ": " + repr(exp))
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
         finally:
             logger.debug("source_csr_entry: " + source_csr_entry.log_entry)
-
-        # Store Sink CR
-        try:
-            cursor = sink_cr_entry.to_db(cursor=cursor)
-        except Exception as exp:
-            error_title = "Failed to store Sink's Consent Record"
-            logger.error(error_title + ": " + repr(exp))
-            raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
-            logger.debug("sink_cr_entry: " + sink_cr_entry.log_entry)
-
-        # Link Sink's CSR with it's CR
-        try:
-            sink_csr_entry.consent_records_id = sink_cr_entry.id
-        except Exception as exp:
-            error_title = "Failed to link Sink's CSR with it's CR"
-            logger.error(error_title + ": " + repr(exp))
-            raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
             logger.debug("sink_csr_entry: " + sink_csr_entry.log_entry)
 
-        # Store Sink CSR
+        # Update Account's consent counters, consent is counted by Sink's CR
         try:
-            cursor = sink_csr_entry.to_db(cursor=cursor)
+            cursor = update_account_counters(
+                cursor=cursor,
+                account_id=sink_slr_entry.account_id,
+                deltas=consent_counter_deltas(status=sink_csr_entry.status)
+            )
         except Exception as exp:
-            error_title = "Failed to store Sink's Consent Status Record"
+            error_title = "Failed to update Account counters"
             logger.error(error_title + ": " + repr(exp))
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-        finally:
-            logger.debug("sink_csr_entry: " + sink_csr_entry.log_entry)
 
         # Commit
         db.connection.commit()
     except Exception as exp:
-        logger.debug('commit failed: ' + repr(exp))
+        logger.debug('commit failed: %s', lazy_repr(exp))
         db.connection.rollback()
         logger.debug('--> rollback')
         #raise ApiError(code=500, title="Failed to store CR's and CSR's", detail=repr(exp), source=endpoint)
         raise
     else:
         logger.info("CR's and CSR's commited")
+        invalidate_auth_token_data(sink_cr_id=sink_cr_entry.consent_id, source_cr_primary_key=source_cr_entry.id)
 
         try:
             data = {
@@ -266,81 +217,49 @@ def store_cr_and_csr(source_slr_entry=None, sink_slr_entry=None, source_cr_entry
 
 
 def get_auth_token_data(sink_cr_object=None, endpoint="get_auth_token_data()"):
+    """
+    Source's Consent Record and Sink's Service Link Record for Authorization token.
+    Result is cached per Sink's consentRecordId and must not be modified by caller.
+
+    :param sink_cr_object: ConsentRecord object with consent_id of Sink's Consent Record
+    :param endpoint: Source of ApiErrors
+    :return: Source's Consent Record and Sink's Service Link Record as dicts
+    """
     if sink_cr_object is None:
         raise AttributeError("Provide sink_cr_object as parameter")
 
+    sink_cr_id = str(sink_cr_object.consent_id)
+
+    if app.config["AUTH_TOKEN_CACHE_ENABLED"]:
+        auth_token_data = auth_token_data_cache.get(key=sink_cr_id)
+        if auth_token_data is not None:
+            logger.debug("Authorization token data from cache: %s", sink_cr_id)
+            return auth_token_data['source_cr'], auth_token_data['sink_slr']
+
     # Get DB cursor
     try:
         cursor = get_db_cursor()
+    except ApiError:
+        raise
     except Exception as exp:
         logger.error('Could not get database cursor: ' + repr(exp))
         raise ApiError(code=500, title="Failed to get database cursor", detail=repr(exp), source=endpoint)
 
-    # Get Sink's CR from DB
+    # Get Sink's CR, Source's CR and Sink's SLR from DB
     try:
-        cursor = sink_cr_object.from_db(cursor=cursor)
-    except Exception as exp:
-        error_title = "Failed to fetch Sink's CR from DB"
+        cursor, auth_token_data = get_auth_token_data_from_db(cursor=cursor, sink_cr_id=sink_cr_id)
+    except IndexError as exp:
+        error_title = "Failed to fetch Consent Records and Sink's SLR from DB"
         logger.error(error_title + ": " + repr(exp))
         raise ApiError(code=404, title=error_title, detail=repr(exp), source=endpoint)
-    finally:
-        logger.debug("sink_cr_object: " + sink_cr_object.log_entry)
-
-    # Get required id's from Sink's CR
-    try:
-        sink_rs_id = str(sink_cr_object.resource_set_id)
-        sink_slr_primary_key = str(sink_cr_object.service_link_records_id)
     except Exception as exp:
-        error_title = "Failed to get id's from Sink's CR"
+        error_title = "Failed to fetch Consent Records and Sink's SLR from DB"
         logger.error(error_title + ": " + repr(exp))
         raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
     finally:
-        logger.debug("sink_rs_id: " + sink_rs_id)
+        logger.debug("sink_cr_id: %s", sink_cr_id)
 
-    # Init Source's Consent Record Object
-    try:
-        source_cr_entry = ConsentRecord(resource_set_id=sink_rs_id, role="Source")
-    except Exception as exp:
-        error_title = "Failed to create Source's Consent Record object"
-        logger.error(error_title + ": " + repr(exp))
-        raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-    finally:
-        logger.debug("source_cr_entry: " + source_cr_entry.log_entry)
-
-    # Get Source's Consent Record from DB
-    source_cr = {}
-    try:
-        cursor = source_cr_entry.from_db(cursor=cursor)
-        source_cr = source_cr_entry.consent_record
-    except Exception as exp:
-        error_title = "Failed to fetch Source's CR from DB"
-        logger.error(error_title + ": " + repr(exp))
-        raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-    finally:
-        logger.debug("source_cr_entry: " + source_cr_entry.log_entry)
-        logger.debug("source_cr: " + json.dumps(source_cr))
-
-    # Init Sink's Service Link Record Object
-    try:
-        sink_slr_entry = ServiceLinkRecord(id=sink_slr_primary_key)
-    except Exception as exp:
-        error_title = "Failed to create Source's Service Link Record object"
-        logger.error(error_title + ": " + repr(exp))
-        raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-    finally:
-        logger.debug("source_cr_entry: " + source_cr_entry.log_entry)
-
-    # Get Source's Consent Record from DB
-    sink_slr = {}
-    try:
-        cursor = sink_slr_entry.from_db(cursor=cursor)
-        sink_slr = sink_slr_entry.service_link_record
-    except Exception as exp:
-        error_title = "Failed to fetch Sink's SLR from DB"
-        logger.error(error_title + ": " + repr(exp))
-        raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
-    finally:
-        logger.debug("sink_slr_entry: " + sink_slr_entry.log_entry)
-        logger.debug("sink_slr: " + json.dumps(sink_slr))
+    if app.config["AUTH_TOKEN_CACHE_ENABLED"]:
+        auth_token_data_cache.set(key=sink_cr_id, value=auth_token_data, tag=auth_token_data['source_cr_primary_key'])
 
-    return source_cr, json.loads(sink_slr)
+    return auth_token_data['source_cr'], auth_token_data['sink_slr']
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Import dependencies
+from flask import json
+
+# Import the database object from the main app module
+from app import app
+
+# create logger with 'spam_application'
+from app.helpers import get_custom_logger, LruTtlCache, lazy_repr
+from app.mod_database.helpers import execute_sql_select_2
+
+logger = get_custom_logger('mod_authorization_services')
+
+# Authorization token data, keyed by consentRecordId of Sink's Consent Record
+auth_token_data_cache = LruTtlCache(
+    max_size=int(app.config["AUTH_TOKEN_CACHE_SIZE"]),
+    ttl=int(app.config["AUTH_TOKEN_CACHE_TTL"])
+)
+
+# Sink's CR, Source's CR with the same Resource Set and Sink's SLR with one query.
+# Uses ConsentRecordId_UNIQUE, ResourceSetId_role_idx and primary key of ServiceLinkRecords.
+AUTH_TOKEN_DATA_QUERY = "SELECT " \
+                        "sink_cr.id, " \
+                        "source_cr.id, " \
+                        "source_cr.consentRecord, " \
+                        "slr.serviceLinkRecord " \
+                        "FROM MyDataAccount.ConsentRecords sink_cr " \
+                        "INNER JOIN MyDataAccount.ConsentRecords source_cr " \
+                        "ON source_cr.ResourceSetId = sink_cr.ResourceSetId AND source_cr.role = 'Source' " \
+                        "INNER JOIN MyDataAccount.ServiceLinkRecords slr " \
+                        "ON slr.id = sink_cr.ServiceLinkRecords_id " \
+                        "WHERE sink_cr.consentRecordId = %s AND sink_cr.role = 'Sink' " \
+                        "ORDER BY source_cr.id " \
+                        "LIMIT 1;"
+
+
+def invalidate_auth_token_data(sink_cr_id=None, source_cr_primary_key=None):
+    """
+    Removes cached Authorization token data of consent from cache of current process.
+    Must be called after the transaction that stores new Consent Status Records for Source's and Sink's Consent
+    Records has been committed. Entries are tagged with primary key of Source's Consent Record.
+
+    :param sink_cr_id: consentRecordId of Sink's Consent Record
+    :param source_cr_primary_key: Primary key of Source's Consent Record
+    """
+    if sink_cr_id is None:
+        raise AttributeError("Provide sink_cr_id as parameter")
+    if source_cr_primary_key is None:
+        raise AttributeError("Provide source_cr_primary_key as parameter")
+
+    removed_by_key = auth_token_data_cache.invalidate(key=str(sink_cr_id))
+    removed_by_tag = auth_token_data_cache.invalidate_tag(tag=str(source_cr_primary_key))
+    if removed_by_key or removed_by_tag:
+        logger.debug('Cached Authorization token data invalidated for ConsentRecord: %s', sink_cr_id)
+
+
+def get_auth_token_data_from_db(cursor=None, sink_cr_id=None):
+    """
+    Fetches Source's Consent Record and Sink's Service Link Record of consent.
+
+    :param cursor: Database cursor
+    :param sink_cr_id: consentRecordId of Sink's Consent Record
+    :return: Database cursor and dict with sink_cr_primary_key, source_cr_primary_key, source_cr and sink_slr
+    """
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if sink_cr_id is None:
+        raise AttributeError("Provide sink_cr_id as parameter")
+
+    try:
+        cursor, data = execute_sql_select_2(cursor=cursor, sql_query=AUTH_TOKEN_DATA_QUERY, arguments=(str(sink_cr_id),))
+    except Exception as exp:
+        logger.debug('sql_query: %s', lazy_repr(exp))
+        raise
+
+    if len(data) == 0:
+        raise IndexError("Consent Records and Service Link Record could not be found with provided sink_cr_id")
+
+    try:
+        auth_token_data = {
+            'sink_cr_primary_key': str(data[0][0]),
+            'source_cr_primary_key': str(data[0][1]),
+            'source_cr': json.loads(data[0][2]),
+            'sink_slr': json.loads(data[0][3]),
+        }
+    except Exception as exp:
+        logger.debug('Could not load json from consentRecord or serviceLinkRecord: %s', lazy_repr(exp))
+        raise
+    else:
+        return cursor, auth_token_data
@@ -30,14 +30,14 @@ from base64 import b64decode
 from app import db, api, login_manager, app
 
 # Import services
-from app.helpers import get_custom_logger, make_json_response, ApiError
+from app.helpers import get_custom_logger, make_json_response, ApiError, lazy_repr, lazy_json
 from app.mod_api_auth.controllers import requires_api_auth_user, get_account_id_by_api_key, provideApiKey, \
     requires_api_auth_sdk
-from app.mod_blackbox.controllers import sign_jws_with_jwk, generate_and_sign_jws, get_account_public_key, \
+from app.mod_blackbox.client import sign_jws_with_jwk, generate_and_sign_jws, get_account_public_key, \
     verify_jws_signature_with_jwk
 from app.mod_database.helpers import get_db_cursor
 from app.mod_database.models import ServiceLinkRecord, ServiceLinkStatusRecord, ConsentRecord, ConsentStatusRecord
-from app.mod_authorization.controllers import sign_cr, sign_csr, store_cr_and_csr, get_auth_token_data
+from app.mod_authorization.controllers import sign_consent, store_cr_and_csr, get_auth_token_data
 from app.mod_authorization.models import NewConsent
 
 mod_authorization_api = Blueprint('authorization_api', __name__, template_folder='templates')
@@ -60,7 +60,7 @@ class ConsentSignAndStore(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -84,7 +84,7 @@ class ConsentSignAndStore(Resource):
             error_detail = {'0': 'Set application/json as Content-Type', '1': 'Provide json payload'}
             raise ApiError(code=400, title="No input data provided", detail=error_detail, source=endpoint)
         else:
-            logger.debug("json_data: " + json.dumps(json_data))
+            logger.debug("json_data: %s", lazy_json(json_data))
 
         # Validate payload content
         schema = NewConsent()
@@ -106,7 +106,7 @@ class ConsentSignAndStore(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch source_cr_payload from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got source_cr_payload: " + json.dumps(source_cr_payload))
+            logger.debug("Got source_cr_payload: %s", lazy_json(source_cr_payload))
 
         # Consent Status Record
         try:
@@ -114,7 +114,7 @@ class ConsentSignAndStore(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch source_csr_payload from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got source_csr_payload: " + json.dumps(source_csr_payload))
+            logger.debug("Got source_csr_payload: %s", lazy_json(source_csr_payload))
 
         ######
         # Sink
@@ -125,7 +125,7 @@ class ConsentSignAndStore(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch sink_cr_payload from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got sink_cr_payload: " + json.dumps(sink_cr_payload))
+            logger.debug("Got sink_cr_payload: %s", lazy_json(sink_cr_payload))
 
         # Consent Status Record
         try:
@@ -133,7 +133,7 @@ class ConsentSignAndStore(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch sink_csr_payload from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got sink_csr_payload: " + json.dumps(sink_csr_payload))
+            logger.debug("Got sink_csr_payload: %s", lazy_json(sink_csr_payload))
 
 
         #####
@@ -198,41 +198,23 @@ class ConsentSignAndStore(Resource):
         # Sign
         ####
 
-        # Sign Source CR
+        # Sign Source's and Sink's CRs and CSRs
         try:
-            source_cr_signed, source_cr_issued = sign_cr(account_id=account_id, payload=source_cr_payload, endpoint=endpoint)
-        except Exception as exp:
-            logger.error("Could not sign Source's CR: " + repr(exp))
-            raise
-        else:
-            logger.info("Source CR signed")
-
-        # Sign Source CSR
-        try:
-            source_csr_signed, source_csr_issued = sign_csr(account_id=account_id, payload=source_csr_payload, endpoint=endpoint)
-        except Exception as exp:
-            logger.error("Could not sign Source's CSR: " + repr(exp))
-            raise
-        else:
-            logger.info("Source CR signed")
-
-        # Sign Sink CR
-        try:
-            sink_cr_signed, sink_cr_issued = sign_cr(account_id=account_id, payload=sink_cr_payload, endpoint=endpoint)
-        except Exception as exp:
-            logger.error("Could not sign Source's CR: " + repr(exp))
-            raise
-        else:
-            logger.info("Sink's CR signed")
-
-        # Sign Sink CSR
-        try:
-            sink_csr_signed, sink_csr_issued = sign_csr(account_id=account_id, payload=sink_csr_payload, endpoint=endpoint)
+            signed, issued = sign_consent(
+                account_id=account_id,
+                source_cr_payload=source_cr_payload,
+                source_csr_payload=source_csr_payload,
+                sink_cr_payload=sink_cr_payload,
+                sink_csr_payload=sink_csr_payload,
+                endpoint=endpoint
+            )
+            (source_cr_dict, source_cr_signed), (source_csr_dict, source_csr_signed), \
+                (sink_cr_dict, sink_cr_signed), (sink_csr_dict, sink_csr_signed) = signed
         except Exception as exp:
-            logger.error("Could not sign Sink's CSR: " + repr(exp))
+            logger.error("Could not sign CRs and CSRs: " + repr(exp))
             raise
         else:
-            logger.info("Sink's CSR signed")
+            logger.info("Source's and Sink's CRs and CSRs signed")
 
         #########
         # Store #
@@ -300,7 +282,7 @@ class ConsentSignAndStore(Resource):
                 status=source_csr_consent_status,
                 consent_status_record=source_csr_signed,
                 consent_record_id=source_csr_cr_id,
-                issued_at=source_csr_issued,
+                issued_at=issued,
                 prev_record_id=source_csr_prev_record_id
             )
         except Exception as exp:
@@ -314,7 +296,7 @@ class ConsentSignAndStore(Resource):
                 status=sink_csr_consent_status,
                 consent_status_record=sink_csr_signed,
                 consent_record_id=sink_csr_cr_id,
-                issued_at=sink_csr_issued,
+                issued_at=issued,
                 prev_record_id=sink_csr_prev_record_id
             )
         except Exception as exp:
@@ -339,7 +321,7 @@ class ConsentSignAndStore(Resource):
             raise
         else:
             logger.info("Stored Consent Record and Consent Status Record")
-            logger.debug("DB Meta: " + json.dumps(db_meta))
+            logger.debug("DB Meta: %s", lazy_json(db_meta))
 
         # Response data container
         try:
@@ -350,33 +332,33 @@ class ConsentSignAndStore(Resource):
             response_data['data']['source']['consentRecord'] = {}
             response_data['data']['source']['consentRecord']['type'] = "ConsentRecord"
             response_data['data']['source']['consentRecord']['attributes'] = {}
-            response_data['data']['source']['consentRecord']['attributes']['cr'] = json.loads(source_cr_signed)
+            response_data['data']['source']['consentRecord']['attributes']['cr'] = source_cr_dict
 
             response_data['data']['source']['consentStatusRecord'] = {}
             response_data['data']['source']['consentStatusRecord']['type'] = "ConsentStatusRecord"
             response_data['data']['source']['consentStatusRecord']['attributes'] = {}
-            response_data['data']['source']['consentStatusRecord']['attributes']['csr'] = json.loads(source_csr_signed)
+            response_data['data']['source']['consentStatusRecord']['attributes']['csr'] = source_csr_dict
 
             response_data['data']['sink'] = {}
             response_data['data']['sink']['consentRecord'] = {}
             response_data['data']['sink']['consentRecord']['type'] = "ConsentRecord"
             response_data['data']['sink']['consentRecord']['attributes'] = {}
-            response_data['data']['sink']['consentRecord']['attributes']['cr'] = json.loads(sink_cr_signed)
+            response_data['data']['sink']['consentRecord']['attributes']['cr'] = sink_cr_dict
 
             response_data['data']['sink']['consentStatusRecord'] = {}
             response_data['data']['sink']['consentStatusRecord']['type'] = "ConsentStatusRecord"
             response_data['data']['sink']['consentStatusRecord']['attributes'] = {}
-            response_data['data']['sink']['consentStatusRecord']['attributes']['csr'] = json.loads(sink_csr_signed)
+            response_data['data']['sink']['consentStatusRecord']['attributes']['csr'] = sink_csr_dict
 
         except Exception as exp:
             logger.error('Could not prepare response data: ' + repr(exp))
             raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
         else:
             logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
+            logger.debug('response_data: %s', lazy_repr(response_data))
 
         response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
+        logger.debug('response_data_dict: %s', lazy_repr(response_data_dict))
         return make_json_response(data=response_data_dict, status_code=201)
 
 
@@ -393,7 +375,7 @@ class AuthorizationTokenData(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -401,7 +383,7 @@ class AuthorizationTokenData(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Unsupported sink_cr_id", detail=repr(exp), source=endpoint)
         finally:
-            logger.debug("sink_cr_id: " + repr(sink_cr_id))
+            logger.debug("sink_cr_id: %s", lazy_repr(sink_cr_id))
 
         # Init Sink's Consent Record Object
         try:
@@ -417,14 +399,16 @@ class AuthorizationTokenData(Resource):
         sink_slr = {}
         try:
             source_cr, sink_slr = get_auth_token_data(sink_cr_object=sink_cr_entry)
+        except ApiError:
+            raise
         except Exception as exp:
             error_title = "Failed to get Authorization token data"
             logger.error(error_title + ": " + repr(exp))
             #raise
             raise ApiError(code=500, title=error_title, detail=repr(exp), source=endpoint)
         finally:
-            logger.debug("source_cr: " + json.dumps(source_cr))
-            logger.debug("sink_slr: " + json.dumps(sink_slr))
+            logger.debug("source_cr: %s", lazy_json(source_cr))
+            logger.debug("sink_slr: %s", lazy_json(sink_slr))
 
 
         # Response data container
@@ -448,10 +432,10 @@ class AuthorizationTokenData(Resource):
             raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
         else:
             logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
+            logger.debug('response_data: %s', lazy_repr(response_data))
 
         response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
+        logger.debug('response_data_dict: %s', lazy_repr(response_data_dict))
         return make_json_response(data=response_data_dict, status_code=201)
 
 
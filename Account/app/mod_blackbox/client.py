@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+Client for Key management
+
+Functions match the functions of mod_blackbox.controllers. If BLACKBOX_SOCKET is configured,
+calls are sent to signing daemon (mod_blackbox.daemon), otherwise controllers are called in-process.
+"""
+import json
+import os
+import socket
+import threading
+import time
+
+from app import app
+from app.mod_blackbox import controllers
+from app.mod_blackbox.helpers import get_custom_logger, BlackboxDaemonError, KeyNotFoundError
+from app.mod_blackbox.services import key_pool
+
+logger = get_custom_logger('mod_blackbox_client')
+
+
+class BlackboxClient(object):
+    """
+    Connection to signing daemon. Each thread uses its own persistent connection.
+    """
+
+    def __init__(self, socket_path=None, timeout=10):
+        if socket_path is None:
+            raise AttributeError("Provide socket_path as parameter")
+
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self._requests = 0
+        self._calls = 0
+        self._errors = 0
+        self._time_total = 0.0
+
+    def _connection(self):
+        pid = os.getpid()
+        if getattr(self._local, 'socket', None) is None or self._local.pid != pid:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            connection.connect(self.socket_path)
+            self._local.socket = connection
+            self._local.rfile = connection.makefile('rb')
+            self._local.pid = pid
+        return self._local.socket, self._local.rfile
+
+    def _disconnect(self):
+        connection = getattr(self._local, 'socket', None)
+        self._local.socket = None
+        self._local.rfile = None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception as exp:
+                logger.debug('Could not close connection to signing daemon: ' + repr(exp))
+
+    def call_many(self, calls=None):
+        """
+        Sends calls to daemon as one request. Daemon runs them in parallel.
+
+        :param calls: List of (method, params) tuples
+        :return: List of responses with result or error in the same order as calls
+        """
+        if calls is None:
+            raise AttributeError("Provide calls as parameter")
+
+        with self._lock:
+            self._request_id += 1
+            request_id = self._request_id
+
+        request = {
+            'id': request_id,
+            'calls': [{'method': method, 'params': params} for method, params in calls]
+        }
+
+        start = time.time()
+        try:
+            connection, rfile = self._connection()
+            connection.sendall((json.dumps(request) + "\n").encode('utf-8'))
+            line = rfile.readline()
+            if not line:
+                raise IOError("Signing daemon closed connection")
+            response = json.loads(line.decode('utf-8'))
+            if response.get('id') != request_id:
+                raise ValueError("Response to wrong request: " + repr(response.get('id')))
+        except Exception as exp:
+            self._disconnect()
+            with self._lock:
+                self._errors += 1
+            logger.error('Call to signing daemon failed: ' + repr(exp))
+            raise BlackboxDaemonError("Call to signing daemon failed", repr(exp))
+        finally:
+            with self._lock:
+                self._requests += 1
+                self._calls += len(calls)
+                self._time_total += time.time() - start
+
+        if 'error' in response:
+            raise BlackboxDaemonError(response['error']['type'], response['error']['detail'])
+        return response['responses']
+
+    def call(self, method=None, **params):
+        """
+        Sends one call to daemon.
+
+        :param method: Name of mod_blackbox.controllers function
+        :return: Result of the call
+        """
+        response = self.call_many(calls=[(method, params)])[0]
+        if 'error' in response:
+            if response['error']['type'] == 'KeyNotFoundError':
+                raise KeyNotFoundError(response['error']['detail'])
+            raise BlackboxDaemonError(response['error']['type'], response['error']['detail'])
+        return response['result']
+
+    def stats(self):
+        """
+        Gauges and counters of the client.
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'socket_path': self.socket_path,
+                'requests': self._requests,
+                'calls': self._calls,
+                'errors': self._errors,
+                'time_avg': self._time_total / self._requests if self._requests else 0.0,
+            }
+
+
+if app.config["BLACKBOX_SOCKET"]:
+    blackbox_client = BlackboxClient(socket_path=app.config["BLACKBOX_SOCKET"], timeout=float(app.config["BLACKBOX_TIMEOUT"]))
+else:
+    blackbox_client = None
+
+
+def start_key_pool():
+    """
+    Starts key pool producer when worker process gets its first request, so that keys are ready before first
+    Account is created. With signing daemon keys are generated in signer processes instead.
+    """
+    if blackbox_client is None:
+        key_pool.start()
+
+
+# Registered without decorator, as before_first_request() of Flask 0.10 does not return the function
+app.before_first_request(start_key_pool)
+
+
+def store_jwk(account_id=None, account_kid=None, account_key=None):
+    if blackbox_client is None:
+        return controllers.store_jwk(account_id=account_id, account_kid=account_kid, account_key=account_key)
+    return blackbox_client.call('store_jwk', account_id=account_id, account_kid=account_kid, account_key=account_key)
+
+
+def gen_account_key(account_id=None):
+    if blackbox_client is None:
+        return controllers.gen_account_key(account_id=account_id)
+    return blackbox_client.call('gen_account_key', account_id=account_id)
+
+
+def gen_account_keys(account_ids=None):
+    if blackbox_client is None:
+        return controllers.gen_account_keys(account_ids=account_ids)
+    return dict(blackbox_client.call('gen_account_keys', account_ids=account_ids))
+
+
+def get_account_public_key(account_id=None):
+    if blackbox_client is None:
+        return controllers.get_account_public_key(account_id=account_id)
+    return tuple(blackbox_client.call('get_account_public_key', account_id=account_id))
+
+
+def sign_jws_with_jwk(account_id=None, jws_json_to_sign=None):
+    if blackbox_client is None:
+        return controllers.sign_jws_with_jwk(account_id=account_id, jws_json_to_sign=jws_json_to_sign)
+    return blackbox_client.call('sign_jws_with_jwk', account_id=account_id, jws_json_to_sign=jws_json_to_sign)
+
+
+def verify_jws_signature_with_jwk(account_id=None, jws_json_to_verify=None):
+    if blackbox_client is None:
+        return controllers.verify_jws_signature_with_jwk(account_id=account_id, jws_json_to_verify=jws_json_to_verify)
+    return blackbox_client.call('verify_jws_signature_with_jwk', account_id=account_id, jws_json_to_verify=jws_json_to_verify)
+
+
+def generate_and_sign_jws(account_id=None, jws_payload=None):
+    if blackbox_client is None:
+        return controllers.generate_and_sign_jws(account_id=account_id, jws_payload=jws_payload)
+    return blackbox_client.call('generate_and_sign_jws', account_id=account_id, jws_payload=jws_payload)
+
+
+def generate_and_sign_jws_batch(account_id=None, jws_payloads=None):
+    if blackbox_client is None:
+        return controllers.generate_and_sign_jws_batch(account_id=account_id, jws_payloads=jws_payloads)
+    return [tuple(entry) for entry in blackbox_client.call('generate_and_sign_jws_batch', account_id=account_id, jws_payloads=jws_payloads)]
+
+
+def verify_and_sign_jws(account_id=None, jws_json_to_verify=None, jws_payload=None):
+    if blackbox_client is None:
+        return controllers.verify_and_sign_jws(account_id=account_id, jws_json_to_verify=jws_json_to_verify, jws_payload=jws_payload)
+    return tuple(blackbox_client.call('verify_and_sign_jws', account_id=account_id, jws_json_to_verify=jws_json_to_verify, jws_payload=jws_payload))
+
+
+def verify_jws_signatures_with_jwk(verifications=None):
+    """
+    Verifies multiple JWSs. With signing daemon verifications are run in parallel.
+
+    :param verifications: List of (account_id, jws_json_to_verify) tuples
+    :return: List of Booleans in the same order as verifications
+    """
+    if verifications is None:
+        raise AttributeError("Provide verifications as parameter")
+
+    if blackbox_client is None:
+        return [
+            controllers.verify_jws_signature_with_jwk(account_id=account_id, jws_json_to_verify=jws_json_to_verify)
+            for account_id, jws_json_to_verify in verifications
+        ]
+
+    responses = blackbox_client.call_many(calls=[
+        ('verify_jws_signature_with_jwk', {'account_id': account_id, 'jws_json_to_verify': jws_json_to_verify})
+        for account_id, jws_json_to_verify in verifications
+    ])
+    results = []
+    for response in responses:
+        if 'error' in response:
+            raise BlackboxDaemonError(response['error']['type'], response['error']['detail'])
+        results.append(response['result'])
+    return results
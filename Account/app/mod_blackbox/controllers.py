@@ -13,13 +13,14 @@ __contact__ = "https://github.com/HIIT/mydata-stack"
 __status__ = "Development"
 """
 import json
-from uuid import uuid4
 
-from app.mod_blackbox.helpers import append_description_to_exception, get_custom_logger
+from app.mod_blackbox.helpers import append_description_to_exception, get_custom_logger, lazy_repr, KeyNotFoundError
 
 from app.mod_blackbox.services import get_sqlite_connection, get_sqlite_cursor, store_jwk_to_db, gen_key_as_jwk, \
+    store_jwks_to_db, engine as key_store, \
     get_public_key_by_account_id, get_key_by_account_id, jws_json_to_object, get_key, jws_sign, log_dict_as_json, \
-    jws_object_to_json, jws_verify, jws_generate
+    jws_object_to_json, jws_verify, jws_generate, get_key_material, invalidate_cached_key, jws_sign_batch, \
+    claim_or_gen_key_as_jwk, jws_serialize
 
 SLR_PAYLOAD = {
   "slr": {
@@ -133,7 +134,7 @@ def store_jwk(account_id=None, account_kid=None, account_key=None):
         raise AttributeError("Provide account_key as parameter")
 
     try:
-        connection = get_sqlite_connection()
+        connection = get_sqlite_connection(account_id=account_id)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
         logger.error('Could not get connection SQL database: ' + repr(exp))
@@ -152,17 +153,17 @@ def store_jwk(account_id=None, account_kid=None, account_key=None):
         exp = append_description_to_exception(exp=exp, description='Could not store jwk to database')
         logger.error('Could not store jwk to database: ' + repr(exp))
         connection.rollback()
-        connection.close()
         raise
     else:
         connection.commit()
-        connection.close()
+        invalidate_cached_key(account_id=account_id)
         logger.debug('JWK, kid and account_id stored')
 
 
 def gen_account_key(account_id=None):
     """
-    Generate key for account ID
+    Generate key for account ID. If account already has a key, Key ID of it is returned instead,
+    so that keys of accounts stored by partially committed gen_account_keys() are not generated again.
 
     :param account_id:
     :return: Key ID for created key
@@ -170,11 +171,16 @@ def gen_account_key(account_id=None):
     if account_id is None:
         raise AttributeError("Provide account_id as parameter")
 
-    account_kid = "acc-kid-" + str(uuid4())
-    logger.debug('Generated account_kid: ' + str(account_kid))
+    try:
+        jwk_object, jwk_public_json, account_kid = get_key_material(account_id=account_id)
+    except KeyNotFoundError:
+        logger.debug('No key for account: %s', account_id)
+    else:
+        logger.info('Account with id: ' + str(account_id) + ' already has JWK with kid: ' + str(account_kid))
+        return account_kid
 
     try:
-        account_key = gen_key_as_jwk(account_kid=account_kid)
+        account_kid, account_key = claim_or_gen_key_as_jwk()
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Failed to generate key for account')
         logger.error('Failed to generate key for account: ' + repr(exp))
@@ -191,6 +197,65 @@ def gen_account_key(account_id=None):
         return account_kid
 
 
+def gen_account_keys(account_ids=None):
+    """
+    Generate keys for multiple account IDs. Keys are stored in one transaction per key store shard.
+
+    :param account_ids: List of account IDs
+    :return: dict of account ID and Key ID of created key
+    """
+    if account_ids is None:
+        raise AttributeError("Provide account_ids as parameter")
+
+    jwk_entries = []
+    for account_id in account_ids:
+        try:
+            account_kid, account_key = claim_or_gen_key_as_jwk()
+        except Exception as exp:
+            exp = append_description_to_exception(exp=exp, description='Failed to generate key for account')
+            logger.error('Failed to generate key for account: ' + repr(exp))
+            raise
+        jwk_entries.append((account_id, account_kid, account_key))
+
+    # Keys are written to shards of accounts, transactions of all shards are committed after every shard succeeded.
+    # If committing a shard fails, earlier shards stay committed and gen_account_key() returns their keys.
+    connections = []
+    try:
+        for shard_entries in key_store.partition(items=jwk_entries, shard_key=lambda entry: entry[0]).values():
+            try:
+                connection = get_sqlite_connection(account_id=shard_entries[0][0])
+            except Exception as exp:
+                exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
+                logger.error('Could not get connection SQL database: ' + repr(exp))
+                raise
+            connections.append(connection)
+
+            try:
+                cursor, connection = get_sqlite_cursor(connection=connection)
+            except Exception as exp:
+                exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
+                logger.error('Could not get cursor for database connection: ' + repr(exp))
+                raise
+
+            try:
+                cursor = store_jwks_to_db(jwk_entries=shard_entries, cursor=cursor)
+            except Exception as exp:
+                exp = append_description_to_exception(exp=exp, description='Could not store jwks to database')
+                logger.error('Could not store jwks to database: ' + repr(exp))
+                raise
+    except Exception:
+        for connection in connections:
+            connection.rollback()
+        raise
+    else:
+        for connection in connections:
+            connection.commit()
+        for account_id, account_kid, account_key in jwk_entries:
+            invalidate_cached_key(account_id=account_id)
+        logger.info('Generated JWKs for ' + str(len(jwk_entries)) + ' accounts')
+        return dict((account_id, account_kid) for account_id, account_kid, account_key in jwk_entries)
+
+
 def get_account_public_key(account_id=None):
     """
     Get public Key by account ID
@@ -203,29 +268,12 @@ def get_account_public_key(account_id=None):
         raise AttributeError("Provide account_id as parameter")
 
     try:
-        connection = get_sqlite_connection()
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
-        logger.error('Could not get connection SQL database: ' + repr(exp))
-        raise
-
-    try:
-        cursor, connection = get_sqlite_cursor(connection=connection)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
-        logger.error('Could not get cursor for database connection: ' + repr(exp))
-        raise
-
-    try:
-        cursor, key_public, kid = get_public_key_by_account_id(account_id=account_id, cursor=cursor)
+        key_object, key_public, kid = get_key_material(account_id=account_id)
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get public key from database')
-        logger.error('Could not get public key from database: ' + repr(exp))
-        connection.rollback()
-        connection.close()
+        exp = append_description_to_exception(exp=exp, description='Could not get public key')
+        logger.error('Could not get public key: ' + repr(exp))
         raise
     else:
-        connection.close()
         logger.debug('Public key fetched')
         return key_public, kid
 
@@ -244,7 +292,7 @@ def get_account_key(account_id=None):
         raise AttributeError("Provide account_id as parameter")
 
     try:
-        connection = get_sqlite_connection()
+        connection = get_sqlite_connection(account_id=account_id)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
         logger.error('Could not get connection SQL database: ' + repr(exp))
@@ -263,10 +311,8 @@ def get_account_key(account_id=None):
         exp = append_description_to_exception(exp=exp, description='Could not lget jwk from database')
         logger.error('Could not get jwk from database: ' + repr(exp))
         connection.rollback()
-        connection.close()
         raise
     else:
-        connection.close()
         logger.debug('JWK fetched')
         return key
 
@@ -306,7 +352,7 @@ def sign_jws_with_jwk(account_id=None, jws_json_to_sign=None):
         # first_key_in_dict = dict_keys[0]
         # logger.debug('JWS payload before Base64 fix: ' + str(jws_structure[first_key_in_dict]['payload']))
         # jws_structure[first_key_in_dict]['payload'] += '=' * (-len(jws_structure[first_key_in_dict]['payload']) % 4)  # Fix incorrect padding of base64 string.
-        logger.debug('JWS payload before Base64 fix: ' + str(jws_structure['payload']))
+        logger.debug('JWS payload before Base64 fix: %s', jws_structure['payload'])
         jws_structure['payload'] += '=' * (-len(jws_structure['payload']) % 4)  # Fix incorrect padding of base64 string.
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Failed to fix incorrect padding of base64 string')
@@ -314,7 +360,7 @@ def sign_jws_with_jwk(account_id=None, jws_json_to_sign=None):
         raise
     else:
         #logger.debug('JWS payload after  Base64 fix: ' + str(jws_structure[first_key_in_dict]['payload']))
-        logger.debug('JWS payload after  Base64 fix: ' + str(jws_structure['payload']))
+        logger.debug('JWS payload after  Base64 fix: %s', jws_structure['payload'])
         logger.info("######## Base64 fix -> OK ########")
 
     # Convert jws_structure to JSON for future steps
@@ -336,58 +382,22 @@ def sign_jws_with_jwk(account_id=None, jws_json_to_sign=None):
         logger.error('Could not convert JWS json to JWS object: ' + repr(exp))
         raise
     else:
-        logger.debug("jws_object_to_sign: " + str(jws_object_to_sign.__dict__))
+        logger.debug("jws_object_to_sign: %s", lazy_repr(jws_object_to_sign.__dict__))
         logger.info("######## JWS object  -> OK ########")
 
-    # Prepare database connection
+    # Get Key as JWK object, public Key as JSON and Key ID
     try:
-        connection = get_sqlite_connection()
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
-        logger.error('Could not get connection SQL database: ' + repr(exp))
-        raise
-    else:
-        logger.info("######## DB Connection -> OK ########")
-
-    # Prepare database cursor
-    try:
-        cursor, connection = get_sqlite_cursor(connection=connection)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
-        logger.error('Could not get cursor for database connection: ' + repr(exp))
-        raise
-    else:
-        logger.info("######## DB Cursor -> OK ########")
-
-    # Get public Key as JSON and Key ID
-    kid = {}
-    try:
-        cursor, key_public_json, kid[0] = get_public_key_by_account_id(account_id=account_id, cursor=cursor)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get public key as JSON')
-        logger.error('Could not get public key as JSON: ' + repr(exp))
-        connection.rollback()
-        connection.close()
-        raise
-    else:
-        logger.info("######## Public Key -> OK ########")
-
-    # Get Key as JWK object and Key ID
-    try:
-        cursor, key_object, kid[1] = get_key(account_id=account_id, cursor=cursor)
+        key_object, key_public_json, kid = get_key_material(account_id=account_id)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not get key object')
         logger.error('Could not get key object: ' + repr(exp))
-        connection.rollback()
-        connection.close()
         raise
     else:
         logger.info("######## Key Object -> OK ########")
-        connection.close()
 
     # Sign JWS
     try:
-        jws_object_signed = jws_sign(account_id=account_id, account_kid=kid[0], jws_object=jws_object_to_sign, jwk_object=key_object, jwk_public_json=key_public_json)
+        jws_object_signed = jws_sign(account_id=account_id, account_kid=kid, jws_object=jws_object_to_sign, jwk_object=key_object, jwk_public_json=key_public_json)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not sign JWS object')
         logger.error('Could not sign JWS object: ' + repr(exp))
@@ -432,45 +442,22 @@ def verify_jws_signature_with_jwk(account_id=None, jws_json_to_verify=None):
         logger.error('Could not convert JWS json to JWS object: ' + repr(exp))
         raise
     else:
-        logger.debug("jws_object_to_verify: " + str(jws_object_to_verify.__dict__))
+        logger.debug("jws_object_to_verify: %s", lazy_repr(jws_object_to_verify.__dict__))
         logger.info("######## JWS object  -> OK ########")
 
-    # Prepare database connection
+    # Get Key as JWK object
     try:
-        connection = get_sqlite_connection()
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
-        logger.error('Could not get connection SQL database: ' + repr(exp))
-        raise
-    else:
-        logger.info("######## DB Connection -> OK ########")
-
-    # Prepare database cursor
-    try:
-        cursor, connection = get_sqlite_cursor(connection=connection)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
-        logger.error('Could not get cursor for database connection: ' + repr(exp))
-        raise
-    else:
-        logger.info("######## DB Cursor -> OK ########")
-
-    # Get Key as JWK object and Key ID
-    try:
-        cursor, key_object, kid = get_key(account_id=account_id, cursor=cursor)
+        key_object, key_public_json, kid = get_key_material(account_id=account_id)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not get key object')
         logger.error('Could not get key object: ' + repr(exp))
-        connection.rollback()
-        connection.close()
         raise
     else:
         logger.info("######## Key Object -> OK ########")
-        connection.close()
 
     # Verifying JWS
     logger.info("Verifying JWS")
-    jws_signature_valid = jws_verify(jws_object=jws_object_to_verify, jwk_object=key_object)
+    jws_signature_valid = jws_verify(jws_object=jws_object_to_verify, jwk_object=key_object, account_kid=kid)
     logger.info("JWS verified: " + str(jws_signature_valid))
 
     return jws_signature_valid
@@ -485,80 +472,152 @@ def generate_and_sign_jws(account_id=None, jws_payload=None):
         jws_payload = CR_CSR_PAYLOAD['sink']['cr']
         logger.info("No jws_payload provided as parameter. Using CR_CSR_PAYLOAD -template instead.")
 
-    # Prepare database connection
+    # Get Key as JWK object, public Key as JSON and Key ID
     try:
-        connection = get_sqlite_connection()
+        key_object, key_public_json, kid = get_key_material(account_id=account_id)
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
-        logger.error('Could not get connection SQL database: ' + repr(exp))
+        exp = append_description_to_exception(exp=exp, description='Could not get key object')
+        logger.error('Could not get key object: ' + repr(exp))
         raise
     else:
-        logger.info("######## DB Connection -> OK ########")
+        logger.info("######## Key Object -> OK ########")
 
-    # Prepare database cursor
+    # Generate JWS
     try:
-        cursor, connection = get_sqlite_cursor(connection=connection)
+        jws_object = jws_generate(payload=jws_payload)
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get cursor for database connection')
-        logger.error('Could not get cursor for database connection: ' + repr(exp))
+        exp = append_description_to_exception(exp=exp, description='Could not generate JWS object')
+        logger.error('Could not generate JWS object: ' + repr(exp))
+        raise
+    else:
+        logger.info("######## JWS Object -> OK ########")
+
+    # Sign JWS
+    try:
+        jws_object_signed = jws_sign(account_id=account_id, account_kid=kid, jws_object=jws_object, jwk_object=key_object, jwk_public_json=key_public_json)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not sign JWS object')
+        logger.error('Could not sign JWS object: ' + repr(exp))
         raise
     else:
-        logger.info("######## DB Cursor -> OK ########")
+        logger.info("######## JWS signature -> OK ########")
 
-    # Get public Key as JSON and Key ID
-    kid = {}
+    # JWS object to JWS JSON
     try:
-        cursor, key_public_json, kid[0] = get_public_key_by_account_id(account_id=account_id, cursor=cursor)
+        jws_json = jws_object_to_json(jws_object=jws_object_signed)
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get public key as JSON')
-        logger.error('Could not get public key as JSON: ' + repr(exp))
-        connection.rollback()
-        connection.close()
+        exp = append_description_to_exception(exp=exp, description='Could not convert JWS object to JWS json')
+        logger.error('Could not convert JWS object to JWS json: ' + repr(exp))
         raise
     else:
-        logger.info("######## Public Key -> OK ########")
+        logger.info("######## JWS conversion -> OK ########")
+        return jws_json
+
+
+def generate_and_sign_jws_batch(account_id=None, jws_payloads=None):
+    """
+    Generates and signs multiple JWSs with key of account. Key is loaded and headers are created once for all JWSs.
 
-    # Get Key as JWK object and Key ID
+    :param account_id: User account ID
+    :param jws_payloads: List of JWS payloads
+    :return: List of (JWS as dict, JSON presentation of JWS) tuples in the same order as jws_payloads
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id or as parameter")
+    if jws_payloads is None:
+        raise AttributeError("Provide jws_payloads or as parameter")
+
+    # Get Key as JWK object, public Key as JSON and Key ID
     try:
-        cursor, key_object, kid[1] = get_key(account_id=account_id, cursor=cursor)
+        key_object, key_public_json, kid = get_key_material(account_id=account_id)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not get key object')
         logger.error('Could not get key object: ' + repr(exp))
-        connection.rollback()
-        connection.close()
         raise
     else:
         logger.info("######## Key Object -> OK ########")
-        connection.close()
 
-    # Generate JWS
+    # Generate JWSs
     try:
-        jws_object = jws_generate(payload=jws_payload)
+        jws_objects = [jws_generate(payload=jws_payload) for jws_payload in jws_payloads]
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not generate JWS object')
-        logger.error('Could not generate JWS object: ' + repr(exp))
+        exp = append_description_to_exception(exp=exp, description='Could not generate JWS objects')
+        logger.error('Could not generate JWS objects: ' + repr(exp))
         raise
     else:
-        logger.info("######## JWS Object -> OK ########")
+        logger.info("######## JWS Objects -> OK ########")
 
-    # Sign JWS
+    # Sign JWSs
     try:
-        jws_object_signed = jws_sign(account_id=account_id, account_kid=kid[0], jws_object=jws_object, jwk_object=key_object, jwk_public_json=key_public_json)
+        jws_objects_signed = jws_sign_batch(account_id=account_id, account_kid=kid, jws_objects=jws_objects, jwk_object=key_object, jwk_public_json=key_public_json)
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not sign JWS object')
-        logger.error('Could not sign JWS object: ' + repr(exp))
+        exp = append_description_to_exception(exp=exp, description='Could not sign JWS objects')
+        logger.error('Could not sign JWS objects: ' + repr(exp))
         raise
     else:
-        logger.info("######## JWS signature -> OK ########")
+        logger.info("######## JWS signatures -> OK ########")
 
-    # JWS object to JWS JSON
+    # JWS objects to JWS dicts and JWS JSONs
     try:
-        jws_json = jws_object_to_json(jws_object=jws_object_signed)
+        jws_serialized = [jws_serialize(jws_object=jws_object) for jws_object in jws_objects_signed]
     except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not convert JWS object to JWS json')
-        logger.error('Could not convert JWS object to JWS json: ' + repr(exp))
+        exp = append_description_to_exception(exp=exp, description='Could not convert JWS objects to JWS json')
+        logger.error('Could not convert JWS objects to JWS json: ' + repr(exp))
         raise
     else:
         logger.info("######## JWS conversion -> OK ########")
-        return jws_json
+        return jws_serialized
+
+
+def verify_and_sign_jws(account_id=None, jws_json_to_verify=None, jws_payload=None):
+    """
+    Verifies JWS and generates and signs new JWS with key of account. Key is loaded once for both.
+    New JWS is not signed if verification fails.
+
+    :param account_id: User account ID
+    :param jws_json_to_verify: JSON presentation of JWS that should be verified
+    :param jws_payload: Payload of JWS to generate
+    :return: Boolean presenting if verification passed and signed JWS json, None if verification failed
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id or as parameter")
+    if jws_json_to_verify is None:
+        raise AttributeError("Provide jws_json_to_verify or as parameter")
+    if jws_payload is None:
+        raise AttributeError("Provide jws_payload or as parameter")
+
+    # Get Key as JWK object, public Key as JSON and Key ID
+    try:
+        key_object, key_public_json, kid = get_key_material(account_id=account_id)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get key object')
+        logger.error('Could not get key object: ' + repr(exp))
+        raise
+    else:
+        logger.info("######## Key Object -> OK ########")
 
+    # Verifying JWS
+    try:
+        jws_object_to_verify = jws_json_to_object(jws_json=jws_json_to_verify)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not convert JWS json to JWS object')
+        logger.error('Could not convert JWS json to JWS object: ' + repr(exp))
+        raise
+    jws_signature_valid = jws_verify(jws_object=jws_object_to_verify, jwk_object=key_object, account_kid=kid)
+    logger.info("JWS verified: " + str(jws_signature_valid))
+    if not jws_signature_valid:
+        logger.error("JWS verification failed, not signing new JWS")
+        return False, None
+
+    # Generate and sign JWS
+    try:
+        jws_object = jws_generate(payload=jws_payload)
+        jws_object_signed = jws_sign(account_id=account_id, account_kid=kid, jws_object=jws_object, jwk_object=key_object, jwk_public_json=key_public_json)
+        jws_json = jws_object_to_json(jws_object=jws_object_signed)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not sign JWS object')
+        logger.error('Could not sign JWS object: ' + repr(exp))
+        raise
+    else:
+        logger.info("######## JWS signature -> OK ########")
+        return jws_signature_valid, jws_json
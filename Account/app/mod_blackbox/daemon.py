@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""
+Signing daemon for Key management
+
+Serves functions of mod_blackbox.controllers over Unix domain socket, so that signing does not compete
+with request handling of web workers. Daemon owns the key store and runs the calls in a pool of
+signer processes.
+
+Protocol is newline delimited JSON. Each request line contains one or more calls,
+calls of one request are run in parallel and their responses are returned in the same order.
+
+    Request:  {"id": 1, "calls": [{"method": "generate_and_sign_jws", "params": {"account_id": 1, ...}}, ...]}
+    Response: {"id": 1, "responses": [{"result": ...}, {"error": {"type": "KeyNotFoundError", "detail": "..."}}]}
+"""
+import json
+import multiprocessing
+import os
+import stat
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from app.mod_blackbox.controllers import store_jwk, gen_account_key, gen_account_keys, get_account_public_key, \
+    sign_jws_with_jwk, verify_jws_signature_with_jwk, generate_and_sign_jws, generate_and_sign_jws_batch, \
+    verify_and_sign_jws
+from app.mod_blackbox.helpers import get_custom_logger
+from app.mod_blackbox.services import key_pool
+
+logger = get_custom_logger('mod_blackbox_daemon')
+
+METHODS = {
+    'store_jwk': store_jwk,
+    'gen_account_key': gen_account_key,
+    'gen_account_keys': gen_account_keys,
+    'get_account_public_key': get_account_public_key,
+    'sign_jws_with_jwk': sign_jws_with_jwk,
+    'verify_jws_signature_with_jwk': verify_jws_signature_with_jwk,
+    'generate_and_sign_jws': generate_and_sign_jws,
+    'generate_and_sign_jws_batch': generate_and_sign_jws_batch,
+    'verify_and_sign_jws': verify_and_sign_jws,
+}
+
+
+def result_to_wire(method=None, result=None):
+    """
+    Converts result of controller function to JSON compatible form.
+    Dict of gen_account_keys() is sent as list of pairs to keep type of account IDs.
+    """
+    if method == 'gen_account_keys':
+        return [[account_id, account_kid] for account_id, account_kid in result.items()]
+    return result
+
+
+def start_signer_process():
+    """
+    Initializer of signer process. Starts key pool producer of the process, so that keys are ready before first
+    call of gen_account_key().
+    """
+    key_pool.start()
+
+
+def call_method(method=None, params=None):
+    """
+    Runs one call in signer process. Exceptions are returned as error objects.
+
+    :param method: Name of function in METHODS
+    :param params: dict of keyword arguments
+    :return: dict with result or error
+    """
+    try:
+        function = METHODS[method]
+    except KeyError:
+        return {'error': {'type': 'AttributeError', 'detail': "Unknown method: " + repr(method)}}
+
+    try:
+        result = function(**(params or {}))
+    except Exception as exp:
+        logger.error(str(method) + ' failed: ' + repr(exp))
+        return {'error': {'type': exp.__class__.__name__, 'detail': repr(exp)}}
+    else:
+        return {'result': result_to_wire(method=method, result=result)}
+
+
+class SigningRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles requests of one client connection until client closes it.
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            try:
+                request = json.loads(line.decode('utf-8'))
+                calls = request['calls']
+            except Exception as exp:
+                logger.error('Malformed request: ' + repr(exp))
+                response = {'id': None, 'error': {'type': 'ValueError', 'detail': repr(exp)}}
+            else:
+                response = {'id': request.get('id'), 'responses': self.server.run_calls(calls=calls)}
+
+            self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+class SigningDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix domain socket server with pool of signer processes.
+    Each client connection is served in own thread, calls are run in signer processes.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path=None, processes=None, call_timeout=10):
+        if socket_path is None:
+            raise AttributeError("Provide socket_path as parameter")
+
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            # Stale socket of previous daemon
+            os.unlink(socket_path)
+
+        self.socket_path = socket_path
+        self.call_timeout = call_timeout
+        self.pool = multiprocessing.Pool(processes=processes, initializer=start_signer_process)
+
+        socketserver.UnixStreamServer.__init__(self, socket_path, SigningRequestHandler)
+        os.chmod(socket_path, stat.S_IRUSR | stat.S_IWUSR)
+        logger.info('Signing daemon listening at ' + socket_path)
+
+    def run_calls(self, calls=None):
+        """
+        Runs calls in signer processes in parallel.
+
+        :param calls: List of dicts with method and params
+        :return: List of responses in the same order as calls
+        """
+        async_results = [
+            self.pool.apply_async(call_method, kwds={'method': call.get('method'), 'params': call.get('params')})
+            for call in calls
+        ]
+
+        responses = []
+        for async_result in async_results:
+            try:
+                responses.append(async_result.get(self.call_timeout))
+            except multiprocessing.TimeoutError:
+                responses.append({'error': {'type': 'BlackboxDaemonError', 'detail': "Call did not complete in " + str(self.call_timeout) + " seconds"}})
+        return responses
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.pool.terminate()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
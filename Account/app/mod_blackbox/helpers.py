@@ -17,6 +17,8 @@ from logging.handlers import TimedRotatingFileHandler
 from os.path import isdir, dirname, abspath
 from os import mkdir
 
+from app.log_helpers import BackgroundLogHandler, LazyLogArgument, lazy_repr, lazy_json
+
 
 def append_description_to_exception(exp=None, description=None):
     """
@@ -56,6 +58,18 @@ class KeyNotFoundError(StandardError):
     pass
 
 
+class BlackboxDaemonError(StandardError):
+    """
+    Exception to indicate that signing daemon could not be reached or it failed to handle the call.
+
+     https://docs.python.org/2/tutorial/errors.html#user-defined-exceptions
+    """
+    pass
+
+
+_log_handler = None
+
+
 def get_custom_logger(logger_name='default_logger'):
     """
     Creates logger instance.
@@ -63,6 +77,10 @@ def get_custom_logger(logger_name='default_logger'):
     :param logger_name: Name for logger
     :return: Logger object
     """
+    # Log level of application config, imported here like in app.helpers.get_custom_logger()
+    from app import app
+
+    global _log_handler
 
     LOG_TO_FILE = False
     DELIMITTER = '/'
@@ -81,23 +99,30 @@ def get_custom_logger(logger_name='default_logger'):
             print("LOG_PATH: '{}' could not be created. Exception: {}.".format(LOG_PATH, repr(e)))
 
     logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.DEBUG)
-
-    # create formatter
-    formatter = logging.Formatter(LOG_FORMATTER)
-
-    # console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # file handler
-    if LOG_TO_FILE:
-        file_handler = TimedRotatingFileHandler(LOG_FILE, when="midnight", interval=1, backupCount=10, utc=True)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+    logger.setLevel(app.config["LOG_LEVEL"])
+
+    if _log_handler is None:
+        # create formatter
+        formatter = logging.Formatter(LOG_FORMATTER)
+
+        # console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.DEBUG)
+        console_handler.setFormatter(formatter)
+        handlers = [console_handler]
+
+        # file handler
+        if LOG_TO_FILE:
+            file_handler = TimedRotatingFileHandler(LOG_FILE, when="midnight", interval=1, backupCount=10, utc=True)
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        # Console and file are written in background thread
+        _log_handler = BackgroundLogHandler(handlers=handlers)
+
+    if _log_handler not in logger.handlers:
+        logger.addHandler(_log_handler)
 
     return logger
 
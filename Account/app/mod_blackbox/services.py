@@ -13,19 +13,53 @@ __status__ = "Development"
 
 # Import dependencies
 import json
+import logging
 import os
-import sqlite3
+import threading
+import time
+from collections import deque
+from uuid import uuid4
 from jwcrypto import jwk, jws
+from jwcrypto.common import base64url_encode
+
+# Import the main app module for configuration
+from app import app
+from app.helpers import LruTtlCache
 
 # create logger with 'spam_application'
-from app.mod_blackbox.helpers import append_description_to_exception, KeyNotFoundError, get_custom_logger, jws_header_fix, \
-    get_current_line_no
+from app.mod_blackbox import jws_fast_path
+from app.mod_blackbox.helpers import append_description_to_exception, KeyNotFoundError, get_custom_logger, lazy_repr
+from app.mod_database.helpers import ShardedSqliteEngine
 
 logger = get_custom_logger('mod_blackbox_services')
 
 DELIMITTER = '/'
 DATABASE = os.path.dirname(os.path.abspath(__file__)) + DELIMITTER + 'blackbox.sqlite'
 #DATABASE = 'blackbox.sqlite'
+BUSY_TIMEOUT = 5.0  # Seconds to wait for lock of database before failing. Default: 5.0
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS account_keys (
+              id            INTEGER   PRIMARY KEY AUTOINCREMENT,
+              kid           TEXT  UNIQUE NOT NULL,
+              account_id    INTEGER  UNIQUE NOT NULL,
+              jws_key       BLOB  NOT NULL
+          );''',
+)
+
+KEY_STORE_SHARDS = int(app.config["KEY_STORE_SHARDS"])
+if app.config["KEY_STORE_PREVIOUS_SHARDS"] is not None:
+    KEY_STORE_PREVIOUS_SHARDS = int(app.config["KEY_STORE_PREVIOUS_SHARDS"])
+else:
+    KEY_STORE_PREVIOUS_SHARDS = None
+
+engine = ShardedSqliteEngine(database=DATABASE, schema=SCHEMA, shards=KEY_STORE_SHARDS, busy_timeout=BUSY_TIMEOUT)
+if KEY_STORE_PREVIOUS_SHARDS is not None and KEY_STORE_PREVIOUS_SHARDS != KEY_STORE_SHARDS:
+    previous_engine = ShardedSqliteEngine(database=DATABASE, schema=SCHEMA, shards=KEY_STORE_PREVIOUS_SHARDS, busy_timeout=BUSY_TIMEOUT)
+else:
+    previous_engine = None
+KEY_CACHE_SIZE = 1000  # Maximum number of accounts with cached keys, 0 disables cache. Default: 1000
+KEY_POOL_SIZE = int(app.config["KEY_POOL_SIZE"])
 
 
 def log_dict_as_json(data=None, pretty=0, lineno=None):
@@ -37,6 +71,8 @@ def log_dict_as_json(data=None, pretty=0, lineno=None):
     """
     if data is None:
         raise AttributeError("Provide data as parameter")
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     if lineno is not None:
         data['lineno'] = str(lineno)
 
@@ -54,65 +90,27 @@ def log_dict_as_json(data=None, pretty=0, lineno=None):
         raise AttributeError("Illegal value for pretty")
 
 
-def init_sqlite_db(connection=None):
+def get_sqlite_connection(account_id=None, sharded_engine=None):
     """
-    Initializes SQLite database.
-
-    :param connection: Database connection object
-    :return: Database connection object
-    """
-    if connection is None:
-        raise AttributeError("Provide connection as parameter")
-
-    sql_query = '''CREATE TABLE account_keys (
-              id            INTEGER   PRIMARY KEY AUTOINCREMENT,
-              kid           TEXT  UNIQUE NOT NULL,
-              account_id    INTEGER  UNIQUE NOT NULL,
-              jws_key       BLOB  NOT NULL
-          );'''
-
-    try:
-        logger.debug('Initializing database')
-        connection.execute(sql_query)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not initialize database')
-        logger.error('connection.execute(sql): ' + repr(exp))
-        connection.rollback()
-        raise
-    else:
-        connection.commit()
-        logger.debug('Database initialized')
-        return connection
-
-
-def get_sqlite_connection():
-    """
-    Get connection for SQLite Database
+    Get connection for shard of SQLite Database that holds keys of account.
+    Connection is persistent connection of current thread and must not be closed.
 
+    :param account_id: User account ID
+    :param sharded_engine: Key store layout, Defaults to current layout
     :return: Database connection object
     """
-
-    if(os.path.exists(DATABASE) and os.path.isfile(DATABASE)):
-        logger.debug("init_db = False")
-        init_db = False
-    else:
-        logger.debug("init_db = True")
-        init_db = True
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+    if sharded_engine is None:
+        sharded_engine = engine
 
     try:
-        connection = sqlite3.connect(DATABASE)
+        connection = sharded_engine.connection(shard_key=account_id)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description="Could not get database connection. Could not open db file.")
-        logger.error('sqlite3.connect(' + DATABASE + '): ' + repr(exp))
+        logger.error('sqlite3.connect(' + sharded_engine.engine(shard_key=account_id).database + '): ' + repr(exp))
         raise
     else:
-        if init_db:
-            try:
-                connection = init_sqlite_db(connection=connection)
-            except Exception:
-                raise
-
-        logger.debug('DB connection at ' + repr(connection))
         return connection
 
 
@@ -133,16 +131,17 @@ def get_sqlite_cursor(connection=None):
         logger.error('connection.cursor(): ' + repr(exp))
         raise
     else:
-        logger.debug('DB cursor at ' + repr(cursor))
+        logger.debug('DB cursor at %s', lazy_repr(cursor))
         return cursor, connection
 
 
-def execute_sql_insert(cursor, sql_query):
+def execute_sql_insert(cursor, sql_query, arguments=()):
     """
     Executes SQL INSERT queries.
 
     :param cursor: Database cursor
     :param sql_query: SQl query to execute
+    :param arguments: Tuple of arguments for ? placeholders in sql_query
     :return: Database cursor and last inserted row id
     """
 
@@ -154,7 +153,7 @@ def execute_sql_insert(cursor, sql_query):
     last_id = ""
 
     try:
-        cursor.execute(sql_query)
+        cursor.execute(sql_query, arguments)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Error in SQL INSERT query execution')
         logger.error('Error in SQL query execution: ' + repr(exp))
@@ -170,17 +169,18 @@ def execute_sql_insert(cursor, sql_query):
         logger.info('cursor.lastrowid not found. Using None instead')
         last_id = None
     else:
-        logger.debug('cursor.lastrowid: ' + last_id)
+        logger.debug('cursor.lastrowid: %s', last_id)
 
     return cursor, last_id
 
 
-def execute_sql_select(cursor=None, sql_query=None):
+def execute_sql_select(cursor=None, sql_query=None, arguments=()):
     """
     Executes SQL SELECT queries.
 
     :param cursor: Database cursor
     :param sql_query: SQl query to execute
+    :param arguments: Tuple of arguments for ? placeholders in sql_query
     :return: Database cursor and result of database query
     """
 
@@ -190,7 +190,7 @@ def execute_sql_select(cursor=None, sql_query=None):
         raise AttributeError("Provide sql_query as parameter")
 
     try:
-        cursor.execute(sql_query)
+        cursor.execute(sql_query, arguments)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Error in SQL SELECT query execution')
         logger.error('Error in SQL query execution: ' + repr(exp))
@@ -229,20 +229,46 @@ def store_jwk_to_db(account_id=None, account_kid=None, account_key=None, cursor=
     if cursor is None:
         raise AttributeError("Provide cursor as parameter")
 
-    sql_query = "INSERT INTO account_keys (kid, account_id, jws_key) VALUES ('%s', '%s', '%s')" % \
-                (account_kid, account_id, account_key)
+    sql_query = "INSERT INTO account_keys (kid, account_id, jws_key) VALUES (?, ?, ?)"
+    arguments = (account_kid, account_id, account_key)
 
     try:
-        cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
+        cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query, arguments=arguments)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not store JWK to Database')
         logger.error('Could not store JWK to Database: ' + repr(exp))
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
         raise
     else:
         return cursor, last_id
 
 
+def store_jwks_to_db(jwk_entries=None, cursor=None):
+    """
+    Stores multiple JWKs to database with one executemany().
+
+    :param jwk_entries: List of (account_id, account_kid, account_key) tuples
+    :param cursor: Database cursor
+    :return: Database cursor
+    """
+    if jwk_entries is None:
+        raise AttributeError("Provide jwk_entries as parameter")
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+
+    sql_query = "INSERT INTO account_keys (account_id, kid, jws_key) VALUES (?, ?, ?)"
+
+    try:
+        cursor.executemany(sql_query, jwk_entries)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not store JWKs to Database')
+        logger.error('Could not store JWKs to Database: ' + repr(exp))
+        raise
+    else:
+        logger.debug('%s JWKs stored', len(jwk_entries))
+        return cursor
+
+
 def get_key(account_id=None, cursor=None):
     """
     Fetches JSON presentation of JWK object from database and converts JSON presentation to JWK object.
@@ -259,14 +285,14 @@ def get_key(account_id=None, cursor=None):
     jwk_dict = {}
 
     # TODO: Fix field name in SQL jws_key-> jwk
-    sql_query = "SELECT id, kid, account_id, jws_key FROM account_keys WHERE account_id='%s' ORDER BY id DESC LIMIT 1" % (account_id)
+    sql_query = "SELECT id, kid, account_id, jws_key FROM account_keys WHERE account_id=? ORDER BY id DESC LIMIT 1"
 
     try:
-        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor)
+        cursor, data = execute_sql_select(sql_query=sql_query, cursor=cursor, arguments=(account_id,))
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not fetch key from database')
         logger.error('Could not fetch key from database: ' + repr(exp))
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
         raise
     else:
         logger.debug("JWK json fetched from database")
@@ -289,8 +315,8 @@ def get_key(account_id=None, cursor=None):
             logger.error('Could not convert JWK json to JWK object: ' + repr(exp))
             raise
         else:
-            logger.debug('jwk_object: ' + str(jwk_object.__dict__))
-            logger.debug('kid: ' + str(jwk_dict['kid']))
+            logger.debug('jwk_object: %s', lazy_repr(jwk_object.__dict__))
+            logger.debug('kid: %s', jwk_dict['kid'])
             return cursor, jwk_object, jwk_dict['kid']
 
 
@@ -321,8 +347,8 @@ def get_public_key_by_account_id(account_id=None, cursor=None):
         logger.error('Could not export public part of the key from JWK object: ' + repr(exp))
         raise
     else:
-        logger.debug('kid: ' + str(kid))
-        logger.debug('jwk_json_public: ' + repr(jwk_json_public))
+        logger.debug('kid: %s', kid)
+        logger.debug('jwk_json_public: %s', lazy_repr(jwk_json_public))
         return cursor, jwk_json_public, kid
 
 
@@ -353,11 +379,101 @@ def get_key_by_account_id(account_id=None, cursor=None):
         logger.error('Could not export key from JWK object: ' + repr(exp))
         raise
     else:
-        logger.debug('kid: ' + str(kid))
-        logger.debug('jwk_object_public: ' + repr(jwk_object))
+        logger.debug('kid: %s', kid)
+        logger.debug('jwk_object_public: %s', lazy_repr(jwk_object))
         return cursor, jwk_json, kid
 
 
+#####################
+# Key cache
+#####################
+# Ready to use key material, keyed by account ID. Entries are (JWK object, JSON presentation of public part of JWK,
+# Key ID) tuples. Keys of accounts do not change, so entries do not expire.
+# Entry of account must be invalidated when key of account is stored.
+key_cache = LruTtlCache(max_size=max(1, KEY_CACHE_SIZE), ttl=0)
+
+
+def invalidate_cached_key(account_id=None):
+    """
+    Removes key material of account from cache of current process.
+
+    :param account_id: User account ID
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    if key_cache.invalidate(key=str(account_id)):
+        logger.debug('Cached key invalidated for account: %s', account_id)
+
+
+def get_key_from_shard(account_id=None, sharded_engine=None):
+    """
+    Gets key of account from shard of key store that holds keys of account.
+
+    :param account_id: User account ID
+    :param sharded_engine: Key store layout, Defaults to current layout
+    :return: JWK object and Key ID
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    try:
+        connection = get_sqlite_connection(account_id=account_id, sharded_engine=sharded_engine)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get connection SQL database.')
+        logger.error('Could not get connection SQL database: ' + repr(exp))
+        raise
+
+    try:
+        cursor, connection = get_sqlite_cursor(connection=connection)
+        cursor, jwk_object, kid = get_key(account_id=account_id, cursor=cursor)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not get key object')
+        logger.error('Could not get key object: ' + repr(exp))
+        connection.rollback()
+        raise
+    else:
+        return jwk_object, kid
+
+
+def get_key_material(account_id=None):
+    """
+    Gets key of account as JWK object, JSON presentation of public part of the key and Key ID.
+    Key material is served from cache, database is used only if account has no cached key.
+
+    :param account_id: User account ID
+    :return: JWK object, JSON presentation of public part of JWK and Key ID
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+
+    entry = key_cache.get(key=str(account_id))
+    if entry is not None:
+        logger.debug('Key material from cache for account: %s', account_id)
+        return entry
+
+    try:
+        jwk_object, kid = get_key_from_shard(account_id=account_id)
+    except KeyNotFoundError:
+        if previous_engine is None:
+            raise
+        # Key store is being resharded and key has not been copied to current layout yet
+        logger.debug('Key not found from current key store layout, using previous layout for account: %s', account_id)
+        jwk_object, kid = get_key_from_shard(account_id=account_id, sharded_engine=previous_engine)
+
+    try:
+        jwk_public_json = jwk_object_to_json_public_part(jwk_object=jwk_object)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not export public part of the key from JWK object')
+        logger.error('Could not export public part of the key from JWK object: ' + repr(exp))
+        raise
+
+    entry = (jwk_object, jwk_public_json, kid)
+    if KEY_CACHE_SIZE:
+        key_cache.set(key=str(account_id), value=entry)
+    return entry
+
+
 #####################
 # JWK
 #####################
@@ -371,7 +487,7 @@ def jwk_json_to_object(jwk_json=None):
     if jwk_json is None:
         raise AttributeError("Provide jwk_json as parameter")
     else:
-        logger.debug("As parameter jwk_json: " + repr(jwk_json).replace('u\'', '\''))
+        logger.debug("As parameter jwk_json: %s", lazy_repr(jwk_json))
 
     try:
         jwk_dict = json.loads(jwk_json)
@@ -380,7 +496,7 @@ def jwk_json_to_object(jwk_json=None):
         logger.error('Could not convert JWK json to JWK dict: ' + repr(exp))
         raise
     else:
-        logger.debug("jwk_json: " + repr(jwk_json))
+        logger.debug("jwk_json: %s", lazy_repr(jwk_json))
         logger.info("JWK json converted to JWK dict")
 
     try:
@@ -391,7 +507,7 @@ def jwk_json_to_object(jwk_json=None):
         raise
     else:
         logger.debug('JWK json converted to JWK object')
-        logger.debug('jwk_object: ' + repr(jwk_object.__dict__))
+        logger.debug('jwk_object: %s', lazy_repr(jwk_object.__dict__))
         return jwk_object
 
 
@@ -413,7 +529,7 @@ def jwk_object_to_json(jwk_object=None):
         raise
     else:
         logger.debug('JWK exported')
-        logger.debug('jwk_json: ' + repr(jwk_json))
+        logger.debug('jwk_json: %s', lazy_repr(jwk_json))
         return jwk_json
 
 
@@ -435,7 +551,7 @@ def jwk_object_to_json_public_part(jwk_object=None):
         raise
     else:
         logger.debug('JWK exported')
-        logger.debug('jwk_json: ' + repr(jwk_json_public))
+        logger.debug('jwk_json: %s', lazy_repr(jwk_json_public))
         return jwk_json_public
 
 
@@ -461,10 +577,155 @@ def gen_key_as_jwk(account_kid=None):
         raise
     else:
         logger.debug('JWK for account generated')
-        logger.debug('account_key: ' + repr(account_key))
+        logger.debug('account_key: %s', lazy_repr(account_key))
         return account_key
 
 
+#####################
+# Key pool
+#####################
+def gen_account_kid():
+    """
+    :return: New Key ID for account key
+    """
+    return "acc-kid-" + str(uuid4())
+
+
+class KeyPool(object):
+    """
+    Reservoir of pre-generated keys that are not yet assigned to any account.
+
+    Background thread keeps the pool filled up to size, so that account creation only claims a ready key.
+    Pool is in memory of current process. Producer thread is started in each process after fork, on first request
+    of web worker and when signer process of daemon starts, so it is safe with forking servers like uWSGI.
+    claim() starts producer if it is not running yet.
+    """
+
+    RATE_WINDOW = 60  # Seconds of history used for refill rate
+
+    def __init__(self, size=50):
+        if size < 0:
+            raise AttributeError("Illegal value for size: " + str(size))
+
+        self.size = size
+
+        self._keys = deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._producer = None
+        self._producer_pid = None
+
+        self._generated = 0
+        self._generation_time_total = 0.0
+        self._generated_at = deque()
+        self._claimed = 0
+        self._misses = 0
+        self._errors = 0
+
+    def start(self):
+        """
+        Starts producer thread for current process if it is not running.
+        """
+        if self.size == 0:
+            return
+
+        pid = os.getpid()
+        with self._condition:
+            if self._producer is not None and self._producer_pid == pid and self._producer.is_alive():
+                return
+            if self._producer_pid != pid:
+                # Keys generated in parent process are not shared with child processes
+                self._keys.clear()
+            self._producer = threading.Thread(target=self._produce, name="blackbox-key-pool")
+            self._producer.daemon = True
+            self._producer_pid = pid
+            self._producer.start()
+            logger.info('Key pool producer started for process ' + str(pid))
+
+    def _produce(self):
+        while True:
+            with self._condition:
+                while len(self._keys) >= self.size:
+                    self._condition.wait()
+
+            start = time.time()
+            account_kid = gen_account_kid()
+            try:
+                account_key = gen_key_as_jwk(account_kid=account_kid)
+            except Exception as exp:
+                logger.error('Key pool could not generate key: ' + repr(exp))
+                with self._condition:
+                    self._errors += 1
+                time.sleep(1)
+                continue
+
+            now = time.time()
+            with self._condition:
+                self._keys.append((account_kid, account_key))
+                self._generated += 1
+                self._generation_time_total += now - start
+                self._generated_at.append(now)
+                while self._generated_at and self._generated_at[0] < now - self.RATE_WINDOW:
+                    self._generated_at.popleft()
+
+    def claim(self):
+        """
+        Takes one pre-generated key from pool.
+
+        :return: Tuple of Key ID and JSON presentation of JWK or None if pool is empty
+        """
+        self.start()
+
+        with self._condition:
+            try:
+                entry = self._keys.popleft()
+            except IndexError:
+                self._misses += 1
+                return None
+            self._claimed += 1
+            self._condition.notify()
+            return entry
+
+    def stats(self):
+        """
+        Gauges and counters of the pool.
+
+        :return: dict
+        """
+        now = time.time()
+        with self._condition:
+            while self._generated_at and self._generated_at[0] < now - self.RATE_WINDOW:
+                self._generated_at.popleft()
+            return {
+                'size': self.size,
+                'depth': len(self._keys),
+                'generated': self._generated,
+                'claimed': self._claimed,
+                'misses': self._misses,
+                'errors': self._errors,
+                'generation_time_avg': self._generation_time_total / self._generated if self._generated else 0.0,
+                'refill_rate': float(len(self._generated_at)) / self.RATE_WINDOW,
+            }
+
+
+key_pool = KeyPool(size=KEY_POOL_SIZE)
+
+
+def claim_or_gen_key_as_jwk():
+    """
+    Takes pre-generated key from key pool. If pool is empty, key is generated in calling thread.
+
+    :return: Key ID and JSON presentation of generated JWK
+    """
+    entry = key_pool.claim()
+    if entry is not None:
+        logger.debug('Key claimed from key pool: %s', entry[0])
+        return entry
+
+    logger.info('Key pool is empty, generating key')
+    account_kid = gen_account_kid()
+    return account_kid, gen_key_as_jwk(account_kid=account_kid)
+
+
 #####################
 # JWS
 #####################
@@ -473,22 +734,82 @@ def jws_generate(payload=None):
         raise AttributeError("Provide payload as parameter")
 
     payload_json = json.dumps(payload)
-    logger.debug('payload_json: ' + payload_json)
+    logger.debug('payload_json: %s', payload_json)
 
     try:
         jws_object = jws.JWS(payload=payload_json)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not generate JWS object with payload')
         logger.error('Could not generate JWS object with payload: ' + repr(exp))
-        log_dict_as_json(data={'payload': repr(payload)})
+        logger.debug('payload: %s', lazy_repr(payload))
         raise
     else:
-        logger.debug('jws_object: ' + str(jws_object))
-        log_dict_as_json(lineno=get_current_line_no(), data={'jws_object': jws_object.__dict__})
+        logger.debug('jws_object: %s', lazy_repr(jws_object.__dict__))
         logger.info('JWS object created')
         return jws_object
 
 
+def jws_signature_to_dict(signature=None):
+    """
+    Converts one signature of JWS object to dict of JWS JSON Serialization.
+    Unprotected header is included as object, also when it was given to jwcrypto as JSON string.
+
+    :param signature: Dict with signature, protected and header of one signature from JWS object
+    :return: dict
+    """
+    if signature is None:
+        raise AttributeError("Provide signature as parameter")
+
+    signature_dict = {'signature': base64url_encode(signature['signature'])}
+    if 'protected' in signature:
+        signature_dict['protected'] = base64url_encode(signature['protected'])
+    if 'header' in signature:
+        header = signature['header']
+        if not isinstance(header, dict):
+            header = json.loads(header)
+        signature_dict['header'] = header
+    return signature_dict
+
+
+def jws_serialize(jws_object=None):
+    """
+    Serializes signed JWS object to JWS JSON Serialization.
+    Flattened syntax is used for JWS with one signature and general syntax for JWS with multiple signatures.
+    - https://tools.ietf.org/html/rfc7515#section-7.2
+
+    :param jws_object: Signed JWS object
+    :return: JWS as dict and JSON presentation of JWS
+    """
+    if jws_object is None:
+        raise AttributeError("Provide jws_object as parameter")
+
+    objects = jws_object.objects
+
+    try:
+        if 'signature' in objects:
+            if not objects.get('valid', False):
+                raise ValueError("No valid signature found")
+            jws_dict = jws_signature_to_dict(signature=objects)
+        elif 'signatures' in objects:
+            jws_dict = {'signatures': [
+                jws_signature_to_dict(signature=signature)
+                for signature in objects['signatures'] if signature.get('valid', False)
+            ]}
+            if len(jws_dict['signatures']) == 0:
+                raise ValueError("No valid signature found")
+        else:
+            raise ValueError("No available signature")
+        jws_dict['payload'] = base64url_encode(objects['payload'])
+        jws_json = json.dumps(jws_dict, separators=(',', ':'), sort_keys=True)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not serialize JWS object')
+        logger.error('Could not serialize JWS object: ' + repr(exp))
+        raise
+    else:
+        logger.info('JWS object serialized')
+        return jws_dict, jws_json
+
+
 def jws_object_to_json(jws_object=None):
     """
     Converts JWS object to JWS JSON presentation
@@ -499,29 +820,17 @@ def jws_object_to_json(jws_object=None):
     """
     if jws_object is None:
         raise AttributeError("Provide jws_object as parameter")
-    else:
-        logger.debug("As parameter jws_object: " + repr(jws_object.__dict__).replace('u\'', '\''))
 
     try:
-        jws_json = jws_object.serialize(compact=False)
+        jws_dict, jws_json = jws_serialize(jws_object=jws_object)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not convert JWS object to JWS json')
         logger.error('Could not convert JWS object to JWS json: ' + repr(exp))
         raise
     else:
-        logger.debug('jws_json: ' + str(jws_json))
+        logger.debug('jws_json: %s', jws_json)
         logger.info('JWS object converted to JWS json')
-
-    try:
-        jws_json_fixed = jws_header_fix(malformed_jws_json=jws_json)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not fix header in JWS json')
-        logger.error('Could not fix header in JWS json: ' + repr(exp))
-        raise
-    else:
-        logger.debug('jws_json_fixed: ' + str(jws_json_fixed))
-        logger.info('Header fixed in JWS json')
-        return jws_json_fixed
+        return jws_json
 
 
 def jws_json_to_object(jws_json=None):
@@ -535,7 +844,7 @@ def jws_json_to_object(jws_json=None):
     if jws_json is None:
         raise AttributeError("Provide jws_json as parameter")
     else:
-        logger.debug("As parameter jws_json: " + repr(jws_json).replace('u\'', '\''))
+        logger.debug("As parameter jws_json: %s", lazy_repr(jws_json))
 
     try:
         jws_object = jws.JWS()
@@ -546,9 +855,127 @@ def jws_json_to_object(jws_json=None):
         raise
     else:
         logger.info('JWS json converted to JWS object')
-        logger.debug('jws_object: ' + repr(jws_object.__dict__))
+        logger.debug('jws_object: %s', lazy_repr(jws_object.__dict__))
+        return jws_object
+
+
+def jws_signing_key(account_kid=None, jwk_object=None):
+    """
+    Key handle of cryptography for signing with key of account.
+    Handles are cached by Key ID, key is exported from JWK object only when handle is not cached.
+
+    :param account_kid: Key ID for user's key
+    :param jwk_object: JWK object
+    :return: cryptography private key object
+    """
+    if account_kid is None:
+        raise AttributeError("Provide account_kid as parameter")
+    if jwk_object is None:
+        raise AttributeError("Provide jwk_object as parameter")
+
+    cache_key = ('sign', account_kid)
+    key = jws_fast_path.key_handles.get(cache_key)
+    if key is None:
+        key = jws_fast_path.private_key_from_jwk(json.loads(jwk_object.export()))
+        jws_fast_path.key_handles.put(cache_key, key)
+    return key
+
+
+def jws_add_signature(jws_object=None, account_kid=None, jwk_object=None, alg=None, unprotected_header=None,
+                      unprotected_header_json=None, protected_header_json=None):
+    """
+    Adds signature to JWS object.
+    ES256 and RS256 signatures are computed directly with cryptography and stored to JWS object the same way as
+    jwcrypto stores them, so that serialization of JWS object is not affected. Other algorithms are signed by jwcrypto.
+
+    :param jws_object: JWS object
+    :param account_kid: Key ID for user's key
+    :param jwk_object: JWK object
+    :param alg: Signature algorithm to use
+    :param unprotected_header: Unprotected header as dict
+    :param unprotected_header_json: JSON presentation of unprotected header
+    :param protected_header_json: JSON presentation of protected header
+    :return: Signed JWS object
+    """
+    if alg not in jws_fast_path.SUPPORTED_ALGS:
+        jws_object.add_signature(jwk_object, alg=alg, header=unprotected_header_json, protected=protected_header_json)
         return jws_object
 
+    objects = jws_object.objects
+    if not objects.get('payload', None):
+        raise ValueError('Missing Payload')
+
+    signing_input = jws_fast_path.encode_protected_header(protected_header_json) + '.' + \
+        jws_fast_path.base64url_encode(objects['payload'])
+    signature = {
+        'signature': jws_fast_path.sign_raw(alg, jws_signing_key(account_kid=account_kid, jwk_object=jwk_object), signing_input.encode('utf-8')),
+        'protected': protected_header_json,
+        'header': unprotected_header,
+        'valid': True
+    }
+
+    # Flattened JWS is converted to general syntax when second signature is added
+    if 'signatures' in objects:
+        objects['signatures'].append(signature)
+    elif 'signature' in objects:
+        first = dict((name, objects.pop(name)) for name in ('signature', 'protected', 'header', 'valid') if name in objects)
+        objects['signatures'] = [first, signature]
+    else:
+        objects.update(signature)
+    return jws_object
+
+
+def jws_verify_fast_path(jws_object=None, account_kid=None, jwk_object=None):
+    """
+    Verifies ES256 and RS256 signatures of JWS object directly with cryptography.
+    JWS is valid if at least one of the signatures verifies, as in jwcrypto.
+    Signatures with other kid than account_kid, like the one Service adds to Service Link Record, are skipped.
+    Error in one signature means that it is not verified by this key, as in jwcrypto.
+
+    :param jws_object: JWS object to verify
+    :param account_kid: Key ID for user's key, used to cache key handle. Defaults to thumbprint of key.
+    :param jwk_object: JWK object to use in verification
+    :return: Boolean, presenting if verification passed. None if JWS has to be verified by jwcrypto.
+    """
+    objects = jws_object.objects
+    if 'signatures' in objects:
+        signatures = objects['signatures']
+    elif 'signature' in objects:
+        signatures = [objects]
+    else:
+        return None
+
+    signing_inputs = []
+    for signature in signatures:
+        header = {}
+        if signature.get('protected', None) is not None:
+            header.update(json.loads(signature['protected']))
+        unprotected_header = signature.get('header', None)
+        if unprotected_header:
+            if not isinstance(unprotected_header, dict):
+                unprotected_header = json.loads(unprotected_header)
+            header.update(unprotected_header)
+        if account_kid is not None and header.get('kid', account_kid) != account_kid:
+            continue
+        if 'crit' in header or header.get('alg', None) not in jws_fast_path.SUPPORTED_ALGS:
+            return None
+        protected = signature.get('protected', None)
+        protected = '' if protected is None else jws_fast_path.encode_protected_header(protected)
+        signing_inputs.append((header['alg'], protected, signature['signature']))
+
+    key = jws_fast_path.verification_key(json.loads(jwk_object.export_public()), cache_key=account_kid)
+    payload = jws_fast_path.base64url_encode(objects['payload'])
+    valid = False
+    for alg, protected, signature in signing_inputs:
+        try:
+            if jws_fast_path.verify_raw(alg, key, (protected + '.' + payload).encode('utf-8'), signature):
+                valid = True
+                break
+        except Exception as exp:
+            logger.debug('Signature with %s not verified: %s', alg, lazy_repr(exp))
+    objects['valid'] = valid
+    return valid
+
 
 def jws_sign(account_id=None, account_kid=None, jws_object=None, jwk_object=None, jwk_public_json=None, alg="ES256"):
     """
@@ -591,12 +1018,14 @@ def jws_sign(account_id=None, account_kid=None, jws_object=None, jwk_object=None
 
     try:
         logger.debug("Signing JWS with following")
-        log_dict_as_json(lineno=get_current_line_no(), data={'jws_object': repr(jws_object.__dict__)})
-        log_dict_as_json(lineno=get_current_line_no(), data={'alg': alg})
-        log_dict_as_json(lineno=get_current_line_no(), data={'unprotected_header_json': unprotected_header})
-        log_dict_as_json(lineno=get_current_line_no(), data={'protected_header_json': protected_header})
-
-        jws_object.add_signature(jwk_object, alg=alg, header=unprotected_header_json, protected=protected_header_json)
+        logger.debug('jws_object: %s', lazy_repr(jws_object.__dict__))
+        logger.debug('alg: %s', alg)
+        logger.debug('unprotected_header_json: %s', unprotected_header_json)
+        logger.debug('protected_header_json: %s', protected_header_json)
+
+        jws_add_signature(jws_object=jws_object, account_kid=account_kid, jwk_object=jwk_object, alg=alg,
+                          unprotected_header=unprotected_header, unprotected_header_json=unprotected_header_json,
+                          protected_header_json=protected_header_json)
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Could not sign JWS with JWK')
         logger.error('Could not sign JWS with JWK: ' + repr(exp))
@@ -604,16 +1033,71 @@ def jws_sign(account_id=None, account_kid=None, jws_object=None, jwk_object=None
         raise
     else:
         logger.info("Signed JWS with JWK")
-        logger.debug("Signed jws_object: " + str(jws_object.__dict__))
+        logger.debug("Signed jws_object: %s", lazy_repr(jws_object.__dict__))
         return jws_object
 
 
-def jws_verify(jws_object=None, jwk_object=None):
+def jws_sign_batch(account_id=None, account_kid=None, jws_objects=None, jwk_object=None, jwk_public_json=None, alg="ES256"):
+    """
+    Signs multiple JWSs with JWK. Headers are created once and used in all signatures.
+
+    :param account_id: User account ID
+    :param account_kid: Key ID for user's key
+    :param jws_objects: List of JWS objects
+    :param jwk_object: JWK object
+    :param jwk_public_json: JSON presentation of public part of JWK
+    :param alg: Signature algorithm to use, Defaults to ES256
+    :return: List of signed JWS objects in the same order as jws_objects
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+    if account_kid is None:
+        raise AttributeError("Provide account_kid as parameter")
+    if jws_objects is None:
+        raise AttributeError("Provide jws_objects as parameter")
+    if jwk_object is None:
+        raise AttributeError("Provide jwk_object as parameter")
+    if jwk_public_json is None:
+        raise AttributeError("Provide jwk_public_json as parameter")
+    if alg is None:
+        raise AttributeError("Provide alg as parameter")
+
+    try:
+        unprotected_header = {'kid': account_kid, 'jwk': json.loads(jwk_public_json)}
+        protected_header = {'alg': alg}
+        unprotected_header_json = json.dumps(unprotected_header)
+        protected_header_json = json.dumps(protected_header)
+    except Exception as exp:
+        exp = append_description_to_exception(exp=exp, description='Could not create headers')
+        logger.error('Could not create headers: ' + repr(exp))
+        raise
+    else:
+        logger.info("Created headers")
+        log_dict_as_json(data=unprotected_header)
+        log_dict_as_json(data=protected_header)
+
+    for index, jws_object in enumerate(jws_objects):
+        try:
+            jws_add_signature(jws_object=jws_object, account_kid=account_kid, jwk_object=jwk_object, alg=alg,
+                              unprotected_header=unprotected_header, unprotected_header_json=unprotected_header_json,
+                              protected_header_json=protected_header_json)
+        except Exception as exp:
+            exp = append_description_to_exception(exp=exp, description='Could not sign JWS number ' + str(index) + ' with JWK')
+            logger.error('Could not sign JWS number ' + str(index) + ' with JWK: ' + repr(exp))
+            raise
+
+    logger.info("Signed " + str(len(jws_objects)) + " JWSs with JWK")
+    return jws_objects
+
+
+def jws_verify(jws_object=None, jwk_object=None, account_kid=None):
     """
     Verifies signature of JWS.
+    ES256 and RS256 signatures are verified directly with cryptography, other algorithms with jwcrypto.
 
     :param jws_object: JWS object to verify
     :param jwk_object: JWK onject to use in verification
+    :param account_kid: Key ID for user's key, optional
     :return: Boolean, presenting if verification passed
     """
     if jws_object is None:
@@ -622,7 +1106,11 @@ def jws_verify(jws_object=None, jwk_object=None):
         raise AttributeError("Provide jwk_object as parameter")
 
     try:
-        jws_object.verify(jwk_object)
+        valid = jws_verify_fast_path(jws_object=jws_object, account_kid=account_kid, jwk_object=jwk_object)
+        if valid is None:
+            jws_object.verify(jwk_object)
+        elif not valid:
+            raise ValueError('Verification failed for all signatures')
     except Exception as exp:
         exp = append_description_to_exception(exp=exp, description='Signature verification failed')
         logger.error('Signature verification failed: ' + repr(exp))
@@ -634,32 +1122,100 @@ def jws_verify(jws_object=None, jwk_object=None):
 
 def clear_blackbox_sqlite_db():
     """
-    Initializes SQLite database.
+    Initializes SQLite database. All shards of current and previous key store layout are cleared.
 
-    :param connection: Database connection object
-    :return: Database connection object
+    :return: True
     """
-    try:
-        connection = get_sqlite_connection()
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not get database connection')
-        logger.error('get_sqlite_connection: ' + repr(exp))
-        raise
-
     sql_query = '''DELETE FROM account_keys WHERE account_id > 3;'''
 
-    try:
-        logger.info('Clearing database')
-        logger.debug('Executing: ' + str(sql_query))
-        connection.execute(sql_query)
-    except Exception as exp:
-        exp = append_description_to_exception(exp=exp, description='Could not clear database')
-        logger.error('connection.execute(sql): ' + repr(exp))
-        connection.rollback()
-        connection.close()
-        raise
-    else:
-        connection.commit()
-        connection.close()
-        logger.info('Database cleared')
-        return True
+    sharded_engines = [engine] if previous_engine is None else [engine, previous_engine]
+    for sharded_engine in sharded_engines:
+        for shard_engine in sharded_engine.engines:
+            try:
+                connection = shard_engine.connection()
+            except Exception as exp:
+                exp = append_description_to_exception(exp=exp, description='Could not get database connection')
+                logger.error('get_sqlite_connection: ' + repr(exp))
+                raise
+
+            try:
+                logger.info('Clearing database ' + shard_engine.database)
+                logger.debug('Executing: %s', sql_query)
+                connection.execute(sql_query)
+            except Exception as exp:
+                exp = append_description_to_exception(exp=exp, description='Could not clear database')
+                logger.error('connection.execute(sql): ' + repr(exp))
+                connection.rollback()
+                raise
+            else:
+                connection.commit()
+
+    key_cache.clear()
+    logger.info('Database cleared')
+    return True
+
+
+def copy_keys_to_layout(source_shards=None, target_shards=None, batch_size=500, progress=None):
+    """
+    Copies keys from key store layout with source_shards shards to layout with target_shards shards.
+
+    Copy can be done online. Source shards are read in batches ordered by row ID, so that each read transaction is
+    short, and each batch is written to target shards in one transaction per shard. Keys that already exist in target
+    layout are kept, they are newer than copied keys. Source files are not modified and can be removed afterwards.
+
+    :param source_shards: Number of shards in source layout
+    :param target_shards: Number of shards in target layout
+    :param batch_size: Keys read at a time from source shard
+    :param progress: Optional function called with counters after each batch
+    :return: dict of counters
+    """
+    if source_shards is None:
+        raise AttributeError("Provide source_shards as parameter")
+    if target_shards is None:
+        raise AttributeError("Provide target_shards as parameter")
+    if source_shards == target_shards:
+        raise AttributeError("Source and target layouts must differ")
+
+    source = ShardedSqliteEngine(database=DATABASE, schema=SCHEMA, shards=source_shards, busy_timeout=BUSY_TIMEOUT)
+    target = ShardedSqliteEngine(database=DATABASE, schema=SCHEMA, shards=target_shards, busy_timeout=BUSY_TIMEOUT)
+
+    select_query = "SELECT id, kid, account_id, jws_key FROM account_keys WHERE id > ? ORDER BY id LIMIT ?"
+    insert_query = "INSERT OR IGNORE INTO account_keys (kid, account_id, jws_key) VALUES (?, ?, ?)"
+    counters = {'read': 0, 'copied': 0, 'skipped': 0}
+
+    for source_engine in source.engines:
+        last_id = 0
+        while True:
+            try:
+                cursor, data = execute_sql_select(cursor=source_engine.connection().cursor(), sql_query=select_query, arguments=(last_id, batch_size))
+            except Exception as exp:
+                exp = append_description_to_exception(exp=exp, description='Could not read keys from ' + source_engine.database)
+                logger.error('Could not read keys from ' + source_engine.database + ': ' + repr(exp))
+                raise
+            source_engine.connection().commit()
+            if not data:
+                break
+            last_id = data[-1][0]
+            counters['read'] += len(data)
+
+            partitions = target.partition(items=[(kid, account_id, jws_key) for row_id, kid, account_id, jws_key in data], shard_key=lambda entry: entry[1])
+            for shard_index, entries in partitions.items():
+                connection = target.engines[shard_index].connection()
+                try:
+                    cursor = connection.cursor()
+                    cursor.executemany(insert_query, entries)
+                except Exception as exp:
+                    exp = append_description_to_exception(exp=exp, description='Could not copy keys to ' + target.engines[shard_index].database)
+                    logger.error('Could not copy keys to ' + target.engines[shard_index].database + ': ' + repr(exp))
+                    connection.rollback()
+                    raise
+                else:
+                    connection.commit()
+                    counters['copied'] += cursor.rowcount
+                    counters['skipped'] += len(entries) - cursor.rowcount
+
+            if progress is not None:
+                progress(counters)
+
+    logger.info('Keys copied from ' + str(source_shards) + ' shards to ' + str(target_shards) + ' shards: ' + json.dumps(counters))
+    return counters
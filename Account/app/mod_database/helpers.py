@@ -2,24 +2,87 @@
 
 # Import dependencies
 import logging
+import os
+import sqlite3
+import threading
+import zlib
 
 # Import the database object from the main app module
 from app import db, app
 
 # create logger with 'spam_application'
-from app.helpers import get_custom_logger
+from app.helpers import get_custom_logger, ApiError, lazy_repr
 
 logger = get_custom_logger('mod_database_helpers')
 
+# Matching modes for build_sql_where_clause()
+MATCH_EXACT = "exact"
+MATCH_PREFIX = "prefix"
+MATCH_SUBSTRING = "substring"
+
+
+def escape_like_wildcards(value=""):
+    """
+    Escapes LIKE wildcards from value so that it is matched literally.
+
+    :param value: Value to escape
+    :return: Escaped value as String
+    """
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_sql_where_clause(criteria=None, match=MATCH_EXACT):
+    """
+    Builds WHERE clause for SELECT query from criteria that have a value set.
+    Unset criteria (None or empty String) are left out of the clause.
+
+    With MATCH_EXACT equality predicates are used so that MySQL can use primary keys,
+    unique indexes and foreign key indexes. MATCH_PREFIX and MATCH_SUBSTRING use LIKE.
+    Prefix match can still use an index, substring match always results to full table scan.
+
+    :param criteria: Tuple of (column name, value) tuples
+    :param match: MATCH_EXACT, MATCH_PREFIX or MATCH_SUBSTRING, defaults to MATCH_EXACT
+    :return: WHERE clause without WHERE keyword and tuple of query arguments
+    """
+    if criteria is None:
+        raise AttributeError("Provide criteria as parameter")
+    if match not in (MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING):
+        raise AttributeError("Illegal value for match: " + repr(match))
+
+    predicates = []
+    arguments = []
+
+    for column, value in criteria:
+        if value is None or value == "":
+            continue
+
+        if match == MATCH_EXACT:
+            predicates.append(column + " = %s")
+            arguments.append(value)
+        elif match == MATCH_PREFIX:
+            predicates.append(column + " LIKE %s")
+            arguments.append(escape_like_wildcards(value=value) + '%')
+        else:
+            predicates.append(column + " LIKE %s")
+            arguments.append('%' + escape_like_wildcards(value=value) + '%')
+
+    if len(predicates) == 0:
+        raise AttributeError("Provide at least one search criteria")
+
+    return " AND ".join(predicates), tuple(arguments)
+
 
 def get_db_cursor():
     try:
         cursor = db.connection.cursor()
+    except ApiError:
+        # Connection pool exhausted
+        raise
     except Exception as exp:
-        logger.debug('db.connection.cursor(): ' + repr(exp))
+        logger.debug('db.connection.cursor(): %s', lazy_repr(exp))
         raise RuntimeError('Could not get cursor for database connection')
     else:
-        logger.debug('DB cursor at ' + repr(cursor))
+        logger.debug('DB cursor at %s', lazy_repr(cursor))
         return cursor
 
 
@@ -36,23 +99,23 @@ def execute_sql_insert(cursor, sql_query):
     last_id = ""
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
 
     try:
         # Should be done like here: http://stackoverflow.com/questions/3617052/escape-string-python-for-mysql/27575399#27575399
         cursor.execute(sql_query)
 
     except Exception as exp:
-        logger.debug('Error in SQL query execution: ' + repr(exp))
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
         raise
 
     try:
         last_id = str(cursor.lastrowid)
     except Exception as exp:
-        logger.debug('cursor.lastrowid not found: ' + repr(exp))
+        logger.debug('cursor.lastrowid not found: %s', lazy_repr(exp))
         raise
     else:
-        logger.debug('cursor.lastrowid: ' + last_id)
+        logger.debug('cursor.lastrowid: %s', last_id)
 
         return cursor, last_id
 
@@ -69,30 +132,101 @@ def execute_sql_insert_2(cursor, sql_query, arguments):
 
     last_id = ""
 
-    logger.debug('sql_query: ' + str(sql_query))
+    logger.debug('sql_query: %s', sql_query)
 
-    for index in range(len(arguments)):
-        logger.debug("arguments[" + str(index) + "]: " + str(arguments[index]))
+    if logger.isEnabledFor(logging.DEBUG):
+        for index in range(len(arguments)):
+            logger.debug("arguments[%s]: %s", index, arguments[index])
 
     try:
         # Should be done like here: http://stackoverflow.com/questions/3617052/escape-string-python-for-mysql/27575399#27575399
         cursor.execute(sql_query, (arguments))
 
     except Exception as exp:
-        logger.debug('Error in SQL query execution: ' + repr(exp))
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
         raise
 
     try:
         last_id = str(cursor.lastrowid)
     except Exception as exp:
-        logger.debug('cursor.lastrowid not found: ' + repr(exp))
+        logger.debug('cursor.lastrowid not found: %s', lazy_repr(exp))
         raise
     else:
-        logger.debug('cursor.lastrowid: ' + last_id)
+        logger.debug('cursor.lastrowid: %s', last_id)
 
         return cursor, last_id
 
 
+def execute_sql_insert_many(cursor=None, sql_query=None, arguments=None):
+    """
+    :param cursor:
+    :param sql_query: INSERT query with single VALUES (%s, ...) placeholder group
+    :param arguments: List of argument tuples, one tuple per row
+    :return: cursor:
+    :return: last_ids: List of inserted row ids in the same order as arguments
+
+    Multi-row INSERT to MySQL
+
+    VALUES placeholder group of sql_query is repeated once per row and query is executed as single INSERT.
+    MySQL returns id of the first inserted row as lastrowid. Ids of the other rows are consecutive only with
+    innodb_autoinc_lock_mode 0 or 1 and auto_increment_increment 1. Connection pool checks these for each
+    connection, and with other settings rows are inserted one by one.
+    """
+
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if sql_query is None:
+        raise AttributeError("Provide sql_query as parameter")
+    if arguments is None:
+        raise AttributeError("Provide arguments as parameter")
+
+    last_ids = []
+
+    if len(arguments) == 0:
+        return cursor, last_ids
+
+    if not getattr(cursor.connection, 'consecutive_insert_ids', False):
+        for row in arguments:
+            try:
+                cursor.execute(sql_query, row)
+                last_ids.append(str(int(cursor.lastrowid)))
+            except Exception as exp:
+                logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
+                raise
+        logger.debug('last_ids: %s - %s', last_ids[0], last_ids[-1])
+        return cursor, last_ids
+
+    try:
+        query_head, values_template = sql_query.rsplit(" VALUES ", 1)
+        sql_query = query_head + " VALUES " + ", ".join([values_template] * len(arguments))
+        flat_arguments = tuple(argument for row in arguments for argument in row)
+    except Exception as exp:
+        logger.debug('Could not build multi-row INSERT: %s', lazy_repr(exp))
+        raise
+
+    if app.config["SUPER_DEBUG"]:
+        logger.debug('sql_query: %s VALUES %s x %s', query_head, values_template, len(arguments))
+
+    try:
+        cursor.execute(sql_query, flat_arguments)
+    except Exception as exp:
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
+        raise
+
+    try:
+        first_id = int(cursor.lastrowid)
+        if cursor.rowcount != len(arguments):
+            raise ValueError("Inserted " + str(cursor.rowcount) + " rows instead of " + str(len(arguments)))
+    except Exception as exp:
+        logger.debug('cursor.lastrowid not found: %s', lazy_repr(exp))
+        raise
+    else:
+        last_ids = [str(first_id + index) for index in range(len(arguments))]
+        logger.debug('last_ids: %s - %s', last_ids[0], last_ids[-1])
+
+        return cursor, last_ids
+
+
 def execute_sql_select(cursor=None, sql_query=None):
     """
     :param cursor:
@@ -104,23 +238,23 @@ def execute_sql_select(cursor=None, sql_query=None):
     """
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
 
     try:
         cursor.execute(sql_query)
 
     except Exception as exp:
-        logger.debug('Error in SQL query execution: ' + repr(exp))
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
         raise
 
     try:
         data = cursor.fetchall()
     except Exception as exp:
-        logger.debug('cursor.fetchall() failed: ' + repr(exp))
+        logger.debug('cursor.fetchall() failed: %s', lazy_repr(exp))
         data = 'No content'
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('data ' + repr(data))
+        logger.debug('data %s', lazy_repr(data))
 
     return cursor, data
 
@@ -136,23 +270,23 @@ def execute_sql_select_2(cursor=None, sql_query=None, arguments=None):
     """
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
 
     try:
         cursor.execute(sql_query, (arguments))
 
     except Exception as exp:
-        logger.debug('Error in SQL query execution: ' + repr(exp))
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
         raise
 
     try:
         data = cursor.fetchall()
     except Exception as exp:
-        logger.debug('cursor.fetchall() failed: ' + repr(exp))
+        logger.debug('cursor.fetchall() failed: %s', lazy_repr(exp))
         data = 'No content'
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('data ' + repr(data))
+        logger.debug('data %s', lazy_repr(data))
 
     return cursor, data
 
@@ -170,27 +304,27 @@ def execute_sql_count(cursor=None, sql_query=None):
     consent_count = 0
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('sql_query: ' + repr(sql_query))
+        logger.debug('sql_query: %s', lazy_repr(sql_query))
 
     try:
         cursor.execute(sql_query)
 
     except Exception as exp:
-        logger.debug('Error in SQL query execution: ' + repr(exp))
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
         raise
 
     try:
         data = cursor.fetchone()
         if app.config["SUPER_DEBUG"]:
-            logger.debug('data: ' + repr(data))
+            logger.debug('data: %s', lazy_repr(data))
 
         consent_count = int(data[0])
 
     except Exception as exp:
-        logger.debug('cursor.fetchone() failed: ' + repr(exp))
+        logger.debug('cursor.fetchone() failed: %s', lazy_repr(exp))
 
     if app.config["SUPER_DEBUG"]:
-        logger.debug('data ' + repr(data))
+        logger.debug('data %s', lazy_repr(data))
 
     return cursor, consent_count
 
@@ -205,7 +339,7 @@ def drop_table_content():
     try:
         cursor = get_db_cursor()
     except Exception as exp:
-        logger.debug('Could not get db cursor: ' + repr(exp))
+        logger.debug('Could not get db cursor: %s', lazy_repr(exp))
         raise
 
     sql_query = "SELECT Concat('TRUNCATE TABLE ',table_schema,'.',TABLE_NAME, ';') " \
@@ -217,23 +351,23 @@ def drop_table_content():
     try:
         cursor.execute(sql_query)
     except Exception as exp:
-        logger.debug('Error in SQL query execution: ' + repr(exp))
+        logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
         db.connection.rollback()
         raise
     else:
         sql_queries = cursor.fetchall()
-        logger.debug("Fetched sql_queries: " + repr(sql_queries))
+        logger.debug("Fetched sql_queries: %s", lazy_repr(sql_queries))
 
         try:
             logger.debug("SET FOREIGN_KEY_CHECKS = 0;")
             cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
 
             for query in sql_queries:
-                logger.debug("Executing: " + str(query[0]))
+                logger.debug("Executing: %s", query[0])
                 sql_query = str(query[0])
                 cursor.execute(sql_query)
         except Exception as exp:
-            logger.debug('Error in SQL query execution: ' + repr(exp))
+            logger.debug('Error in SQL query execution: %s', lazy_repr(exp))
             db.connection.rollback()
 
             logger.debug("SET FOREIGN_KEY_CHECKS = 1;")
@@ -248,3 +382,188 @@ def drop_table_content():
             cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
 
             return True
+
+
+class SqliteEngine(object):
+    """
+    Long-lived SQLite connections, one per thread.
+
+    Connections are opened once per thread and process and reused by later operations, so they must not be closed
+    by callers. Database is used in WAL mode, which lets readers run concurrently with a writer, and writers wait
+    up to busy_timeout for each other instead of failing with "database is locked".
+    Schema is initialized once per process with CREATE TABLE IF NOT EXISTS statements.
+    Migrations are functions that get connection and bring existing database up to date, they are run after schema
+    statements and must be idempotent.
+    """
+
+    def __init__(self, database=None, schema=None, busy_timeout=5.0, cached_statements=100, migrations=()):
+        if database is None:
+            raise AttributeError("Provide database as parameter")
+        if schema is None:
+            raise AttributeError("Provide schema as parameter")
+
+        self.database = database
+        self.schema = schema
+        self.migrations = migrations
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized_pid = None
+        self._connections_opened = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database, timeout=self.busy_timeout, cached_statements=self.cached_statements)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL;")
+            connection.execute("PRAGMA synchronous=NORMAL;")
+            connection.execute("PRAGMA busy_timeout=" + str(int(self.busy_timeout * 1000)) + ";")
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _init_schema(self, connection=None):
+        pid = os.getpid()
+        if self._initialized_pid == pid:
+            return
+        with self._lock:
+            if self._initialized_pid == pid:
+                return
+            try:
+                for sql_query in self.schema:
+                    connection.execute(sql_query)
+                for migration in self.migrations:
+                    migration(connection)
+            except Exception:
+                connection.rollback()
+                raise
+            else:
+                connection.commit()
+                self._initialized_pid = pid
+
+    def connection(self):
+        """
+        Connection of current thread. Connection is opened on first call.
+
+        :return: Database connection object
+        """
+        pid = os.getpid()
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != pid:
+            # Connections inherited from parent process are not used after fork
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = pid
+            with self._lock:
+                self._connections_opened += 1
+
+        self._init_schema(connection=connection)
+        return connection
+
+    def stats(self):
+        """
+        Gauges and counters of the engine.
+
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'database': self.database,
+                'connections_opened': self._connections_opened,
+                'busy_timeout': self.busy_timeout,
+            }
+
+
+class ShardedSqliteEngine(object):
+    """
+    SQLite database partitioned into shard files by shard key, such as account ID.
+
+    Each shard is separate database file with its own SqliteEngine, so that writes to different shards are not
+    serialized behind one write lock. Shard of key is CRC32 of the key modulo number of shards, which stays the same
+    across processes and restarts. With one shard the database file is used as such.
+    """
+
+    def __init__(self, database=None, schema=None, shards=1, busy_timeout=5.0, cached_statements=100):
+        if database is None:
+            raise AttributeError("Provide database as parameter")
+        if schema is None:
+            raise AttributeError("Provide schema as parameter")
+        if shards < 1:
+            raise AttributeError("Illegal value for shards: " + str(shards))
+
+        self.database = database
+        self.shards = shards
+        self.engines = [
+            SqliteEngine(
+                database=self.shard_database(database=database, shards=shards, index=index),
+                schema=schema,
+                busy_timeout=busy_timeout,
+                cached_statements=cached_statements
+            )
+            for index in range(shards)
+        ]
+
+    @staticmethod
+    def shard_database(database=None, shards=1, index=0):
+        """
+        Path of shard file. Number of shards is part of the name, so that layouts can coexist while resharding.
+
+        :return: Path of database file
+        """
+        if shards == 1:
+            return database
+        root, extension = os.path.splitext(database)
+        return root + '.' + str(index) + '-of-' + str(shards) + extension
+
+    def shard_index(self, shard_key=None):
+        if shard_key is None:
+            raise AttributeError("Provide shard_key as parameter")
+        return (zlib.crc32(str(shard_key).encode('utf-8')) & 0xffffffff) % self.shards
+
+    def engine(self, shard_key=None):
+        """
+        :param shard_key: Key that selects the shard, such as account ID
+        :return: SqliteEngine of shard
+        """
+        return self.engines[self.shard_index(shard_key=shard_key)]
+
+    def connection(self, shard_key=None):
+        """
+        Connection of current thread to shard of shard_key.
+
+        :param shard_key: Key that selects the shard, such as account ID
+        :return: Database connection object
+        """
+        return self.engine(shard_key=shard_key).connection()
+
+    def partition(self, items=None, shard_key=None):
+        """
+        Groups items by shard.
+
+        :param items: Iterable of items
+        :param shard_key: Function that returns shard key of item
+        :return: dict of shard index and list of items, items keep their order
+        """
+        if items is None:
+            raise AttributeError("Provide items as parameter")
+        if shard_key is None:
+            raise AttributeError("Provide shard_key as parameter")
+
+        partitions = {}
+        for item in items:
+            partitions.setdefault(self.shard_index(shard_key=shard_key(item)), []).append(item)
+        return partitions
+
+    def stats(self):
+        """
+        Gauges and counters of the shards.
+
+        :return: dict
+        """
+        return {
+            'database': self.database,
+            'shards': self.shards,
+            'engines': [engine.stats() for engine in self.engines],
+        }
@@ -3,6 +3,8 @@
 # Import dependencies
 import uuid
 import logging
+from collections import namedtuple
+
 import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/bcrypt/2.0.0
 
 # Import the database object from the main app module
@@ -11,12 +13,52 @@ from flask import json
 from app import db, api, login_manager, app
 
 # create logger with 'spam_application'
-from app.helpers import get_custom_logger
-from app.mod_database.helpers import execute_sql_insert, execute_sql_insert_2, execute_sql_select_2
+from app.helpers import get_custom_logger, lazy_repr
+from app.mod_database.helpers import execute_sql_insert, execute_sql_insert_2, execute_sql_select_2, \
+    execute_sql_insert_many, build_sql_where_clause, MATCH_EXACT
 
 logger = get_custom_logger(__name__)
 
 
+def bulk_insert_objects(cursor=None, objects=None, table=None, columns=None):
+    """
+    Inserts model objects to table with one multi-row INSERT and sets id of each object.
+
+    :param cursor: Database cursor
+    :param objects: List of model objects
+    :param table: Name of database table
+    :param columns: Tuple of (column name, value placeholder, function that returns value of object) tuples
+    :return: Database cursor and list of inserted ids
+    """
+    if cursor is None:
+        raise AttributeError("Provide cursor as parameter")
+    if objects is None:
+        raise AttributeError("Provide objects as parameter")
+    if table is None:
+        raise AttributeError("Provide table as parameter")
+    if columns is None:
+        raise AttributeError("Provide columns as parameter")
+
+    sql_query = "INSERT INTO " + table + " (" + \
+                ", ".join([column for column, placeholder, value in columns]) + \
+                ") VALUES (" + \
+                ", ".join([placeholder for column, placeholder, value in columns]) + \
+                ")"
+
+    arguments = [tuple([value(obj) for column, placeholder, value in columns]) for obj in objects]
+
+    try:
+        logger.info("Inserting " + str(len(arguments)) + " rows to " + table)
+        cursor, last_ids = execute_sql_insert_many(cursor=cursor, sql_query=sql_query, arguments=arguments)
+    except Exception as exp:
+        logger.debug('sql_query: %s', lazy_repr(exp))
+        raise
+    else:
+        for obj, last_id in zip(objects, last_ids):
+            obj.id = last_id
+        return cursor, last_ids
+
+
 ##########################################
 ##########################################
 ##########################################
@@ -59,11 +101,11 @@ class Account():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         return dictionary
 
@@ -82,35 +124,56 @@ class Account():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('globalIdenttifyer', "%s", lambda obj: obj.global_identifier),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple Account objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of Account objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="Accounts", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('globalIdenttifyer', self.global_identifier),
+            ('activated', self.activated),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, globalIdenttifyer, activated " \
                     "FROM MyDataAccount.Accounts " \
-                    "WHERE id LIKE %s AND globalIdenttifyer LIKE %s AND activated LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.global_identifier) + '%',
-            '%' + str(self.activated) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -178,11 +241,11 @@ class LocalIdentity():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['accounts_id']
         return dictionary
@@ -204,36 +267,59 @@ class LocalIdentity():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('username', "%s", lambda obj: obj.username),
+        ('Accounts_id', "%s", lambda obj: obj.accounts_id),
+        ('LocalIdentityPWDs_id', "%s", lambda obj: obj.pwd_id),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple LocalIdentity objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of LocalIdentity objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="LocalIdentities", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('username', self.username),
+            ('LocalIdentityPWDs_id', self.pwd_id),
+            ('Accounts_id', self.accounts_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, username, LocalIdentityPWDs_id, Accounts_id " \
                     "FROM MyDataAccount.LocalIdentities " \
-                    "WHERE id LIKE %s AND username LIKE %s AND LocalIdentityPWDs_id LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.username) + '%',
-            '%' + str(self.pwd_id) + '%',
-            '%' + str(self.accounts_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -279,11 +365,11 @@ class LocalIdentityPWD():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         return dictionary
 
@@ -302,34 +388,55 @@ class LocalIdentityPWD():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('password', "%s", lambda obj: obj.password),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple LocalIdentityPWD objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of LocalIdentityPWD objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="LocalIdentityPWDs", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('password', self.password),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, password " \
                     "FROM MyDataAccount.LocalIdentityPWDs " \
-                    "WHERE id LIKE %s AND password LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.password) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -415,11 +522,11 @@ class OneTimeCookie():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         return dictionary
 
@@ -440,39 +547,44 @@ class OneTimeCookie():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('oneTimeCookie', self.cookie),
+            ('used', self.used),
+            ('created', self.created),
+            ('updated', self.updated),
+            ('LocalIdentities_id', self.identity_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, oneTimeCookie, used, created, updated, LocalIdentities_id " \
                     "FROM MyDataAccount.OneTimeCookies " \
-                    "WHERE id LIKE %s AND oneTimeCookie LIKE %s AND used LIKE %s AND created LIKE %s " \
-                    "AND updated LIKE %s AND LocalIdentities_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.cookie) + '%',
-            '%' + str(self.used) + '%',
-            '%' + str(self.created) + '%',
-            '%' + str(self.updated) + '%',
-            '%' + str(self.identity_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -533,11 +645,11 @@ class Salt():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         return dictionary
 
@@ -557,35 +669,57 @@ class Salt():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('salt', "%s", lambda obj: obj.salt),
+        ('LocalIdentities_id', "%s", lambda obj: obj.identity_id),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple Salt objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of Salt objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="Salts", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('salt', self.salt),
+            ('LocalIdentities_id', self.identity_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, salt, LocalIdentities_id " \
                     "FROM MyDataAccount.Salts " \
-                    "WHERE id LIKE %s AND salt LIKE %s AND LocalIdentities_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.salt) + '%',
-            '%' + str(self.identity_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -679,11 +813,11 @@ class Particulars():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -708,39 +842,63 @@ class Particulars():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('firstname', "%s", lambda obj: obj.firstname),
+        ('lastname', "%s", lambda obj: obj.lastname),
+        ('dateOfBirth', "STR_TO_DATE(%s, '%%d-%%m-%%Y')", lambda obj: obj.date_of_birth),
+        ('img_url', "%s", lambda obj: obj.img_url),
+        ('Accounts_id', "%s", lambda obj: obj.account_id),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple Particulars objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of Particulars objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="Particulars", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('firstname', self.firstname),
+            ('lastname', self.lastname),
+            ('dateOfBirth', self.date_of_birth),
+            ('img_url', self.img_url),
+            ('Accounts_id', self.account_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, firstname, lastname, dateOfBirth, img_url, Accounts_id " \
                     "FROM MyDataAccount.Particulars " \
-                    "WHERE id LIKE %s AND firstname LIKE %s AND lastname LIKE %s AND dateOfBirth LIKE %s " \
-                    "AND img_url LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.firstname) + '%',
-            '%' + str(self.lastname) + '%',
-            '%' + str(self.date_of_birth) + '%',
-            '%' + str(self.img_url) + '%',
-            '%' + str(self.account_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -823,11 +981,11 @@ class Email():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -849,37 +1007,61 @@ class Email():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('email', "%s", lambda obj: obj.email),
+        ('typeEnum', "%s", lambda obj: obj.type),
+        ('prime', "%s", lambda obj: obj.prime),
+        ('Accounts_id', "%s", lambda obj: obj.account_id),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple Email objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of Email objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="Emails", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
-        sql_query = "SELECT id, email, typeEnum, prime, Accounts_id " \
-                    "FROM MyDataAccount.Particulars " \
-                    "WHERE id LIKE %s AND email LIKE %s AND typeEnum LIKE %s AND prime LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.email) + '%',
-            '%' + str(self.type) + '%',
-            '%' + str(self.prime) + '%',
-            '%' + str(self.account_id) + '%',
+        criteria = (
+            ('id', self.id),
+            ('email', self.email),
+            ('typeEnum', self.type),
+            ('prime', self.prime),
+            ('Accounts_id', self.account_id),
         )
 
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
+        sql_query = "SELECT id, email, typeEnum, prime, Accounts_id " \
+                    "FROM MyDataAccount.Emails " \
+                    "WHERE " + where_clause + ";"
+
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -960,11 +1142,11 @@ class Telephone():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -986,37 +1168,43 @@ class Telephone():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
-        sql_query = "SELECT id, tel, typeEnum, prime, Accounts_id " \
-                    "FROM MyDataAccount.Particulars " \
-                    "WHERE id LIKE %s AND tel LIKE %s AND typeEnum LIKE %s AND prime LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.tel) + '%',
-            '%' + str(self.type) + '%',
-            '%' + str(self.prime) + '%',
-            '%' + str(self.account_id) + '%',
+        criteria = (
+            ('id', self.id),
+            ('tel', self.tel),
+            ('typeEnum', self.type),
+            ('prime', self.prime),
+            ('Accounts_id', self.account_id),
         )
 
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
+        sql_query = "SELECT id, tel, typeEnum, prime, Accounts_id " \
+                    "FROM MyDataAccount.Telephones " \
+                    "WHERE " + where_clause + ";"
+
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -1088,11 +1276,11 @@ class Settings():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -1114,34 +1302,40 @@ class Settings():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
+        criteria = (
+            ('id', self.id),
+            ('key', self.key),
+            ('value', self.value),
+            ('Accounts_id', self.account_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, key, value, Accounts_id " \
                     "FROM MyDataAccount.Settings " \
-                    "WHERE id LIKE %s AND key LIKE %s AND value LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.key) + '%',
-            '%' + str(self.value) + '%',
-            '%' + str(self.account_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -1220,11 +1414,11 @@ class EventLog():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -1246,37 +1440,43 @@ class EventLog():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('actor', self.actor),
+            ('event', self.event),
+            ('created', self.created),
+            ('Accounts_id', self.account_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, actor, event, created, Accounts_id " \
                     "FROM MyDataAccount.EventLogs " \
-                    "WHERE id LIKE %s AND actor LIKE %s AND event LIKE %s AND created LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.actor) + '%',
-            '%' + str(self.event) + '%',
-            '%' + str(self.created) + '%',
-            '%' + str(self.account_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -1412,11 +1612,11 @@ class Contacts():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -1438,44 +1638,48 @@ class Contacts():
         try:
             cursor, last_id = execute_sql_insert(cursor=cursor, sql_query=sql_query)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
-        sql_query = "SELECT id, address1, address2, postal_code, city, state, country, typeEnum, prime, Accounts_id " \
-                    "FROM MyDataAccount.Contacts " \
-                    "WHERE id LIKE %s AND address1 LIKE %s AND address2 LIKE %s AND postal_code LIKE %s " \
-                    "AND city LIKE %s AND state LIKE %s AND country LIKE %s AND typeEnum LIKE %s " \
-                    "AND prime LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.address1) + '%',
-            '%' + str(self.address2) + '%',
-            '%' + str(self.postal_code) + '%',
-            '%' + str(self.city) + '%',
-            '%' + str(self.state) + '%',
-            '%' + str(self.country) + '%',
-            '%' + str(self.typeEnum) + '%',
-            '%' + str(self.prime) + '%',
-            '%' + str(self.account_id) + '%',
+        criteria = (
+            ('id', self.id),
+            ('address1', self.address1),
+            ('address2', self.address2),
+            ('postalCode', self.postal_code),
+            ('city', self.city),
+            ('state', self.state),
+            ('country', self.country),
+            ('typeEnum', self.type),
+            ('prime', self.prime),
+            ('Accounts_id', self.account_id),
         )
 
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
+        sql_query = "SELECT id, address1, address2, postalCode, city, state, country, typeEnum, prime, Accounts_id " \
+                    "FROM MyDataAccount.Contacts " \
+                    "WHERE " + where_clause + ";"
+
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -1588,11 +1792,11 @@ class ServiceLinkRecord():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['account_id']
         return dictionary
@@ -1634,38 +1838,63 @@ class ServiceLinkRecord():
             logger.info("Inserting to ServiceLinkRecords")
             cursor, last_id = execute_sql_insert_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=""):
+    BULK_INSERT_COLUMNS = (
+        ('serviceLinkRecord', "%s", lambda obj: str(obj.service_link_record)),
+        ('serviceLinkRecordId', "%s", lambda obj: str(obj.service_link_record_id)),
+        ('serviceId', "%s", lambda obj: str(obj.service_id)),
+        ('surrogateId', "%s", lambda obj: str(obj.surrogate_id)),
+        ('operatorId', "%s", lambda obj: str(obj.operator_id)),
+        ('Accounts_id', "%s", lambda obj: str(obj.account_id)),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple ServiceLinkRecord objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of ServiceLinkRecord objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="ServiceLinkRecords", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor="", match=MATCH_EXACT):
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('serviceLinkRecord', self.service_link_record),
+            ('serviceLinkRecordId', self.service_link_record_id),
+            ('serviceId', self.service_id),
+            ('surrogateId', self.surrogate_id),
+            ('operatorId', self.operator_id),
+            ('Accounts_id', self.account_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, serviceLinkRecord, Accounts_id, serviceLinkRecordId, serviceId, surrogateId, operatorId  " \
                     "FROM MyDataAccount.ServiceLinkRecords " \
-                    "WHERE id LIKE %s AND serviceLinkRecord LIKE %s AND serviceLinkRecordId LIKE %s AND " \
-                    "serviceId LIKE %s AND surrogateId LIKE %s AND operatorId LIKE %s AND Accounts_id LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.service_link_record) + '%',
-            '%' + str(self.service_link_record_id) + '%',
-            '%' + str(self.service_id) + '%',
-            '%' + str(self.surrogate_id) + '%',
-            '%' + str(self.operator_id) + '%',
-            '%' + str(self.account_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("ServiceLinkRecord could not be found with provided information")
             if len(data[0]):
@@ -1686,6 +1915,72 @@ class ServiceLinkRecord():
                 self.operator_id = data[6]
             return cursor
 
+    @classmethod
+    def bulk_from_db(cls, cursor=None, objects=None):
+        """
+        Fetches multiple ServiceLinkRecord objects with one query.
+        Each object is matched with exact match against the fields that are set.
+
+        :param cursor: Database cursor
+        :param objects: List of ServiceLinkRecord objects
+        :return: Database cursor
+        """
+        if cursor is None:
+            raise AttributeError("Provide cursor as parameter")
+        if objects is None:
+            raise AttributeError("Provide objects as parameter")
+
+        columns = ('id', 'serviceLinkRecord', 'Accounts_id', 'serviceLinkRecordId', 'serviceId', 'surrogateId', 'operatorId')
+
+        criteria_list = []
+        where_clauses = []
+        arguments = ()
+        for obj in objects:
+            criteria = (
+                ('id', obj.id),
+                ('serviceLinkRecord', obj.service_link_record),
+                ('serviceLinkRecordId', obj.service_link_record_id),
+                ('serviceId', obj.service_id),
+                ('surrogateId', obj.surrogate_id),
+                ('operatorId', obj.operator_id),
+                ('Accounts_id', obj.account_id),
+            )
+            try:
+                where_clause, obj_arguments = build_sql_where_clause(criteria=criteria, match=MATCH_EXACT)
+            except Exception as exp:
+                logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+                raise
+            criteria_list.append(criteria)
+            where_clauses.append("(" + where_clause + ")")
+            arguments += obj_arguments
+
+        sql_query = "SELECT " + ", ".join(columns) + " " \
+                    "FROM MyDataAccount.ServiceLinkRecords " \
+                    "WHERE " + " OR ".join(where_clauses) + ";"
+
+        try:
+            cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
+        except Exception as exp:
+            logger.debug('sql_query: %s', lazy_repr(exp))
+            raise
+        else:
+            logger.debug("Got " + str(len(data)) + " rows")
+            for obj, criteria in zip(objects, criteria_list):
+                for row in data:
+                    row_dict = dict(zip(columns, row))
+                    if all(str(row_dict[column]) == str(value) for column, value in criteria if value not in (None, "")):
+                        obj.id = row_dict['id']
+                        obj.service_link_record = row_dict['serviceLinkRecord']
+                        obj.account_id = row_dict['Accounts_id']
+                        obj.service_link_record_id = row_dict['serviceLinkRecordId']
+                        obj.service_id = row_dict['serviceId']
+                        obj.surrogate_id = row_dict['surrogateId']
+                        obj.operator_id = row_dict['operatorId']
+                        break
+                else:
+                    raise IndexError("ServiceLinkRecord could not be found with provided information: " + repr(criteria))
+            return cursor
+
 
 class ServiceLinkStatusRecord():
     id = None
@@ -1781,11 +2076,11 @@ class ServiceLinkStatusRecord():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['service_link_records_id']
         return dictionary
@@ -1828,43 +2123,68 @@ class ServiceLinkStatusRecord():
             logger.info("Inserting to ServiceLinkStatusRecords")
             cursor, last_id = execute_sql_insert_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('serviceLinkStatusRecordId', "%s", lambda obj: str(obj.service_link_status_record_id)),
+        ('serviceLinkStatus', "%s", lambda obj: str(obj.status)),
+        ('serviceLinkStatusRecord', "%s", lambda obj: str(obj.service_link_status_record)),
+        ('ServiceLinkRecords_id', "%s", lambda obj: int(obj.service_link_records_id)),
+        ('serviceLinkRecordId', "%s", lambda obj: str(obj.service_link_record_id)),
+        ('issued_at', "%s", lambda obj: str(obj.issued_at)),
+        ('prevRecordId', "%s", lambda obj: str(obj.prev_record_id)),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple ServiceLinkStatusRecord objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of ServiceLinkStatusRecord objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="ServiceLinkStatusRecords", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('serviceLinkStatus', self.status),
+            ('serviceLinkStatusRecord', self.service_link_status_record),
+            ('ServiceLinkRecords_id', self.service_link_records_id),
+            ('serviceLinkRecordId', self.service_link_record_id),
+            ('issued_at', self.issued_at),
+            ('prevRecordId', self.prev_record_id),
+            ('serviceLinkStatusRecordId', self.service_link_status_record_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, serviceLinkStatus, serviceLinkStatusRecord, ServiceLinkRecords_id, serviceLinkRecordId, " \
                     "issued_at, prevRecordId, serviceLinkStatusRecordId " \
                     "FROM MyDataAccount.ServiceLinkStatusRecords " \
-                    "WHERE id LIKE %s AND serviceLinkStatus LIKE %s AND serviceLinkStatusRecord LIKE %s AND " \
-                    "ServiceLinkRecords_id LIKE %s AND serviceLinkRecordId LIKE %s AND issued_at LIKE %s AND " \
-                    "prevRecordId LIKE %s AND serviceLinkStatusRecordId LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.status) + '%',
-            '%' + str(self.service_link_status_record) + '%',
-            '%' + str(self.service_link_records_id) + '%',
-            '%' + str(self.service_link_record_id) + '%',
-            '%' + str(self.issued_at) + '%',
-            '%' + str(self.prev_record_id) + '%',
-            '%' + str(self.service_link_status_record_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -1928,11 +2248,11 @@ class SurrogateId():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         return dictionary
 
@@ -1944,24 +2264,30 @@ class SurrogateId():
     def log_entry(self):
         return str(self.__class__.__name__) + " object " + str(self.to_json)
 
-    def from_db(self, cursor=""):
+    def from_db(self, cursor="", match=MATCH_EXACT):
+
+        criteria = (
+            ('serviceId', self.service_id),
+            ('Accounts_id', self.account_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
 
         sql_query = "SELECT surrogateId, serviceLinkRecordId " \
                     "FROM MyDataAccount.ServiceLinkRecords " \
-                    "WHERE serviceId LIKE %s AND Accounts_id LIKE %s ORDER BY id DESC LIMIT 1;"
-
-        arguments = (
-            '%' + str(self.service_id) + '%',
-            '%' + str(self.account_id) + '%',
-        )
+                    "WHERE " + where_clause + " ORDER BY id DESC LIMIT 1;"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("Surrogate Id and serviceLinkRecordId could not be found with provided information")
             if len(data[0]):
@@ -2070,11 +2396,11 @@ class ConsentRecord():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['service_link_records_id']
         return dictionary
@@ -2115,40 +2441,66 @@ class ConsentRecord():
             logger.info("Inserting to ConsentRecords")
             cursor, last_id = execute_sql_insert_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=""):
+    BULK_INSERT_COLUMNS = (
+        ('consentRecord', "%s", lambda obj: str(obj.consent_record)),
+        ('surrogateId', "%s", lambda obj: str(obj.surrogate_id)),
+        ('consentRecordId', "%s", lambda obj: str(obj.consent_id)),
+        ('ResourceSetId', "%s", lambda obj: str(obj.resource_set_id)),
+        ('serviceLinkRecordId', "%s", lambda obj: str(obj.service_link_record_id)),
+        ('subjectId', "%s", lambda obj: str(obj.subject_id)),
+        ('ServiceLinkRecords_id', "%s", lambda obj: str(obj.service_link_records_id)),
+        ('role', "%s", lambda obj: str(obj.role)),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple ConsentRecord objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of ConsentRecord objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="ConsentRecords", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor="", match=MATCH_EXACT):
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('ServiceLinkRecords_id', self.service_link_records_id),
+            ('surrogateId', self.surrogate_id),
+            ('consentRecordId', self.consent_id),
+            ('ResourceSetId', self.resource_set_id),
+            ('serviceLinkRecordId', self.service_link_record_id),
+            ('subjectId', self.subject_id),
+            ('role', self.role),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, consentRecord, ServiceLinkRecords_id, surrogateId, consentRecordId, ResourceSetId, serviceLinkRecordId, subjectId, role " \
                     "FROM MyDataAccount.ConsentRecords " \
-                    "WHERE id LIKE %s AND ServiceLinkRecords_id LIKE %s AND surrogateId LIKE %s AND " \
-                    "consentRecordId LIKE %s AND ResourceSetId LIKE %s AND serviceLinkRecordId LIKE %s AND " \
-                    "subjectId LIKE %s AND role LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.service_link_records_id) + '%',
-            '%' + str(self.surrogate_id) + '%',
-            '%' + str(self.consent_id) + '%',
-            '%' + str(self.resource_set_id) + '%',
-            '%' + str(self.service_link_record_id) + '%',
-            '%' + str(self.subject_id) + '%',
-            '%' + str(self.role) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("Surrogate Id and serviceLinkRecordId could not be found with provided information")
             if len(data[0]):
@@ -2175,7 +2527,7 @@ class ConsentRecord():
             try:
                 self.consent_record = json.loads(self.consent_record)
             except Exception as exp:
-                logger.debug('Could not load json from consent_record: ' + repr(exp))
+                logger.debug('Could not load json from consent_record: %s', lazy_repr(exp))
                 raise
 
             return cursor
@@ -2264,11 +2616,11 @@ class ConsentStatusRecord():
 
     @property
     def to_dict(self):
-        return self.__dict__
+        return dict(self.__dict__)
 
     @property
     def to_dict_external(self):
-        dictionary = self.__dict__
+        dictionary = dict(self.__dict__)
         del dictionary['id']
         del dictionary['consent_records_id']
         return dictionary
@@ -2305,42 +2657,66 @@ class ConsentStatusRecord():
             logger.info("Inserting to ConsentStatusRecords")
             cursor, last_id = execute_sql_insert_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
             self.id = last_id
             return cursor
 
-    def from_db(self, cursor=None):
+    BULK_INSERT_COLUMNS = (
+        ('consentStatus', "%s", lambda obj: str(obj.status)),
+        ('consentStatusRecord', "%s", lambda obj: str(obj.consent_status_record)),
+        ('ConsentRecords_id', "%s", lambda obj: str(obj.consent_records_id)),
+        ('consentRecordId', "%s", lambda obj: str(obj.consent_record_id)),
+        ('issued_at', "%s", lambda obj: str(obj.issued_at)),
+        ('prevRecordId', "%s", lambda obj: str(obj.prev_record_id)),
+    )
+
+    @classmethod
+    def bulk_to_db(cls, cursor=None, objects=None):
+        """
+        Inserts multiple ConsentStatusRecord objects with one multi-row INSERT and sets id of each object.
+
+        :param cursor: Database cursor
+        :param objects: List of ConsentStatusRecord objects
+        :return: Database cursor and list of inserted ids
+        """
+        return bulk_insert_objects(cursor=cursor, objects=objects, table="ConsentStatusRecords", columns=cls.BULK_INSERT_COLUMNS)
+
+    def from_db(self, cursor=None, match=MATCH_EXACT):
         if cursor is None:
             raise AttributeError("Provide cursor as parameter")
 
         # TODO: Don't allow if role is only criteria
 
+        criteria = (
+            ('id', self.id),
+            ('consentStatus', self.status),
+            ('consentStatusRecord', self.consent_status_record),
+            ('ConsentRecords_id', self.consent_records_id),
+            ('consentRecordId', self.consent_record_id),
+            ('issued_at', self.issued_at),
+            ('prevRecordId', self.prev_record_id),
+        )
+
+        try:
+            where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+        except Exception as exp:
+            logger.debug('build_sql_where_clause: %s', lazy_repr(exp))
+            raise
+
         sql_query = "SELECT id, consentStatus, consentStatusRecord, ConsentRecords_id, consentRecordId, " \
                     "issued_at, prevRecordId " \
                     "FROM MyDataAccount.ConsentStatusRecords " \
-                    "WHERE id LIKE %s AND consentStatus LIKE %s AND consentStatusRecord LIKE %s AND " \
-                    "ConsentRecords_id LIKE %s AND consentRecordId LIKE %s AND issued_at LIKE %s AND " \
-                    "prevRecordId LIKE %s;"
-
-        arguments = (
-            '%' + str(self.id) + '%',
-            '%' + str(self.status) + '%',
-            '%' + str(self.consent_status_record) + '%',
-            '%' + str(self.consent_records_id) + '%',
-            '%' + str(self.consent_record_id) + '%',
-            '%' + str(self.issued_at) + '%',
-            '%' + str(self.prev_record_id) + '%',
-        )
+                    "WHERE " + where_clause + ";"
 
         try:
             cursor, data = execute_sql_select_2(cursor=cursor, sql_query=sql_query, arguments=arguments)
         except Exception as exp:
-            logger.debug('sql_query: ' + repr(exp))
+            logger.debug('sql_query: %s', lazy_repr(exp))
             raise
         else:
-            logger.debug("Got data: " + repr(data))
+            logger.debug("Got data: %s", lazy_repr(data))
             if len(data) == 0:
                 raise IndexError("DB query returned no results")
             if len(data[0]):
@@ -2362,3 +2738,51 @@ class ConsentStatusRecord():
 
             return cursor
 
+
+##########################################
+# Rows
+##########################################
+class RowMixin(object):
+    """
+    Read-only record for listing queries. Rows are created straight from cursor.fetchall() tuples.
+    Dictionary and JSON views are new objects, so they can be modified freely.
+    """
+    __slots__ = ()
+    external_exclude = ()
+
+    @classmethod
+    def from_rows(cls, rows=None):
+        if rows is None:
+            raise AttributeError("Provide rows as parameter")
+        return [cls._make(row) for row in rows]
+
+    @property
+    def to_dict(self):
+        return dict(zip(self._fields, self))
+
+    @property
+    def to_dict_external(self):
+        return dict((field, value) for field, value in zip(self._fields, self) if field not in self.external_exclude)
+
+    @property
+    def to_json(self):
+        return json.dumps(self.to_dict)
+
+    @property
+    def log_entry(self):
+        return str(self.__class__.__name__) + " object " + str(self.to_json)
+
+
+class ContactRow(RowMixin, namedtuple('ContactRow', ['id', 'address1', 'address2', 'postal_code', 'city', 'state', 'country', 'type', 'prime'])):
+    __slots__ = ()
+    external_exclude = ('id',)
+
+
+class EmailRow(RowMixin, namedtuple('EmailRow', ['id', 'email', 'type', 'prime'])):
+    __slots__ = ()
+    external_exclude = ('id',)
+
+
+class TelephoneRow(RowMixin, namedtuple('TelephoneRow', ['id', 'tel', 'type', 'prime'])):
+    __slots__ = ()
+    external_exclude = ('id',)
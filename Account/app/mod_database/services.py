@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+
+"""
+MySQL connection pool
+"""
+
+# Import dependencies
+import os
+import threading
+import time
+from collections import deque
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import _app_ctx_stack, current_app
+
+from app.helpers import get_custom_logger, ApiError, lazy_repr
+
+logger = get_custom_logger('mod_database_services')
+
+
+class PoolExhaustedError(StandardError):
+    """
+    Exception to indicate that no connection could be borrowed from the pool within borrow timeout.
+
+     https://docs.python.org/2/tutorial/errors.html#user-defined-exceptions
+    """
+    pass
+
+
+def has_consecutive_insert_ids(connection=None):
+    """
+    Checks if ids of rows inserted with one multi-row INSERT are consecutive for connection.
+    That holds only with innodb_autoinc_lock_mode 0 or 1 and auto_increment_increment 1.
+    Lock mode 2 (default in MySQL 8) and multi-master setups like Galera break it.
+
+    :param connection: MySQLdb connection object
+    :return: Boolean
+    """
+    if connection is None:
+        raise AttributeError("Provide connection as parameter")
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+        lock_mode, increment = cursor.fetchone()
+    except Exception as exp:
+        logger.info('Could not check auto increment settings, multi-row INSERTs are disabled: ' + repr(exp))
+        return False
+    finally:
+        cursor.close()
+
+    consecutive = int(lock_mode) in (0, 1) and int(increment) == 1
+    if not consecutive:
+        logger.info('innodb_autoinc_lock_mode=' + str(lock_mode) + ', auto_increment_increment=' + str(increment) +
+                    ', multi-row INSERTs are disabled')
+    return consecutive
+
+
+class ConnectionPool(object):
+    """
+    Thread safe pool of MySQL connections.
+
+    Connections are validated with ping() when borrowed and replaced when they are older than max_lifetime.
+    If all max_size connections are in use, borrow() waits at most borrow_timeout seconds
+    and raises PoolExhaustedError.
+    """
+
+    def __init__(self, connect_kwargs=None, min_size=1, max_size=10, max_lifetime=3600, borrow_timeout=5,
+                 ping_on_borrow=True):
+        if connect_kwargs is None:
+            raise AttributeError("Provide connect_kwargs as parameter")
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise AttributeError("Illegal pool size: min_size=" + str(min_size) + ", max_size=" + str(max_size))
+
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.borrow_timeout = borrow_timeout
+        self.ping_on_borrow = ping_on_borrow
+
+        self._condition = threading.Condition(threading.Lock())
+        self._idle = deque()  # (connection, created_at) tuples, last released at the right end
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._borrow_count = 0
+        self._timeout_count = 0
+        self._created_count = 0
+        self._discarded_count = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._wait_time_last = 0.0
+
+    def _connect(self):
+        connection = MySQLdb.connect(**self.connect_kwargs)
+        try:
+            # Read by execute_sql_insert_many()
+            connection.consecutive_insert_ids = has_consecutive_insert_ids(connection=connection)
+        except Exception:
+            connection.close()
+            raise
+        with self._condition:
+            self._created_count += 1
+        return connection, time.time()
+
+    def _close(self, connection=None):
+        try:
+            connection.close()
+        except Exception as exp:
+            logger.debug('connection.close(): %s', lazy_repr(exp))
+        with self._condition:
+            self._discarded_count += 1
+
+    def _is_expired(self, created_at=None):
+        return self.max_lifetime and (time.time() - created_at) > self.max_lifetime
+
+    def fill(self):
+        """
+        Opens connections until pool has min_size connections.
+        """
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify()
+
+    def borrow(self):
+        """
+        Borrows connection from pool. Connection must be given back with release().
+
+        :return: Tuple of MySQLdb connection object and its creation time
+        """
+        start = time.time()
+        deadline = start + self.borrow_timeout
+        entry = None
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._timeout_count += 1
+                    raise PoolExhaustedError(
+                        "No free database connection in " + str(self.borrow_timeout) + " seconds, " +
+                        str(self._in_use) + "/" + str(self.max_size) + " connections in use"
+                    )
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if entry is not None and self._is_expired(created_at=entry[1]):
+                logger.debug('Connection reached max lifetime, reconnecting')
+                self._close(connection=entry[0])
+                entry = None
+            if entry is not None and self.ping_on_borrow:
+                try:
+                    entry[0].ping()
+                except Exception as exp:
+                    logger.info('Connection ping failed, reconnecting: ' + repr(exp))
+                    self._close(connection=entry[0])
+                    entry = None
+            if entry is None:
+                entry = self._connect()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        wait_time = time.time() - start
+        with self._condition:
+            self._borrow_count += 1
+            self._wait_time_total += wait_time
+            self._wait_time_last = wait_time
+            if wait_time > self._wait_time_max:
+                self._wait_time_max = wait_time
+
+        return entry
+
+    def release(self, entry=None, discard=False):
+        """
+        Gives borrowed connection back to pool.
+
+        :param entry: Tuple returned by borrow()
+        :param discard: If True, connection is closed instead of returning it to pool
+        """
+        if entry is None:
+            raise AttributeError("Provide entry as parameter")
+
+        if not discard and self._is_expired(created_at=entry[1]):
+            discard = True
+
+        if discard:
+            self._close(connection=entry[0])
+
+        with self._condition:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append(entry)
+            self._condition.notify()
+
+    def stats(self):
+        """
+        Gauges and counters of the pool.
+
+        :return: dict
+        """
+        with self._condition:
+            return {
+                'size': self._size,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'borrowed': self._borrow_count,
+                'timeouts': self._timeout_count,
+                'created': self._created_count,
+                'discarded': self._discarded_count,
+                'wait_time_last': self._wait_time_last,
+                'wait_time_max': self._wait_time_max,
+                'wait_time_avg': self._wait_time_total / self._borrow_count if self._borrow_count else 0.0,
+            }
+
+
+class PooledMySQL(object):
+    """
+    Drop-in replacement for Flask-MySQLdb's MySQL object.
+
+    db.connection borrows a connection from the pool for the current application context
+    and the connection is given back to the pool when the context is torn down.
+    Uncommitted changes are rolled back before connection is given back.
+
+    Pool is created lazily in each process, so it is safe with forking servers like uWSGI.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_READ_DEFAULT_FILE', None)
+        app.config.setdefault('MYSQL_USE_UNICODE', True)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8')
+        app.config.setdefault('MYSQL_SQL_MODE', None)
+        app.config.setdefault('MYSQL_CURSORCLASS', None)
+        app.config.setdefault('MYSQL_POOL_MIN_SIZE', 1)
+        app.config.setdefault('MYSQL_POOL_MAX_SIZE', 10)
+        app.config.setdefault('MYSQL_POOL_MAX_LIFETIME', 3600)
+        app.config.setdefault('MYSQL_POOL_BORROW_TIMEOUT', 5)
+        app.config.setdefault('MYSQL_POOL_PING_ON_BORROW', True)
+
+        if hasattr(app, 'teardown_appcontext'):
+            app.teardown_appcontext(self.teardown)
+        else:
+            app.teardown_request(self.teardown)
+
+    @staticmethod
+    def connect_kwargs(config=None):
+        """
+        Connection arguments for MySQLdb.connect() from application config.
+        Same configuration keys as in Flask-MySQLdb.
+
+        :param config: Application config
+        :return: dict
+        """
+        if config is None:
+            raise AttributeError("Provide config as parameter")
+
+        kwargs = {}
+        if config['MYSQL_HOST']:
+            kwargs['host'] = config['MYSQL_HOST']
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['passwd'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['db'] = config['MYSQL_DB']
+        if config['MYSQL_PORT']:
+            kwargs['port'] = config['MYSQL_PORT']
+        if config['MYSQL_UNIX_SOCKET']:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if config['MYSQL_CONNECT_TIMEOUT']:
+            kwargs['connect_timeout'] = int(config['MYSQL_CONNECT_TIMEOUT'])
+        if config['MYSQL_READ_DEFAULT_FILE']:
+            kwargs['read_default_file'] = config['MYSQL_READ_DEFAULT_FILE']
+        if config['MYSQL_USE_UNICODE']:
+            kwargs['use_unicode'] = config['MYSQL_USE_UNICODE']
+        if config['MYSQL_CHARSET']:
+            kwargs['charset'] = config['MYSQL_CHARSET']
+        if config['MYSQL_SQL_MODE']:
+            kwargs['sql_mode'] = config['MYSQL_SQL_MODE']
+        if config['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(MySQLdb.cursors, config['MYSQL_CURSORCLASS'])
+        return kwargs
+
+    @property
+    def pool(self):
+        """
+        Connection pool of current process.
+        """
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != pid:
+                    config = current_app.config
+                    pool = ConnectionPool(
+                        connect_kwargs=self.connect_kwargs(config=config),
+                        min_size=int(config['MYSQL_POOL_MIN_SIZE']),
+                        max_size=int(config['MYSQL_POOL_MAX_SIZE']),
+                        max_lifetime=int(config['MYSQL_POOL_MAX_LIFETIME']),
+                        borrow_timeout=float(config['MYSQL_POOL_BORROW_TIMEOUT']),
+                        ping_on_borrow=bool(config['MYSQL_POOL_PING_ON_BORROW'])
+                    )
+                    try:
+                        pool.fill()
+                    except Exception as exp:
+                        logger.error('Could not open initial database connections: ' + repr(exp))
+                    self._pool = pool
+                    self._pool_pid = pid
+                    logger.info('Database connection pool created for process ' + str(pid))
+        return self._pool
+
+    def borrow(self):
+        """
+        Borrows connection from pool outside of application context managed connection.
+        PoolExhaustedError is converted to ApiError with status code 503.
+
+        :return: Tuple of MySQLdb connection object and its creation time, give back with release()
+        """
+        try:
+            return self.pool.borrow()
+        except PoolExhaustedError as exp:
+            logger.error('Database connection pool exhausted: ' + repr(exp))
+            raise ApiError(code=503, title="Database connection pool exhausted", detail=repr(exp))
+
+    def release(self, entry=None, discard=False):
+        self.pool.release(entry=entry, discard=discard)
+
+    @property
+    def connection(self):
+        ctx = _app_ctx_stack.top
+        if ctx is not None:
+            if not hasattr(ctx, 'mysql_pool_entry'):
+                ctx.mysql_pool_entry = self.borrow()
+            return ctx.mysql_pool_entry[0]
+
+    def teardown(self, exception):
+        ctx = _app_ctx_stack.top
+        entry = getattr(ctx, 'mysql_pool_entry', None)
+        if entry is None:
+            return
+        del ctx.mysql_pool_entry
+        self.rollback_and_release(entry=entry)
+
+    def rollback_and_release(self, entry=None):
+        """
+        Rolls back uncommitted changes and gives connection back to pool.
+        Connection is discarded if rollback fails.
+
+        :param entry: Tuple returned by borrow()
+        """
+        discard = False
+        try:
+            entry[0].rollback()
+        except Exception as exp:
+            logger.info('Rollback failed, discarding connection: ' + repr(exp))
+            discard = True
+        self.release(entry=entry, discard=discard)
+
+    def stats(self):
+        if self._pool is None or self._pool_pid != os.getpid():
+            return {}
+        return self._pool.stats()
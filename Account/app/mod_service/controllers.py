@@ -19,8 +19,9 @@ from flask_restful import Resource, Api, reqparse
 from app import db, api, login_manager, app
 
 # Import services
-from app.helpers import get_custom_logger, ApiError, get_utc_time
-from app.mod_blackbox.controllers import get_account_public_key, generate_and_sign_jws
+from app.helpers import get_custom_logger, ApiError, get_utc_time, lazy_repr, lazy_json
+from app.mod_account.services import update_account_counters, service_link_counter_deltas
+from app.mod_blackbox.client import get_account_public_key, generate_and_sign_jws, verify_and_sign_jws
 from app.mod_database.helpers import get_db_cursor
 
 
@@ -49,7 +50,7 @@ def sign_slr(account_id=None, slr_payload=None, endpoint="sign_slr(account_id, s
     else:
         logger.info("Account owner's public key and kid fetched")
     finally:
-        logger.debug("account_public_key: " + account_public_key_log_entry)
+        logger.debug("account_public_key: %s", account_public_key_log_entry)
 
     # Fill Account key to cr_keys
     try:
@@ -91,8 +92,8 @@ def sign_slr(account_id=None, slr_payload=None, endpoint="sign_slr(account_id, s
         logger.info('Service Link Record created and signed')
         return slr_signed
     finally:
-        logger.debug("slr_payload: " + json.dumps(slr_payload))
-        logger.debug("slr_signed: " + slr_signed)
+        logger.debug("slr_payload: %s", lazy_json(slr_payload))
+        logger.debug("slr_signed: %s", slr_signed)
 
 
 def sign_ssr(account_id=None, ssr_payload=None, endpoint="sign_ssr(account_id, slr_payload, endpoint)"):
@@ -131,8 +132,8 @@ def sign_ssr(account_id=None, ssr_payload=None, endpoint="sign_ssr(account_id, s
         logger.info('Service Link Status Record created and signed')
         return ssr_signed, timestamp_to_fill
     finally:
-        logger.debug("ssr_payload: " + json.dumps(ssr_payload))
-        logger.debug("ssr_signed: " + ssr_signed)
+        logger.debug("ssr_payload: %s", lazy_json(ssr_payload))
+        logger.debug("ssr_signed: %s", ssr_signed)
 
 
 def store_slr_and_ssr(slr_entry=None, ssr_entry=None, endpoint="sign_ssr(account_id, slr_payload, endpoint)"):
@@ -144,6 +145,8 @@ def store_slr_and_ssr(slr_entry=None, ssr_entry=None, endpoint="sign_ssr(account
     # Get DB cursor
     try:
         cursor = get_db_cursor()
+    except ApiError:
+        raise
     except Exception as exp:
         logger.error('Could not get database cursor: ' + repr(exp))
         raise ApiError(code=500, title="Failed to get database cursor", detail=repr(exp), source=endpoint)
@@ -157,11 +160,17 @@ def store_slr_and_ssr(slr_entry=None, ssr_entry=None, endpoint="sign_ssr(account
 
         cursor = ssr_entry.to_db(cursor=cursor)
 
+        cursor = update_account_counters(
+            cursor=cursor,
+            account_id=slr_entry.account_id,
+            deltas=service_link_counter_deltas(status=ssr_entry.status)
+        )
+
         data = {'slr_id': slr_id, 'ssr_id': ssr_entry.id}
 
         db.connection.commit()
     except Exception as exp:
-        logger.debug('commit failed: ' + repr(exp))
+        logger.debug('commit failed: %s', lazy_repr(exp))
         db.connection.rollback()
         logger.debug('--> rollback')
         raise ApiError(code=500, title="Failed to store slr and ssr", detail=repr(exp), source=endpoint)
@@ -173,6 +182,74 @@ def store_slr_and_ssr(slr_entry=None, ssr_entry=None, endpoint="sign_ssr(account
         logger.debug("ssr_entry: " + ssr_entry.log_entry)
 
 
+def verify_sign_and_store_slr_and_ssr(account_id=None, slr=None, ssr_payload=None, slr_entry=None, ssr_entry=None,
+                                      timer=None, endpoint="verify_sign_and_store_slr_and_ssr()"):
+    """
+    Verifies Account owner's signature in Service Link Record, signs Service Link Status Record and stores both.
+    Key of account is loaded once for verification and signing, and records are stored in one transaction.
+    If signature can not be verified, nothing is signed or stored and ApiError 403 is raised.
+
+    :param account_id: User account ID
+    :param slr: Service Link Record as dict
+    :param ssr_payload: Payload of Service Link Status Record, iat is filled
+    :param slr_entry: ServiceLinkRecord to store
+    :param ssr_entry: ServiceLinkStatusRecord to store, signed record and issued_at are filled
+    :param timer: StageTimer for durations of stages
+    :return: dict with slr_id and ssr_id of database and signed Service Link Status Record as JSON
+    """
+    if account_id is None:
+        raise AttributeError("Provide account_id as parameter")
+    if slr is None:
+        raise AttributeError("Provide slr as parameter")
+    if ssr_payload is None:
+        raise AttributeError("Provide ssr_payload as parameter")
+    if slr_entry is None:
+        raise AttributeError("Provide slr_entry as parameter")
+    if ssr_entry is None:
+        raise AttributeError("Provide ssr_entry as parameter")
+
+    logger.info("Verifying Service Link Record and signing Service Link Status Record")
+
+    # Fill timestamp to iat in ssr
+    try:
+        timestamp_to_fill = get_utc_time()
+        ssr_payload['iat'] = timestamp_to_fill
+    except Exception as exp:
+        logger.error("Could not fill timestamp to iat in ssr_payload: " + repr(exp))
+        raise ApiError(code=500, title="Failed to fill timestamp to iat in ssr_payload", detail=repr(exp), source=endpoint)
+
+    # Verify Account owner's signature in slr and sign ssr
+    try:
+        slr_verified, ssr_signed = verify_and_sign_jws(
+            account_id=account_id,
+            jws_json_to_verify=json.dumps(slr),
+            jws_payload=json.dumps(ssr_payload)
+        )
+    except Exception as exp:
+        logger.error("Could not verify Service Link Record and sign Service Link Status Record: " + repr(exp))
+        raise ApiError(code=500, title="Failed to verify Service Link Record and sign Service Link Status Record", detail=repr(exp), source=endpoint)
+    else:
+        logger.info('Verification passed: ' + str(slr_verified))
+    if timer is not None:
+        timer.mark('verify_and_sign')
+
+    if not slr_verified:
+        logger.error("Account owner's signature in Service Link Record could not be verified")
+        raise ApiError(code=403, title="Account owner's signature in Service Link Record could not be verified", source=endpoint)
+    logger.info('Service Link Status Record created and signed')
+    logger.debug("ssr_signed: %s", ssr_signed)
+
+    ssr_entry.service_link_status_record = ssr_signed
+    ssr_entry.issued_at = timestamp_to_fill
+
+    data = store_slr_and_ssr(slr_entry=slr_entry, ssr_entry=ssr_entry, endpoint=endpoint)
+    if timer is not None:
+        timer.mark('store')
+
+    data['ssr_signed'] = ssr_signed
+    return data
+
+
 def get_surrogate_id_by_account_and_service(account_id=None, service_id=None, endpoint="(get_surrogate_id_by_account_and_Service)"):
     if account_id is None:
         raise AttributeError("Provide account_id as parameter")
@@ -203,7 +280,7 @@ def get_surrogate_id_by_account_and_service(account_id=None, service_id=None, en
         logger.error('Could not get surrogate id from db: ' + repr(exp))
         raise
     else:
-        logger.debug("Got sur_id_obj:" + json.dumps(sur_id_obj.to_dict))
+        logger.debug("Got sur_id_obj:%s", lazy_json(sur_id_obj.to_dict))
         return sur_id_obj.to_dict
     finally:
         logger.debug("sur_id_obj: " + sur_id_obj.log_entry)
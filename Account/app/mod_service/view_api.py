@@ -30,14 +30,16 @@ from base64 import b64decode
 from app import db, api, login_manager, app
 
 # Import services
-from app.helpers import get_custom_logger, make_json_response, ApiError
+from app.helpers import get_custom_logger, make_json_response, ApiError, lazy_repr, lazy_json, StageTimer, \
+    debug_timing_requested
 from app.mod_api_auth.controllers import requires_api_auth_user, get_account_id_by_api_key, provideApiKey, \
     requires_api_auth_sdk
-from app.mod_blackbox.controllers import sign_jws_with_jwk, generate_and_sign_jws, get_account_public_key, \
+from app.mod_blackbox.client import sign_jws_with_jwk, generate_and_sign_jws, get_account_public_key, \
     verify_jws_signature_with_jwk
 from app.mod_database.helpers import get_db_cursor
 from app.mod_database.models import ServiceLinkRecord, ServiceLinkStatusRecord
-from app.mod_service.controllers import sign_slr, store_slr_and_ssr, sign_ssr, get_surrogate_id_by_account_and_service
+from app.mod_service.controllers import sign_slr, store_slr_and_ssr, sign_ssr, get_surrogate_id_by_account_and_service, \
+    verify_sign_and_store_slr_and_ssr
 from app.mod_service.models import NewServiceLink, VerifyServiceLink
 
 mod_service_api = Blueprint('service_api', __name__, template_folder='templates')
@@ -59,7 +61,7 @@ class ServiceLinkSign(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -76,6 +78,7 @@ class ServiceLinkSign(Resource):
 
     @requires_api_auth_sdk
     def post(self, account_id):
+        timer = StageTimer()
 
         try:
             endpoint = str(api.url_for(self, account_id=account_id))
@@ -86,7 +89,7 @@ class ServiceLinkSign(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -100,7 +103,7 @@ class ServiceLinkSign(Resource):
             error_detail = {'0': 'Set application/json as Content-Type', '1': 'Provide json payload'}
             raise ApiError(code=400, title="No input data provided", detail=error_detail, source=endpoint)
         else:
-            logger.debug("json_data: " + json.dumps(json_data))
+            logger.debug("json_data: %s", lazy_json(json_data))
 
         # Validate payload content
         schema = NewServiceLink()
@@ -134,13 +137,16 @@ class ServiceLinkSign(Resource):
             logger.error("Could not fetch code from json")
             raise ApiError(code=400, title="Could not fetch code from json", detail=repr(exp), source=endpoint)
 
+        timer.mark('parse')
+
         # Sign SLR
         try:
             slr_signed = sign_slr(account_id=account_id, slr_payload=slr_payload, endpoint=str(endpoint))
         except Exception as exp:
             logger.error("Could not sign SLR")
-            logger.debug("Could not sign SLR: " + repr(exp))
+            logger.debug("Could not sign SLR: %s", lazy_repr(exp))
             raise
+        timer.mark('sign_slr')
 
         # Response data container
         try:
@@ -152,21 +158,25 @@ class ServiceLinkSign(Resource):
             response_data['data']['slr']['attributes'] = {}
             response_data['data']['slr']['attributes']['slr'] = json.loads(slr_signed)
             response_data['data']['surrogate_id'] = surrogate_id
+            if debug_timing_requested():
+                timer.mark('response')
+                response_data['meta'] = {'timing': timer.to_dict()}
         except Exception as exp:
             logger.error('Could not prepare response data: ' + repr(exp))
             raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
         else:
             logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
+            logger.debug('response_data: %s', lazy_repr(response_data))
 
         response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
+        logger.debug('response_data_dict: %s', lazy_repr(response_data_dict))
         return make_json_response(data=response_data_dict, status_code=201)
 
 
 class ServiceLinkVerify(Resource):
     @requires_api_auth_sdk
     def post(self, account_id):
+        timer = StageTimer()
 
         try:
             endpoint = str(api.url_for(self, account_id=account_id))
@@ -177,7 +187,7 @@ class ServiceLinkVerify(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -191,7 +201,7 @@ class ServiceLinkVerify(Resource):
             error_detail = {'0': 'Set application/json as Content-Type', '1': 'Provide json payload'}
             raise ApiError(code=400, title="No input data provided", detail=error_detail, source=endpoint)
         else:
-            logger.debug("json_data: " + json.dumps(json_data))
+            logger.debug("json_data: %s", lazy_json(json_data))
 
         # Validate payload content
         schema = VerifyServiceLink()
@@ -213,7 +223,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch slr from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got slr: " + json.dumps(slr))
+            logger.debug("Got slr: %s", lazy_json(slr))
 
         # Get surrogate_id
         try:
@@ -221,7 +231,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch surrogate id from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got surrogate_id: " + str(surrogate_id))
+            logger.debug("Got surrogate_id: %s", surrogate_id)
 
         # Decode slr payload
         try:
@@ -233,7 +243,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not decode slr payload", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("slr_payload_decoded: " + str(slr_payload_decoded))
+            logger.debug("slr_payload_decoded: %s", slr_payload_decoded)
 
         # Get service_link_record_id
         try:
@@ -241,7 +251,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch service link record id from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got slr_id: " + str(slr_id))
+            logger.debug("Got slr_id: %s", slr_id)
 
         # Get service_id
         try:
@@ -249,7 +259,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch service id from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got service_id: " + str(service_id))
+            logger.debug("Got service_id: %s", service_id)
 
         # Get operator_id
         try:
@@ -257,7 +267,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch operator id from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got operator_id: " + str(operator_id))
+            logger.debug("Got operator_id: %s", operator_id)
 
         #######
         # Ssr
@@ -275,7 +285,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch record_id from ssr_payload", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got ssr_id: " + str(ssr_id))
+            logger.debug("Got ssr_id: %s", ssr_id)
 
         # Get ssr_status
         try:
@@ -283,7 +293,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch sl_status from ssr_payload", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got ssr_status: " + str(ssr_status))
+            logger.debug("Got ssr_status: %s", ssr_status)
 
         # Get slr_id_from_ssr
         try:
@@ -291,7 +301,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch slr_id from ssr_payload", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got slr_id: " + str(slr_id))
+            logger.debug("Got slr_id: %s", slr_id)
 
         # Get prev_ssr_id
         try:
@@ -299,7 +309,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch prev_ssr_id from ssr_payload", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got prev_ssr_id: " + str(prev_ssr_id))
+            logger.debug("Got prev_ssr_id: %s", prev_ssr_id)
 
         #
         # Get code
@@ -308,7 +318,7 @@ class ServiceLinkVerify(Resource):
         except Exception as exp:
             raise ApiError(code=400, title="Could not fetch code from json", detail=repr(exp), source=endpoint)
         else:
-            logger.debug("Got code: " + str(code))
+            logger.debug("Got code: %s", code)
 
         ##
         ##
@@ -317,29 +327,9 @@ class ServiceLinkVerify(Resource):
             detail_data = {'slr_id': str(slr_id), 'slr_id_from_ssr': str(slr_id_from_ssr)}
             raise ApiError(code=409, title="Service Link Record ID's are not matching", detail=detail_data, source=endpoint)
 
-        ##
-        ##
-        # Verify Account owner's signature in Service Link Record
-        try:
-            slr_verified = verify_jws_signature_with_jwk(account_id=account_id, jws_json_to_verify=json.dumps(slr))
-        except Exception as exp:
-            logger.error("Could not verify Account owner's signature in Service Link Record: " + repr(exp))
-            raise ApiError(code=500, title="Failed to verify Account owner's signature in Service Link Record", detail=repr(exp), source=endpoint)
-        else:
-            logger.info('Service Link Record verified')
-            logger.info('Verification passed: ' + str(slr_verified))
-
-        # Sign Ssr
-        try:
-            ssr_signed, ssr_iat = sign_ssr(account_id=account_id, ssr_payload=ssr_payload, endpoint=str(endpoint))
-        except Exception as exp:
-            logger.error("Could not sign Ssr")
-            logger.debug("Could not sign Ssr: " + repr(exp))
-            raise
-
+        timer.mark('parse')
 
-        # Store slr and ssr
-        logger.info("Storing Service Link Record and Service Link Status Record")
+        # Verify Account owner's signature in Service Link Record, sign Ssr and store slr and ssr
         try:
             slr_entry = ServiceLinkRecord(
                 service_link_record=json.dumps(slr),
@@ -354,27 +344,36 @@ class ServiceLinkVerify(Resource):
             raise ApiError(code=500, title="Failed to create Service Link Record object", detail=repr(exp), source=endpoint)
 
         try:
+            # Signed record and issued_at are filled when Ssr is signed
             ssr_entry = ServiceLinkStatusRecord(
                 service_link_status_record_id=ssr_id,
                 status=ssr_status,
-                service_link_status_record=ssr_signed,
                 service_link_record_id=slr_id_from_ssr,
-                issued_at=ssr_iat,
                 prev_record_id=prev_ssr_id
             )
         except Exception as exp:
             logger.error('Could not create Service Link Status Record object: ' + repr(exp))
             raise ApiError(code=500, title="Failed to create Service Link Status Record object", detail=repr(exp), source=endpoint)
 
+        logger.info("Storing Service Link Record and Service Link Status Record")
         try:
-            db_meta = store_slr_and_ssr(slr_entry=slr_entry, ssr_entry=ssr_entry, endpoint=str(endpoint))
+            db_meta = verify_sign_and_store_slr_and_ssr(
+                account_id=account_id,
+                slr=slr,
+                ssr_payload=ssr_payload,
+                slr_entry=slr_entry,
+                ssr_entry=ssr_entry,
+                timer=timer,
+                endpoint=str(endpoint)
+            )
+            ssr_signed = db_meta.pop('ssr_signed')
         except Exception as exp:
             logger.error("Could not store Service Link Record and Service Link Status Record")
-            logger.debug("Could not store SLR and Ssr: " + repr(exp))
+            logger.debug("Could not store SLR and Ssr: %s", lazy_repr(exp))
             raise
         else:
             logger.info("Stored Service Link Record and Service Link Status Record")
-            logger.debug("DB Meta: " + json.dumps(db_meta))
+            logger.debug("DB Meta: %s", lazy_json(db_meta))
 
         # Response data container
         try:
@@ -394,15 +393,18 @@ class ServiceLinkVerify(Resource):
             response_data['data']['ssr']['attributes']['ssr'] = json.loads(ssr_signed)
 
             response_data['data']['surrogate_id'] = surrogate_id
+            if debug_timing_requested():
+                timer.mark('response')
+                response_data['meta'] = {'timing': timer.to_dict()}
         except Exception as exp:
             logger.error('Could not prepare response data: ' + repr(exp))
             raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
         else:
             logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
+            logger.debug('response_data: %s', lazy_repr(response_data))
 
         response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
+        logger.debug('response_data_dict: %s', lazy_repr(response_data_dict))
         return make_json_response(data=response_data_dict, status_code=201)
 
 
@@ -419,7 +421,7 @@ class ServiceSurrogate(Resource):
             api_key = request.headers.get('Api-Key')
         except Exception as exp:
             logger.error("No ApiKey in headers")
-            logger.debug("No ApiKey in headers: " + repr(repr(exp)))
+            logger.debug("No ApiKey in headers: %s", lazy_repr(exp))
             return provideApiKey(endpoint=endpoint)
 
         try:
@@ -440,7 +442,7 @@ class ServiceSurrogate(Resource):
             logger.error('Could not get surrogate_id: ' + repr(exp))
             raise ApiError(code=500, title="Could not get surrogate_id", detail=repr(exp), source=endpoint)
         else:
-            logger.debug('Got surrogate_id: ' + repr(surrogate_id))
+            logger.debug('Got surrogate_id: %s', lazy_repr(surrogate_id))
 
         # Response data container
         try:
@@ -455,10 +457,10 @@ class ServiceSurrogate(Resource):
             raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp), source=endpoint)
         else:
             logger.info('Response data ready')
-            logger.debug('response_data: ' + repr(response_data))
+            logger.debug('response_data: %s', lazy_repr(response_data))
 
         response_data_dict = dict(response_data)
-        logger.debug('response_data_dict: ' + repr(response_data_dict))
+        logger.debug('response_data_dict: %s', lazy_repr(response_data_dict))
         return make_json_response(data=response_data_dict, status_code=200)
 
 
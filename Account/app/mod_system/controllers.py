@@ -2,6 +2,7 @@
 
 # Import dependencies
 import json
+import os
 import uuid
 import logging
 import bcrypt  # https://github.com/pyca/bcrypt/, https://pypi.python.org/pypi/bcrypt/2.0.0
@@ -18,16 +19,21 @@ import requests
 from app import db, api, app, make_json_response
 
 # Import Models
-from app.helpers import get_custom_logger, ApiError
+from app.helpers import get_custom_logger, ApiError, lazy_repr, get_log_handler_stats
 from app.mod_account.view_api import Accounts
-from app.mod_api_auth.controllers import gen_account_api_key
+from app.mod_api_auth.controllers import gen_account_api_key, clear_api_key_cache, get_api_key_cache_stats, \
+    requires_api_auth_sdk
 from app.mod_api_auth.services import clear_apikey_sqlite_db
+from app.mod_api_auth.services import engine as api_auth_sqlite_engine
 from app.mod_auth.controllers import SignUp
-from app.mod_auth.helpers import get_account_by_username_and_password
+from app.mod_auth.helpers import get_account_by_username_and_password, user_cache, credential_cache
+from app.mod_auth.services import hash_pool
+from app.mod_authorization.services import auth_token_data_cache
 
 # Import Resources
-from app.mod_blackbox.controllers import gen_account_key
-from app.mod_blackbox.services import clear_blackbox_sqlite_db
+from app.mod_blackbox.client import gen_account_key, blackbox_client
+from app.mod_blackbox.services import clear_blackbox_sqlite_db, key_cache, key_pool
+from app.mod_blackbox.services import engine as blackbox_sqlite_engine
 from app.mod_database.helpers import get_db_cursor, drop_table_content
 from app.mod_database.models import Particulars, Account, LocalIdentityPWD, LocalIdentity, Salt, Email
 from app.mod_account.view_html import Home
@@ -44,7 +50,7 @@ class InitDb(Resource):
     def get(self, secret=None):
 
         # Verifying secret
-        logger.debug("Provided secret: " + str(secret))
+        logger.debug("Provided secret: %s", secret)
         if secret is None:
             logger.debug("No secret provided --> terminating")
             raise ApiError(code=403, title="Provide correct secret!")
@@ -68,6 +74,12 @@ class InitDb(Resource):
             logger.info("Cleared")
             response_data['Account'] = "MySQL Database cleared"
 
+        # Account ids are reused after tables are cleared
+        user_cache.clear()
+        credential_cache.clear()
+        auth_token_data_cache.clear()
+        clear_api_key_cache()
+
         # Clear Blackbox Sqlite
         logger.info("##########")
         logger.info("Clearing Blackbox Sqlite")
@@ -157,29 +169,29 @@ class InitDb(Resource):
         #url = api.url_for(resource=SignUp, _external=True)
         headers = {'Content-Type': 'application/json'}
         url = api.url_for(resource=Accounts, _external=True,)
-        logger.debug("Posting: " + str(url))
+        logger.debug("Posting: %s", url)
 
         logger.debug("##########")
-        logger.debug("Creating: " + repr(form_data[0]))
+        logger.debug("Creating: %s", lazy_repr(form_data[0]))
         #r = requests.post(url, data=form_data[0])
         r = requests.post(url, json=json_data[0], headers=headers)
-        logger.debug("Response status: " + str(r.status_code))
+        logger.debug("Response status: %s", r.status_code)
         if r.status_code != 201:
             raise ApiError(code=500, title="Could not create first user", detail=str(r.text))
 
         logger.debug("##########")
-        logger.debug("Creating: " + repr(json_data[1]))
+        logger.debug("Creating: %s", lazy_repr(json_data[1]))
         #r = requests.post(url, data=form_data[1])
         r = requests.post(url, json=json_data[1], headers=headers)
-        logger.debug("Response status: " + str(r.status_code))
+        logger.debug("Response status: %s", r.status_code)
         if r.status_code != 201:
             raise ApiError(code=500, title="Could not create second user", detail=str(r.text))
 
         logger.debug("##########")
-        logger.debug("Creating: " + repr(json_data[2]))
+        logger.debug("Creating: %s", lazy_repr(json_data[2]))
         #r = requests.post(url, data=form_data[2])
         r = requests.post(url, json=json_data[2], headers=headers)
-        logger.debug("Response status: " + str(r.status_code))
+        logger.debug("Response status: %s", r.status_code)
         if r.status_code != 201:
             raise ApiError(code=500, title="Could not create third user", detail=str(r.text))
 
@@ -208,5 +220,41 @@ class InitDb(Resource):
         return response
 
 
+class SystemMetrics(Resource):
+    @requires_api_auth_sdk
+    def get(self):
+        """
+        Gauges and counters of current process.
+        :return:
+        """
+        try:
+            response_data = {}
+            response_data['meta'] = {}
+            response_data['meta']['process'] = os.getpid()
+
+            response_data['data'] = {}
+            response_data['data']['type'] = "SystemMetrics"
+            response_data['data']['attributes'] = {}
+            response_data['data']['attributes']['mysql_pool'] = db.stats()
+            response_data['data']['attributes']['user_cache'] = user_cache.stats()
+            response_data['data']['attributes']['credential_cache'] = credential_cache.stats()
+            response_data['data']['attributes']['auth_token_cache'] = auth_token_data_cache.stats()
+            response_data['data']['attributes']['hash_pool'] = hash_pool.stats()
+            response_data['data']['attributes']['blackbox_key_cache'] = key_cache.stats()
+            response_data['data']['attributes']['blackbox_key_pool'] = key_pool.stats()
+            response_data['data']['attributes']['blackbox_sqlite'] = blackbox_sqlite_engine.stats()
+            response_data['data']['attributes']['api_auth_sqlite'] = api_auth_sqlite_engine.stats()
+            response_data['data']['attributes']['api_key_cache'] = get_api_key_cache_stats()
+            response_data['data']['attributes']['log_handler'] = get_log_handler_stats()
+            if blackbox_client is not None:
+                response_data['data']['attributes']['blackbox_client'] = blackbox_client.stats()
+        except Exception as exp:
+            logger.error('Could not prepare response data: ' + repr(exp))
+            raise ApiError(code=500, title="Could not prepare response data", detail=repr(exp))
+
+        return make_json_response(data=response_data, status_code=200)
+
+
 # Register resources
 api.add_resource(InitDb, '/system/db/init/<string:secret>', endpoint='db_init')
+api.add_resource(SystemMetrics, '/system/metrics/', endpoint='system_metrics')
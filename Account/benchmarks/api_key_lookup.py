@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lookup benchmark for API Key database.
+
+Fills api_keys table with given number of API Keys and compares legacy lookup, where presented API Key is compared
+to plaintext BLOB column without index, to lookup by SHA-256 digest from unique index as get_account_id() does.
+Legacy lookup scans the table, so fewer lookups are timed for it.
+
+Usage (from Account directory):
+    python benchmarks/api_key_lookup.py [--keys 1000000] [--lookups 10000] [--legacy-lookups 20]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from base64 import b64encode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mod_api_auth.helpers import hash_api_key
+from app.mod_api_auth.services import SCHEMA, migrate_api_key_hashes
+
+
+def generate_api_key():
+    # Same format as gen_account_api_keys()
+    return b64encode(("account-api-key-" + str(uuid.uuid4())).encode('utf-8')).decode('utf-8')
+
+
+def fill(connection=None, keys=0, batch_size=10000):
+    """
+    Stores API Keys without digests, as legacy database has them.
+
+    :return: Sample of stored API Keys
+    """
+    sample = []
+    for first in range(0, keys, batch_size):
+        entries = [(account_id, generate_api_key()) for account_id in range(first, min(first + batch_size, keys))]
+        connection.executemany("INSERT INTO api_keys (account_id, api_key) VALUES (?, ?)", entries)
+        sample.extend(random.sample(entries, min(len(entries), 100)))
+    connection.commit()
+    return [api_key for account_id, api_key in sample]
+
+
+def time_lookups(connection=None, sql_query=None, arguments=None):
+    start = time.time()
+    for argument in arguments:
+        if connection.execute(sql_query, (argument,)).fetchone() is None:
+            raise ValueError("API Key not found")
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API Key lookup benchmark")
+    parser.add_argument('--keys', type=int, default=1000000, help="API Keys in database")
+    parser.add_argument('--lookups', type=int, default=10000, help="Lookups by digest")
+    parser.add_argument('--legacy-lookups', type=int, default=20, help="Lookups by plaintext API Key")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="api_key_lookup_")
+    try:
+        connection = sqlite3.connect(os.path.join(directory, 'apiauth.sqlite'))
+        for sql_query in SCHEMA:
+            connection.execute(sql_query)
+
+        start = time.time()
+        sample = fill(connection=connection, keys=args.keys)
+        print("Keys: {}, filled in {:.1f} s".format(args.keys, time.time() - start))
+
+        start = time.time()
+        migrate_api_key_hashes(connection=connection)
+        connection.commit()
+        print("Migrated in {:.1f} s, database {:.1f} MB".format(
+            time.time() - start, os.path.getsize(os.path.join(directory, 'apiauth.sqlite')) / 1048576.0
+        ))
+        print("")
+
+        legacy_keys = [random.choice(sample) for index in range(args.legacy_lookups)]
+        duration = time_lookups(
+            connection=connection,
+            sql_query="SELECT id, account_id, api_key FROM api_keys WHERE api_key=? ORDER BY id DESC LIMIT 1",
+            arguments=legacy_keys
+        )
+        print("{:<24} {:>6} lookups {:.3f} s, {:>10.1f} us/lookup".format(
+            "plaintext, no index", len(legacy_keys), duration, 1000000 * duration / len(legacy_keys)
+        ))
+
+        keys = [random.choice(sample) for index in range(args.lookups)]
+        start = time.time()
+        hashes = [hash_api_key(api_key=api_key) for api_key in keys]
+        hash_duration = time.time() - start
+        duration = time_lookups(
+            connection=connection,
+            sql_query="SELECT id, account_id, api_key FROM api_keys WHERE api_key_hash=?",
+            arguments=hashes
+        )
+        print("{:<24} {:>6} lookups {:.3f} s, {:>10.1f} us/lookup (hashing {:.1f} us)".format(
+            "digest, unique index", len(keys), duration, 1000000 * duration / len(keys), 1000000 * hash_duration / len(keys)
+        ))
+        connection.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+Concurrent write benchmark for sharded key store of blackbox.
+
+Worker processes store keys for new accounts as store_jwk() does, one transaction per key, and then look up
+the stored keys. The same burst is run against key stores with different number of shards in a temporary directory.
+
+Usage (from Account directory):
+    python benchmarks/blackbox_shards.py [--processes 8] [--accounts 500] [--shards 1,2,4,8]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mod_database.helpers import ShardedSqliteEngine
+from app.mod_blackbox.services import SCHEMA
+
+JWS_KEY = '{"kty": "EC", "crv": "P-256", "x": "' + 'x' * 43 + '", "y": "' + 'y' * 43 + '", "d": "' + 'd' * 43 + '"}'
+
+
+def worker(database, shards, first_account_id, accounts, start_event, results):
+    store = ShardedSqliteEngine(database=database, schema=SCHEMA, shards=shards)
+    account_ids = range(first_account_id, first_account_id + accounts)
+    errors = 0
+    start_event.wait()
+
+    start = time.time()
+    for account_id in account_ids:
+        connection = store.connection(shard_key=account_id)
+        try:
+            connection.execute(
+                "INSERT INTO account_keys (kid, account_id, jws_key) VALUES (?, ?, ?)",
+                ("acc-kid-" + str(uuid.uuid4()), account_id, JWS_KEY)
+            )
+            connection.commit()
+        except sqlite3.OperationalError:
+            # database is locked
+            connection.rollback()
+            errors += 1
+    write_duration = time.time() - start
+
+    start = time.time()
+    for account_id in account_ids:
+        cursor = store.connection(shard_key=account_id).cursor()
+        cursor.execute("SELECT id, kid, account_id, jws_key FROM account_keys WHERE account_id=? ORDER BY id DESC LIMIT 1", (account_id,))
+        cursor.fetchall()
+    read_duration = time.time() - start
+
+    results.put((write_duration, read_duration, errors))
+
+
+def run_case(directory=None, shards=1, processes=1, accounts=0):
+    """
+    :return: Slowest write and read duration of workers in seconds and number of failed writes
+    """
+    database = os.path.join(directory, 'blackbox-' + str(shards) + '.sqlite')
+    # Files and schema are created before the burst
+    store = ShardedSqliteEngine(database=database, schema=SCHEMA, shards=shards)
+    for engine in store.engines:
+        engine.connection()
+
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=worker, args=(database, shards, index * accounts, accounts, start_event, results))
+        for index in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    time.sleep(0.5)
+    start_event.set()
+    durations = [results.get() for process in workers]
+    for process in workers:
+        process.join()
+
+    return max(duration[0] for duration in durations), max(duration[1] for duration in durations), sum(duration[2] for duration in durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded key store write benchmark")
+    parser.add_argument('--processes', type=int, default=8, help="Concurrent worker processes")
+    parser.add_argument('--accounts', type=int, default=500, help="New accounts per process")
+    parser.add_argument('--shards', default='1,2,4,8', help="Comma separated numbers of shards to compare")
+    args = parser.parse_args()
+
+    total = args.processes * args.accounts
+    print("Processes: {}, accounts: {}".format(args.processes, total))
+    print("")
+
+    directory = tempfile.mkdtemp(prefix="blackbox_shards_")
+    try:
+        for shards in [int(value) for value in args.shards.split(',')]:
+            write_duration, read_duration, errors = run_case(directory=directory, shards=shards, processes=args.processes, accounts=args.accounts)
+            print("{:>2} shards  writes {:.3f} s, {:>7.0f} keys/s, {} failed  lookups {:.3f} s, {:>7.0f} keys/s".format(
+                shards, write_duration, total / write_duration, errors, read_duration, total / read_duration
+            ))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark for ConsentRecord lookups.
+
+Compares the legacy LIKE '%value%' lookup against exact-match lookup built with build_sql_where_clause().
+Benchmark table is created as a copy of MyDataAccount.ConsentRecords (indexes included, foreign keys excluded)
+and filled with given number of rows.
+
+Usage (from Account directory):
+    python benchmarks/consent_record_lookup.py [--rows 1000000] [--lookups 1000] [--keep]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+import MySQLdb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app.mod_database.helpers import build_sql_where_clause, MATCH_EXACT, MATCH_PREFIX
+
+TABLE = "MyDataAccount.ConsentRecordsBenchmark"
+BATCH_SIZE = 10000
+
+COLUMNS = "id, consentRecord, ServiceLinkRecords_id, surrogateId, consentRecordId, ResourceSetId, " \
+          "serviceLinkRecordId, subjectId, role"
+
+
+def get_connection():
+    return MySQLdb.connect(
+        host=config.MYSQL_HOST,
+        user=config.MYSQL_USER,
+        passwd=config.MYSQL_PASSWORD,
+        db=config.MYSQL_DB,
+        port=config.MYSQL_PORT,
+        charset=config.MYSQL_CHARSET
+    )
+
+
+def create_table(cursor=None, rows=0):
+    cursor.execute("DROP TABLE IF EXISTS " + TABLE + ";")
+    cursor.execute("CREATE TABLE " + TABLE + " LIKE MyDataAccount.ConsentRecords;")
+
+    sql_query = "INSERT INTO " + TABLE + " (" \
+                "consentRecord, ServiceLinkRecords_id, surrogateId, consentRecordId, ResourceSetId, " \
+                "serviceLinkRecordId, subjectId, role" \
+                ") VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+
+    consent_ids = []
+    inserted = 0
+    while inserted < rows:
+        batch = []
+        for index in range(inserted, min(inserted + BATCH_SIZE, rows)):
+            consent_id = str(uuid.uuid4())
+            consent_ids.append(consent_id)
+            batch.append((
+                '{"consentRecord": "benchmark"}',
+                index % 1000 + 1,
+                str(uuid.uuid4()),
+                consent_id,
+                str(uuid.uuid4()),
+                str(uuid.uuid4()),
+                str(index % 50),
+                random.choice(["Source", "Sink"]),
+            ))
+        cursor.executemany(sql_query, batch)
+        inserted += len(batch)
+        cursor.connection.commit()
+        print("Inserted {} / {} rows".format(inserted, rows))
+
+    return consent_ids
+
+
+def legacy_lookup_query(consent_id=None):
+    sql_query = "SELECT " + COLUMNS + " " \
+                "FROM " + TABLE + " " \
+                "WHERE id LIKE %s AND ServiceLinkRecords_id LIKE %s AND surrogateId LIKE %s AND " \
+                "consentRecordId LIKE %s AND ResourceSetId LIKE %s AND serviceLinkRecordId LIKE %s AND " \
+                "subjectId LIKE %s AND role LIKE %s;"
+
+    arguments = ('%%', '%%', '%%', '%' + consent_id + '%', '%%', '%%', '%%', '%Sink%')
+    return sql_query, arguments
+
+
+def lookup_query(consent_id=None, match=MATCH_EXACT):
+    criteria = (
+        ('consentRecordId', consent_id),
+        ('role', "Sink"),
+    )
+    where_clause, arguments = build_sql_where_clause(criteria=criteria, match=match)
+    sql_query = "SELECT " + COLUMNS + " FROM " + TABLE + " WHERE " + where_clause + ";"
+    return sql_query, arguments
+
+
+def run(cursor=None, label="", query_builder=None, consent_ids=None):
+    sql_query, arguments = query_builder(consent_ids[0])
+    cursor.execute("EXPLAIN " + sql_query, arguments)
+    plan = cursor.fetchall()
+
+    durations = []
+    for consent_id in consent_ids:
+        sql_query, arguments = query_builder(consent_id)
+        start = time.time()
+        cursor.execute(sql_query, arguments)
+        cursor.fetchall()
+        durations.append(time.time() - start)
+
+    durations.sort()
+    print("")
+    print(label)
+    print("  plan:   " + repr(plan))
+    print("  total:  {:.3f} s for {} lookups".format(sum(durations), len(durations)))
+    print("  mean:   {:.3f} ms".format(1000 * sum(durations) / len(durations)))
+    print("  median: {:.3f} ms".format(1000 * durations[len(durations) // 2]))
+    print("  p99:    {:.3f} ms".format(1000 * durations[int(len(durations) * 0.99)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ConsentRecord lookup benchmark")
+    parser.add_argument('--rows', type=int, default=1000000, help="Rows in benchmark table")
+    parser.add_argument('--lookups', type=int, default=1000, help="Lookups per query type")
+    parser.add_argument('--legacy-lookups', type=int, default=20, help="Lookups with legacy LIKE query")
+    parser.add_argument('--keep', action='store_true', help="Keep benchmark table")
+    args = parser.parse_args()
+
+    connection = get_connection()
+    cursor = connection.cursor()
+
+    try:
+        consent_ids = create_table(cursor=cursor, rows=args.rows)
+        sample = random.sample(consent_ids, min(args.lookups, len(consent_ids)))
+
+        run(cursor=cursor, label="Legacy LIKE '%value%' on every column", query_builder=legacy_lookup_query,
+            consent_ids=sample[:args.legacy_lookups])
+        run(cursor=cursor, label="Exact match", query_builder=lambda x: lookup_query(x, MATCH_EXACT),
+            consent_ids=sample)
+        run(cursor=cursor, label="Prefix match", query_builder=lambda x: lookup_query(x, MATCH_PREFIX),
+            consent_ids=sample)
+    finally:
+        if not args.keep:
+            cursor.execute("DROP TABLE IF EXISTS " + TABLE + ";")
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
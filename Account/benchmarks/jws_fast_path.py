@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark for signing and verifying JWS with jwcrypto and with jws_fast_path.
+
+Signs and verifies the same payload with ES256 and RS256 keys. jwcrypto builds JWS object and
+looks up key handle for every operation, fast path uses cached key handle and pre-encoded protected header.
+Before timing, signatures of both implementations are cross-verified.
+
+Usage (from Account directory):
+    python benchmarks/jws_fast_path.py [--number 1000] [--repeat 5] [--rsa-size 2048]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jwcrypto import jwk, jws
+
+from app.mod_blackbox import jws_fast_path
+
+PAYLOAD = {
+    "account_id": "2",
+    "cr_id": "29ffddfc-60a1-4bf0-931c-4d5ef02d67f2",
+    "iat": 1471593026,
+    "consent_status": "Active"
+}
+
+
+def jwcrypto_sign(key=None, alg=None, payload_json=None, header_json=None):
+    jws_object = jws.JWS(payload=payload_json)
+    jws_object.add_signature(key, alg=alg, header=header_json, protected=json.dumps({'alg': alg}))
+    return jws_object.serialize()
+
+
+def jwcrypto_verify(key=None, jws_json=None):
+    jws_object = jws.JWS()
+    jws_object.deserialize(jws_json)
+    jws_object.verify(key)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JWS fast path microbenchmark")
+    parser.add_argument('--number', type=int, default=1000, help="Operations per repeat")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats per case")
+    parser.add_argument('--rsa-size', type=int, default=2048, help="Size of RSA key in bits")
+    args = parser.parse_args()
+
+    payload_json = json.dumps(PAYLOAD)
+    keys = (
+        ('ES256', jwk.JWK(generate='EC', crv='P-256', kid='bench-ec')),
+        ('RS256', jwk.JWK(generate='RSA', size=args.rsa_size, kid='bench-rsa')),
+    )
+
+    for alg, key in keys:
+        key_dict = json.loads(key.export())
+        public_key_dict = json.loads(key.export_public())
+        header = {'kid': key_dict['kid'], 'jwk': public_key_dict}
+        header_json = json.dumps(header)
+        signing_key = jws_fast_path.signing_key(key_dict)
+        verification_key = jws_fast_path.verification_key(public_key_dict)
+
+        jwcrypto_json = jwcrypto_sign(key=key, alg=alg, payload_json=payload_json, header_json=header_json)
+        fast_path_dict = jws_fast_path.sign(payload_json, signing_key, alg=alg, header=header)
+        if not jwcrypto_verify(key=key, jws_json=json.dumps(fast_path_dict)):
+            raise ValueError("jwcrypto could not verify fast path signature")
+        jwcrypto_dict = json.loads(jwcrypto_json)
+        if not jws_fast_path.verify_signature(jwcrypto_dict['payload'], jwcrypto_dict, verification_key):
+            raise ValueError("Fast path could not verify jwcrypto signature")
+
+        cases = (
+            ("jwcrypto sign", lambda: jwcrypto_sign(key=key, alg=alg, payload_json=payload_json, header_json=header_json)),
+            ("fast path sign", lambda: jws_fast_path.sign(payload_json, jws_fast_path.signing_key(key_dict, cache_key=key_dict['kid']), alg=alg, header=header)),
+            ("jwcrypto verify", lambda: jwcrypto_verify(key=key, jws_json=jwcrypto_json)),
+            ("fast path verify", lambda: jws_fast_path.verify_signature(fast_path_dict['payload'], fast_path_dict, jws_fast_path.verification_key(public_key_dict, cache_key=key_dict['kid']))),
+        )
+
+        print("")
+        print(alg)
+        for label, function in cases:
+            best = min(timeit.repeat(function, number=args.number, repeat=args.repeat))
+            print("{:<18} best {:.3f} s, {:.1f} us/op, {:.0f} ops/s".format(label, best, 1000000 * best / args.number, args.number / best))
+
+    print("")
+    print("Key handles: {}".format(jws_fast_path.key_handles.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark for JWS JSON serialization.
+
+Compares the legacy path (jwcrypto serialize(), string replace based jws_header_fix() and json.loads() by caller)
+against jws_serialize() that builds JWS dict from structured headers and encodes it once.
+JWS is signed once with generated P-256 key, only serialization is measured.
+
+Usage (from Account directory):
+    python benchmarks/jws_serialization.py [--payload-size 10000] [--signatures 1] [--number 1000] [--repeat 5]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+
+from jwcrypto import jwk, jws
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mod_blackbox.helpers import jws_header_fix
+from app.mod_blackbox.services import jws_serialize
+
+
+def generate_payload(size=0):
+    """
+    Consent Record like payload with usage rules filling it to approximately given size.
+    """
+    payload = {
+        "common_part": {
+            "cr_id": "ed926523-d31a-4671-b5f3-beedd2805a86",
+            "rs_id": "Amazing Source_ed19ee3f-7d16-4537-8272-85b6912b6ae7",
+            "slr_id": "123",
+            "surrogate_id": "Surrhurrdurrrrrr",
+        },
+        "role_specific_part": {
+            "role": "Sink",
+            "usage_rules": [],
+        },
+    }
+    index = 0
+    while len(json.dumps(payload)) < size:
+        payload["role_specific_part"]["usage_rules"].append("Usage rule number " + str(index))
+        index += 1
+    return json.dumps(payload)
+
+
+def signed_jws(payload=None, signatures=1):
+    jws_object = jws.JWS(payload=payload)
+    for index in range(signatures):
+        key = jwk.JWK(generate="EC", cvr="P-256", kid="bench-kid-" + str(index))
+        header = json.dumps({'kid': "bench-kid-" + str(index), 'jwk': json.loads(key.export_public())})
+        jws_object.add_signature(key, alg="ES256", header=header, protected=json.dumps({'alg': "ES256"}))
+    return jws_object
+
+
+def legacy_serialize(jws_object=None):
+    jws_json = jws_header_fix(malformed_jws_json=jws_object.serialize(compact=False))
+    return json.loads(jws_json), jws_json
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JWS serialization microbenchmark")
+    parser.add_argument('--payload-size', type=int, default=10000, help="Approximate payload size in bytes")
+    parser.add_argument('--signatures', type=int, default=1, help="Signatures per JWS")
+    parser.add_argument('--number', type=int, default=1000, help="Serializations per repeat")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats per case")
+    args = parser.parse_args()
+
+    logging.getLogger('mod_blackbox_services').setLevel(logging.WARNING)
+
+    jws_object = signed_jws(payload=generate_payload(size=args.payload_size), signatures=args.signatures)
+
+    legacy_dict, legacy_json = legacy_serialize(jws_object=jws_object)
+    jws_dict, jws_json = jws_serialize(jws_object=jws_object)
+    print("Payload: {} bytes, signatures: {}".format(args.payload_size, args.signatures))
+    print("Same JWS as legacy path: {}".format(legacy_dict == jws_dict))
+    print("")
+
+    cases = (
+        ("serialize + header fix + json.loads", legacy_serialize),
+        ("jws_serialize", jws_serialize),
+    )
+    for label, function in cases:
+        durations = timeit.repeat(lambda: function(jws_object=jws_object), number=args.number, repeat=args.repeat)
+        best = min(durations)
+        print("{:<38} best {:.3f} s, {:.1f} us/JWS".format(label, best, 1000000 * best / args.number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark for debug logging of large payloads.
+
+Compares eager formatting (logger.debug('data: ' + repr(data))) against lazy arguments
+(logger.debug('data: %s', lazy_repr(data))) with DEBUG enabled and disabled.
+Records are written to /dev/null by BackgroundLogHandler, so that terminal output is not measured.
+
+Usage (from Account directory):
+    python benchmarks/lazy_logging.py [--payload-size 10000] [--number 10000] [--repeat 5]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.log_helpers import BackgroundLogHandler, lazy_repr, lazy_json
+
+
+def generate_payload(size=0):
+    payload = {"rows": []}
+    index = 0
+    while len(json.dumps(payload)) < size:
+        payload["rows"].append({"id": index, "value": "Row number " + str(index)})
+        index += 1
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lazy logging microbenchmark")
+    parser.add_argument('--payload-size', type=int, default=10000, help="Approximate payload size in bytes")
+    parser.add_argument('--number', type=int, default=10000, help="Log calls per repeat")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats per case")
+    args = parser.parse_args()
+
+    payload = generate_payload(size=args.payload_size)
+
+    null_handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler = BackgroundLogHandler(handlers=[null_handler])
+    logger = logging.getLogger('lazy_logging_benchmark')
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    cases = (
+        ("eager repr", lambda: logger.debug('data: ' + repr(payload))),
+        ("lazy_repr", lambda: logger.debug('data: %s', lazy_repr(payload))),
+        ("eager json.dumps", lambda: logger.debug('data: ' + json.dumps(payload))),
+        ("lazy_json", lambda: logger.debug('data: %s', lazy_json(payload))),
+    )
+
+    print("Payload: {} bytes".format(args.payload_size))
+    for level in (logging.DEBUG, logging.INFO):
+        logger.setLevel(level)
+        print("")
+        print("Level {}".format(logging.getLevelName(level)))
+        for label, function in cases:
+            best = min(timeit.repeat(function, number=args.number, repeat=args.repeat))
+            print("{:<18} best {:.3f} s, {:.2f} us/call".format(label, best, 1000000 * best / args.number))
+        handler.flush()
+
+    print("")
+    print("Handler: {}".format(handler.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark for listing query row materialization.
+
+Compares legacy model objects (Contacts + to_dict per row) against namedtuple based ContactRow
+created straight from cursor.fetchall() tuples. Database is not needed, rows are generated.
+
+Usage (from Account directory):
+    python benchmarks/listing_rows.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mod_database.models import Contacts, ContactRow
+
+
+def generate_rows(count=0):
+    return [
+        (index, "Street " + str(index), "", "00100", "Helsinki", "Uusimaa", "Finland", "Personal", index % 2)
+        for index in range(count)
+    ]
+
+
+def legacy_listing(rows=None):
+    contacts = []
+    for entry in rows:
+        contact_obj = Contacts(
+            id=entry[0],
+            address1=entry[1],
+            address2=entry[2],
+            postal_code=entry[3],
+            city=entry[4],
+            state=entry[5],
+            country=entry[6],
+            type=entry[7],
+            prime=entry[8]
+        )
+        contacts.append(contact_obj.to_dict)
+    return contacts
+
+
+def row_listing(rows=None):
+    return ContactRow.from_rows(rows=rows)
+
+
+def row_listing_as_dicts(rows=None):
+    return [row.to_dict for row in ContactRow.from_rows(rows=rows)]
+
+
+def legacy_object_size(entry=None):
+    contact_obj = Contacts(
+        id=entry[0],
+        address1=entry[1],
+        address2=entry[2],
+        postal_code=entry[3],
+        city=entry[4],
+        state=entry[5],
+        country=entry[6],
+        type=entry[7],
+        prime=entry[8]
+    )
+    return sys.getsizeof(contact_obj) + sys.getsizeof(contact_obj.__dict__) + sys.getsizeof(contact_obj.to_dict)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Listing row benchmark")
+    parser.add_argument('--rows', type=int, default=100000, help="Rows per listing")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats per case")
+    args = parser.parse_args()
+
+    rows = generate_rows(count=args.rows)
+
+    print("Rows: {}".format(args.rows))
+    print("")
+    print("Container overhead per row, field values excluded:")
+    print("  Contacts object + to_dict: {} bytes".format(legacy_object_size(entry=rows[0])))
+    print("  ContactRow:                {} bytes".format(sys.getsizeof(ContactRow._make(rows[0]))))
+    print("")
+
+    cases = (
+        ("Contacts object + to_dict", legacy_listing),
+        ("ContactRow", row_listing),
+        ("ContactRow + to_dict", row_listing_as_dicts),
+    )
+    for label, function in cases:
+        durations = timeit.repeat(lambda: function(rows=rows), number=1, repeat=args.repeat)
+        best = min(durations)
+        print("{:<28} best {:.3f} s, {:.2f} us/row".format(label, best, 1000000 * best / args.rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+Concurrent stress benchmark for SQLite key stores of blackbox and API auth modules.
+
+Compares the legacy connection handling (os.path.exists, sqlite3.connect and close for every operation,
+rollback journal) against SqliteEngine (persistent connection per thread, WAL, busy timeout and
+parameterized statements). Threads run key lookups mixed with key inserts against a temporary database
+with the same schema as account_keys table.
+
+Usage (from Account directory):
+    python benchmarks/sqlite_stores.py [--threads 8] [--operations 2000] [--writes 0.05] [--keys 10000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mod_database.helpers import SqliteEngine
+from app.mod_blackbox.services import SCHEMA
+
+LEGACY_SCHEMA = SCHEMA[0].replace("CREATE TABLE IF NOT EXISTS", "CREATE TABLE")
+
+
+def fill_database(database=None, keys=0):
+    connection = sqlite3.connect(database)
+    connection.execute(LEGACY_SCHEMA)
+    connection.executemany(
+        "INSERT INTO account_keys (kid, account_id, jws_key) VALUES (?, ?, ?)",
+        [("acc-kid-" + str(uuid.uuid4()), index, '{"kty": "EC"}') for index in range(keys)]
+    )
+    connection.commit()
+    connection.close()
+
+
+def legacy_lookup(database=None, account_id=None):
+    if not (os.path.exists(database) and os.path.isfile(database)):
+        raise IOError("Database missing")
+    connection = sqlite3.connect(database)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, kid, account_id, jws_key FROM account_keys WHERE account_id='%s' ORDER BY id DESC LIMIT 1" % (account_id))
+        return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def legacy_insert(database=None, account_id=None):
+    if not (os.path.exists(database) and os.path.isfile(database)):
+        raise IOError("Database missing")
+    connection = sqlite3.connect(database)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO account_keys (kid, account_id, jws_key) VALUES ('%s', '%s', '%s')" %
+                       ("acc-kid-" + str(uuid.uuid4()), account_id, '{"kty": "EC"}'))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def engine_lookup(engine=None, account_id=None):
+    cursor = engine.connection().cursor()
+    cursor.execute("SELECT id, kid, account_id, jws_key FROM account_keys WHERE account_id=? ORDER BY id DESC LIMIT 1", (account_id,))
+    return cursor.fetchall()
+
+
+def engine_insert(engine=None, account_id=None):
+    connection = engine.connection()
+    try:
+        connection.execute(
+            "INSERT INTO account_keys (kid, account_id, jws_key) VALUES (?, ?, ?)",
+            ("acc-kid-" + str(uuid.uuid4()), account_id, '{"kty": "EC"}')
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def run_case(lookup=None, insert=None, threads=1, operations=0, writes=0.0, keys=0):
+    """
+    :return: Duration in seconds and number of failed operations
+    """
+    errors = [0]
+    errors_lock = threading.Lock()
+    next_account_id = [keys]
+    start_event = threading.Event()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        start_event.wait()
+        for index in range(operations):
+            try:
+                if rng.random() < writes:
+                    with errors_lock:
+                        next_account_id[0] += 1
+                        account_id = next_account_id[0]
+                    insert(account_id=account_id)
+                else:
+                    lookup(account_id=rng.randint(0, keys - 1))
+            except sqlite3.OperationalError:
+                # database is locked
+                with errors_lock:
+                    errors[0] += 1
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    start = time.time()
+    start_event.set()
+    for thread in workers:
+        thread.join()
+    return time.time() - start, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite key store stress benchmark")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent threads")
+    parser.add_argument('--operations', type=int, default=2000, help="Operations per thread")
+    parser.add_argument('--writes', type=float, default=0.05, help="Share of operations that insert a key")
+    parser.add_argument('--keys', type=int, default=10000, help="Keys in database before benchmark")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="sqlite_stores_")
+    try:
+        legacy_database = os.path.join(directory, 'legacy.sqlite')
+        engine_database = os.path.join(directory, 'engine.sqlite')
+        fill_database(database=legacy_database, keys=args.keys)
+        fill_database(database=engine_database, keys=args.keys)
+        engine = SqliteEngine(database=engine_database, schema=SCHEMA)
+
+        total = args.threads * args.operations
+        print("Threads: {}, operations: {}, writes: {:.0%}, keys: {}".format(args.threads, total, args.writes, args.keys))
+        print("")
+
+        cases = (
+            ("Connection per operation", lambda account_id: legacy_lookup(database=legacy_database, account_id=account_id),
+             lambda account_id: legacy_insert(database=legacy_database, account_id=account_id)),
+            ("SqliteEngine", lambda account_id: engine_lookup(engine=engine, account_id=account_id),
+             lambda account_id: engine_insert(engine=engine, account_id=account_id)),
+        )
+        for label, lookup, insert in cases:
+            duration, errors = run_case(
+                lookup=lookup,
+                insert=insert,
+                threads=args.threads,
+                operations=args.operations,
+                writes=args.writes,
+                keys=args.keys
+            )
+            print("{:<26} {:.3f} s, {:>9.0f} ops/s, {} failed".format(label, duration, total / duration, errors))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
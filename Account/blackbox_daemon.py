@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+"""
+Signing daemon of blackbox.
+
+Owns the key store and serves signing and verification for Account workers over Unix domain socket.
+Workers use the daemon when BLACKBOX_SOCKET is configured, see app/mod_blackbox/client.py.
+
+Usage (from Account directory):
+    python blackbox_daemon.py [--socket /run/mydata/blackbox.sock] [--processes 4] [--timeout 10]
+"""
+import argparse
+import signal
+import sys
+import threading
+
+from app import app
+from app.mod_blackbox.daemon import SigningDaemon
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Signing daemon of blackbox")
+    parser.add_argument('--socket', default=app.config["BLACKBOX_SOCKET"],
+                        help="Path of Unix domain socket")
+    parser.add_argument('--processes', type=int, default=app.config["BLACKBOX_PROCESSES"],
+                        help="Signer processes")
+    parser.add_argument('--timeout', type=float, default=app.config["BLACKBOX_TIMEOUT"],
+                        help="Seconds to wait for one call to complete")
+    args = parser.parse_args()
+
+    if not args.socket:
+        parser.error("Provide --socket or configure BLACKBOX_SOCKET")
+
+    daemon = SigningDaemon(socket_path=args.socket, processes=args.processes, call_timeout=args.timeout)
+
+    def shutdown(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so it can not be called from serving thread
+        threading.Thread(target=daemon.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    sys.stderr.write("Signing daemon listening at {} with {} signer processes\n".format(args.socket, args.processes))
+    try:
+        daemon.serve_forever()
+    finally:
+        daemon.server_close()
+
+
+if __name__ == '__main__':
+    main()
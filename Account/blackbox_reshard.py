@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Resharding tool for key store of blackbox.
+
+Copies keys from one key store layout to another while Account keeps running. Resharding is done in three steps:
+    1. Set KEY_STORE_SHARDS to new number of shards and KEY_STORE_PREVIOUS_SHARDS to current number of shards in
+       config.py and restart Account and signing daemon. New keys are stored to new layout and
+       keys missing from new layout are read from previous layout.
+    2. Run this tool to copy keys from previous layout to new layout.
+    3. Set KEY_STORE_PREVIOUS_SHARDS back to None and restart. Files of previous layout can be removed.
+
+Usage (from Account directory):
+    python blackbox_reshard.py --from-shards 1 --to-shards 8 [--batch-size 500]
+"""
+import argparse
+import sys
+
+from app.mod_blackbox.services import copy_keys_to_layout, KEY_STORE_SHARDS, KEY_STORE_PREVIOUS_SHARDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resharding tool for key store of blackbox")
+    parser.add_argument('--from-shards', type=int, default=KEY_STORE_PREVIOUS_SHARDS,
+                        help="Shards in layout to copy from, Defaults to KEY_STORE_PREVIOUS_SHARDS")
+    parser.add_argument('--to-shards', type=int, default=KEY_STORE_SHARDS,
+                        help="Shards in layout to copy to, Defaults to KEY_STORE_SHARDS")
+    parser.add_argument('--batch-size', type=int, default=500, help="Keys copied in one transaction")
+    args = parser.parse_args()
+
+    if args.from_shards is None:
+        parser.error("Provide --from-shards or configure KEY_STORE_PREVIOUS_SHARDS")
+    if args.from_shards == args.to_shards:
+        parser.error("Layouts to copy from and to must differ")
+
+    def progress(counters):
+        sys.stderr.write("Read {read}, copied {copied}, already in target {skipped}\r".format(**counters))
+
+    counters = copy_keys_to_layout(
+        source_shards=args.from_shards,
+        target_shards=args.to_shards,
+        batch_size=args.batch_size,
+        progress=progress
+    )
+    sys.stderr.write("\n")
+    sys.stderr.write("Keys copied from {} shards to {} shards: {}\n".format(args.from_shards, args.to_shards, counters))
+
+
+if __name__ == '__main__':
+    main()
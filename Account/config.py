@@ -17,6 +17,8 @@ LOG_FORMATTER = '%(asctime)s - %(name)s in function %(funcName)s at line: %(line
 LOG_PATH = './logs/'
 LOG_FILE = LOG_PATH + 'account.log'
 LOG_TO_FILE = False
+LOG_LEVEL = 'DEBUG'  # 'INFO' in production skips formatting of debug entries. Default: 'DEBUG'
+LOG_QUEUE_SIZE = 10000  # Log records waiting for background writer, more are dropped. Default: 10000
 
 # Define the application directory
 import os
@@ -37,6 +39,68 @@ MYSQL_CHARSET = 'utf8'  # If present, the connection character set will be chang
 #MYSQL_SQL_MODE = ''  # If present, the session SQL mode will be set to the given string.
 #MYSQL_CURSORCLASS = ''  # If present, the cursor class will be set to the given string.
 
+# Database connection pool
+MYSQL_POOL_MIN_SIZE = 1  # Connections opened when pool is created. Default: 1
+MYSQL_POOL_MAX_SIZE = 10  # Maximum number of connections per process. Default: 10
+MYSQL_POOL_MAX_LIFETIME = 3600  # Connections older than this (in seconds) are reopened. 0 disables. Default: 3600
+MYSQL_POOL_BORROW_TIMEOUT = 5  # Seconds to wait for free connection before responding with 503. Default: 5
+MYSQL_POOL_PING_ON_BORROW = True  # Check connection with ping before it is handed out. Default: True
+
+# Password hashing
+BCRYPT_ROUNDS = 12  # bcrypt cost of new password hashes. Existing hashes keep their cost. Default: 12
+HASH_POOL_SIZE = 2  # Worker processes for bcrypt, 0 hashes in request thread. Default: 2
+HASH_POOL_QUEUE_SIZE = 32  # Hashing operations pending at a time, more are rejected with 503. Default: 32
+HASH_POOL_BULK_QUEUE_SIZE = 8  # Part of HASH_POOL_QUEUE_SIZE bulk operations like Account import can use. Default: 8
+HASH_POOL_TIMEOUT = 10  # Seconds to wait for hashing result before responding with 503. Default: 10
+
+# Cache of logged in Users loaded by Flask-Login, per process
+USER_CACHE_ENABLED = True  # Default: True
+USER_CACHE_SIZE = 1000  # Maximum number of cached Users. Default: 1000
+USER_CACHE_TTL = 300  # Seconds a cached User is used before it is loaded again from database. Default: 300
+
+# Account import
+ACCOUNT_IMPORT_CHUNK_SIZE = 500  # Accounts stored in one transaction in bulk import. Default: 500
+
+# Account export
+ACCOUNT_EXPORT_FETCH_SIZE = 500  # Rows fetched at a time from unbuffered cursor when streaming export. Default: 500
+
+# Cache of successful HTTP Basic verifications of /api/auth/user/, per process. Keyed by HMAC of credentials.
+CREDENTIAL_CACHE_ENABLED = True  # Default: True
+CREDENTIAL_CACHE_SIZE = 1000  # Maximum number of cached verifications. Default: 1000
+CREDENTIAL_CACHE_TTL = 60  # Seconds verified credentials are accepted without bcrypt and database. Default: 60
+
+# Cache of Authorization token data, per process
+AUTH_TOKEN_CACHE_ENABLED = True  # Default: True
+AUTH_TOKEN_CACHE_SIZE = 10000  # Maximum number of cached consents. Default: 10000
+AUTH_TOKEN_CACHE_TTL = 3600  # Seconds cached Authorization token data is used before it is fetched again from database. Default: 3600
+
+# Cache of Account IDs of API Keys, per process
+API_KEY_CACHE_ENABLED = True  # Default: True
+API_KEY_CACHE_SIZE = 10000  # Maximum number of cached API Keys. Default: 10000
+API_KEY_CACHE_TTL = 300  # Seconds cached Account ID of API Key is used before it is fetched again from database. Default: 300
+API_KEY_NEGATIVE_CACHE_SIZE = 10000  # Maximum number of cached unknown API Keys, kept apart from known ones. Default: 10000
+API_KEY_NEGATIVE_CACHE_TTL = 60  # Seconds unknown API Key is rejected without database lookup. Default: 60
+
+# Signed API tokens, verified without database. See mod_api_auth/helpers.py
+API_TOKEN_ENABLED = False  # /api/auth/user/ and /api/auth/sdk/ issue signed tokens instead of API Keys. Default: False
+API_TOKEN_SECRETS = []  # HMAC secrets, first one signs and all verify. Must be same on all instances and set if tokens are enabled. Default: []
+API_TOKEN_TTL = 3600  # Seconds API token is valid. Default: 3600
+API_TOKEN_REVOCATION_LIST_SIZE = 10000  # Maximum number of revocation checks of tokens cached in memory. Default: 10000
+API_TOKEN_REVOCATION_CACHE_TTL = 10  # Seconds token is accepted without checking revocations stored by other workers. Default: 10
+
+# Requests with this header get durations of handling stages in meta of response, None disables. Default: 'X-Debug-Timing'
+DEBUG_TIMING_HEADER = 'X-Debug-Timing'
+
+# Signing daemon of blackbox, see blackbox_daemon.py
+BLACKBOX_SOCKET = None  # Path of Unix domain socket of signing daemon, None signs in request process. Default: None
+BLACKBOX_TIMEOUT = 10  # Seconds to wait for response of signing daemon. Default: 10
+BLACKBOX_PROCESSES = 4  # Signer processes of signing daemon. Default: 4
+
+# Key store of blackbox, see blackbox_reshard.py for changing number of shards
+KEY_STORE_SHARDS = 1  # Key store is partitioned by account ID into this many database files. Default: 1
+KEY_STORE_PREVIOUS_SHARDS = None  # Shards of previous layout while resharding, keys missing from current layout are read from it. Default: None
+KEY_POOL_SIZE = 50  # Pre-generated keys kept ready for new accounts in each process, 0 disables pool. Default: 50
+
 
 # Application threads. A common general assumption is
 # using 2 per available processor cores - to handle
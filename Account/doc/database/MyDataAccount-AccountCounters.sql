@@ -0,0 +1,39 @@
+-- Migration for existing MyDataAccount databases
+-- Adds AccountCounters table and computes counters of existing Accounts
+-- from Service Link Records, Consent Records and their latest status records.
+-- Consents are counted by Sink's Consent Records, one per consent.
+
+USE `MyDataAccount` ;
+
+CREATE TABLE IF NOT EXISTS `MyDataAccount`.`AccountCounters` (
+  `Accounts_id` INT NOT NULL,
+  `serviceLinks` INT NOT NULL DEFAULT 0,
+  `serviceLinksActive` INT NOT NULL DEFAULT 0,
+  `serviceLinksRemoved` INT NOT NULL DEFAULT 0,
+  `consents` INT NOT NULL DEFAULT 0,
+  `consentsActive` INT NOT NULL DEFAULT 0,
+  `consentsPaused` INT NOT NULL DEFAULT 0,
+  `consentsWithdrawn` INT NOT NULL DEFAULT 0,
+  `updated` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`Accounts_id`),
+  CONSTRAINT `fk_AccountCounters_Accounts1`
+    FOREIGN KEY (`Accounts_id`)
+    REFERENCES `MyDataAccount`.`Accounts` (`id`)
+    ON DELETE NO ACTION
+    ON UPDATE NO ACTION)
+ENGINE = InnoDB;
+
+INSERT INTO MyDataAccount.AccountCounters (Accounts_id, serviceLinks, serviceLinksActive, serviceLinksRemoved, consents, consentsActive, consentsPaused, consentsWithdrawn)
+SELECT acc.id,
+  (SELECT count(slr.id) FROM MyDataAccount.ServiceLinkRecords slr WHERE slr.Accounts_id = acc.id),
+  (SELECT count(ssr.id) FROM MyDataAccount.ServiceLinkStatusRecords ssr JOIN MyDataAccount.ServiceLinkRecords slr ON ssr.ServiceLinkRecords_id = slr.id WHERE slr.Accounts_id = acc.id AND ssr.serviceLinkStatus = 'Active' AND ssr.id = (SELECT max(latest.id) FROM MyDataAccount.ServiceLinkStatusRecords latest WHERE latest.ServiceLinkRecords_id = slr.id)),
+  (SELECT count(ssr.id) FROM MyDataAccount.ServiceLinkStatusRecords ssr JOIN MyDataAccount.ServiceLinkRecords slr ON ssr.ServiceLinkRecords_id = slr.id WHERE slr.Accounts_id = acc.id AND ssr.serviceLinkStatus = 'Removed' AND ssr.id = (SELECT max(latest.id) FROM MyDataAccount.ServiceLinkStatusRecords latest WHERE latest.ServiceLinkRecords_id = slr.id)),
+  (SELECT count(cr.id) FROM MyDataAccount.ConsentRecords cr JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink'),
+  (SELECT count(csr.id) FROM MyDataAccount.ConsentStatusRecords csr JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink' AND csr.consentStatus = 'Active' AND csr.id = (SELECT max(latest.id) FROM MyDataAccount.ConsentStatusRecords latest WHERE latest.ConsentRecords_id = cr.id)),
+  (SELECT count(csr.id) FROM MyDataAccount.ConsentStatusRecords csr JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink' AND csr.consentStatus = 'Paused' AND csr.id = (SELECT max(latest.id) FROM MyDataAccount.ConsentStatusRecords latest WHERE latest.ConsentRecords_id = cr.id)),
+  (SELECT count(csr.id) FROM MyDataAccount.ConsentStatusRecords csr JOIN MyDataAccount.ConsentRecords cr ON csr.ConsentRecords_id = cr.id JOIN MyDataAccount.ServiceLinkRecords slr ON cr.ServiceLinkRecords_id = slr.id WHERE slr.Accounts_id = acc.id AND cr.role = 'Sink' AND csr.consentStatus = 'Withdrawn' AND csr.id = (SELECT max(latest.id) FROM MyDataAccount.ConsentStatusRecords latest WHERE latest.ConsentRecords_id = cr.id))
+FROM MyDataAccount.Accounts acc
+ON DUPLICATE KEY UPDATE Accounts_id = Accounts_id;
+
+GRANT CREATE TEMPORARY TABLES, DELETE, DROP, INSERT, LOCK TABLES, SELECT, UPDATE ON MyDataAccount.* TO 'mydataaccount'@'%';
+FLUSH PRIVILEGES;
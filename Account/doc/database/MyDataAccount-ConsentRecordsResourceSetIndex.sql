@@ -0,0 +1,8 @@
+-- Migration for existing MyDataAccount databases
+-- Adds index used to find Source's Consent Record by Resource Set and role
+-- when Authorization token data is fetched.
+
+USE `MyDataAccount` ;
+
+ALTER TABLE `MyDataAccount`.`ConsentRecords`
+  ADD INDEX `ResourceSetId_role_idx` (`ResourceSetId` ASC, `role` ASC);
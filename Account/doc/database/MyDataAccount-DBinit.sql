@@ -31,6 +31,30 @@ CREATE TABLE IF NOT EXISTS `MyDataAccount`.`Accounts` (
 ENGINE = InnoDB;
 
 
+-- -----------------------------------------------------
+-- Table `MyDataAccount`.`AccountCounters`
+-- -----------------------------------------------------
+DROP TABLE IF EXISTS `MyDataAccount`.`AccountCounters` ;
+
+CREATE TABLE IF NOT EXISTS `MyDataAccount`.`AccountCounters` (
+  `Accounts_id` INT NOT NULL,
+  `serviceLinks` INT NOT NULL DEFAULT 0,
+  `serviceLinksActive` INT NOT NULL DEFAULT 0,
+  `serviceLinksRemoved` INT NOT NULL DEFAULT 0,
+  `consents` INT NOT NULL DEFAULT 0,
+  `consentsActive` INT NOT NULL DEFAULT 0,
+  `consentsPaused` INT NOT NULL DEFAULT 0,
+  `consentsWithdrawn` INT NOT NULL DEFAULT 0,
+  `updated` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`Accounts_id`),
+  CONSTRAINT `fk_AccountCounters_Accounts1`
+    FOREIGN KEY (`Accounts_id`)
+    REFERENCES `MyDataAccount`.`Accounts` (`id`)
+    ON DELETE NO ACTION
+    ON UPDATE NO ACTION)
+ENGINE = InnoDB;
+
+
 -- -----------------------------------------------------
 -- Table `MyDataAccount`.`Particulars`
 -- -----------------------------------------------------
@@ -96,6 +120,7 @@ CREATE TABLE IF NOT EXISTS `MyDataAccount`.`ConsentRecords` (
   INDEX `fk_ConsentRecords_ServiceLinkRecords1_idx` (`ServiceLinkRecords_id` ASC),
   UNIQUE INDEX `ConsentRecordId_UNIQUE` (`consentRecordId` ASC),
   UNIQUE INDEX `serviceLinkRecordId_UNIQUE` (`serviceLinkRecordId` ASC),
+  INDEX `ResourceSetId_role_idx` (`ResourceSetId` ASC, `role` ASC),
   CONSTRAINT `fk_ConsentRecords_ServiceLinkRecords1`
     FOREIGN KEY (`ServiceLinkRecords_id`)
     REFERENCES `MyDataAccount`.`ServiceLinkRecords` (`id`)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bulk import of Accounts from NDJSON file.
+
+Each line is one Account in the same format as in POST /api/accounts/.
+Result of each row is written to stdout as NDJSON and summary to stderr.
+
+Usage (from Account directory):
+    python import_accounts.py accounts.ndjson [--chunk-size 500] > results.ndjson
+    cat accounts.ndjson | python import_accounts.py - > results.ndjson
+"""
+import argparse
+import json
+import sys
+import time
+
+from app import app
+from app.mod_account.controllers import import_accounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import of Accounts from NDJSON file")
+    parser.add_argument('file', help="NDJSON file, - for stdin")
+    parser.add_argument('--chunk-size', type=int, default=app.config["ACCOUNT_IMPORT_CHUNK_SIZE"],
+                        help="Accounts stored in one transaction")
+    args = parser.parse_args()
+
+    if args.file == '-':
+        lines = sys.stdin
+    else:
+        lines = open(args.file, 'r')
+
+    created = 0
+    failed = 0
+    start = time.time()
+
+    try:
+        with app.app_context():
+            for result in import_accounts(lines=lines, chunk_size=args.chunk_size):
+                if result['status'] == 'created':
+                    created += 1
+                else:
+                    failed += 1
+                sys.stdout.write(json.dumps(result) + "\n")
+                if (created + failed) % 1000 == 0:
+                    sys.stderr.write("{} rows processed\n".format(created + failed))
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+    sys.stderr.write("Created {} Accounts, {} rows failed in {:.1f} s\n".format(created, failed, time.time() - start))
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
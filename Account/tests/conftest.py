@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests are run from Account directory with: python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+Service Link Records signed like Account and Service_Components sign them.
+"""
+import json
+from uuid import uuid4
+
+from jwcrypto import jwk
+
+from app.mod_blackbox import jws_fast_path
+from app.mod_blackbox.services import gen_key_as_jwk, jws_generate, jws_sign, jws_object_to_json
+
+SLR_PAYLOAD = {"surrogate_id": "surrogate", "service_id": "service", "operator_id": "operator"}
+
+
+def account_key():
+    """
+    Key IDs are unique, as key handles are cached by them.
+    """
+    return jwk.JWK(**json.loads(gen_key_as_jwk(account_kid=uuid4().hex)))
+
+
+def key_id(key=None):
+    return json.loads(key.export_public())["kid"]
+
+
+def service_key():
+    return jwk.JWK.generate(kty='RSA', size=2048, kid="service-kid")
+
+
+def sign_by_account(key=None):
+    jws_object = jws_sign(account_id=1, account_kid=key_id(key=key), jws_object=jws_generate(payload=SLR_PAYLOAD),
+                          jwk_object=key, jwk_public_json=key.export_public())
+    return json.loads(jws_object_to_json(jws_object=jws_object))
+
+
+def sign_by_service(slr=None, key=None):
+    """
+    Adds RS256 signature as Service_Components StoreSLR does.
+    """
+    slr = dict(slr, payload=jws_fast_path.base64url_encode(jws_fast_path.base64url_decode(slr["payload"])))
+    header = {"kid": "service-kid", "jwk": json.loads(key.export_public())}
+    return jws_fast_path.add_signature(slr, jws_fast_path.signing_key(json.loads(key.export())),
+                                       alg="RS256", header=header, protected_json=json.dumps({"alg": "RS256"}))
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bulk import of Accounts in chunks.
+"""
+import json
+
+import pytest
+
+from app.mod_account import controllers as account_controllers
+from app.mod_account.controllers import import_accounts
+
+
+class FakeAccount(object):
+    def __init__(self, id=None):
+        self.id = id
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeDb(object):
+    def __init__(self, connection=None):
+        self.connection = connection
+
+
+class AccountStore(object):
+    """
+    Stores Accounts in memory. Transactions containing username given in failing_username fail.
+    """
+    def __init__(self, failing_username=None):
+        self.failing_username = failing_username
+        self.transactions = []
+        self.accounts = []
+
+    def store_accounts(self, cursor=None, account_entries=None):
+        self.transactions.append([entry['username'] for entry in account_entries])
+        if self.failing_username in self.transactions[-1]:
+            raise Exception("Duplicate username")
+        accounts = []
+        for entry in account_entries:
+            self.accounts.append(entry)
+            accounts.append(FakeAccount(id=len(self.accounts)))
+        return cursor, accounts
+
+
+def hash_passwords(passwords=None):
+    return [('Weak password', None, None) if password == 'weak' else (None, 'salt', 'hash-' + password)
+            for password in passwords]
+
+
+def account_line(username=None, password='Hello'):
+    return json.dumps({
+        'username': username,
+        'password': password,
+        'firstName': 'Erkki',
+        'lastName': 'Esimerkki',
+        'dateOfBirth': '2016-03-27',
+        'email': username + '@example.com',
+        'acceptTermsOfService': 'True'
+    })
+
+
+@pytest.fixture
+def account_import(monkeypatch):
+    store = AccountStore()
+    keys = []
+    monkeypatch.setattr(account_controllers, 'db', FakeDb(connection=FakeConnection()))
+    monkeypatch.setattr(account_controllers, 'get_db_cursor', lambda: None)
+    monkeypatch.setattr(account_controllers, 'hash_passwords', hash_passwords)
+    monkeypatch.setattr(account_controllers, 'store_accounts', store.store_accounts)
+    monkeypatch.setattr(account_controllers, 'invalidate_cached_credentials', lambda account_id=None: None)
+    monkeypatch.setattr(account_controllers, 'invalidate_cached_user', lambda account_id=None: None)
+    monkeypatch.setattr(account_controllers, 'gen_account_keys', lambda account_ids=None: keys.extend(account_ids))
+    monkeypatch.setattr(account_controllers, 'gen_account_api_keys', lambda account_ids=None: None)
+    return store, keys
+
+
+def test_chunks_are_stored_in_one_transaction(account_import):
+    store, keys = account_import
+    lines = [account_line(username='user' + str(index)) for index in range(5)]
+
+    results = list(import_accounts(lines=lines, chunk_size=2))
+
+    assert [result['status'] for result in results] == ['created'] * 5
+    assert store.transactions == [['user0', 'user1'], ['user2', 'user3'], ['user4']]
+    assert [account['pwd_hash'] for account in store.accounts] == ['hash-Hello'] * 5
+    assert keys == ['1', '2', '3', '4', '5']
+
+
+def test_failing_rows_are_reported_without_aborting_import(account_import):
+    store, keys = account_import
+    store.failing_username = 'taken'
+    lines = [
+        account_line(username='user0'),
+        'not json',
+        account_line(username='taken'),
+        account_line(username='weakling', password='weak'),
+        '',
+        account_line(username='user1'),
+    ]
+
+    results = list(import_accounts(lines=lines, chunk_size=10))
+
+    assert [(result['line'], result['status']) for result in sorted(results, key=lambda result: result['line'])] == [
+        (1, 'created'), (2, 'failed'), (3, 'failed'), (4, 'failed'), (6, 'created')
+    ]
+    # Failed transaction is retried one Account at a time
+    assert store.transactions == [['user0', 'taken', 'user1'], ['user0'], ['taken'], ['user1']]
+    assert [account['username'] for account in store.accounts] == ['user0', 'user1']
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+Issuing, verification and revocation of signed API tokens.
+"""
+import os
+
+import pytest
+
+from app import app
+from app.mod_api_auth import controllers as api_auth_controllers
+from app.mod_api_auth import services as api_auth_services
+from app.mod_api_auth.controllers import issue_api_token, verify_api_token, revoke_api_token, revoked_api_tokens
+from app.mod_api_auth.helpers import ApiTokenError
+from app.mod_database.helpers import SqliteEngine
+
+
+@pytest.fixture
+def api_token_store(monkeypatch, tmpdir):
+    monkeypatch.setitem(app.config, "API_TOKEN_SECRETS", ['new-secret', 'old-secret'])
+    engine = SqliteEngine(
+        database=os.path.join(str(tmpdir), 'apiauth.sqlite'),
+        schema=api_auth_services.SCHEMA,
+        migrations=(api_auth_services.migrate_api_key_hashes,)
+    )
+    monkeypatch.setattr(api_auth_services, 'engine', engine)
+    revoked_api_tokens.clear()
+    yield engine
+    revoked_api_tokens.clear()
+
+
+def test_issued_token_is_verified_for_its_scope(api_token_store):
+    token = issue_api_token(subject=42, scope='user')
+
+    claims = verify_api_token(api_key=token, scope='user')
+
+    assert claims['sub'] == '42'
+    with pytest.raises(ApiTokenError):
+        verify_api_token(api_key=token, scope='sdk')
+
+
+def test_token_signed_with_old_secret_is_verified(monkeypatch, api_token_store):
+    monkeypatch.setitem(app.config, "API_TOKEN_SECRETS", ['old-secret'])
+    token = issue_api_token(subject=42, scope='user')
+    monkeypatch.setitem(app.config, "API_TOKEN_SECRETS", ['new-secret', 'old-secret'])
+
+    assert verify_api_token(api_key=token, scope='user')['sub'] == '42'
+
+
+def test_tampered_token_is_rejected(api_token_store):
+    token = issue_api_token(subject=42, scope='user')
+    payload, signature = token.rsplit('.', 1)
+    tampered = payload + '.' + ('A' if signature[0] != 'A' else 'B') + signature[1:]
+
+    with pytest.raises(ApiTokenError):
+        verify_api_token(api_key=tampered, scope='user')
+    assert not revoke_api_token(api_key=tampered)
+
+
+def test_revocation_is_seen_by_other_workers(api_token_store):
+    token = issue_api_token(subject=42, scope='user')
+    other_token = issue_api_token(subject=42, scope='user')
+
+    assert revoke_api_token(api_key=token)
+    # Cache of other worker does not know about the revocation
+    revoked_api_tokens.clear()
+
+    with pytest.raises(ApiTokenError):
+        verify_api_token(api_key=token, scope='user')
+    assert verify_api_token(api_key=other_token, scope='user')['sub'] == '42'
+
+
+def test_revocation_check_is_cached(monkeypatch, api_token_store):
+    token = issue_api_token(subject=42, scope='user')
+    verify_api_token(api_key=token, scope='user')
+
+    def fail(**kwargs):
+        raise AssertionError("Revocation checked from database")
+    monkeypatch.setattr(api_auth_controllers, 'is_api_token_revoked_in_db', fail)
+
+    assert verify_api_token(api_key=token, scope='user')['sub'] == '42'
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""
+Multi-row INSERT of model objects.
+"""
+from app.mod_database import models
+from app.mod_database.models import Particulars, ServiceLinkStatusRecord
+
+
+def test_bulk_to_db_inserts_columns_of_model(monkeypatch):
+    inserts = []
+
+    def execute_sql_insert_many(cursor=None, sql_query=None, arguments=None):
+        inserts.append((sql_query, arguments))
+        return cursor, [11, 12]
+    monkeypatch.setattr(models, 'execute_sql_insert_many', execute_sql_insert_many)
+    objects = [
+        Particulars(firstname='Erkki', lastname='Esimerkki', date_of_birth='01-02-1980', img_url='a.png', account_id=1),
+        Particulars(firstname='Iso', lastname='Kenkku', date_of_birth='03-04-1990', img_url='b.png', account_id=2),
+    ]
+
+    cursor, last_ids = Particulars.bulk_to_db(cursor='cursor', objects=objects)
+
+    assert inserts == [(
+        "INSERT INTO Particulars (firstname, lastname, dateOfBirth, img_url, Accounts_id) "
+        "VALUES (%s, %s, STR_TO_DATE(%s, '%%d-%%m-%%Y'), %s, %s)",
+        [('Erkki', 'Esimerkki', '01-02-1980', 'a.png', 1), ('Iso', 'Kenkku', '03-04-1990', 'b.png', 2)]
+    )]
+    assert (cursor, last_ids) == ('cursor', [11, 12])
+    assert [obj.id for obj in objects] == [11, 12]
+
+
+def test_bulk_to_db_converts_values_like_to_db(monkeypatch):
+    inserts = []
+
+    def execute_sql_insert_many(cursor=None, sql_query=None, arguments=None):
+        inserts.append(arguments)
+        return cursor, [5]
+    monkeypatch.setattr(models, 'execute_sql_insert_many', execute_sql_insert_many)
+    record = ServiceLinkStatusRecord(
+        service_link_status_record_id='ssr-1',
+        status='Active',
+        service_link_status_record={'ssr': 1},
+        service_link_records_id='3',
+        service_link_record_id='slr-1',
+        issued_at=1234,
+        prev_record_id='NULL'
+    )
+
+    ServiceLinkStatusRecord.bulk_to_db(cursor='cursor', objects=[record])
+
+    assert inserts[0][0][3] == 3
+    assert inserts[0][0][5] == '1234'
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+Caches of Users, credentials and Authorization token data are invalidated after commit.
+"""
+import pytest
+
+from app.mod_account import controllers as account_controllers
+from app.mod_auth.helpers import credential_cache, user_cache
+from app.mod_authorization import controllers as authorization_controllers
+from app.mod_authorization.services import auth_token_data_cache, invalidate_auth_token_data
+from app.mod_database.models import ConsentRecord, ConsentStatusRecord, ServiceLinkRecord
+
+
+class FakeAccount(object):
+    def __init__(self, id=None):
+        self.id = id
+
+
+class FakeConnection(object):
+    """
+    Records state of cache at commit, so that tests can check that nothing was invalidated before it.
+    """
+    def __init__(self, on_commit=None, fail=False):
+        self.on_commit = on_commit
+        self.fail = fail
+        self.committed = []
+        self.rolled_back = 0
+
+    def commit(self):
+        self.committed.append(self.on_commit())
+        if self.fail:
+            raise Exception("Commit failed")
+
+    def rollback(self):
+        self.rolled_back += 1
+
+
+class FakeDb(object):
+    def __init__(self, connection=None):
+        self.connection = connection
+
+
+@pytest.fixture
+def clean_caches():
+    user_cache.clear()
+    credential_cache.clear()
+    auth_token_data_cache.clear()
+    yield
+    user_cache.clear()
+    credential_cache.clear()
+    auth_token_data_cache.clear()
+
+
+def store_with_connection(monkeypatch, connection=None):
+    monkeypatch.setattr(account_controllers, 'db', FakeDb(connection=connection))
+    monkeypatch.setattr(account_controllers, 'get_db_cursor', lambda: None)
+    monkeypatch.setattr(
+        account_controllers,
+        'store_accounts',
+        lambda cursor=None, account_entries=None: (cursor, [FakeAccount(id=entry['id']) for entry in account_entries])
+    )
+    results = [{}]
+    account_controllers.store_imported_accounts(account_entries=[{'id': 1}], results=results)
+    return results
+
+
+def test_user_and_credentials_are_invalidated_after_commit(monkeypatch, clean_caches):
+    user_cache.set(key=u'1', value='user-1')
+    user_cache.set(key=u'2', value='user-2')
+    credential_cache.set(key='credentials-1', value={'account_id': '1'}, tag='1')
+    credential_cache.set(key='credentials-2', value={'account_id': '2'}, tag='2')
+    connection = FakeConnection(
+        on_commit=lambda: (user_cache.get(key=u'1'), credential_cache.get(key='credentials-1'))
+    )
+
+    results = store_with_connection(monkeypatch, connection=connection)
+
+    assert results[0]['status'] == 'created'
+    assert connection.committed == [('user-1', {'account_id': '1'})]
+    assert user_cache.get(key=u'1') is None
+    assert user_cache.get(key=u'2') == 'user-2'
+    assert credential_cache.get(key='credentials-1') is None
+    assert credential_cache.get(key='credentials-2') == {'account_id': '2'}
+
+
+def test_user_and_credentials_are_kept_if_commit_fails(monkeypatch, clean_caches):
+    user_cache.set(key=u'1', value='user-1')
+    credential_cache.set(key='credentials-1', value={'account_id': '1'}, tag='1')
+    connection = FakeConnection(on_commit=lambda: None, fail=True)
+
+    results = store_with_connection(monkeypatch, connection=connection)
+
+    assert 'errors' in results[0]
+    assert connection.rolled_back == 2
+    assert user_cache.get(key=u'1') == 'user-1'
+    assert credential_cache.get(key='credentials-1') == {'account_id': '1'}
+
+
+def test_auth_token_data_is_invalidated_by_sink_cr_id_and_source_cr(clean_caches):
+    auth_token_data_cache.set(key='sink-cr-1', value={'source_cr_primary_key': '10'}, tag='10')
+    auth_token_data_cache.set(key='sink-cr-2', value={'source_cr_primary_key': '10'}, tag='10')
+    auth_token_data_cache.set(key='sink-cr-3', value={'source_cr_primary_key': '30'}, tag='30')
+    auth_token_data_cache.set(key='sink-cr-4', value={'source_cr_primary_key': '40'}, tag='40')
+
+    invalidate_auth_token_data(sink_cr_id='sink-cr-3', source_cr_primary_key=10)
+
+    assert auth_token_data_cache.get(key='sink-cr-1') is None
+    assert auth_token_data_cache.get(key='sink-cr-2') is None
+    assert auth_token_data_cache.get(key='sink-cr-3') is None
+    assert auth_token_data_cache.get(key='sink-cr-4') == {'source_cr_primary_key': '40'}
+
+
+def bulk_to_db_with_ids(first_id=None):
+    def bulk_to_db(cls, cursor=None, objects=None):
+        for index, obj in enumerate(objects):
+            obj.id = first_id + index
+        return cursor, [obj.id for obj in objects]
+    return classmethod(bulk_to_db)
+
+
+def test_auth_token_data_is_invalidated_after_consent_is_committed(monkeypatch, clean_caches):
+    auth_token_data_cache.set(key='sink-cr', value={'source_cr_primary_key': '10'}, tag='10')
+    connection = FakeConnection(on_commit=lambda: auth_token_data_cache.get(key='sink-cr'))
+    monkeypatch.setattr(authorization_controllers, 'db', FakeDb(connection=connection))
+    monkeypatch.setattr(authorization_controllers, 'get_db_cursor', lambda: None)
+    monkeypatch.setattr(authorization_controllers, 'update_account_counters', lambda cursor=None, **kwargs: cursor)
+    monkeypatch.setattr(ServiceLinkRecord, 'bulk_from_db', classmethod(lambda cls, cursor=None, objects=None: cursor))
+    monkeypatch.setattr(ConsentRecord, 'bulk_to_db', bulk_to_db_with_ids(first_id=10))
+    monkeypatch.setattr(ConsentStatusRecord, 'bulk_to_db', bulk_to_db_with_ids(first_id=20))
+
+    authorization_controllers.store_cr_and_csr(
+        source_slr_entry=ServiceLinkRecord(account_id=1),
+        sink_slr_entry=ServiceLinkRecord(account_id=1),
+        source_cr_entry=ConsentRecord(consent_id='source-cr', role='Source'),
+        source_csr_entry=ConsentStatusRecord(status='Active'),
+        sink_cr_entry=ConsentRecord(consent_id='sink-cr', role='Sink'),
+        sink_csr_entry=ConsentStatusRecord(status='Active')
+    )
+
+    assert connection.committed == [{'source_cr_primary_key': '10'}]
+    assert auth_token_data_cache.get(key='sink-cr') is None
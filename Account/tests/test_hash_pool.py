@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Queue slot accounting and bulk hashing of HashPool.
+"""
+import threading
+import time
+
+import pytest
+
+from app.helpers import ApiError
+from app.mod_auth import services
+from app.mod_auth.services import HashPool
+
+
+def sleep_task(seconds=0.0):
+    time.sleep(seconds)
+    return seconds
+
+
+def slow_hash_task(password=None, rounds=4):
+    time.sleep(0.2)
+    return None, 'salt', 'hash-' + password, 0.2
+
+
+def wait_until_idle(hash_pool=None, timeout=5.0):
+    deadline = time.time() + timeout
+    while hash_pool.stats()['pending'] and time.time() < deadline:
+        time.sleep(0.01)
+    return hash_pool.stats()['pending'] == 0
+
+
+@pytest.fixture
+def hash_pool():
+    hash_pool = HashPool(pool_size=1, queue_size=1, timeout=0.1, rounds=4, bulk_queue_size=1)
+    yield hash_pool
+    hash_pool.close()
+
+
+def test_timed_out_operation_keeps_slot_until_it_completes(hash_pool):
+    with pytest.raises(ApiError) as exc_info:
+        hash_pool._run(operation='hash', function=sleep_task, kwargs={'seconds': 0.5})
+    assert exc_info.value.title == "Password hashing timed out"
+    assert hash_pool.stats()['pending'] == 1
+
+    # Operation is still running in pool, so queue is full
+    with pytest.raises(ApiError) as exc_info:
+        hash_pool._run(operation='verify', function=sleep_task, kwargs={'seconds': 0.0})
+    assert exc_info.value.title == "Password hashing queue is full"
+
+    assert wait_until_idle(hash_pool=hash_pool)
+    result, wait_time = hash_pool._run(operation='verify', function=sleep_task, kwargs={'seconds': 0.0})
+    assert result == 0.0
+
+
+def test_completed_operation_releases_slot_once(hash_pool):
+    result, wait_time = hash_pool._run(operation='hash', function=sleep_task, kwargs={'seconds': 0.0})
+    assert wait_until_idle(hash_pool=hash_pool)
+
+    assert hash_pool._slots.acquire(False)
+    assert not hash_pool._slots.acquire(False)
+    hash_pool._slots.release()
+
+
+def test_bulk_hashing_leaves_slots_for_other_operations(monkeypatch):
+    monkeypatch.setattr(services, '_hash_password_task', slow_hash_task)
+    hash_pool = HashPool(pool_size=2, queue_size=3, timeout=5, rounds=4, bulk_queue_size=2)
+    results = []
+    bulk = threading.Thread(target=lambda: results.extend(hash_pool.hash_passwords(passwords=[str(i) for i in range(6)])))
+    try:
+        bulk.start()
+        time.sleep(0.1)
+        assert hash_pool.stats()['pending'] <= 2
+
+        result, wait_time = hash_pool._run(operation='verify', function=sleep_task, kwargs={'seconds': 0.0})
+        assert result == 0.0
+        assert hash_pool.stats()['verify']['rejected'] == 0
+
+        bulk.join()
+        assert [pwd_hash for error, salt, pwd_hash in results] == ['hash-' + str(i) for i in range(6)]
+    finally:
+        hash_pool.close()
+
+
+def test_bulk_hashing_reports_timeouts_per_password(monkeypatch):
+    monkeypatch.setattr(services, '_hash_password_task', slow_hash_task)
+    hash_pool = HashPool(pool_size=1, queue_size=2, timeout=0.1, rounds=4, bulk_queue_size=2)
+    try:
+        results = hash_pool.hash_passwords(passwords=['a', 'b'])
+    finally:
+        hash_pool.close()
+
+    assert [error for error, salt, pwd_hash in results] == ["Password hashing timed out"] * 2
+
+
+def test_unicode_password_is_hashed_and_verified():
+    hash_pool = HashPool(pool_size=0, queue_size=1, rounds=4, bulk_queue_size=1)
+    password = u'p\xe4ssw\xf6rd'
+
+    [(error, salt, pwd_hash)] = hash_pool.hash_passwords(passwords=[password])
+
+    assert error is None
+    assert hash_pool.verify_password(password=password, salt=salt, pwd_hash=pwd_hash)
+    assert not hash_pool.verify_password(password=u'password', salt=salt, pwd_hash=pwd_hash)
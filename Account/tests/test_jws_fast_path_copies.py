@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copies of jws_fast_path.py in Account, Operator_Components and Service_Components are identical.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from check_jws_fast_path import COPIES, file_digest
+
+
+def test_copies_of_jws_fast_path_are_identical():
+    canonical = file_digest(path=COPIES[0])
+
+    differing = [path for path in COPIES[1:] if file_digest(path=path) != canonical]
+
+    assert differing == [], "Run: python check_jws_fast_path.py --sync"
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""
+Verification of Service Link Records signed by Account owner and Service.
+"""
+import json
+
+from app.mod_blackbox import jws_fast_path
+from app.mod_blackbox.services import jws_json_to_object, jws_verify
+
+from slr_helpers import account_key, key_id, service_key, sign_by_account, sign_by_service
+
+
+def verify(slr=None, key=None):
+    return jws_verify(jws_object=jws_json_to_object(jws_json=json.dumps(slr)), jwk_object=key, account_kid=key_id(key=key))
+
+
+def test_account_signature_verifies():
+    key = account_key()
+    assert verify(slr=sign_by_account(key=key), key=key)
+
+
+def test_slr_with_account_es256_and_service_rs256_signatures_verifies():
+    key = account_key()
+    slr = sign_by_service(slr=sign_by_account(key=key), key=service_key())
+
+    assert len(slr["signatures"]) == 2
+    assert verify(slr=slr, key=key)
+
+
+def test_slr_with_two_signatures_does_not_verify_with_key_of_other_account():
+    key = account_key()
+    slr = sign_by_service(slr=sign_by_account(key=key), key=service_key())
+
+    assert not verify(slr=slr, key=account_key())
+
+
+def test_verify_raw_rejects_key_of_other_type():
+    ec_key = jws_fast_path.verification_key(json.loads(account_key().export_public()))
+    rsa_key = service_key()
+    signing_input = b"protected.payload"
+    signature = jws_fast_path.sign_raw("RS256", jws_fast_path.signing_key(json.loads(rsa_key.export())), signing_input)
+
+    assert not jws_fast_path.verify_raw("RS256", ec_key, signing_input, signature)
+    assert jws_fast_path.verify_raw("RS256", jws_fast_path.verification_key(json.loads(rsa_key.export_public())),
+                                    signing_input, signature)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+Starting of key pool producer of blackbox.
+"""
+from app import app
+from app.mod_blackbox import client as blackbox_client
+from app.mod_blackbox.services import KeyPool
+
+
+class RecordingKeyPool(object):
+    def __init__(self):
+        self.started = 0
+
+    def start(self):
+        self.started += 1
+
+
+def test_key_pool_is_started_on_first_request(monkeypatch):
+    key_pool = RecordingKeyPool()
+    monkeypatch.setattr(blackbox_client, 'key_pool', key_pool)
+    monkeypatch.setattr(blackbox_client, 'blackbox_client', None)
+
+    assert blackbox_client.start_key_pool in app.before_first_request_funcs
+    blackbox_client.start_key_pool()
+    assert key_pool.started == 1
+
+
+def test_key_pool_is_not_started_with_signing_daemon(monkeypatch):
+    key_pool = RecordingKeyPool()
+    monkeypatch.setattr(blackbox_client, 'key_pool', key_pool)
+    monkeypatch.setattr(blackbox_client, 'blackbox_client', object())
+
+    blackbox_client.start_key_pool()
+    assert key_pool.started == 0
+
+
+def test_disabled_key_pool_does_not_start_producer():
+    key_pool = KeyPool(size=0)
+
+    key_pool.start()
+
+    assert key_pool.claim() is None
+    assert key_pool.stats()['misses'] == 1
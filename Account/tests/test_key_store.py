@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+Key generation of imported Accounts with sharded key store of blackbox.
+"""
+import os
+
+import pytest
+
+from app.mod_account.controllers import generate_imported_account_keys
+from app.mod_blackbox import controllers as blackbox_controllers
+from app.mod_blackbox import services as blackbox_services
+from app.mod_blackbox.controllers import gen_account_key, gen_account_keys
+from app.mod_database.helpers import ShardedSqliteEngine
+
+
+class ConnectionWithFailingCommit(object):
+    """
+    Connection of key store that fails the commit given in fail_at, counted across all connections.
+    """
+    commits = 0
+    fail_at = None
+
+    def __init__(self, connection=None):
+        self.connection = connection
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def commit(self):
+        ConnectionWithFailingCommit.commits += 1
+        if ConnectionWithFailingCommit.commits == ConnectionWithFailingCommit.fail_at:
+            self.connection.rollback()
+            raise Exception("Commit failed")
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+
+@pytest.fixture
+def key_store(monkeypatch, tmpdir):
+    engine = ShardedSqliteEngine(
+        database=os.path.join(str(tmpdir), 'blackbox.sqlite'),
+        schema=blackbox_services.SCHEMA,
+        shards=2
+    )
+    monkeypatch.setattr(blackbox_services, 'engine', engine)
+    monkeypatch.setattr(blackbox_services, 'previous_engine', None)
+    monkeypatch.setattr(blackbox_controllers, 'key_store', engine)
+    monkeypatch.setattr(
+        blackbox_controllers,
+        'get_sqlite_connection',
+        lambda account_id=None: ConnectionWithFailingCommit(connection=engine.connection(shard_key=account_id))
+    )
+
+    def gen_key():
+        account_kid = blackbox_services.gen_account_kid()
+        return account_kid, blackbox_services.gen_key_as_jwk(account_kid=account_kid)
+    monkeypatch.setattr(blackbox_controllers, 'claim_or_gen_key_as_jwk', gen_key)
+
+    monkeypatch.setattr(ConnectionWithFailingCommit, 'commits', 0)
+    monkeypatch.setattr(ConnectionWithFailingCommit, 'fail_at', None)
+    blackbox_services.key_cache.clear()
+    yield engine
+    blackbox_services.key_cache.clear()
+
+
+def account_ids_in_both_shards(engine=None):
+    account_ids = {}
+    account_id = 1000
+    while len(account_ids) < 2:
+        account_ids.setdefault(engine.shard_index(shard_key=account_id), account_id)
+        account_id += 1
+    return [account_ids[0], account_ids[1]]
+
+
+def stored_keys(engine=None, account_id=None):
+    connection = engine.connection(shard_key=account_id)
+    return connection.execute("SELECT kid FROM account_keys WHERE account_id=?", (account_id,)).fetchall()
+
+
+def test_gen_account_key_returns_existing_key(key_store):
+    account_kid = gen_account_key(account_id=1)
+
+    assert gen_account_key(account_id=1) == account_kid
+    assert stored_keys(engine=key_store, account_id=1) == [(account_kid,)]
+
+
+def test_fallback_after_partially_committed_batch_does_not_duplicate_keys(key_store):
+    account_ids = account_ids_in_both_shards(engine=key_store)
+    # First shard is committed, second one fails
+    ConnectionWithFailingCommit.fail_at = 2
+    results = [{'id': str(account_id)} for account_id in account_ids]
+
+    generate_imported_account_keys(
+        results=results,
+        key_type='Key',
+        batch_function=gen_account_keys,
+        single_function=gen_account_key
+    )
+
+    assert ConnectionWithFailingCommit.commits > 2
+    assert [result for result in results if 'warnings' in result] == []
+    for account_id in account_ids:
+        assert len(stored_keys(engine=key_store, account_id=account_id)) == 1
+
+
+def test_key_material_is_cached_until_invalidated(key_store):
+    account_kid = gen_account_key(account_id=1)
+
+    entry = blackbox_services.get_key_material(account_id=1)
+    assert entry[2] == account_kid
+    assert blackbox_services.get_key_material(account_id=1) is entry
+
+    blackbox_services.invalidate_cached_key(account_id=1)
+    assert blackbox_services.key_cache.get(key='1') is None
+    assert blackbox_services.get_key_material(account_id=1)[2] == account_kid
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""
+Log level of module loggers and content of API Key log entries.
+"""
+import logging
+
+from app import app
+from app.mod_api_auth import controllers as api_auth_controllers
+from app.mod_api_auth.helpers import get_custom_logger as get_api_auth_logger
+from app.mod_blackbox.helpers import get_custom_logger as get_blackbox_logger
+
+
+class RecordingLogger(object):
+    def __init__(self):
+        self.entries = []
+
+    def debug(self, msg, *args):
+        self.entries.append(msg % args)
+
+    error = info = debug
+
+
+def test_loggers_follow_configured_log_level(monkeypatch):
+    monkeypatch.setitem(app.config, "LOG_LEVEL", 'INFO')
+
+    for get_custom_logger in (get_api_auth_logger, get_blackbox_logger):
+        logger = get_custom_logger('test_logging_' + get_custom_logger.__module__)
+        assert logger.getEffectiveLevel() == logging.INFO
+        assert not logger.isEnabledFor(logging.DEBUG)
+
+
+def test_api_key_is_not_logged(monkeypatch):
+    logger = RecordingLogger()
+    monkeypatch.setattr(api_auth_controllers, 'logger', logger)
+    monkeypatch.setattr(api_auth_controllers, 'get_account_id_by_api_key', lambda api_key=None: '42')
+
+    assert api_auth_controllers.check_api_auth_user(api_key='secret-api-key')
+    assert 'Found account_id: 42' in logger.entries
+    assert not [entry for entry in logger.entries if 'secret-api-key' in entry]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+LruTtlCache and invalidation of cached API Keys.
+"""
+import time
+
+from app.helpers import LruTtlCache
+from app.mod_api_auth.controllers import api_key_cache, unknown_api_key_cache, invalidate_api_key_cache
+from app.mod_api_auth.helpers import hash_api_key
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LruTtlCache(max_size=2, ttl=60)
+    cache.set(key='a', value=1)
+    cache.set(key='b', value=2)
+    assert cache.get(key='a') == 1
+    cache.set(key='c', value=3)
+
+    assert cache.get(key='b') is None
+    assert cache.get(key='a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entry_is_not_returned():
+    cache = LruTtlCache(max_size=2, ttl=60)
+    cache.set(key='a', value=1, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get(key='a', default='missing') == 'missing'
+    assert cache.stats()['expirations'] == 1
+
+
+def test_invalidate_tag_removes_only_entries_of_tag():
+    cache = LruTtlCache(max_size=10, ttl=60)
+    cache.set(key='a', value=1, tag='1')
+    cache.set(key='b', value=1, tag='1')
+    cache.set(key='c', value=2, tag='2')
+
+    assert cache.invalidate_tag(tag='1') == 2
+    assert cache.get(key='a') is None
+    assert cache.get(key='b') is None
+    assert cache.get(key='c') == 2
+    assert cache.invalidate_tag(tag='1') == 0
+
+
+def test_tag_index_follows_evictions_and_replacements():
+    cache = LruTtlCache(max_size=1, ttl=60)
+    cache.set(key='a', value=1, tag='1')
+    cache.set(key='a', value=2, tag='2')
+    assert cache.invalidate_tag(tag='1') == 0
+
+    cache.set(key='b', value=3, tag='2')
+    assert cache.invalidate_tag(tag='2') == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_new_api_key_invalidates_cached_keys_of_account_only():
+    api_key_cache.clear()
+    unknown_api_key_cache.clear()
+    api_key_cache.set(key=hash_api_key(api_key='old-key-1'), value='1', tag='1')
+    api_key_cache.set(key=hash_api_key(api_key='key-2'), value='2', tag='2')
+    unknown_api_key_cache.set(key=hash_api_key(api_key='new-key-1'), value=True)
+
+    invalidate_api_key_cache(account_id=1, api_key='new-key-1')
+
+    assert api_key_cache.get(key=hash_api_key(api_key='old-key-1')) is None
+    assert api_key_cache.get(key=hash_api_key(api_key='key-2')) == '2'
+    assert unknown_api_key_cache.get(key=hash_api_key(api_key='new-key-1')) is None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+Verification, signing and storing of Service Link in one pipeline, with SLR signed by Account owner and Service.
+"""
+import json
+
+import pytest
+
+from app.helpers import ApiError
+from app.mod_blackbox import controllers as blackbox_controllers
+from app.mod_service import controllers as service_controllers
+
+from slr_helpers import account_key, key_id, service_key, sign_by_account, sign_by_service
+
+
+class Entry(object):
+    service_link_status_record = None
+    issued_at = None
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    entries = []
+
+    def store_slr_and_ssr(slr_entry=None, ssr_entry=None, endpoint=None):
+        entries.append((slr_entry, ssr_entry))
+        return {'slr_id': 1, 'ssr_id': 2}
+
+    monkeypatch.setattr(service_controllers, 'store_slr_and_ssr', store_slr_and_ssr)
+    return entries
+
+
+def use_key(monkeypatch, key=None):
+    material = (key, key.export_public(), key_id(key=key))
+    monkeypatch.setattr(blackbox_controllers, 'get_key_material', lambda account_id=None: material)
+
+
+def run_pipeline(slr=None):
+    return service_controllers.verify_sign_and_store_slr_and_ssr(
+        account_id=1,
+        slr=slr,
+        ssr_payload={"record_id": "ssr", "sl_status": "Active"},
+        slr_entry=Entry(),
+        ssr_entry=Entry()
+    )
+
+
+def test_slr_signed_by_account_and_service_is_stored_with_signed_ssr(monkeypatch, stored):
+    key = account_key()
+    use_key(monkeypatch, key=key)
+    slr = sign_by_service(slr=sign_by_account(key=key), key=service_key())
+
+    data = run_pipeline(slr=slr)
+
+    assert len(stored) == 1
+    ssr_entry = stored[0][1]
+    assert ssr_entry.service_link_status_record == data['ssr_signed']
+    assert ssr_entry.issued_at is not None
+    assert 'signature' in json.loads(data['ssr_signed']) or 'signatures' in json.loads(data['ssr_signed'])
+
+
+def test_slr_signed_with_key_of_other_account_is_rejected(monkeypatch, stored):
+    use_key(monkeypatch, key=account_key())
+    slr = sign_by_service(slr=sign_by_account(key=account_key()), key=service_key())
+
+    with pytest.raises(ApiError) as exc_info:
+        run_pipeline(slr=slr)
+
+    assert exc_info.value.code == 403
+    assert stored == []
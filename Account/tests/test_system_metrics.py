@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""
+Authentication of system metrics endpoint.
+"""
+import pytest
+
+from app import app
+from app.mod_api_auth.controllers import get_api_key_sdk
+from app.mod_system import controllers as system_controllers
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Key pool producer is not started by first request of tests
+    monkeypatch.setattr(app, 'before_first_request_funcs', [])
+    return app.test_client()
+
+
+def test_metrics_require_api_key(client):
+    assert client.get('/system/metrics/').status_code == 401
+    assert client.get('/system/metrics/', headers={'Api-Key': 'wrong-api-key'}).status_code == 401
+
+
+def test_metrics_are_returned_with_sdk_api_key(monkeypatch, client):
+    monkeypatch.setattr(system_controllers.db, 'stats', lambda: {})
+
+    response = client.get('/system/metrics/', headers={'Api-Key': get_api_key_sdk()})
+
+    assert response.status_code == 200
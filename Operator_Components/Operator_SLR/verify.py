@@ -13,6 +13,7 @@ from flask_cors import CORS
 from flask_restful import Resource, Api
 from helpers import AccountManagerHandler, Helpers
 from jwcrypto import jws, jwk
+import jws_fast_path
 
 api_SLR_Verify = Blueprint("api_SLR_blueprint", __name__)
 
@@ -53,6 +54,11 @@ user_account_id = account_id + "_" + str(guid())
 
 
 def verifyJWS(json_JWS):
+    """
+    Verifies JWS with JWKs embedded in its signature headers.
+    ES256 and RS256 signatures are verified directly with cryptography, other algorithms with jwcrypto.
+    :return: True if at least one signature is valid
+    """
     def verify(jws, header):
         try:
             sign_key = jwk.JWK(**header["jwk"])
@@ -62,23 +68,26 @@ def verifyJWS(json_JWS):
             debug_log.info(repr(e))
 
     try:
-
-        json_web_signature = jws.JWS()
-        if (isinstance(json_JWS, dict)):
-            json_web_signature.deserialize(dumps(json_JWS))
-        elif (isinstance(json_JWS, str)):
-            json_web_signature = jws.JWS(json_JWS)
+        if (isinstance(json_JWS, str)):
             json_JWS = loads(json_JWS)
+        # Payload is re-encoded without padding, as jwcrypto does before verifying
+        payload = jws_fast_path.base64url_encode(jws_fast_path.base64url_decode(json_JWS["payload"]))
 
-        if json_JWS.get("header", False):  # Only one signature
-            if (verify(json_web_signature, json_JWS["header"])):
-                return True
-            return False
-        elif json_JWS.get("signatures", False):  # Multiple signatures
-            signatures = json_JWS["signatures"]
-            for signature in signatures:
-                if (verify(json_web_signature, signature["header"])):
-                    return True
+        for signature in jws_fast_path.signatures_of(json_JWS):
+            header = signature.get("header", {})
+            if (isinstance(header, str)):
+                header = loads(header)
+            try:
+                if jws_fast_path.signature_alg(signature) in jws_fast_path.SUPPORTED_ALGS:
+                    if jws_fast_path.verify_signature(payload, signature, jws_fast_path.verification_key(header["jwk"])):
+                        return True
+                else:
+                    json_web_signature = jws.JWS()
+                    json_web_signature.deserialize(dumps(json_JWS))
+                    if (verify(json_web_signature, header)):
+                        return True
+            except Exception as e:
+                debug_log.info(repr(e))
         return False
     except Exception as e:
         debug_log.info("M:", repr(e))
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+"""
+Direct ES256 and RS256 signing and verification of JWS with cryptography.
+
+Produces the same JWS JSON Serialization as jwcrypto, without building JWS and JWK objects for every operation.
+Key handles of cryptography are cached and constant protected headers are encoded once.
+Same module is used by Account blackbox, Operator_Components and Service_Components, copies must be kept identical.
+Run check_jws_fast_path.py in repository root to check them, --sync copies Account blackbox version over the others.
+
+Works with Python 2 and 3 and with cryptography 1.3 and newer.
+"""
+import binascii
+import json
+import threading
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from hashlib import sha256
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+
+SUPPORTED_ALGS = ('ES256', 'RS256')
+KEY_HANDLE_CACHE_SIZE = 1000  # Cached key handles per process. Default: 1000
+
+
+def base64url_encode(data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return urlsafe_b64encode(data).decode('utf-8').rstrip('=')
+
+
+def base64url_decode(data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def int_from_base64url(data):
+    return int(binascii.hexlify(base64url_decode(data)), 16)
+
+
+def int_to_bytes(value, length):
+    return binascii.unhexlify('%0*x' % (length * 2, value))
+
+
+_protected_headers = {}
+
+
+def encode_protected_header(protected_json):
+    """
+    base64url of protected header. Headers are encoded once, there are only a few distinct ones.
+
+    :param protected_json: Protected header as JSON string
+    :return: base64url encoded protected header
+    """
+    protected = _protected_headers.get(protected_json)
+    if protected is None:
+        protected = base64url_encode(protected_json)
+        if len(_protected_headers) < 100:
+            _protected_headers[protected_json] = protected
+    return protected
+
+
+# Protected headers as created by json.dumps({'alg': alg})
+PROTECTED_JSON = dict((alg, json.dumps({'alg': alg})) for alg in SUPPORTED_ALGS)
+PROTECTED = dict((alg, encode_protected_header(PROTECTED_JSON[alg])) for alg in SUPPORTED_ALGS)  # ES256: eyJhbGciOiAiRVMyNTYifQ
+
+
+def jwk_thumbprint(jwk_dict):
+    """
+    RFC 7638 thumbprint of JWK.
+
+    :param jwk_dict: JWK as dict
+    :return: base64url encoded SHA-256 thumbprint
+    """
+    required = {'EC': ('crv', 'kty', 'x', 'y'), 'RSA': ('e', 'kty', 'n')}[jwk_dict['kty']]
+    members = json.dumps(dict((name, jwk_dict[name]) for name in required), separators=(',', ':'), sort_keys=True)
+    return base64url_encode(sha256(members.encode('utf-8')).digest())
+
+
+class KeyHandleCache(object):
+    """
+    LRU cache of cryptography key objects. Keys are immutable, so handles are shared between threads.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cache_key):
+        with self._lock:
+            handle = self._entries.pop(cache_key, None)
+            if handle is None:
+                self.misses += 1
+                return None
+            self._entries[cache_key] = handle
+            self.hits += 1
+            return handle
+
+    def put(self, cache_key, handle):
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = handle
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+key_handles = KeyHandleCache(max_size=KEY_HANDLE_CACHE_SIZE)
+
+
+def _ec_public_numbers(jwk_dict):
+    if jwk_dict.get('crv') != 'P-256':
+        raise ValueError("Unsupported curve: " + repr(jwk_dict.get('crv')))
+    return ec.EllipticCurvePublicNumbers(
+        int_from_base64url(jwk_dict['x']), int_from_base64url(jwk_dict['y']), ec.SECP256R1()
+    )
+
+
+def _rsa_public_numbers(jwk_dict):
+    return rsa.RSAPublicNumbers(int_from_base64url(jwk_dict['e']), int_from_base64url(jwk_dict['n']))
+
+
+def public_key_from_jwk(jwk_dict):
+    """
+    :param jwk_dict: Public or private JWK as dict
+    :return: cryptography public key object
+    """
+    if jwk_dict['kty'] == 'EC':
+        return _ec_public_numbers(jwk_dict).public_key(default_backend())
+    elif jwk_dict['kty'] == 'RSA':
+        return _rsa_public_numbers(jwk_dict).public_key(default_backend())
+    raise ValueError("Unsupported key type: " + repr(jwk_dict['kty']))
+
+
+def private_key_from_jwk(jwk_dict):
+    """
+    :param jwk_dict: Private JWK as dict
+    :return: cryptography private key object
+    """
+    if jwk_dict['kty'] == 'EC':
+        return ec.EllipticCurvePrivateNumbers(
+            int_from_base64url(jwk_dict['d']), _ec_public_numbers(jwk_dict)
+        ).private_key(default_backend())
+    elif jwk_dict['kty'] == 'RSA':
+        public_numbers = _rsa_public_numbers(jwk_dict)
+        d = int_from_base64url(jwk_dict['d'])
+        if 'p' in jwk_dict:
+            p, q = int_from_base64url(jwk_dict['p']), int_from_base64url(jwk_dict['q'])
+        else:
+            p, q = rsa.rsa_recover_prime_factors(public_numbers.n, public_numbers.e, d)
+        return rsa.RSAPrivateNumbers(
+            p, q, d, rsa.rsa_crt_dmp1(d, p), rsa.rsa_crt_dmq1(d, q), rsa.rsa_crt_iqmp(p, q), public_numbers
+        ).private_key(default_backend())
+    raise ValueError("Unsupported key type: " + repr(jwk_dict['kty']))
+
+
+def signing_key(jwk_dict, cache_key=None):
+    """
+    Cached private key handle.
+
+    :param jwk_dict: Private JWK as dict
+    :param cache_key: Unique identifier of key, such as kid. Defaults to thumbprint of JWK.
+    :return: cryptography private key object
+    """
+    cache_key = ('sign', cache_key or jwk_thumbprint(jwk_dict))
+    handle = key_handles.get(cache_key)
+    if handle is None:
+        handle = private_key_from_jwk(jwk_dict)
+        key_handles.put(cache_key, handle)
+    return handle
+
+
+def verification_key(jwk_dict, cache_key=None):
+    """
+    Cached public key handle.
+
+    :param jwk_dict: JWK as dict
+    :param cache_key: Unique identifier of key, such as kid. Defaults to thumbprint of JWK.
+    :return: cryptography public key object
+    """
+    cache_key = ('verify', cache_key or jwk_thumbprint(jwk_dict))
+    handle = key_handles.get(cache_key)
+    if handle is None:
+        handle = public_key_from_jwk(jwk_dict)
+        key_handles.put(cache_key, handle)
+    return handle
+
+
+def sign_raw(alg, key, signing_input):
+    """
+    :return: JWS signature bytes, for ES256 R and S as 32 byte big endian integers
+    """
+    if alg == 'ES256':
+        if hasattr(key, 'sign'):
+            der_signature = key.sign(signing_input, ec.ECDSA(hashes.SHA256()))
+        else:
+            signer = key.signer(ec.ECDSA(hashes.SHA256()))
+            signer.update(signing_input)
+            der_signature = signer.finalize()
+        r, s = decode_dss_signature(der_signature)
+        return int_to_bytes(r, 32) + int_to_bytes(s, 32)
+    elif alg == 'RS256':
+        if hasattr(key, 'sign'):
+            return key.sign(signing_input, padding.PKCS1v15(), hashes.SHA256())
+        signer = key.signer(padding.PKCS1v15(), hashes.SHA256())
+        signer.update(signing_input)
+        return signer.finalize()
+    raise ValueError("Unsupported alg: " + repr(alg))
+
+
+def verify_raw(alg, key, signing_input, signature):
+    """
+    :return: Boolean, False also if type of key does not match alg
+    """
+    try:
+        if alg == 'ES256':
+            if not isinstance(key, ec.EllipticCurvePublicKey) or len(signature) != 64:
+                return False
+            signature = encode_dss_signature(int(binascii.hexlify(signature[:32]), 16), int(binascii.hexlify(signature[32:]), 16))
+            arguments = (ec.ECDSA(hashes.SHA256()),)
+        elif alg == 'RS256':
+            if not isinstance(key, rsa.RSAPublicKey):
+                return False
+            arguments = (padding.PKCS1v15(), hashes.SHA256())
+        else:
+            raise ValueError("Unsupported alg: " + repr(alg))
+
+        if hasattr(key, 'verify'):
+            key.verify(signature, signing_input, *arguments)
+        else:
+            verifier = key.verifier(signature, *arguments)
+            verifier.update(signing_input)
+            verifier.verify()
+    except InvalidSignature:
+        return False
+    return True
+
+
+def sign(payload, key, alg='ES256', header=None, protected_json=None):
+    """
+    Signs payload to flattened JWS JSON Serialization.
+
+    :param payload: Payload as bytes or str
+    :param key: Private key handle from signing_key()
+    :param alg: ES256 or RS256
+    :param header: Unprotected header as dict
+    :param protected_json: Protected header as JSON string, Defaults to json.dumps({'alg': alg})
+    :return: JWS as dict
+    """
+    if protected_json is None:
+        protected_json = PROTECTED_JSON[alg]
+    jws_dict = {'payload': base64url_encode(payload), 'protected': encode_protected_header(protected_json)}
+    jws_dict['signature'] = base64url_encode(sign_raw(alg, key, (jws_dict['protected'] + '.' + jws_dict['payload']).encode('utf-8')))
+    if header is not None:
+        jws_dict['header'] = header
+    return jws_dict
+
+
+def add_signature(jws_dict, key, alg='ES256', header=None, protected_json=None):
+    """
+    Adds signature to JWS JSON Serialization. Flattened JWS is converted to general syntax like jwcrypto does.
+
+    :param jws_dict: JWS as dict, modified in place
+    :return: JWS as dict
+    """
+    if protected_json is None:
+        protected_json = PROTECTED_JSON[alg]
+    signature = {'protected': encode_protected_header(protected_json)}
+    signature['signature'] = base64url_encode(sign_raw(alg, key, (signature['protected'] + '.' + jws_dict['payload']).encode('utf-8')))
+    if header is not None:
+        signature['header'] = header
+
+    if 'signatures' not in jws_dict:
+        first = dict((name, jws_dict.pop(name)) for name in ('protected', 'header', 'signature') if name in jws_dict)
+        jws_dict['signatures'] = [first] if first else []
+    jws_dict['signatures'].append(signature)
+    return jws_dict
+
+
+def signature_alg(signature):
+    """
+    :param signature: One signature of JWS as dict with protected and header
+    :return: alg of signature
+    """
+    protected = signature.get('protected')
+    if protected:
+        alg = json.loads(base64url_decode(protected).decode('utf-8')).get('alg')
+        if alg is not None:
+            return alg
+    header = signature.get('header') or {}
+    if not isinstance(header, dict):
+        header = json.loads(header)
+    return header.get('alg')
+
+
+def verify_signature(payload, signature, key):
+    """
+    Verifies one signature of JWS.
+
+    :param payload: base64url encoded payload of JWS
+    :param signature: Signature as dict with protected, header and signature
+    :param key: Public key handle from verification_key()
+    :return: Boolean
+    """
+    alg = signature_alg(signature)
+    if alg not in SUPPORTED_ALGS:
+        raise ValueError("Unsupported alg: " + repr(alg))
+    signing_input = ((signature.get('protected') or '') + '.' + payload).encode('utf-8')
+    return verify_raw(alg, key, signing_input, base64url_decode(signature['signature']))
+
+
+def signatures_of(jws_dict):
+    """
+    :param jws_dict: JWS as dict in flattened or general syntax
+    :return: List of signatures as dicts
+    """
+    if 'signatures' in jws_dict:
+        return jws_dict['signatures']
+    return [jws_dict]
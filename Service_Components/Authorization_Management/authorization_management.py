@@ -124,23 +124,23 @@ class Install_CR(Resource):
 
         slrt = SLR_tool()
         slrt.slr = self.helpers.get_slr(surr_id)
-        verify_is_success = crt.verify_cr(slrt.get_cr_keys())
-        if verify_is_success:
+        cr_report, csr_report = crt.verify_cr_and_csr(slrt.get_cr_keys())
+        debug_log.info("CR verification: {}".format(dumps(cr_report)))
+        debug_log.info("CSR verification: {}".format(dumps(csr_report)))
+        if cr_report["valid"]:
             sq.task("Verify CR is issued by authorized party")
             debug_log.info("CR was verified with key from SLR")
         else:
-            raise DetailedHTTPException(detail={"msg": "Verifying CR failed",},
+            raise DetailedHTTPException(detail={"msg": "Verifying CR failed", "signatures": cr_report["signatures"]},
                                         title="Failure in CR verifying",
                                         status=451)
 
         sq.task("Verify CSR integrity")
         # SLR includes CR keys which means we need to get key from stored SLR and use it to verify this
-        verify_is_success = crt.verify_csr(slrt.get_cr_keys())
-
-        if verify_is_success:
+        if csr_report["valid"]:
             debug_log.info("CSR was verified with key from SLR")
         else:
-            raise DetailedHTTPException(detail={"msg": "Verifying CSR failed",},
+            raise DetailedHTTPException(detail={"msg": "Verifying CSR failed", "signatures": csr_report["signatures"]},
                                         title="Failure in CSR verifying",
                                         status=451)
 
@@ -170,8 +170,7 @@ class Install_CR(Resource):
                                         title="Failure in CSR verifying",
                                         status=451)
 
-        verify_is_success = crt.verify_cr(slrt.get_cr_keys())
-        if verify_is_success:
+        if csr_report["valid"]:
             sq.task("Verify CSR is issued by authorized party")
             debug_log.info("CSR was verified with key from SLR")
         else:
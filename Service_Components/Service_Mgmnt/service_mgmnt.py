@@ -13,8 +13,9 @@ from Templates import Sequences
 from flask import request, abort, Blueprint, current_app
 from flask_cors import CORS
 from flask_restful import Resource, Api
-from helpers import Helpers
-from jwcrypto import jws, jwk
+from helpers import Helpers, jws_verifier
+from jwcrypto import jwk
+import jws_fast_path
 
 api_Service_Mgmnt = Blueprint("api_Service_Mgmnt", __name__)
 
@@ -180,36 +181,13 @@ class SignInRedirector(Resource):
 
 
 def verifyJWS(json_JWS):
-    def verify(jws, header):
-        try:
-            sign_key = jwk.JWK(**header["jwk"])
-            jws.verify(sign_key)
-            return True
-        except Exception as e:
-            debug_log.info(repr(e))
-
-    try:
-
-        json_web_signature = jws.JWS()
-        if (isinstance(json_JWS, dict)):
-            json_web_signature.deserialize(dumps(json_JWS))
-        elif (isinstance(json_JWS, str)):
-            json_web_signature = jws.JWS(json_JWS)
-            json_JWS = loads(json_JWS)
-
-        if json_JWS.get("header", False):  # Only one signature
-            if (verify(json_web_signature, json_JWS["header"])):
-                return True
-            return False
-        elif json_JWS.get("signatures", False):  # Multiple signatures
-            signatures = json_JWS["signatures"]
-            for signature in signatures:
-                if (verify(json_web_signature, signature["header"])):
-                    return True
-        return False
-    except Exception as e:
-        debug_log.info("M:", repr(e))
-        return False
+    """
+    Verifies JWS with JWKs embedded in its signature headers.
+    :return: True if at least one signature is valid
+    """
+    report = jws_verifier.verify(json_JWS)
+    debug_log.info(dumps(report))
+    return report["valid"]
 
 
 def header_fix(malformed_dictionary):  # We do not check if its malformed, we expect it to be.
@@ -300,36 +278,26 @@ class StoreSLR(Resource):
                                         trace=traceback.format_exc(limit=100).splitlines())
 
         try:
-            sq.task("Create empty JSW object")
-            jwssa = jws.JWS()
             debug_log.info("SLR R:\n", loads(dumps(slr)))
             debug_log.info(slr["header"]["jwk"])
 
-            sq.task("Deserialize slr to JWS object created before")
-            jwssa.deserialize(dumps(slr))
-
-            sq.task("Load JWK used to sign JWS from the slr headers into an object")
-            sign_key = jwk.JWK(**slr["header"]["jwk"])
-
             sq.task("Verify SLR was signed using the key shipped with it")
-            debug_log.info(verifyJWS(slr))
-            verify = jwssa.verify(sign_key)  # Verifying changes the state of this object
+            if not verifyJWS(slr):
+                raise ValueError("Verification failed for all signatures")
         except Exception as e:
             raise DetailedHTTPException(title="Verifying JWS signature failed",
                                         exception=e,
                                         trace=traceback.format_exc(limit=100).splitlines())
 
         try:
-            sq.task("Fix possible serialization errors in JWS")
-            faulty_JSON = loads(jwssa.serialize(
-                compact=False))  # For some reason serialization messes up "header" from "header": {} to "header": "{}"
-            faulty_JSON["header"] = faulty_JSON["header"]
-
             sq.task("Add our signature in the JWS")
-            jwssa.add_signature(self.service_key, alg="RS256", header=dumps(self.headeri), protected=dumps(self.protti))
+            # Payload is re-encoded without padding, as jwcrypto does before signing
+            jwssa = dict(slr, payload=jws_fast_path.base64url_encode(jws_fast_path.base64url_decode(slr["payload"])))
+            jws_fast_path.add_signature(jwssa, jws_fast_path.signing_key(loads(self.service_key.export())),
+                                        alg="RS256", header=self.headeri, protected_json=dumps(self.protti))
 
             sq.task("Fix possible header errors")
-            fixed = header_fix(loads(jwssa.serialize(compact=False)))
+            fixed = header_fix(jwssa)
             debug_log.info("{}\n{}\n{}".format("Verified and Signed Signature:\n", dumps(fixed, indent=3),
                                                "\n###### END OF SIGNATURE #######"))
 
@@ -174,7 +174,7 @@ def register_blueprints(app, package_name, package_path):
                 apis.append(item)
     return rv, apis
 
-from base64 import urlsafe_b64decode as decode
+from base64 import urlsafe_b64decode as decode, urlsafe_b64encode
 from json import loads
 class SLR_tool:
     def __init__(self):
@@ -283,6 +283,207 @@ class SLR_tool:
 # print(sl.get_source_surrogate_id())
 
 from jwcrypto import jwk, jws
+from jwcrypto.common import base64url_decode
+from hashlib import sha256
+import jws_fast_path
+from multiprocessing import Pool
+import os
+
+
+def jwk_thumbprint(key):
+    """
+    RFC 7638 thumbprint of JWK given as dict, computed without building JWK object.
+    :param key: JWK as dict
+    :return: base64url encoded SHA-256 thumbprint
+    """
+    required = {"EC": ("crv", "kty", "x", "y"),
+                "RSA": ("e", "kty", "n"),
+                "oct": ("k", "kty")}[key["kty"]]
+    canonical = dumps(dict((name, key[name]) for name in required), separators=(",", ":"), sort_keys=True)
+    return urlsafe_b64encode(sha256(canonical.encode("utf-8")).digest()).decode("utf-8").rstrip("=")
+
+
+class JWS_verifier:
+    """
+    Verifies JWS JSON Serializations with one or more signatures.
+
+    JWS is parsed once. Each signature is matched to candidate keys by kid and RFC 7638 thumbprint
+    before any crypto is done, so each signature is verified at most once per matching key.
+    ES256 and RS256 are verified directly with cryptography, see jws_fast_path. For other algorithms
+    JWK objects are built once per key and cached by thumbprint.
+    Results are reported per signature:
+        {"valid": True,
+         "signatures": [{"index": 0, "kid": "...", "alg": "ES256", "matched_by": "kid",
+                         "key_thumbprint": "...", "valid": True, "error": None}, ...]}
+    """
+    def __init__(self, processes=2, pool_threshold=8, key_cache_size=1000):
+        self.processes = processes
+        self.pool_threshold = pool_threshold  # Smaller batches are verified in the calling process
+        self.key_cache_size = key_cache_size
+        self._jwk_objects = {}
+        self._pool = None
+        self._pool_pid = None
+
+    @staticmethod
+    def parse(json_jws):
+        """
+        :param json_jws: JWS JSON Serialization as dict or str, flattened or general syntax
+        :return: payload in base64url and list of signatures as dicts with protected, header and signature
+        """
+        if isinstance(json_jws, str):
+            json_jws = loads(json_jws)
+        if "signatures" in json_jws:
+            signatures = json_jws["signatures"]
+        else:
+            signatures = [json_jws]
+        parsed = []
+        for signature in signatures:
+            header = signature.get("header", {})
+            if isinstance(header, str):  # Malformed header after jws.serialize()
+                header = loads(header)
+            parsed.append({"protected": signature.get("protected"),
+                           "header": header,
+                           "signature": signature["signature"]})
+        return json_jws["payload"], parsed
+
+    def _jwk_object(self, key, thumbprint):
+        jwk_object = self._jwk_objects.get(thumbprint)
+        if jwk_object is None:
+            if len(self._jwk_objects) >= self.key_cache_size:
+                self._jwk_objects.clear()
+            jwk_object = jwk.JWK(**key)
+            self._jwk_objects[thumbprint] = jwk_object
+        return jwk_object
+
+    @staticmethod
+    def match_keys(header, keys):
+        """
+        Candidate keys for one signature. Keys with kid of signature are tried first, then keys with the same
+        thumbprint as JWK embedded in the header. Without keys JWK embedded in the header is trusted.
+        :return: list of (key, thumbprint, matched_by) tuples
+        """
+        embedded = header.get("jwk")
+        if keys is None:
+            if embedded is None:
+                return []
+            return [(embedded, jwk_thumbprint(embedded), "embedded")]
+
+        candidates = []
+        seen = set()
+        kid = header.get("kid", embedded.get("kid") if embedded else None)
+        if kid is not None:
+            for key in keys:
+                if key.get("kid") == kid:
+                    thumbprint = jwk_thumbprint(key)
+                    if thumbprint not in seen:
+                        seen.add(thumbprint)
+                        candidates.append((key, thumbprint, "kid"))
+        if embedded is not None:
+            embedded_thumbprint = jwk_thumbprint(embedded)
+            for key in keys:
+                thumbprint = jwk_thumbprint(key)
+                if thumbprint == embedded_thumbprint and thumbprint not in seen:
+                    seen.add(thumbprint)
+                    candidates.append((key, thumbprint, "thumbprint"))
+        return candidates
+
+    def verify_signature(self, payload, signature, keys=None):
+        """
+        Verifies one parsed signature against matching keys.
+        :return: Report of signature as dict
+        """
+        header = signature["header"]
+        report = {"kid": header.get("kid"), "alg": None, "matched_by": None,
+                  "key_thumbprint": None, "valid": False, "error": None}
+        try:
+            protected = base64url_decode(signature["protected"]).decode("utf-8") if signature["protected"] else None
+            alg = (loads(protected) if protected else {}).get("alg", header.get("alg"))
+            report["alg"] = alg
+            payload_bytes = base64url_decode(payload)
+            signature_bytes = base64url_decode(signature["signature"])
+        except Exception as e:
+            report["error"] = "Malformed signature: {}".format(repr(e))
+            return report
+
+        try:
+            candidates = self.match_keys(header, keys)
+        except Exception as e:
+            report["error"] = "Malformed key: {}".format(repr(e))
+            return report
+        if not candidates:
+            report["error"] = "No key matches kid or thumbprint of signature"
+            return report
+
+        for key, thumbprint, matched_by in candidates:
+            report["matched_by"] = matched_by
+            report["key_thumbprint"] = thumbprint
+            try:
+                if alg in jws_fast_path.SUPPORTED_ALGS:
+                    # Verified directly with cryptography, key handle is cached by thumbprint
+                    signing_input = "{}.{}".format(jws_fast_path.encode_protected_header(protected) if protected else "",
+                                                   jws_fast_path.base64url_encode(payload_bytes))
+                    if not jws_fast_path.verify_raw(alg, jws_fast_path.verification_key(key, cache_key=thumbprint),
+                                                    signing_input.encode("utf-8"), signature_bytes):
+                        raise ValueError("Verification failed")
+                else:
+                    jws.JWSCore(alg, self._jwk_object(key, thumbprint), protected, payload_bytes).verify(signature_bytes)
+            except Exception as e:
+                report["error"] = repr(e)
+            else:
+                report["valid"] = True
+                report["error"] = None
+                break
+        return report
+
+    def verify(self, json_jws, keys=None, require_all=False):
+        """
+        :param json_jws: JWS JSON Serialization as dict or str
+        :param keys: List of trusted JWKs as dicts, None trusts JWKs embedded in signature headers
+        :param require_all: If True, every signature must be valid, otherwise one valid signature is enough
+        :return: Report as dict
+        """
+        try:
+            payload, signatures = self.parse(json_jws)
+        except Exception as e:
+            return {"valid": False, "signatures": [], "error": "Malformed JWS: {}".format(repr(e))}
+
+        reports = []
+        for index, signature in enumerate(signatures):
+            report = self.verify_signature(payload, signature, keys)
+            report["index"] = index
+            reports.append(report)
+
+        results = [report["valid"] for report in reports]
+        valid = bool(results) and (all(results) if require_all else any(results))
+        return {"valid": valid, "signatures": reports, "error": None}
+
+    def _get_pool(self):
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = Pool(processes=self.processes)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def verify_many(self, jobs):
+        """
+        Verifies batch of JWSs. Batches of at least pool_threshold JWSs are verified in process pool.
+        :param jobs: List of (json_jws, keys, require_all) tuples
+        :return: List of reports in the same order as jobs
+        """
+        jobs = list(jobs)
+        if self.processes and len(jobs) >= self.pool_threshold:
+            return self._get_pool().map(_verify_job, jobs)
+        return [self.verify(json_jws, keys, require_all) for json_jws, keys, require_all in jobs]
+
+
+jws_verifier = JWS_verifier()
+
+
+def _verify_job(job):
+    # Runs in worker process of JWS_verifier pool
+    json_jws, keys, require_all = job
+    return jws_verifier.verify(json_jws, keys, require_all)
+
+
 class CR_tool:
     def __init__(self):
         self.cr = {
@@ -367,34 +568,23 @@ class CR_tool:
         return self.get_CR_payload()["role_specific_part"]["role"]
 
     def verify_cr(self, keys):
-        for key in keys:
-            cr_jwk = jwk.JWK(**key)
-            cr_jws = jws.JWS()
-            cr_jws.deserialize(dumps(self.cr["cr"]))
+        return self.verify_cr_report(keys)["valid"]
 
-            try:
-                cr_jws.verify(cr_jwk)
-                return True
-            except Exception as e:
-                pass
-                #print(repr(e))
-                #return False
-        return False
+    def verify_csr(self, keys):
+        return self.verify_csr_report(keys)["valid"]
 
+    def verify_cr_report(self, keys):
+        return jws_verifier.verify(self.cr["cr"], keys)
 
-    def verify_csr(self, keys):
-        for key in keys:
-            cr_jwk = jwk.JWK(**key)
-            csr_jws = jws.JWS()
-            csr_jws.deserialize(dumps(self.cr["csr"]))
-            try:
-                csr_jws.verify(cr_jwk)
-                return True
-            except Exception as e:
-                pass
-                #print(repr(e))
-                #return False
-        return False
+    def verify_csr_report(self, keys):
+        return jws_verifier.verify(self.cr["csr"], keys)
+
+    def verify_cr_and_csr(self, keys):
+        """
+        Verifies CR and CSR in one batch.
+        :return: Reports of CR and CSR
+        """
+        return jws_verifier.verify_many([(self.cr["cr"], keys, False), (self.cr["csr"], keys, False)])
 
 #crt = CR_tool()
 #print (dumps(crt.get_CR_payload(), indent=2))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""
+Checks that copies of jws_fast_path.py in Account blackbox, Operator_Components and Service_Components are identical.
+
+Exits with status 1 and lists differing copies if they are not. With --sync copies canonical Account blackbox
+version over the others.
+
+Usage (from repository root):
+    python check_jws_fast_path.py [--sync]
+"""
+import argparse
+import os
+import shutil
+import sys
+from hashlib import sha256
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# First one is the canonical copy
+COPIES = (
+    os.path.join('Account', 'app', 'mod_blackbox', 'jws_fast_path.py'),
+    os.path.join('Operator_Components', 'jws_fast_path.py'),
+    os.path.join('Service_Components', 'jws_fast_path.py'),
+)
+
+
+def file_digest(path=None):
+    with open(os.path.join(ROOT, path), 'rb') as source:
+        return sha256(source.read()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that copies of jws_fast_path.py are identical")
+    parser.add_argument('--sync', action='store_true', help="Copy " + COPIES[0] + " over the other copies")
+    args = parser.parse_args()
+
+    canonical = file_digest(path=COPIES[0])
+    differing = [path for path in COPIES[1:] if file_digest(path=path) != canonical]
+
+    if args.sync:
+        for path in differing:
+            shutil.copyfile(os.path.join(ROOT, COPIES[0]), os.path.join(ROOT, path))
+            print("Copied " + COPIES[0] + " to " + path)
+        return 0
+
+    if differing:
+        for path in differing:
+            print(path + " differs from " + COPIES[0])
+        return 1
+
+    print("All " + str(len(COPIES)) + " copies of jws_fast_path.py are identical")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())